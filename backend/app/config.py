@@ -44,7 +44,74 @@ class Settings(BaseSettings):
     max_file_size: int = 10 * 1024 * 1024  # 10MB
     allowed_image_types: List[str] = ["image/jpeg", "image/png", "image/webp"]
     max_files_per_upload: int = 10
+    upload_spool_max_bytes: int = 1024 * 1024  # Uploads above this are spooled to disk
+    max_image_pixels: int = 40_000_000  # Reject decompression bombs before decoding
+    image_batch_concurrency: int = 4  # Files processed at once by batch uploads
+    image_process_workers: int = 0  # Image processing worker processes (0 = one per CPU)
+    direct_upload_expires_in: int = 900  # Lifetime of presigned direct-to-storage upload URLs (seconds)
+    image_job_poll_interval: int = 5  # Seconds between checks for pending image processing jobs
+    image_job_max_attempts: int = 3
+    image_job_timeout: int = 600  # Seconds before a job stuck in processing is retried
+    storage_delete_concurrency: int = 4  # DeleteObjects batches (up to 1,000 keys each) in flight at once
+    storage_deletion_retry_interval: int = 300  # Seconds between retries of failed storage deletions
     
+    # Image Variants
+    lazy_image_variants: bool = True  # Render thumbnails and platform variants on first request
+    image_variant_cache_dir: str = "./.cache/image_variants"
+    image_variant_cache_max_bytes: int = 512 * 1024 * 1024  # 512MB
+    
+    # Near-Duplicate Detection
+    near_duplicate_max_distance: int = 6  # Perceptual hash bits that may differ between near duplicates
+    near_duplicate_index_max_users: int = 256  # Per-user hash indexes kept in memory
+    near_duplicate_index_ttl: int = 300  # Seconds before a user's index is rebuilt from the database
+    
+    # Metrics
+    metrics_enabled: bool = False  # Expose Prometheus metrics at /metrics
+    metrics_collection_concurrency: int = 4  # Metrics requests in flight per platform while collecting for a user
+    engagement_rollup_interval: int = 60  # Seconds between engagement rollup recomputation passes
+    engagement_rollup_batch_size: int = 500  # Rollup buckets recomputed per pass
+    engagement_polling_enabled: bool = True  # Refresh engagement of published posts in the background
+    engagement_poll_interval: int = 60  # Seconds between engagement polling passes
+    engagement_poll_batch_size: int = 100  # Post results polled per pass, shared between platforms; bounds API calls
+    engagement_poll_min_interval: int = 600  # Seconds between polls of a just-published post
+    engagement_poll_max_interval: int = 86400  # Seconds between polls of an older post
+    engagement_poll_age_factor: float = 0.2  # Poll interval as a fraction of the post's age, within those bounds
+    engagement_poll_max_age_days: int = 30  # Posts older than this are no longer polled
+    engagement_poll_max_failures: int = 5  # Consecutive failed polls before a post result is given up on
+    engagement_history_interval: int = 300  # Seconds between engagement history downsampling passes
+    engagement_history_batch_size: int = 5000  # Samples rolled up per batch
+    engagement_history_raw_days: int = 7  # Days raw engagement samples are kept
+    engagement_history_hourly_days: int = 90  # Days hourly engagement samples are kept; daily ones are kept for good
+    sales_rollup_repair_interval: int = 3600  # Seconds between sales rollup repair passes
+    analytics_snapshot_ttl: int = 300  # Seconds before a user's columnar analytics snapshot is reloaded
+    analytics_snapshot_max_users: int = 128  # Columnar analytics snapshots kept in memory
+    analytics_snapshot_days: int = 800  # History in cached snapshots: a year plus the year before it
+    
+    # Response Cache
+    redis_url: str = ""  # Shares data versions and cached responses between workers; in-process when unset
+    single_worker: bool = False  # Trust in-process data versions without Redis; only correct when one API process serves all requests
+    response_cache_ttl: int = 60  # Seconds a cached dashboard/analytics response is served as fresh
+    response_cache_stale_ttl: int = 300  # Further seconds it is served while being refreshed in the background
+    response_cache_max_entries: int = 2048  # Responses kept in process memory
+    
+    # Sales Sync
+    sales_sync_initial_days: int = 90  # Order history pulled on a connection's first sync
+    sales_sync_platform_concurrency: int = 4  # Connections of one platform synced at once per process
+    
+    # Sales Import
+    sales_import_dir: str = "./.cache/sales_imports"  # Uploaded CSV files awaiting import; shared by the API workers
+    sales_import_max_bytes: int = 200 * 1024 * 1024  # 200MB
+    sales_import_chunk_size: int = 2000  # Rows validated and inserted per transaction (1,000-5,000 works well)
+    sales_import_max_errors: int = 100  # Row errors kept for reporting per import
+    sales_import_poll_interval: int = 5  # Seconds between checks for pending sales imports
+    sales_import_max_attempts: int = 3
+    sales_import_timeout: int = 600  # Seconds without progress before an import stuck in processing is resumed
+
+    # List Pagination
+    list_total_cache_ttl: int = 60  # Seconds a list's total is reused before it is counted again
+    list_total_cache_max_entries: int = 4096  # List totals kept in process memory
+    list_total_estimate_threshold: int = 10000  # Planner estimates at least this large are returned instead of counting (PostgreSQL)
+
     # Content Security
     max_content_length: int = 10000  # characters
     max_title_length: int = 200
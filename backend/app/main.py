@@ -1,10 +1,21 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from .config import settings
 from .routers import auth, images, content, products, oauth, posts, platforms, preferences, sales, engagement, analytics, privacy
 from .middleware import SecurityMiddleware, RequestValidationMiddleware, LoggingMiddleware, CSRFProtectionMiddleware
 from .security_hardening import configure_security_middleware
+from .services.image_processing import shutdown_process_pool
+from .services.image_metrics import get_image_metrics
+from .services.image_jobs import get_image_job_processor
+from .services.storage_deletion import get_storage_deletion_service
+from .services.engagement_rollups import get_engagement_rollup_service
+from .services.engagement_poller import get_engagement_poller
+from .services.engagement_history import get_engagement_history_service
+from .services.sales_import import get_sales_import_processor
+from .services.sales_rollups import get_sales_rollup_repair_service
+import asyncio
 import logging
 import gc
 
@@ -19,8 +30,38 @@ async def lifespan(app: FastAPI):
     """Simple application lifespan manager."""
     # Startup
     gc.collect()
+    image_job_processor = get_image_job_processor()
+    image_job_task = asyncio.create_task(image_job_processor.start())
+    storage_deletion_service = get_storage_deletion_service()
+    storage_deletion_task = asyncio.create_task(storage_deletion_service.start())
+    engagement_rollup_service = get_engagement_rollup_service()
+    engagement_rollup_task = asyncio.create_task(engagement_rollup_service.start())
+    sales_rollup_repair_service = get_sales_rollup_repair_service()
+    sales_rollup_repair_task = asyncio.create_task(sales_rollup_repair_service.start())
+    engagement_history_service = get_engagement_history_service()
+    engagement_history_task = asyncio.create_task(engagement_history_service.start())
+    sales_import_processor = get_sales_import_processor()
+    sales_import_task = asyncio.create_task(sales_import_processor.start())
+    engagement_poller = get_engagement_poller() if settings.engagement_polling_enabled else None
+    engagement_poller_task = asyncio.create_task(engagement_poller.start()) if engagement_poller else None
     yield
     # Shutdown
+    await image_job_processor.stop()
+    image_job_task.cancel()
+    await storage_deletion_service.stop()
+    storage_deletion_task.cancel()
+    await engagement_rollup_service.stop()
+    engagement_rollup_task.cancel()
+    await sales_rollup_repair_service.stop()
+    sales_rollup_repair_task.cancel()
+    await engagement_history_service.stop()
+    engagement_history_task.cancel()
+    await sales_import_processor.stop()
+    sales_import_task.cancel()
+    if engagement_poller:
+        await engagement_poller.stop()
+        engagement_poller_task.cancel()
+    shutdown_process_pool()
     gc.collect()
 
 app = FastAPI(
@@ -65,6 +106,13 @@ async def root():
         "status": "running"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for the image pipeline, when enabled."""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not found")
+    return PlainTextResponse(get_image_metrics().render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     """Basic health check endpoint."""
@@ -22,6 +22,13 @@ from .security_config import security_config
 
 logger = logging.getLogger(__name__)
 
+# Single-image upload endpoints are rejected from Content-Length alone when the
+# body cannot fit within the maximum image size plus multipart framing.
+SINGLE_IMAGE_UPLOAD_PATHS = {"/images/upload", "/images/process", "/images/validate"}
+SINGLE_UPLOAD_MAX_REQUEST_SIZE = settings.max_file_size + 64 * 1024
+BATCH_UPLOAD_PATH = "/images/upload/batch"
+BATCH_UPLOAD_MAX_REQUEST_SIZE = settings.max_files_per_upload * SINGLE_UPLOAD_MAX_REQUEST_SIZE
+
 
 class SecurityMiddleware(BaseHTTPMiddleware):
     """Comprehensive security middleware."""
@@ -120,7 +127,12 @@ class SecurityMiddleware(BaseHTTPMiddleware):
         if content_length:
             try:
                 size = int(content_length)
-                max_size = 50 * 1024 * 1024  # 50MB
+                if request.url.path in SINGLE_IMAGE_UPLOAD_PATHS:
+                    max_size = SINGLE_UPLOAD_MAX_REQUEST_SIZE
+                elif request.url.path == BATCH_UPLOAD_PATH:
+                    max_size = BATCH_UPLOAD_MAX_REQUEST_SIZE
+                else:
+                    max_size = 50 * 1024 * 1024  # 50MB
                 if size > max_size:
                     raise SecurityError(f"Request too large: {size} bytes")
             except ValueError:
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, DateTime, Boolean, Integer, Text, DECIMAL, JSON, ForeignKey
+from sqlalchemy import Column, String, Date, DateTime, Boolean, Integer, SmallInteger, BigInteger, Text, DECIMAL, JSON, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from sqlalchemy.orm import relationship
 from .database import Base
 import uuid
@@ -61,11 +61,18 @@ class Image(Base):
     file_size = Column(Integer, nullable=False)
     dimensions = Column(JSON, nullable=False)  # {"width": 800, "height": 600}
     format = Column(String, nullable=False)
+    content_hash = Column(String, index=True)  # SHA-256 of the original upload bytes
+    perceptual_hash = Column(String)  # 64-bit dHash as hex, for near-duplicate detection
     created_at = Column(DateTime, default=func.now())
 
     # Relationships
     user = relationship("User", back_populates="images")
 
+    # Serves per-user listings newest first
+    __table_args__ = (
+        Index("ix_images_user_id_created_at", "user_id", "created_at"),
+    )
+
     def __repr__(self):
         return f"<Image(id={self.id}, filename={self.original_filename}, user_id={self.user_id})>"
 
@@ -74,7 +81,7 @@ class ProductImage(Base):
     __tablename__ = "product_images"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    product_id = Column(String, ForeignKey("products.id"), nullable=False)
+    product_id = Column(String, ForeignKey("products.id"), nullable=False, index=True)
     original_filename = Column(String, nullable=False)
     original_url = Column(String, nullable=False)
     compressed_url = Column(String, nullable=False)
@@ -84,6 +91,8 @@ class ProductImage(Base):
     file_size = Column(Integer, nullable=False)
     dimensions = Column(JSON, nullable=False)  # {"width": 800, "height": 600}
     format = Column(String, nullable=False)
+    content_hash = Column(String, index=True)  # SHA-256 of the original upload bytes
+    perceptual_hash = Column(String)  # 64-bit dHash as hex, for near-duplicate detection
     created_at = Column(DateTime, default=func.now())
 
     # Relationships
@@ -93,6 +102,89 @@ class ProductImage(Base):
         return f"<ProductImage(id={self.id}, filename={self.original_filename}, product_id={self.product_id})>"
 
 
+class StoredObject(Base):
+    __tablename__ = "stored_objects"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    content_hash = Column(String, nullable=False, unique=True, index=True)  # Hash of bytes (originals) or source hash + variant spec
+    storage_path = Column(String, nullable=False, unique=True)
+    url = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    content_type = Column(String, nullable=False)
+    
+    # Number of Image/ProductImage rows whose storage_paths reference this object
+    ref_count = Column(Integer, nullable=False, default=0)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=func.now())
+    last_referenced_at = Column(DateTime, default=func.now())
+
+    def __repr__(self):
+        return f"<StoredObject(id={self.id}, content_hash={self.content_hash}, ref_count={self.ref_count})>"
+
+
+class StorageUsage(Base):
+    __tablename__ = "storage_usage"
+    
+    # One row per content type of indexed stored objects
+    content_type = Column(String, primary_key=True)
+    object_count = Column(Integer, nullable=False, default=0)
+    total_bytes = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<StorageUsage(content_type={self.content_type}, object_count={self.object_count}, total_bytes={self.total_bytes})>"
+
+
+class StorageDeletion(Base):
+    __tablename__ = "storage_deletion_queue"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    storage_path = Column(String, nullable=False, unique=True)
+    
+    # Retry tracking; rows are removed once the object is deleted
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=func.now(), index=True)
+    last_error = Column(Text)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=func.now())
+
+    def __repr__(self):
+        return f"<StorageDeletion(storage_path={self.storage_path}, attempts={self.attempts})>"
+
+
+class ImageProcessingJob(Base):
+    __tablename__ = "image_processing_jobs"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    product_id = Column(String, ForeignKey("products.id"))  # Attach the result to this product instead of the image library
+    
+    # Object uploaded directly to storage by the client
+    upload_path = Column(String, nullable=False, unique=True)
+    original_filename = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    platforms = Column(JSON)  # Platforms to optimize for
+    
+    # Processing tracking
+    status = Column(String, nullable=False, default="pending", index=True)  # pending, processing, completed, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    error_message = Column(Text)
+    
+    # Result: an Image or ProductImage id
+    result_id = Column(String)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<ImageProcessingJob(id={self.id}, upload_path={self.upload_path}, status={self.status})>"
+
+
 class PlatformConnection(Base):
     __tablename__ = "platform_connections"
     
@@ -128,6 +220,11 @@ class PlatformConnection(Base):
     # Relationships
     user = relationship("User", backref="platform_connections")
 
+    # Serves a user's active connections, optionally for one platform
+    __table_args__ = (
+        Index("ix_platform_connections_user_platform_active", "user_id", "platform", "is_active"),
+    )
+
     def __repr__(self):
         return f"<PlatformConnection(id={self.id}, user_id={self.user_id}, platform={self.platform}, is_active={self.is_active})>"
 
@@ -165,13 +262,18 @@ class Post(Base):
     last_error = Column(Text)
     
     # Timestamps
-    created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), index=True)  # Drives engagement poll discovery
 
     # Relationships
     user = relationship("User", backref="posts")
     product = relationship("Product", backref="posts")
 
+    # Serves per-user listings newest first, keyed on (created_at, id)
+    __table_args__ = (
+        Index("ix_posts_user_id_created_at", "user_id", "created_at", "id"),
+    )
+
     def __repr__(self):
         return f"<Post(id={self.id}, title={self.title}, status={self.status}, user_id={self.user_id})>"
 
@@ -185,7 +287,7 @@ class PostQueue(Base):
     
     # Queue management
     status = Column(String, nullable=False, default="pending")  # pending, processing, completed, failed
-    priority = Column(Integer, default=0)  # Higher number = higher priority
+    priority = Column(Integer, nullable=False, default=0)  # Higher number = higher priority
     scheduled_at = Column(DateTime, nullable=False)  # When to process this queue item
     
     # Processing tracking
@@ -209,6 +311,16 @@ class PostQueue(Base):
         return f"<PostQueue(id={self.id}, post_id={self.post_id}, platform={self.platform}, status={self.status})>"
 
 
+# Serves queue listings in processing order (priority DESC, scheduled_at, id) per status,
+# and process_queue's pending batch
+Index(
+    "ix_post_queue_status_priority_scheduled",
+    PostQueue.status, PostQueue.priority.desc(), PostQueue.scheduled_at, PostQueue.id
+)
+# Serves a post's queue items: remaining-item counts, deletes and joins from posts
+Index("ix_post_queue_post_id_status", PostQueue.post_id, PostQueue.status)
+
+
 class PlatformPreferences(Base):
     __tablename__ = "platform_preferences"
     
@@ -328,7 +440,7 @@ class SaleEvent(Base):
     # Timestamps
     occurred_at = Column(DateTime, nullable=False)  # When the sale actually occurred
     recorded_at = Column(DateTime, default=func.now())  # When we recorded this sale
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), index=True)  # Drives rollup repair
     
     # Status and processing
     status = Column(String, nullable=False, default="confirmed")  # confirmed, pending, cancelled, refunded
@@ -340,10 +452,115 @@ class SaleEvent(Base):
     product = relationship("Product", backref="sale_events")
     post = relationship("Post", backref="sale_events")
 
+    __table_args__ = (
+        # One sale per platform order; imports and syncs dedupe against it
+        Index("ix_sale_events_user_platform_order", "user_id", "platform", "order_id", unique=True),
+        # Serves per-user listings newest first, keyed on (occurred_at, id)
+        Index("ix_sale_events_user_occurred_at", "user_id", "occurred_at", "id"),
+        # Serves rollup rebuilds and backfills, which only read confirmed sales
+        Index(
+            "ix_sale_events_user_confirmed_occurred", "user_id", "occurred_at", "currency",
+            postgresql_where=text("status = 'confirmed'")
+        ),
+    )
+
     def __repr__(self):
         return f"<SaleEvent(id={self.id}, platform={self.platform}, amount={self.amount}, user_id={self.user_id})>"
 
 
+class SalesSyncState(Base):
+    __tablename__ = "sales_sync_state"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    connection_id = Column(String, ForeignKey("platform_connections.id"), nullable=False, unique=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    platform = Column(String, nullable=False)
+    
+    # High-water mark of the orders synced so far; the next sync pulls orders changed since
+    cursor = Column(JSON)  # Platform-specific, e.g. {"updated_at": "..."} for Shopify
+    
+    # Last sync outcome
+    last_sync_at = Column(DateTime)
+    last_status = Column(String)  # success, failed
+    last_error = Column(Text)
+    synced_count = Column(Integer, nullable=False, default=0)  # Orders created or updated, all time
+    
+    # Timestamps
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<SalesSyncState(connection_id={self.connection_id}, platform={self.platform}, cursor={self.cursor})>"
+
+
+class SalesImportJob(Base):
+    __tablename__ = "sales_import_jobs"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    
+    # Uploaded CSV staged on local disk
+    file_path = Column(String, nullable=False, unique=True)
+    original_filename = Column(String, nullable=False)
+    file_size = Column(BigInteger, nullable=False)
+    
+    # Processing tracking
+    status = Column(String, nullable=False, default="pending", index=True)  # pending, processing, completed, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    error_message = Column(Text)
+    
+    # Progress, committed with each chunk; an interrupted import resumes at byte_offset
+    byte_offset = Column(BigInteger, nullable=False, default=0)
+    rows_processed = Column(Integer, nullable=False, default=0)
+    rows_imported = Column(Integer, nullable=False, default=0)
+    rows_duplicate = Column(Integer, nullable=False, default=0)
+    rows_failed = Column(Integer, nullable=False, default=0)
+    errors = Column(JSON)  # First settings.sales_import_max_errors row errors
+    
+    # Timestamps
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<SalesImportJob(id={self.id}, status={self.status}, rows_processed={self.rows_processed})>"
+
+
+class SalesDailyRollup(Base):
+    __tablename__ = "sales_daily_rollup"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    
+    # Bucket: confirmed sales of one product on one platform, day and currency
+    day = Column(Date, nullable=False)  # UTC day of occurred_at
+    platform = Column(String, nullable=False)
+    product_key = Column(String, nullable=False)  # "<product id>|<product title>", either part may be empty
+    product_id = Column(String)  # Not a foreign key: rollups outlive deleted products like their sales do
+    product_title = Column(String)
+    currency = Column(String, nullable=False)
+    
+    # Sums over the bucket's sales
+    order_count = Column(Integer, nullable=False, default=0)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(DECIMAL(14, 2), nullable=False, default=0)
+    commission = Column(DECIMAL(14, 2), nullable=False, default=0)
+    net_revenue = Column(DECIMAL(14, 2), nullable=False, default=0)
+    commission_rate_sum = Column(DECIMAL(12, 4), nullable=False, default=0)  # Over sales with a rate
+    commission_rate_count = Column(Integer, nullable=False, default=0)
+    
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "day", "platform", "product_key", "currency", name="uq_sales_daily_rollup_bucket"),
+        Index("ix_sales_daily_rollup_user_currency_day", "user_id", "currency", "day"),
+    )
+
+    def __repr__(self):
+        return f"<SalesDailyRollup(user_id={self.user_id}, day={self.day}, platform={self.platform}, revenue={self.revenue})>"
+
+
 class EngagementMetrics(Base):
     __tablename__ = "engagement_metrics"
     
@@ -373,7 +590,7 @@ class EngagementMetrics(Base):
     
     # Timestamps
     metrics_date = Column(DateTime, nullable=False)  # Date the metrics represent (for historical data)
-    collected_at = Column(DateTime, default=func.now())  # When we collected this data
+    collected_at = Column(DateTime, default=func.now(), nullable=False)  # When we collected this data
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
     # Status and processing
@@ -384,10 +601,51 @@ class EngagementMetrics(Base):
     user = relationship("User", backref="engagement_metrics")
     post = relationship("Post", backref="engagement_metrics")
 
+    __table_args__ = (
+        # Serves per-user listings most recently collected first, keyed on (collected_at, id)
+        Index("ix_engagement_metrics_user_collected_at", "user_id", "collected_at", "id"),
+        # Serves dashboard and rollup reads of active metrics over a date range
+        Index(
+            "ix_engagement_metrics_user_active_date", "user_id", "metrics_date", "platform",
+            postgresql_where=text("status = 'active'")
+        ),
+        # Serves per-post lookups and the upsert of collected metrics
+        Index("ix_engagement_metrics_user_post_platform", "user_id", "post_id", "platform"),
+    )
+
     def __repr__(self):
         return f"<EngagementMetrics(id={self.id}, platform={self.platform}, post_id={self.post_id}, likes={self.likes})>"
 
 
+class EngagementSample(Base):
+    __tablename__ = "engagement_samples"
+    
+    # Append-only history of engagement; PostgreSQL partitions it by month of sampled_at
+    post_id = Column(String, primary_key=True)  # Not foreign keys: history outlives deleted posts
+    platform = Column(String, primary_key=True)
+    resolution = Column(SmallInteger, primary_key=True)  # 0 raw, 1 hourly, 2 daily
+    sampled_at = Column(DateTime, primary_key=True)  # Collection time (raw) or period start
+    user_id = Column(String, nullable=False)
+    
+    # Change in the post's counters since its previous sample (summed over the period when downsampled)
+    likes = Column(Integer, nullable=False, default=0)
+    shares = Column(Integer, nullable=False, default=0)
+    comments = Column(Integer, nullable=False, default=0)
+    views = Column(Integer, nullable=False, default=0)
+    reach = Column(Integer, nullable=False, default=0)
+    
+    rolled_up = Column(Boolean, nullable=False, default=False)  # Counted in the next coarser resolution
+
+    __table_args__ = (
+        Index("ix_engagement_samples_user_resolution_sampled", "user_id", "resolution", "sampled_at"),
+        Index("ix_engagement_samples_resolution_rolled_sampled", "resolution", "rolled_up", "sampled_at"),
+        {"postgresql_partition_by": "RANGE (sampled_at)"},
+    )
+
+    def __repr__(self):
+        return f"<EngagementSample(post_id={self.post_id}, platform={self.platform}, resolution={self.resolution}, sampled_at={self.sampled_at})>"
+
+
 class MetricsAggregation(Base):
     __tablename__ = "metrics_aggregations"
     
@@ -395,8 +653,8 @@ class MetricsAggregation(Base):
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
     
     # Aggregation parameters
-    aggregation_type = Column(String, nullable=False)  # daily, weekly, monthly, platform, product
-    aggregation_key = Column(String, nullable=False)  # Date string, platform name, product ID, etc.
+    aggregation_type = Column(String, nullable=False)  # daily, weekly, monthly, product
+    aggregation_key = Column(String, nullable=False)  # "<period start>|<platform>" or "<month start>|<product id>|<platform>"
     period_start = Column(DateTime, nullable=False)
     period_end = Column(DateTime, nullable=False)
     
@@ -409,6 +667,8 @@ class MetricsAggregation(Base):
     total_reach = Column(Integer, default=0)
     
     # Calculated aggregated metrics
+    engagement_rate_sum = Column(DECIMAL(14, 2), default=0)  # Sum over metrics with a rate, for exact averages
+    rated_posts = Column(Integer, default=0)  # Metrics included in engagement_rate_sum
     average_engagement_rate = Column(DECIMAL(5, 2))
     best_performing_post_id = Column(String)
     worst_performing_post_id = Column(String)
@@ -423,15 +683,52 @@ class MetricsAggregation(Base):
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
     # Status
-    status = Column(String, nullable=False, default="current")  # current, outdated, recalculating
+    status = Column(String, nullable=False, default="current")  # open, current, outdated, recalculating
     
     # Relationships
     user = relationship("User", backref="metrics_aggregations")
 
+    # One row per bucket, so deltas can be applied as upserts; range reads by period
+    __table_args__ = (
+        UniqueConstraint("user_id", "aggregation_type", "aggregation_key", name="uq_metrics_aggregations_bucket"),
+        Index("ix_metrics_aggregations_user_type_period", "user_id", "aggregation_type", "period_start"),
+        Index("ix_metrics_aggregations_status_period_end", "status", "period_end"),
+    )
+
     def __repr__(self):
         return f"<MetricsAggregation(id={self.id}, type={self.aggregation_type}, key={self.aggregation_key}, user_id={self.user_id})>"
 
 
+class EngagementPollSchedule(Base):
+    __tablename__ = "engagement_poll_schedule"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    
+    # One published platform result of a post
+    post_id = Column(String, nullable=False)  # Not a foreign key: the schedule is dropped once the post is gone
+    platform = Column(String, nullable=False)
+    platform_post_id = Column(String, nullable=False)
+    published_at = Column(DateTime, nullable=False)
+    
+    # Polling state; next_poll_at is null once the post is too old to poll
+    next_poll_at = Column(DateTime)
+    last_polled_at = Column(DateTime)
+    poll_count = Column(Integer, nullable=False, default=0)
+    consecutive_failures = Column(Integer, nullable=False, default=0)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("post_id", "platform", "platform_post_id", name="uq_engagement_poll_schedule_target"),
+        Index("ix_engagement_poll_schedule_platform_next_poll", "platform", "next_poll_at"),
+    )
+
+    def __repr__(self):
+        return f"<EngagementPollSchedule(post_id={self.post_id}, platform={self.platform}, next_poll_at={self.next_poll_at})>"
+
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
     
@@ -466,6 +763,13 @@ class AuditLog(Base):
     # Relationships
     user = relationship("User", backref="audit_logs")
 
+    __table_args__ = (
+        # Serves per-user listings newest first, keyed on (timestamp, id)
+        Index("ix_audit_logs_user_timestamp", "user_id", "timestamp", "id"),
+        # Serves the cross-user reads by age: critical events, failed actions and cleanup
+        Index("ix_audit_logs_timestamp", "timestamp"),
+    )
+
     def __repr__(self):
         return f"<AuditLog(id={self.id}, action={self.action}, user_id={self.user_id}, timestamp={self.timestamp})>"
 
@@ -0,0 +1,242 @@
+"""
+Keyset (cursor) pagination.
+
+Lists are ordered by one or more sort columns ending with a unique one
+(usually the row id), and a page continues after the last row of the
+previous one:
+
+    WHERE (sort, id) < (:last_sort, :last_id) ORDER BY sort DESC, id DESC
+
+so with an index on the sort columns every page costs the same, however
+deep. Clients get the position as an opaque cursor string and pass it back
+to fetch the next page.
+
+List totals are counted separately by list_total(). Counting a large list
+costs as much as reading it, so unless an exact count is asked for, totals
+are reused for a short while and, on PostgreSQL, large lists report the
+planner's row estimate instead.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.orm import Query
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# A sort column and whether it is descending
+SortKey = Tuple[Any, bool]
+
+
+class InvalidCursor(ValueError):
+    """A pagination cursor that was not issued by this API or does not fit the list."""
+
+
+class Page(NamedTuple):
+    """One page of a list."""
+    items: List[Any]
+    total: int
+    total_exact: bool  # False when total is the planner's estimate
+    next_cursor: Optional[str]  # None on the last page
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+        if "dec" in value:
+            return Decimal(value["dec"])
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Opaque cursor for a position (the sort key values of a row)."""
+    payload = json.dumps([_encode_value(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int = 2) -> Tuple[Any, ...]:
+    """
+    Position encoded in a cursor.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed or has the wrong number of values
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError("unexpected cursor shape")
+        return tuple(_decode_value(value) for value in values)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid pagination cursor: {e}")
+
+
+def newest_first(sort_column, id_column) -> List[SortKey]:
+    """Sort keys for the common (sort_column DESC, id_column DESC) order."""
+    return [(sort_column, True), (id_column, True)]
+
+
+def after(keys: Sequence[SortKey], position: Sequence[Any]):
+    """Filter for rows after a position in the order of keys."""
+    directions = {descending for _, descending in keys}
+    if len(directions) == 1:
+        # A row-value comparison, which an index on the columns serves as a range scan
+        columns = tuple_(*(column for column, _ in keys))
+        values = tuple_(*position)
+        return columns < values if directions.pop() else columns > values
+
+    # Mixed directions: expand the comparison, bounding the leading column
+    # so the index still narrows the scan
+    branches = []
+    for index, (column, descending) in enumerate(keys):
+        equal = [keys[earlier][0] == position[earlier] for earlier in range(index)]
+        beyond = column < position[index] if descending else column > position[index]
+        branches.append(and_(*equal, beyond))
+    first_column, first_descending = keys[0]
+    bound = first_column <= position[0] if first_descending else first_column >= position[0]
+    return and_(bound, or_(*branches))
+
+
+def keyset_order(keys: Sequence[SortKey]) -> list:
+    """ORDER BY clauses matching after()."""
+    return [column.desc() if descending else column.asc() for column, descending in keys]
+
+
+def keyset_page(
+    query: Query,
+    keys: Sequence[SortKey],
+    limit: int,
+    cursor: Optional[str] = None,
+    offset: int = 0
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Fetch one page of a query in keyset order.
+
+    Args:
+        query: Filtered query of ORM rows; it must not be ordered yet
+        keys: (column, descending) pairs to sort by; the last column must be
+            unique (usually the primary key) and none of them nullable
+        limit: Page size
+        cursor: Cursor of the previous page (None for the first page)
+        offset: Rows to skip, for clients still paging by offset; cursor
+            clients leave it at 0
+
+    Returns:
+        Tuple of (rows, cursor of the next page or None on the last page)
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    if cursor:
+        query = query.filter(after(keys, decode_cursor(cursor, len(keys))))
+
+    query = query.order_by(*keyset_order(keys))
+    if offset:
+        query = query.offset(offset)
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, column.key) for column, _ in keys])
+
+
+_totals: "OrderedDict[str, Tuple[int, bool, float]]" = OrderedDict()
+
+
+def _total_key(query: Query) -> str:
+    compiled = query.statement.compile(dialect=query.session.get_bind().dialect)
+    params = sorted((name, repr(value)) for name, value in compiled.params.items())
+    return hashlib.sha256(f"{compiled}|{params}".encode()).hexdigest()
+
+
+def estimated_count(query: Query) -> Optional[int]:
+    """
+    The PostgreSQL planner's estimate of the number of rows a query returns.
+
+    Returns:
+        The estimate, or None on other databases or when it is unavailable
+    """
+    session = query.session
+    dialect = session.get_bind().dialect
+    if dialect.name != "postgresql":
+        return None
+
+    compiled = query.order_by(None).statement.compile(dialect=dialect)
+    try:
+        # In a savepoint, so a failed EXPLAIN leaves the caller's transaction usable
+        with session.begin_nested():
+            plan = session.connection().exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+            ).scalar()
+    except Exception as e:
+        logger.warning(f"Could not estimate list size: {e}")
+        return None
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def list_total(query: Query, exact: bool = False) -> Tuple[int, bool]:
+    """
+    Number of rows in a list.
+
+    Exact counts are only run when asked for, or when the list is small
+    enough for the count to be cheap (below
+    settings.list_total_estimate_threshold by the planner's estimate).
+    Otherwise the planner's estimate is returned. Either way the total is
+    reused for settings.list_total_cache_ttl seconds, so paging through a
+    list does not count it again for every page.
+
+    Args:
+        query: Filtered query of the list
+        exact: Count the rows even when the list is large
+
+    Returns:
+        Tuple of (total, whether it is an exact count)
+    """
+    key = _total_key(query)
+    cached = _totals.get(key)
+    if cached is not None:
+        total, is_exact, stored_at = cached
+        if time.time() - stored_at < settings.list_total_cache_ttl and (is_exact or not exact):
+            _totals.move_to_end(key)
+            return total, is_exact
+
+    total, is_exact = None, True
+    if not exact:
+        estimate = estimated_count(query)
+        if estimate is not None and estimate >= settings.list_total_estimate_threshold:
+            total, is_exact = estimate, False
+    if total is None:
+        total = query.order_by(None).count()
+
+    _totals[key] = (total, is_exact, time.time())
+    _totals.move_to_end(key)
+    while len(_totals) > settings.list_total_cache_max_entries:
+        _totals.popitem(last=False)
+    return total, is_exact
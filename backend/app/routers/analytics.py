@@ -4,7 +4,7 @@ Analytics API endpoints for platform performance analysis.
 
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 
 from ..database import get_db
@@ -13,12 +13,14 @@ from ..models import User
 from ..services.sales_tracking import SalesTrackingService
 from ..services.engagement_metrics import get_engagement_metrics_service
 from ..services.analytics_service import AnalyticsService
+from ..services.response_cache import get_response_cache
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
 
 @router.get("/platform-performance")
 async def get_platform_performance_breakdown(
+    request: Request,
     start_date: Optional[datetime] = Query(None, description="Start date for analysis"),
     end_date: Optional[datetime] = Query(None, description="End date for analysis"),
     platforms: Optional[List[str]] = Query(None, description="Specific platforms to analyze"),
@@ -33,18 +35,22 @@ async def get_platform_performance_breakdown(
     if not start_date:
         start_date = end_date - timedelta(days=30)
     
-    analytics_service = AnalyticsService(db)
-    return await analytics_service.get_platform_performance_breakdown(
-        user_id=current_user.id,
-        start_date=start_date,
-        end_date=end_date,
-        platforms=platforms,
-        currency=currency
-    )
+    async def compute(db: Session):
+        analytics_service = AnalyticsService(db)
+        return await analytics_service.get_platform_performance_breakdown(
+            user_id=current_user.id,
+            start_date=start_date,
+            end_date=end_date,
+            platforms=platforms,
+            currency=currency
+        )
+    
+    return await get_response_cache().respond(request, current_user.id, "analytics/platform-performance", compute, db)
 
 
 @router.get("/platform-comparison")
 async def get_platform_comparison(
+    request: Request,
     platform_a: str = Query(..., description="First platform to compare"),
     platform_b: str = Query(..., description="Second platform to compare"),
     start_date: Optional[datetime] = Query(None, description="Start date for comparison"),
@@ -60,19 +66,23 @@ async def get_platform_comparison(
     if not start_date:
         start_date = end_date - timedelta(days=30)
     
-    analytics_service = AnalyticsService(db)
-    return await analytics_service.compare_platforms(
-        user_id=current_user.id,
-        platform_a=platform_a,
-        platform_b=platform_b,
-        start_date=start_date,
-        end_date=end_date,
-        currency=currency
-    )
+    async def compute(db: Session):
+        analytics_service = AnalyticsService(db)
+        return await analytics_service.compare_platforms(
+            user_id=current_user.id,
+            platform_a=platform_a,
+            platform_b=platform_b,
+            start_date=start_date,
+            end_date=end_date,
+            currency=currency
+        )
+    
+    return await get_response_cache().respond(request, current_user.id, "analytics/platform-comparison", compute, db)
 
 
 @router.get("/top-products")
 async def get_top_performing_products(
+    request: Request,
     start_date: Optional[datetime] = Query(None, description="Start date for analysis"),
     end_date: Optional[datetime] = Query(None, description="End date for analysis"),
     platforms: Optional[List[str]] = Query(None, description="Specific platforms to analyze"),
@@ -88,19 +98,23 @@ async def get_top_performing_products(
     if not start_date:
         start_date = end_date - timedelta(days=30)
     
-    analytics_service = AnalyticsService(db)
-    return await analytics_service.get_top_performing_products(
-        user_id=current_user.id,
-        start_date=start_date,
-        end_date=end_date,
-        platforms=platforms,
-        limit=limit,
-        currency=currency
-    )
+    async def compute(db: Session):
+        analytics_service = AnalyticsService(db)
+        return await analytics_service.get_top_performing_products(
+            user_id=current_user.id,
+            start_date=start_date,
+            end_date=end_date,
+            platforms=platforms,
+            limit=limit,
+            currency=currency
+        )
+    
+    return await get_response_cache().respond(request, current_user.id, "analytics/top-products", compute, db)
 
 
 @router.get("/platform-roi")
 async def get_platform_roi_analysis(
+    request: Request,
     start_date: Optional[datetime] = Query(None, description="Start date for ROI analysis"),
     end_date: Optional[datetime] = Query(None, description="End date for ROI analysis"),
     platforms: Optional[List[str]] = Query(None, description="Specific platforms to analyze"),
@@ -115,18 +129,22 @@ async def get_platform_roi_analysis(
     if not start_date:
         start_date = end_date - timedelta(days=30)
     
-    analytics_service = AnalyticsService(db)
-    return await analytics_service.get_platform_roi_analysis(
-        user_id=current_user.id,
-        start_date=start_date,
-        end_date=end_date,
-        platforms=platforms,
-        currency=currency
-    )
+    async def compute(db: Session):
+        analytics_service = AnalyticsService(db)
+        return await analytics_service.get_platform_roi_analysis(
+            user_id=current_user.id,
+            start_date=start_date,
+            end_date=end_date,
+            platforms=platforms,
+            currency=currency
+        )
+    
+    return await get_response_cache().respond(request, current_user.id, "analytics/platform-roi", compute, db)
 
 
 @router.get("/insights")
 async def get_analytics_insights(
+    request: Request,
     start_date: Optional[datetime] = Query(None, description="Start date for insights"),
     end_date: Optional[datetime] = Query(None, description="End date for insights"),
     platforms: Optional[List[str]] = Query(None, description="Specific platforms to analyze"),
@@ -141,18 +159,22 @@ async def get_analytics_insights(
     if not start_date:
         start_date = end_date - timedelta(days=30)
     
-    analytics_service = AnalyticsService(db)
-    return await analytics_service.get_analytics_insights(
-        user_id=current_user.id,
-        start_date=start_date,
-        end_date=end_date,
-        platforms=platforms,
-        currency=currency
-    )
+    async def compute(db: Session):
+        analytics_service = AnalyticsService(db)
+        return await analytics_service.get_analytics_insights(
+            user_id=current_user.id,
+            start_date=start_date,
+            end_date=end_date,
+            platforms=platforms,
+            currency=currency
+        )
+    
+    return await get_response_cache().respond(request, current_user.id, "analytics/insights", compute, db)
 
 
 @router.get("/performance-trends")
 async def get_performance_trends(
+    request: Request,
     start_date: Optional[datetime] = Query(None, description="Start date for trend analysis"),
     end_date: Optional[datetime] = Query(None, description="End date for trend analysis"),
     platforms: Optional[List[str]] = Query(None, description="Specific platforms to analyze"),
@@ -172,12 +194,15 @@ async def get_performance_trends(
     if group_by not in ["day", "week", "month"]:
         raise HTTPException(status_code=400, detail="Invalid group_by parameter. Must be 'day', 'week', or 'month'")
     
-    analytics_service = AnalyticsService(db)
-    return await analytics_service.get_performance_trends(
-        user_id=current_user.id,
-        start_date=start_date,
-        end_date=end_date,
-        platforms=platforms,
-        group_by=group_by,
-        currency=currency
-    )
\ No newline at end of file
+    async def compute(db: Session):
+        analytics_service = AnalyticsService(db)
+        return await analytics_service.get_performance_trends(
+            user_id=current_user.id,
+            start_date=start_date,
+            end_date=end_date,
+            platforms=platforms,
+            group_by=group_by,
+            currency=currency
+        )
+    
+    return await get_response_cache().respond(request, current_user.id, "analytics/performance-trends", compute, db)
\ No newline at end of file
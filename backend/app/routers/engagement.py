@@ -7,12 +7,13 @@ retrieval, and analytics dashboard functionality.
 
 from datetime import datetime, timedelta
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, Request
 from sqlalchemy.orm import Session
 
 from ..database import get_db
 from ..dependencies import get_current_user
-from ..models import User
+from ..models import User, Post
+from ..pagination import InvalidCursor, keyset_page, list_total, newest_first
 from ..schemas import (
     EngagementMetricsResponse,
     EngagementMetricsListResponse,
@@ -22,7 +23,9 @@ from ..schemas import (
     MetricsAggregationResponse
 )
 from ..services.engagement_metrics import get_engagement_metrics_service
+from ..services.engagement_rollups import apply_metrics_change, contribution_of
 from ..services.platform_integration import Platform
+from ..services.response_cache import get_response_cache
 
 router = APIRouter(prefix="/engagement", tags=["engagement"])
 
@@ -92,6 +95,7 @@ async def collect_engagement_metrics(
 
 @router.get("/dashboard", response_model=EngagementDashboardData)
 async def get_engagement_dashboard(
+    request: Request,
     start_date: Optional[datetime] = Query(None, description="Start date for dashboard data"),
     end_date: Optional[datetime] = Query(None, description="End date for dashboard data"),
     platforms: Optional[List[str]] = Query(None, description="Specific platforms to include"),
@@ -130,14 +134,16 @@ async def get_engagement_dashboard(
                     detail=f"Invalid platform specified: {str(e)}"
                 )
         
-        dashboard_data = await engagement_service.get_engagement_dashboard_data(
-            user_id=current_user.id,
-            start_date=start_date,
-            end_date=end_date,
-            platforms=platforms
-        )
+        # The service opens its own session
+        async def compute(db: Session):
+            return await engagement_service.get_engagement_dashboard_data(
+                user_id=current_user.id,
+                start_date=start_date,
+                end_date=end_date,
+                platforms=platforms
+            )
         
-        return dashboard_data
+        return await get_response_cache().respond(request, current_user.id, "engagement/dashboard", compute)
         
     except HTTPException:
         raise
@@ -313,18 +319,21 @@ async def get_engagement_metrics(
     post_id: Optional[str] = Query(None, description="Filter by post ID"),
     start_date: Optional[datetime] = Query(None, description="Filter by start date"),
     end_date: Optional[datetime] = Query(None, description="Filter by end date"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    exact_total: bool = Query(False, description="Count the total exactly instead of estimating it for large lists"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Get paginated list of engagement metrics.
     
-    Returns a paginated list of engagement metrics with optional filtering
-    by platform, post, and date range.
+    Returns a paginated list of engagement metrics, most recently collected
+    first, with optional filtering by platform, post, and date range. Page
+    with cursor (the previous page's next_cursor) rather than skip: cursor
+    pages cost the same however deep they are.
     """
     try:
         from ..models import EngagementMetrics
-        from sqlalchemy import and_, desc
         
         # Build query with filters
         query = db.query(EngagementMetrics).filter(
@@ -352,21 +361,24 @@ async def get_engagement_metrics(
         if end_date:
             query = query.filter(EngagementMetrics.metrics_date <= end_date)
         
-        # Get total count
-        total = query.count()
-        
-        # Get paginated results
-        metrics = query.order_by(desc(EngagementMetrics.collected_at)).offset(skip).limit(limit).all()
+        total, total_exact = list_total(query, exact_total)
+        metrics, next_cursor = keyset_page(
+            query, newest_first(EngagementMetrics.collected_at, EngagementMetrics.id), limit, cursor, offset=skip
+        )
         
         return EngagementMetricsListResponse(
             metrics=[EngagementMetricsResponse.model_validate(metric) for metric in metrics],
             total=total,
+            total_exact=total_exact,
             skip=skip,
-            limit=limit
+            limit=limit,
+            next_cursor=next_cursor
         )
         
     except HTTPException:
         raise
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -420,9 +432,12 @@ async def delete_engagement_metric(
                 detail="Engagement metric not found"
             )
         
-        # Mark as inactive instead of deleting
+        # Mark as inactive instead of deleting, and take it out of the rollups
+        product_id = db.query(Post.product_id).filter(Post.id == metric.post_id).scalar()
+        before = contribution_of(metric, product_id)
         metric.status = "inactive"
         metric.updated_at = datetime.utcnow()
+        apply_metrics_change(db, current_user.id, before, None)
         
         db.commit()
         
@@ -440,6 +455,7 @@ async def delete_engagement_metric(
 
 @router.get("/summary", response_model=dict)
 async def get_engagement_summary(
+    request: Request,
     days: int = Query(30, ge=1, le=365, description="Number of days to include in summary"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -453,45 +469,48 @@ async def get_engagement_summary(
         from ..models import EngagementMetrics
         from sqlalchemy import func, and_
         
-        # Calculate date range
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=days)
-        
-        # Get summary metrics
-        summary_query = db.query(
-            func.count(EngagementMetrics.id).label("total_posts"),
-            func.sum(EngagementMetrics.likes).label("total_likes"),
-            func.sum(EngagementMetrics.shares).label("total_shares"),
-            func.sum(EngagementMetrics.comments).label("total_comments"),
-            func.sum(EngagementMetrics.views).label("total_views"),
-            func.sum(EngagementMetrics.reach).label("total_reach"),
-            func.avg(EngagementMetrics.engagement_rate).label("avg_engagement_rate"),
-            func.count(func.distinct(EngagementMetrics.platform)).label("active_platforms")
-        ).filter(
-            and_(
-                EngagementMetrics.user_id == current_user.id,
-                EngagementMetrics.metrics_date >= start_date,
-                EngagementMetrics.metrics_date <= end_date,
-                EngagementMetrics.status == "active"
-            )
-        ).first()
-        
-        return {
-            "period_days": days,
-            "start_date": start_date.isoformat(),
-            "end_date": end_date.isoformat(),
-            "total_posts": int(summary_query.total_posts or 0),
-            "total_likes": int(summary_query.total_likes or 0),
-            "total_shares": int(summary_query.total_shares or 0),
-            "total_comments": int(summary_query.total_comments or 0),
-            "total_views": int(summary_query.total_views or 0),
-            "total_reach": int(summary_query.total_reach or 0),
-            "average_engagement_rate": float(summary_query.avg_engagement_rate or 0),
-            "active_platforms": int(summary_query.active_platforms or 0),
-            "total_engagement": int((summary_query.total_likes or 0) + 
-                                 (summary_query.total_shares or 0) + 
-                                 (summary_query.total_comments or 0))
-        }
+        async def compute(db: Session):
+            # Calculate date range
+            end_date = datetime.utcnow()
+            start_date = end_date - timedelta(days=days)
+        
+            # Get summary metrics
+            summary_query = db.query(
+                func.count(EngagementMetrics.id).label("total_posts"),
+                func.sum(EngagementMetrics.likes).label("total_likes"),
+                func.sum(EngagementMetrics.shares).label("total_shares"),
+                func.sum(EngagementMetrics.comments).label("total_comments"),
+                func.sum(EngagementMetrics.views).label("total_views"),
+                func.sum(EngagementMetrics.reach).label("total_reach"),
+                func.avg(EngagementMetrics.engagement_rate).label("avg_engagement_rate"),
+                func.count(func.distinct(EngagementMetrics.platform)).label("active_platforms")
+            ).filter(
+                and_(
+                    EngagementMetrics.user_id == current_user.id,
+                    EngagementMetrics.metrics_date >= start_date,
+                    EngagementMetrics.metrics_date <= end_date,
+                    EngagementMetrics.status == "active"
+                )
+            ).first()
+        
+            return {
+                "period_days": days,
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat(),
+                "total_posts": int(summary_query.total_posts or 0),
+                "total_likes": int(summary_query.total_likes or 0),
+                "total_shares": int(summary_query.total_shares or 0),
+                "total_comments": int(summary_query.total_comments or 0),
+                "total_views": int(summary_query.total_views or 0),
+                "total_reach": int(summary_query.total_reach or 0),
+                "average_engagement_rate": float(summary_query.avg_engagement_rate or 0),
+                "active_platforms": int(summary_query.active_platforms or 0),
+                "total_engagement": int((summary_query.total_likes or 0) + 
+                                     (summary_query.total_shares or 0) + 
+                                     (summary_query.total_comments or 0))
+            }
+        
+        return await get_response_cache().respond(request, current_user.id, "engagement/summary", compute, db)
         
     except Exception as e:
         raise HTTPException(
@@ -2,28 +2,69 @@
 Image processing API endpoints.
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query, Header
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
+import json
 import time
 import logging
 
-from ..services.image_processing import image_service, ImageValidationError
+from ..config import settings
+from ..services.image_processing import image_service, ImageValidationError, ALLOWED_EXTENSIONS
+from ..services.image_jobs import create_image_job, get_image_job_processor
 from ..services.cloud_storage import get_storage_service, StorageError
-from ..schemas import ImageUploadResponse, ImageProcessingResult
+from ..services.content_store import get_content_store
+from ..services.image_encoding import available_formats, content_type_for, negotiate_format
+from ..services.image_variants import get_variant_service, VariantSpec, VariantError
+from ..services.perceptual_hash import get_near_duplicate_service
+from ..schemas import ImageUploadResponse, ImageProcessingResult, DirectUploadComplete, ImageJobResponse
 from ..dependencies import get_current_user, get_db
-from ..models import User, Image
+from ..models import User, Image, ImageProcessingJob, Product
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/images", tags=["images"])
 
+# Encodings of the small thumbnail, smallest first; JPEG is always present
+THUMBNAIL_SOURCE_FORMATS = ['AVIF', 'WEBP', 'JPEG']
+
+
+def _thumbnail_sources(img: Image) -> dict:
+    """Map content type to URL for each stored encoding of an image's small thumbnail."""
+    thumbnail_urls = img.thumbnail_urls or {}
+    sources = {}
+    for image_format in THUMBNAIL_SOURCE_FORMATS:
+        key = 'small' if image_format == 'JPEG' else f"small_{image_format.lower()}"
+        if thumbnail_urls.get(key):
+            sources[content_type_for(image_format)] = thumbnail_urls[key]
+    return sources
+
+
+def _image_summary(img: Image, accept: Optional[str]) -> dict:
+    """Serialize an image for listings, choosing the thumbnail encoding the client accepts."""
+    sources = _thumbnail_sources(img)
+    available = [f for f in THUMBNAIL_SOURCE_FORMATS if content_type_for(f) in sources]
+    thumbnail_format = negotiate_format(accept, available)
+    return {
+        "id": img.id,
+        "original_url": img.original_url,
+        "compressed_url": img.compressed_url,
+        "thumbnail_url": sources.get(content_type_for(thumbnail_format), img.compressed_url),
+        "thumbnail_sources": sources,
+        "file_size": img.file_size,
+        "dimensions": img.dimensions,
+        "file_name": img.original_filename,
+        "created_at": img.created_at.isoformat()
+    }
+
 
 @router.post("/upload", response_model=ImageUploadResponse)
 async def upload_image(
     file: UploadFile = File(...),
     platforms: Optional[List[str]] = Query(None, description="Platforms to optimize for"),
     product_id: Optional[str] = Query(None, description="Product ID for organizing files"),
+    reuse_similar: bool = Query(False, description="Return an existing near-duplicate image instead of processing the upload"),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -31,25 +72,36 @@ async def upload_image(
     
     This endpoint accepts an image file, validates it, compresses it,
     generates thumbnails, optimizes it for specified platforms, and uploads all variants to cloud storage.
+    The response lists the user's visually similar images in ``near_duplicates``;
+    with ``reuse_similar``, the nearest one is returned instead.
     """
     try:
         start_time = time.time()
         
         # Process the image and upload to cloud storage
-        result = await image_service.process_image(file, platforms, product_id, current_user.id)
+        result = await image_service.process_image(
+            file, platforms, product_id, current_user.id, reuse_similar=reuse_similar
+        )
         
         processing_time = time.time() - start_time
         
+        if result.reused:
+            message = f"Reused similar image {result.id} in {processing_time:.2f}s"
+        else:
+            message = f"Image processed and uploaded successfully in {processing_time:.2f}s"
+        
         return ImageUploadResponse(
             success=True,
             image_id=result.id,
-            message=f"Image processed and uploaded successfully in {processing_time:.2f}s",
+            message=message,
             urls={
                 "original": result.original_url,
                 "compressed": result.compressed_url,
                 "thumbnails": result.thumbnail_urls,
                 "platform_optimized": result.platform_optimized_urls
-            }
+            },
+            near_duplicates=result.near_duplicates,
+            reused=result.reused
         )
         
     except ImageValidationError as e:
@@ -63,6 +115,32 @@ async def upload_image(
         raise HTTPException(status_code=500, detail="Image upload failed")
 
 
+@router.post("/upload/batch")
+async def upload_images_batch(
+    files: List[UploadFile] = File(...),
+    platforms: Optional[List[str]] = Query(None, description="Platforms to optimize for"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Upload and process several images in one request.
+    
+    Files are processed concurrently and progress is streamed back as
+    newline-delimited JSON: one event per file as it is received and as it
+    completes or fails, then a final ``done`` event once the images are saved.
+    """
+    if len(files) > settings.max_files_per_upload:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximum {settings.max_files_per_upload} files allowed per upload"
+        )
+    
+    async def event_stream():
+        async for event in image_service.process_batch(files, current_user.id, platforms):
+            yield json.dumps(event, default=str) + "\n"
+    
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
 @router.post("/process", response_model=ImageProcessingResult)
 async def process_image(
     file: UploadFile = File(...),
@@ -192,6 +270,126 @@ async def generate_presigned_upload_url(
         raise HTTPException(status_code=500, detail="Failed to generate upload URL")
 
 
+def _check_direct_upload_type(filename: str, content_type: str) -> None:
+    """Reject direct uploads that could never be processed."""
+    extension = '.' + filename.split('.')[-1].lower()
+    if extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"File extension {extension} not supported. Allowed: {ALLOWED_EXTENSIONS}")
+    if content_type not in settings.allowed_image_types:
+        raise HTTPException(status_code=400, detail=f"Content type {content_type} not supported. Allowed: {settings.allowed_image_types}")
+
+
+def _job_response(job: ImageProcessingJob) -> ImageJobResponse:
+    return ImageJobResponse(
+        id=job.id,
+        status=job.status,
+        storage_path=job.upload_path,
+        original_filename=job.original_filename,
+        product_id=job.product_id,
+        result_id=job.result_id,
+        attempts=job.attempts or 0,
+        error_message=job.error_message,
+        created_at=job.created_at,
+        completed_at=job.completed_at
+    )
+
+
+@router.post("/direct-upload")
+async def create_direct_upload(
+    filename: str = Query(..., description="Original filename"),
+    content_type: str = Query(..., description="MIME type of the file"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Generate a presigned URL for uploading an original straight to storage.
+    
+    After the upload succeeds, call /images/direct-upload/complete with the
+    returned storage_path to have the image processed in the background.
+    """
+    _check_direct_upload_type(filename, content_type)
+    
+    try:
+        presigned_data = await get_storage_service().generate_direct_upload_url(
+            current_user.id, filename, content_type, settings.direct_upload_expires_in
+        )
+        
+        return {
+            "success": True,
+            "upload_data": {
+                "upload_url": presigned_data.upload_url,
+                "fields": presigned_data.fields,
+                "storage_path": presigned_data.storage_path,
+                "expires_at": presigned_data.expires_at.isoformat()
+            },
+            "message": "Direct upload URL generated successfully"
+        }
+        
+    except StorageError as e:
+        logger.error(f"Failed to generate direct upload URL: {e}")
+        raise HTTPException(status_code=500, detail="Failed to generate upload URL")
+
+
+@router.post("/direct-upload/complete", response_model=ImageJobResponse, status_code=202)
+async def complete_direct_upload(
+    request: DirectUploadComplete,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Queue processing of an original uploaded directly to storage.
+    
+    Returns the processing job; poll /images/jobs/{job_id} for its result.
+    """
+    if not request.storage_path.startswith(f"uploads/{current_user.id}/"):
+        raise HTTPException(status_code=403, detail="Upload does not belong to the current user")
+    _check_direct_upload_type(request.filename, request.content_type)
+    
+    if request.product_id:
+        product = db.query(Product).filter(
+            Product.id == request.product_id,
+            Product.user_id == current_user.id
+        ).first()
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+    
+    try:
+        stored = await get_storage_service().head_file(request.storage_path)
+    except StorageError as e:
+        logger.error(f"Failed to check direct upload {request.storage_path}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to check uploaded file")
+    
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Uploaded file not found")
+    if stored['size'] > settings.max_file_size:
+        raise HTTPException(status_code=413, detail=f"File size exceeds maximum allowed size of {settings.max_file_size} bytes")
+    
+    job = create_image_job(
+        db, current_user.id, request.storage_path, request.filename, request.content_type,
+        request.platforms, request.product_id
+    )
+    get_image_job_processor().notify()
+    
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=ImageJobResponse)
+async def get_image_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the status of a direct upload processing job."""
+    job = db.query(ImageProcessingJob).filter(
+        ImageProcessingJob.id == job_id,
+        ImageProcessingJob.user_id == current_user.id
+    ).first()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return _job_response(job)
+
+
 @router.get("/download/{storage_path:path}")
 async def generate_presigned_download_url(
     storage_path: str,
@@ -221,6 +419,71 @@ async def generate_presigned_download_url(
         raise HTTPException(status_code=500, detail="Failed to generate download URL")
 
 
+@router.get("/{image_id}/variant")
+async def get_image_variant(
+    image_id: str,
+    platform: Optional[str] = Query(None, description="Platform to optimize for"),
+    thumbnail: Optional[str] = Query(None, description="Thumbnail size name (small, medium, large)"),
+    width: Optional[int] = Query(None, ge=1, le=4096, description="Maximum width in pixels"),
+    height: Optional[int] = Query(None, ge=1, le=4096, description="Maximum height in pixels"),
+    quality: int = Query(85, ge=1, le=100, description="Encoding quality"),
+    format: str = Query("JPEG", description="Output format (JPEG, PNG, WEBP, AVIF, or AUTO to negotiate from Accept)"),
+    accept: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get a variant of an image, rendering it on first request.
+    
+    Specify either a platform, a standard thumbnail size, or an explicit
+    width/height bounding box. With format=AUTO, thumbnails and explicit
+    sizes are encoded in the smallest format the client's Accept header lists.
+    """
+    image = db.query(Image).filter(
+        Image.id == image_id,
+        Image.user_id == current_user.id
+    ).first()
+    
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    output_format = format.upper()
+    if output_format == "AUTO":
+        output_format = negotiate_format(accept, [f for f in THUMBNAIL_SOURCE_FORMATS if f in available_formats()])
+    
+    variant_service = get_variant_service()
+    try:
+        if platform:
+            stored_file = await variant_service.get_platform_variant(db, image, platform)
+        elif thumbnail:
+            stored_file = await variant_service.get_thumbnail(db, image, thumbnail, output_format)
+        elif width and height:
+            spec = VariantSpec(width=width, height=height, quality=quality, format=output_format)
+            stored_file = await variant_service.get_variant(db, image, spec)
+        else:
+            raise HTTPException(status_code=400, detail="Specify a platform, a thumbnail size, or width and height")
+        
+        db.commit()
+        
+        return {
+            "success": True,
+            "image_id": image.id,
+            "url": stored_file.url,
+            "size": stored_file.size,
+            "content_type": stored_file.content_type
+        }
+        
+    except HTTPException:
+        raise
+    except VariantError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except StorageError as e:
+        db.rollback()
+        logger.error(f"Failed to generate variant for image {image_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to generate image variant")
+
+
 @router.delete("/{image_id}")
 async def delete_image(
     image_id: str,
@@ -242,13 +505,15 @@ async def delete_image(
         if not image:
             raise HTTPException(status_code=404, detail="Image not found")
         
-        # Delete from cloud storage
-        storage_service = get_storage_service()
-        storage_results = await image_service.delete_processed_image(image.storage_paths)
-        
-        # Delete from database
+        # Release shared objects, then delete from database
+        content_store = get_content_store()
+        releasable = content_store.release_references(db, (image.storage_paths or {}).values())
         db.delete(image)
         db.commit()
+        get_near_duplicate_service().remove(current_user.id, [image_id])
+        
+        # Delete objects no other image references from cloud storage
+        storage_results = await content_store.purge(releasable)
         
         return {
             "success": True,
@@ -267,6 +532,7 @@ async def delete_image(
 @router.get("/user/images")
 async def list_user_images(
     limit: int = Query(100, description="Maximum number of images to return"),
+    accept: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -282,16 +548,7 @@ async def list_user_images(
         return {
             "success": True,
             "images": [
-                {
-                    "id": img.id,
-                    "original_url": img.original_url,
-                    "compressed_url": img.compressed_url,
-                    "thumbnail_url": img.thumbnail_urls.get("small", img.compressed_url),
-                    "file_size": img.file_size,
-                    "dimensions": img.dimensions,
-                    "file_name": img.original_filename,
-                    "created_at": img.created_at.isoformat()
-                }
+                _image_summary(img, accept)
                 for img in images
             ],
             "count": len(images)
@@ -305,6 +562,7 @@ async def list_user_images(
 @router.post("/by-ids")
 async def get_images_by_ids(
     request: dict,
+    accept: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -325,16 +583,7 @@ async def get_images_by_ids(
         return {
             "success": True,
             "images": [
-                {
-                    "id": img.id,
-                    "original_url": img.original_url,
-                    "compressed_url": img.compressed_url,
-                    "thumbnail_url": img.thumbnail_urls.get("small", img.compressed_url),
-                    "file_size": img.file_size,
-                    "dimensions": img.dimensions,
-                    "file_name": img.original_filename,
-                    "created_at": img.created_at.isoformat()
-                }
+                _image_summary(img, accept)
                 for img in images
             ]
         }
@@ -347,7 +596,8 @@ async def get_images_by_ids(
 
 @router.get("/storage/stats")
 async def get_storage_stats(
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """
     Get storage usage statistics.
@@ -356,7 +606,7 @@ async def get_storage_stats(
     """
     try:
         storage_service = get_storage_service()
-        stats = await storage_service.get_storage_stats()
+        stats = await storage_service.get_storage_stats(db)
         
         return {
             "success": True,
@@ -13,6 +13,7 @@ from datetime import datetime
 from ..database import get_db
 from ..dependencies import get_current_user
 from ..models import User
+from ..pagination import InvalidCursor
 from ..schemas import (
     PostCreate, PostUpdate, PostResponse, PostListResponse,
     PostQueueResponse, PostingRequest, SchedulePostRequest, PostingResult
@@ -50,6 +51,8 @@ async def list_posts(
     limit: int = Query(50, ge=1, le=100, description="Maximum number of posts to return"),
     status: Optional[str] = Query(None, description="Filter by post status"),
     product_id: Optional[str] = Query(None, description="Filter by product ID"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    exact_total: bool = Query(False, description="Count the total exactly instead of estimating it for large lists"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     posting_service: PostingService = Depends(get_posting_service)
@@ -57,19 +60,25 @@ async def list_posts(
     """
     List posts for the current user with pagination and filtering.
     
-    Supports filtering by status and product ID, with pagination.
+    Supports filtering by status and product ID. Page with cursor (the
+    previous page's next_cursor) rather than skip: cursor pages cost the
+    same however deep they are.
     """
     try:
-        posts, total = await posting_service.list_posts(
-            current_user.id, db, skip, limit, status, product_id
+        page = await posting_service.list_posts(
+            current_user.id, db, skip, limit, status, product_id, cursor, exact_total
         )
         
         return PostListResponse(
-            posts=posts,
-            total=total,
+            posts=page.items,
+            total=page.total,
+            total_exact=page.total_exact,
             skip=skip,
-            limit=limit
+            limit=limit,
+            next_cursor=page.next_cursor
         )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to list posts")
 
@@ -192,6 +201,8 @@ async def get_queue_status(
     skip: int = Query(0, ge=0, description="Number of items to skip"),
     limit: int = Query(50, ge=1, le=100, description="Maximum number of items to return"),
     status: Optional[str] = Query(None, description="Filter by queue status"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    exact_total: bool = Query(False, description="Count the total exactly instead of estimating it for large queues"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     posting_service: PostingService = Depends(get_posting_service)
@@ -203,16 +214,20 @@ async def get_queue_status(
     scheduled times, and retry counts.
     """
     try:
-        queue_items, total = await posting_service.get_queue_status(
-            current_user.id, db, status, skip, limit
+        page = await posting_service.get_queue_status(
+            current_user.id, db, status, skip, limit, cursor, exact_total
         )
         
         return {
-            "queue_items": queue_items,
-            "total": total,
+            "queue_items": page.items,
+            "total": page.total,
+            "total_exact": page.total_exact,
             "skip": skip,
-            "limit": limit
+            "limit": limit,
+            "next_cursor": page.next_cursor
         }
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to get queue status")
 
@@ -273,6 +288,8 @@ async def get_all_queue_status(
     skip: int = Query(0, ge=0, description="Number of items to skip"),
     limit: int = Query(50, ge=1, le=100, description="Maximum number of items to return"),
     status: Optional[str] = Query(None, description="Filter by queue status"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    exact_total: bool = Query(False, description="Count the total exactly instead of estimating it for large queues"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     posting_service: PostingService = Depends(get_posting_service)
@@ -284,16 +301,20 @@ async def get_all_queue_status(
     """
     # Note: In a real application, you'd want to add admin role checking here
     try:
-        queue_items, total = await posting_service.get_queue_status(
-            None, db, status, skip, limit  # None for user_id means all users
+        page = await posting_service.get_queue_status(
+            None, db, status, skip, limit, cursor, exact_total  # None for user_id means all users
         )
         
         return {
-            "queue_items": queue_items,
-            "total": total,
+            "queue_items": page.items,
+            "total": page.total,
+            "total_exact": page.total_exact,
             "skip": skip,
-            "limit": limit
+            "limit": limit,
+            "next_cursor": page.next_cursor
         }
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to get queue status")
 
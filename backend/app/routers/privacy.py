@@ -18,7 +18,8 @@ from pydantic import BaseModel, Field
 
 from ..database import get_db
 from ..dependencies import get_current_user
-from ..models import User, AuditLog, DataDeletionRequest
+from ..models import User, DataDeletionRequest
+from ..pagination import InvalidCursor
 from ..services.data_privacy_service import data_privacy_service
 from ..services.audit_service import audit_service
 from ..security import security_validator
@@ -79,8 +80,10 @@ class AuditLogResponse(BaseModel):
     """Response model for audit log listing."""
     entries: List[AuditLogEntry]
     total_count: int
+    total_exact: bool = True  # False when total_count is the database's estimate
     page: int
     page_size: int
+    next_cursor: Optional[str] = None  # Pass as cursor to get the next page; None on the last page
 
 
 @router.post("/export", response_model=DataExportResponse)
@@ -373,6 +376,8 @@ async def get_audit_log(
     page_size: int = 50,
     action_filter: Optional[str] = None,
     sensitivity_filter: Optional[str] = None,
+    cursor: Optional[str] = None,
+    exact_total: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -380,7 +385,9 @@ async def get_audit_log(
     Get audit log entries for the current user.
     
     This endpoint provides access to the user's audit log,
-    showing all actions performed on their data.
+    showing all actions performed on their data. Page with cursor (the
+    previous page's next_cursor) rather than page: cursor pages cost the
+    same however deep they are, and page is ignored when a cursor is given.
     """
     try:
         # Validate page parameters
@@ -389,26 +396,20 @@ async def get_audit_log(
         if page_size < 1 or page_size > 100:
             page_size = 50
         
-        offset = (page - 1) * page_size
+        offset = (page - 1) * page_size if not cursor else 0
         
         # Get audit log entries
-        entries = await audit_service.get_user_audit_log(
+        result = await audit_service.get_user_audit_log(
             db=db,
             user_id=current_user.id,
             limit=page_size,
             offset=offset,
             action_filter=action_filter,
-            sensitivity_filter=sensitivity_filter
+            sensitivity_filter=sensitivity_filter,
+            cursor=cursor,
+            exact_total=exact_total
         )
         
-        # Get total count for pagination
-        query = db.query(AuditLog).filter(AuditLog.user_id == current_user.id)
-        if action_filter:
-            query = query.filter(AuditLog.action.like(f"%{action_filter}%"))
-        if sensitivity_filter:
-            query = query.filter(AuditLog.sensitivity_level == sensitivity_filter)
-        total_count = query.count()
-        
         # Convert to response format
         audit_entries = [
             AuditLogEntry(
@@ -422,16 +423,20 @@ async def get_audit_log(
                 timestamp=entry.timestamp,
                 ip_address=entry.ip_address
             )
-            for entry in entries
+            for entry in result.items
         ]
         
         return AuditLogResponse(
             entries=audit_entries,
-            total_count=total_count,
+            total_count=result.total,
+            total_exact=result.total_exact,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            next_cursor=result.next_cursor
         )
         
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to get audit log: {e}")
         raise HTTPException(
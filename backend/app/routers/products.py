@@ -3,10 +3,15 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..database import get_db
 from ..dependencies import get_current_user
-from ..models import User, Product, ProductImage
+from ..models import User, Product, ProductImage, ImageProcessingJob
 from ..schemas import ProductCreate, ProductResponse, ProductImageResponse
+from ..services.cloud_storage import get_storage_service, StorageError
+from ..services.content_store import get_content_store
+import logging
 import uuid
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/products",
     tags=["products"],
@@ -177,7 +182,16 @@ async def delete_product(
             detail="Product not found"
         )
     
-    # Delete the product (images will be cascade deleted due to relationship)
+    # Release product images and their stored files before removing the product
+    try:
+        await get_storage_service().delete_product_images(product_id, db)
+    except StorageError as e:
+        logger.error(f"Failed to clean up storage for product {product_id}: {e}")
+    
+    # Direct uploads still queued for the product no longer have anywhere to go
+    db.query(ImageProcessingJob).filter(ImageProcessingJob.product_id == product_id).delete(synchronize_session=False)
+    
+    # Delete the product (remaining images will be cascade deleted due to relationship)
     db.delete(product)
     db.commit()
 
@@ -265,5 +279,13 @@ async def delete_product_image(
             detail="Image not found"
         )
     
+    content_store = get_content_store()
+    releasable = content_store.release_references(db, (image.storage_paths or {}).values())
     db.delete(image)
-    db.commit()
\ No newline at end of file
+    db.commit()
+    
+    # Remove stored files that no other image references
+    try:
+        await content_store.purge(releasable)
+    except StorageError as e:
+        logger.error(f"Failed to delete stored files for image {image_id}: {e}")
\ No newline at end of file
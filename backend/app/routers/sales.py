@@ -2,19 +2,27 @@
 Sales tracking API endpoints.
 """
 
-from typing import List, Optional
+import csv
+import io
+import json
+from typing import Callable, Iterator, List, Optional
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..database import SessionLocal, get_db
 from ..dependencies import get_current_user
-from ..models import User
+from ..models import SalesImportJob, User
+from ..pagination import InvalidCursor
 from ..schemas import (
     SaleEventCreate, SaleEventUpdate, SaleEventResponse, SaleEventListResponse,
-    SalesMetrics, SalesDashboardData, SalesReportRequest
+    SalesMetrics, SalesDashboardData, SalesReportRequest, SalesImportJobResponse
 )
-from ..services.sales_tracking import SalesTrackingService
+from ..services.response_cache import get_response_cache
+from ..services.sales_import import create_import_job, get_sales_import_processor
+from ..services.sales_tracking import DuplicateSaleError, SalesTrackingService
 from ..services.sales_sync import SalesSyncService
 
 router = APIRouter(prefix="/sales", tags=["sales"])
@@ -26,9 +34,12 @@ async def create_sale_event(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Create a new sale event."""
+    """Create a new sale event. Returns 409 if the platform order is already recorded."""
     service = SalesTrackingService(db)
-    return await service.create_sale_event(current_user.id, sale_data)
+    try:
+        return await service.create_sale_event(current_user.id, sale_data)
+    except DuplicateSaleError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 
 @router.get("/events", response_model=SaleEventListResponse)
@@ -39,20 +50,32 @@ async def get_sales_list(
     start_date: Optional[datetime] = Query(None, description="Filter sales from this date"),
     end_date: Optional[datetime] = Query(None, description="Filter sales until this date"),
     status: Optional[str] = Query(None, description="Filter by sale status"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    exact_total: bool = Query(False, description="Count the total exactly instead of estimating it for large lists"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get paginated list of sale events with optional filters."""
+    """
+    Get paginated list of sale events with optional filters, newest first.
+    
+    Page with cursor (the previous page's next_cursor) rather than skip:
+    cursor pages cost the same however deep they are.
+    """
     service = SalesTrackingService(db)
-    result = await service.get_sales_list(
-        user_id=current_user.id,
-        skip=skip,
-        limit=limit,
-        platform=platform,
-        start_date=start_date,
-        end_date=end_date,
-        status=status
-    )
+    try:
+        result = await service.get_sales_list(
+            user_id=current_user.id,
+            skip=skip,
+            limit=limit,
+            platform=platform,
+            start_date=start_date,
+            end_date=end_date,
+            status=status,
+            cursor=cursor,
+            exact_total=exact_total
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return SaleEventListResponse(**result)
 
 
@@ -107,6 +130,7 @@ async def delete_sale_event(
 
 @router.get("/metrics", response_model=SalesMetrics)
 async def get_sales_metrics(
+    request: Request,
     start_date: Optional[datetime] = Query(None, description="Start date for metrics calculation"),
     end_date: Optional[datetime] = Query(None, description="End date for metrics calculation"),
     platforms: Optional[List[str]] = Query(None, description="Filter by platforms"),
@@ -121,30 +145,66 @@ async def get_sales_metrics(
     if not start_date:
         start_date = end_date - timedelta(days=30)
     
-    service = SalesTrackingService(db)
-    return await service.get_sales_metrics(
-        user_id=current_user.id,
-        start_date=start_date,
-        end_date=end_date,
-        platforms=platforms,
-        currency=currency
-    )
+    async def compute(db: Session):
+        service = SalesTrackingService(db)
+        return await service.get_sales_metrics(
+            user_id=current_user.id,
+            start_date=start_date,
+            end_date=end_date,
+            platforms=platforms,
+            currency=currency
+        )
+    
+    return await get_response_cache().respond(request, current_user.id, "sales/metrics", compute, db)
 
 
 @router.get("/dashboard", response_model=SalesDashboardData)
 async def get_sales_dashboard(
+    request: Request,
     days: int = Query(30, ge=1, le=365, description="Number of days to include in dashboard"),
     currency: str = Query("USD", description="Currency for calculations"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get comprehensive sales dashboard data."""
-    service = SalesTrackingService(db)
-    return await service.get_dashboard_data(
-        user_id=current_user.id,
-        days=days,
-        currency=currency
-    )
+    async def compute(db: Session):
+        service = SalesTrackingService(db)
+        return await service.get_dashboard_data(
+            user_id=current_user.id,
+            days=days,
+            currency=currency
+        )
+    
+    return await get_response_cache().respond(request, current_user.id, "sales/dashboard", compute, db)
+
+
+REPORT_CSV_COLUMNS = [
+    "id", "occurred_at", "platform", "order_id", "status", "amount", "currency",
+    "commission_amount", "net_amount", "quantity", "product_id", "product_title",
+    "product_sku", "customer_location", "sale_source", "post_id"
+]
+
+
+def _stream_report_sales(user_id: str, report_request: SalesReportRequest, first_line: Optional[str],
+                         format_sale: Callable[[SaleEventResponse], str]) -> Iterator[str]:
+    """Stream a report's detailed sales with a session of its own, one line per sale."""
+    if first_line is not None:
+        yield first_line
+    db = SessionLocal()
+    try:
+        sales = SalesTrackingService(db).iter_report_sales(
+            user_id, report_request.start_date, report_request.end_date, report_request.platforms
+        )
+        for sale in sales:
+            yield format_sale(SaleEventResponse.model_validate(sale))
+    finally:
+        db.close()
+
+
+def _csv_line(values: List) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
 
 
 @router.post("/report")
@@ -153,9 +213,27 @@ async def generate_sales_report(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Generate a detailed sales report."""
+    """
+    Generate a detailed sales report.
+    
+    With format=json the detailed sales are paged: pass the returned
+    details_next_cursor as details_cursor for the next page. format=ndjson
+    streams the report as its first line followed by one line per sale, and
+    format=csv streams the detailed sales as CSV.
+    """
     service = SalesTrackingService(db)
     
+    if report_request.format == "csv":
+        filename = f"sales_report_{report_request.start_date:%Y%m%d}_{report_request.end_date:%Y%m%d}.csv"
+        return StreamingResponse(
+            _stream_report_sales(
+                current_user.id, report_request, _csv_line(REPORT_CSV_COLUMNS),
+                lambda sale: _csv_line([getattr(sale, column) for column in REPORT_CSV_COLUMNS])
+            ),
+            media_type="text/csv",
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+    
     # Get metrics
     metrics = await service.get_sales_metrics(
         user_id=current_user.id,
@@ -199,15 +277,33 @@ async def generate_sales_report(
         "generated_at": datetime.utcnow().isoformat()
     }
     
-    # Include detailed sales if requested
-    if report_request.include_details:
-        sales_data = await service.get_sales_list(
-            user_id=current_user.id,
-            start_date=report_request.start_date,
-            end_date=report_request.end_date,
-            limit=10000  # Large limit for report
+    if report_request.format == "ndjson":
+        first_line = json.dumps({"type": "report", **jsonable_encoder(report_data)}) + "\n"
+        if not report_request.include_details:
+            return StreamingResponse(iter([first_line]), media_type="application/x-ndjson")
+        return StreamingResponse(
+            _stream_report_sales(
+                current_user.id, report_request, first_line,
+                lambda sale: json.dumps({"type": "sale", **sale.model_dump(mode="json")}) + "\n"
+            ),
+            media_type="application/x-ndjson"
         )
-        report_data["detailed_sales"] = sales_data["sales"]
+    
+    # Include a page of detailed sales if requested
+    if report_request.include_details:
+        try:
+            page = await service.get_report_sales_page(
+                user_id=current_user.id,
+                start_date=report_request.start_date,
+                end_date=report_request.end_date,
+                platforms=report_request.platforms,
+                limit=report_request.details_limit,
+                cursor=report_request.details_cursor
+            )
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        report_data["detailed_sales"] = page["sales"]
+        report_data["details_next_cursor"] = page["next_cursor"]
     
     return report_data
 
@@ -270,6 +366,62 @@ async def bulk_import_sales(
     return result
 
 
+def _import_job_response(job: SalesImportJob) -> SalesImportJobResponse:
+    return SalesImportJobResponse(
+        id=job.id,
+        status=job.status,
+        original_filename=job.original_filename,
+        progress=1.0 if job.status == "completed" else (job.byte_offset / job.file_size if job.file_size else 0.0),
+        rows_processed=job.rows_processed or 0,
+        rows_imported=job.rows_imported or 0,
+        rows_duplicate=job.rows_duplicate or 0,
+        rows_failed=job.rows_failed or 0,
+        errors=job.errors or [],
+        attempts=job.attempts or 0,
+        error_message=job.error_message,
+        created_at=job.created_at,
+        completed_at=job.completed_at
+    )
+
+
+@router.post("/imports", response_model=SalesImportJobResponse, status_code=202)
+async def create_sales_import(
+    file: UploadFile = File(..., description="CSV file with a header row"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Import sales from a CSV file in the background.
+    
+    Columns are the fields of a manual sale entry; platform, order_id,
+    amount and occurred_at are required. Orders already recorded for the
+    platform are skipped. Poll /sales/imports/{job_id} for progress.
+    """
+    try:
+        job = await create_import_job(db, current_user.id, file)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    get_sales_import_processor().notify()
+    return _import_job_response(job)
+
+
+@router.get("/imports/{job_id}", response_model=SalesImportJobResponse)
+async def get_sales_import(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the status and progress of a sales import."""
+    job = db.query(SalesImportJob).filter(
+        SalesImportJob.id == job_id,
+        SalesImportJob.user_id == current_user.id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Sales import not found")
+    return _import_job_response(job)
+
+
 @router.get("/platforms")
 async def get_sales_platforms(
     current_user: User = Depends(get_current_user),
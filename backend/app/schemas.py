@@ -120,6 +120,8 @@ class ImageUploadResponse(BaseModel):
     image_id: str
     message: str
     urls: Dict  # {"original": "url", "compressed": "url", "thumbnails": {...}, "platform_optimized": {...}}
+    near_duplicates: List[str] = []  # IDs of the user's visually similar images, nearest first
+    reused: bool = False  # True when image_id is an existing similar image rather than the upload
 
 
 class ImageProcessingResult(BaseModel):
@@ -134,6 +136,29 @@ class ImageProcessingResult(BaseModel):
     urls: Optional[Dict] = None  # {"original": "url", "compressed": "url", "thumbnails": {...}, "platform_optimized": {...}}
 
 
+class DirectUploadComplete(BaseModel):
+    """Schema for completing a direct-to-storage upload."""
+    storage_path: str
+    filename: str
+    content_type: str
+    platforms: List[str] = []
+    product_id: Optional[str] = None
+
+
+class ImageJobResponse(BaseModel):
+    """Schema for image processing job status."""
+    id: str
+    status: str  # pending, processing, completed, failed
+    storage_path: str
+    original_filename: str
+    product_id: Optional[str] = None
+    result_id: Optional[str] = None
+    attempts: int
+    error_message: Optional[str] = None
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+
+
 # Content Generation schemas
 class ContentGenerationInput(BaseModel):
     """Schema for content generation input."""
@@ -248,8 +273,10 @@ class PostListResponse(BaseModel):
     """Schema for post list response with pagination."""
     posts: List[PostResponse]
     total: int
+    total_exact: bool = True  # False when total is the database's estimate
     skip: int
     limit: int
+    next_cursor: Optional[str] = None  # Pass as cursor to get the next page; None on the last page
 
 
 class PostQueueResponse(BaseModel):
@@ -502,8 +529,27 @@ class SaleEventListResponse(BaseModel):
     """Schema for sale event list response with pagination."""
     sales: List[SaleEventResponse]
     total: int
+    total_exact: bool = True  # False when total is the database's estimate
     skip: int
     limit: int
+    next_cursor: Optional[str] = None  # Pass as cursor to get the next page; None on the last page
+
+
+class SalesImportJobResponse(BaseModel):
+    """Schema for sales import job status and progress."""
+    id: str
+    status: str  # pending, processing, completed, failed
+    original_filename: str
+    progress: float  # Share of the file processed, 0 to 1
+    rows_processed: int
+    rows_imported: int
+    rows_duplicate: int
+    rows_failed: int
+    errors: List[Dict[str, Any]] = []  # First few row errors: {"row": n, "error": "..."}
+    attempts: int
+    error_message: Optional[str] = None
+    created_at: datetime
+    completed_at: Optional[datetime] = None
 
 
 class SalesMetrics(BaseModel):
@@ -547,6 +593,12 @@ class SalesReportRequest(BaseModel):
     product_ids: Optional[List[str]] = None
     group_by: str = Field(default="day", description="Group by: day, week, month")
     include_details: bool = Field(default=False, description="Include detailed sale events")
+    format: str = Field(
+        default="json", pattern="^(json|ndjson|csv)$",
+        description="json, or ndjson/csv to stream the detailed sales"
+    )
+    details_limit: int = Field(default=1000, ge=1, le=10000, description="Detailed sales per page (json)")
+    details_cursor: Optional[str] = Field(None, description="details_next_cursor of the previous page (json)")
 
 
 # Engagement Metrics schemas
@@ -613,8 +665,10 @@ class EngagementMetricsListResponse(BaseModel):
     """Schema for engagement metrics list response with pagination."""
     metrics: List[EngagementMetricsResponse]
     total: int
+    total_exact: bool = True  # False when total is the database's estimate
     skip: int
     limit: int
+    next_cursor: Optional[str] = None  # Pass as cursor to get the next page; None on the last page
 
 
 class MetricsAggregationResponse(BaseModel):
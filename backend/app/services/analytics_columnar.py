@@ -0,0 +1,413 @@
+"""
+Columnar per-user analytics snapshots.
+
+The analytics endpoints all summarise the same rows for one user over a
+date window: the daily sales rollup, the daily engagement rollup buckets
+and the per-platform results of published posts. A ColumnarSnapshot loads
+those rows once into NumPy columns (days, platform/product/currency codes,
+amounts and engagement counters); any window is then a boolean mask plus
+group-by sums, which takes milliseconds even over years of history.
+
+Amounts are held as int64 minor units (cents, and ten-thousandths for
+commission rate sums), so sums stay exact. Snapshots are cached per user
+and tagged with the user's data version (see data_versions); a snapshot is
+reused only while that version is current.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import MetricsAggregation, Post, SalesDailyRollup
+from .data_versions import get_data_versions
+
+logger = logging.getLogger(__name__)
+
+MONEY_SCALE = 100  # DECIMAL(14, 2) amounts as cents
+RATE_SCALE = 10_000  # DECIMAL(12, 4) commission rate sums
+
+SALES_SUM_COLUMNS = ('revenue', 'commission', 'net_revenue', 'rate_sum', 'orders', 'quantity', 'rate_count')
+ENGAGEMENT_SUM_COLUMNS = ('posts', 'likes', 'shares', 'comments', 'views', 'reach', 'rate_sum', 'rated_posts')
+
+# Post statuses whose per-platform results count as published posts
+PUBLISHED_POST_STATUSES = ("published", "partial")
+
+
+def to_units(value, scale: int) -> int:
+    """An exact decimal amount (or None) as a whole number of 1/scale units."""
+    if value is None:
+        return 0
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return int((value * scale).to_integral_value())
+
+
+def from_units(units: int, scale: int) -> Decimal:
+    return Decimal(int(units)) / scale
+
+
+def group_sum(codes: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    """Sum values per group code in [0, size); exact for integer columns."""
+    sums = np.zeros(size, dtype=values.dtype)
+    np.add.at(sums, codes, values)
+    return sums
+
+
+def period_starts(days: np.ndarray, group_by: str) -> np.ndarray:
+    """First day of each day's period: the day itself, its week (from Monday) or its month."""
+    if group_by == "week":
+        # 1970-01-01 was a Thursday, so days since the epoch + 3 is 0 on Mondays (mod 7)
+        return days - ((days.astype(np.int64) + 3) % 7).astype('timedelta64[D]')
+    if group_by == "month":
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    return days
+
+
+class Codes:
+    """Dense integer codes for the distinct values of a column."""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def code(self, value: str) -> int:
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+    def find(self, value: str) -> Optional[int]:
+        return self._index.get(value)
+
+
+class ColumnarSnapshot:
+    """One user's analytics rows from first_day onwards, as NumPy columns."""
+
+    def __init__(self, user_id: str, first_day: date, version: int = 0):
+        self.user_id = user_id
+        self.first_day = first_day
+        self.version = version
+        self.built_at = time.monotonic()
+        self.platforms = Codes()
+        self.titles = Codes()
+        self.currencies = Codes()
+        self.sales: Dict[str, np.ndarray] = {}
+        self.engagement: Dict[str, np.ndarray] = {}
+        self.posts: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def load(cls, db: Session, user_id: str, first_day: date, version: int = 0) -> "ColumnarSnapshot":
+        """Load a user's snapshot with one query per source table."""
+        started = time.perf_counter()
+        snapshot = cls(user_id, first_day, version)
+        snapshot._load_sales(db)
+        snapshot._load_engagement(db)
+        snapshot._load_posts(db)
+        logger.debug(
+            f"Loaded analytics snapshot for user {user_id} from {first_day}: "
+            f"{len(snapshot.sales['day'])} sales rows, {len(snapshot.engagement['day'])} engagement rows, "
+            f"{len(snapshot.posts['day'])} post results in {time.perf_counter() - started:.3f}s"
+        )
+        return snapshot
+
+    def covers(self, day: date) -> bool:
+        return day >= self.first_day
+
+    def _load_sales(self, db: Session) -> None:
+        rows = db.query(
+            SalesDailyRollup.day,
+            SalesDailyRollup.platform,
+            SalesDailyRollup.product_title,
+            SalesDailyRollup.currency,
+            SalesDailyRollup.revenue,
+            SalesDailyRollup.commission,
+            SalesDailyRollup.net_revenue,
+            SalesDailyRollup.commission_rate_sum,
+            SalesDailyRollup.order_count,
+            SalesDailyRollup.quantity,
+            SalesDailyRollup.commission_rate_count
+        ).filter(
+            SalesDailyRollup.user_id == self.user_id,
+            SalesDailyRollup.day >= self.first_day
+        ).yield_per(10000)
+
+        columns: Dict[str, list] = {name: [] for name in ('day', 'platform', 'title', 'currency', *SALES_SUM_COLUMNS)}
+        for row in rows:
+            columns['day'].append(row.day)
+            columns['platform'].append(self.platforms.code(row.platform))
+            columns['title'].append(self.titles.code(row.product_title) if row.product_title else -1)
+            columns['currency'].append(self.currencies.code(row.currency))
+            columns['revenue'].append(to_units(row.revenue, MONEY_SCALE))
+            columns['commission'].append(to_units(row.commission, MONEY_SCALE))
+            columns['net_revenue'].append(to_units(row.net_revenue, MONEY_SCALE))
+            columns['rate_sum'].append(to_units(row.commission_rate_sum, RATE_SCALE))
+            columns['orders'].append(row.order_count or 0)
+            columns['quantity'].append(row.quantity or 0)
+            columns['rate_count'].append(row.commission_rate_count or 0)
+
+        self.sales = {
+            'day': np.array(columns.pop('day'), dtype='datetime64[D]'),
+            'platform': np.array(columns.pop('platform'), dtype=np.int32),
+            'title': np.array(columns.pop('title'), dtype=np.int32),
+            'currency': np.array(columns.pop('currency'), dtype=np.int16),
+            **{name: np.array(values, dtype=np.int64) for name, values in columns.items()}
+        }
+
+    def _load_engagement(self, db: Session) -> None:
+        buckets = db.query(
+            MetricsAggregation.period_start,
+            MetricsAggregation.platforms_included,
+            MetricsAggregation.total_posts,
+            MetricsAggregation.total_likes,
+            MetricsAggregation.total_shares,
+            MetricsAggregation.total_comments,
+            MetricsAggregation.total_views,
+            MetricsAggregation.total_reach,
+            MetricsAggregation.engagement_rate_sum,
+            MetricsAggregation.rated_posts
+        ).filter(
+            MetricsAggregation.user_id == self.user_id,
+            MetricsAggregation.aggregation_type == 'daily',
+            MetricsAggregation.period_start >= datetime.combine(self.first_day, datetime.min.time())
+        ).yield_per(10000)
+
+        columns: Dict[str, list] = {name: [] for name in ('day', 'platform', *ENGAGEMENT_SUM_COLUMNS)}
+        for bucket in buckets:
+            if not bucket.platforms_included:
+                continue
+            columns['day'].append(bucket.period_start.date())
+            columns['platform'].append(self.platforms.code(bucket.platforms_included[0]))
+            columns['posts'].append(bucket.total_posts or 0)
+            columns['likes'].append(bucket.total_likes or 0)
+            columns['shares'].append(bucket.total_shares or 0)
+            columns['comments'].append(bucket.total_comments or 0)
+            columns['views'].append(bucket.total_views or 0)
+            columns['reach'].append(bucket.total_reach or 0)
+            columns['rate_sum'].append(to_units(bucket.engagement_rate_sum, MONEY_SCALE))
+            columns['rated_posts'].append(bucket.rated_posts or 0)
+
+        self.engagement = {
+            'day': np.array(columns.pop('day'), dtype='datetime64[D]'),
+            'platform': np.array(columns.pop('platform'), dtype=np.int32),
+            **{name: np.array(values, dtype=np.int64) for name, values in columns.items()}
+        }
+
+    def _load_posts(self, db: Session) -> None:
+        rows = db.query(Post.published_at, Post.results).filter(
+            Post.user_id == self.user_id,
+            Post.published_at >= datetime.combine(self.first_day, datetime.min.time()),
+            Post.status.in_(PUBLISHED_POST_STATUSES)
+        ).yield_per(1000)
+
+        days, platforms = [], []
+        for published_at, results in rows:
+            for result in results or []:
+                if result.get("status") == "success" and result.get("platform"):
+                    days.append(published_at.date())
+                    platforms.append(self.platforms.code(result["platform"]))
+
+        self.posts = {
+            'day': np.array(days, dtype='datetime64[D]'),
+            'platform': np.array(platforms, dtype=np.int32),
+            'published': np.ones(len(days), dtype=np.int64)
+        }
+
+    # Kernels
+
+    def _window(self, table: Dict[str, np.ndarray], start_day: date, end_day: date,
+                platforms: Optional[List[str]]) -> np.ndarray:
+        """Mask of a table's rows from start_day to end_day (inclusive) on the given platforms."""
+        days = table['day']
+        mask = (days >= np.datetime64(start_day, 'D')) & (days <= np.datetime64(end_day, 'D'))
+        if platforms:
+            codes = [code for code in map(self.platforms.find, platforms) if code is not None]
+            mask &= np.isin(table['platform'], codes)
+        return mask
+
+    def _sales_window(self, start_day: date, end_day: date, currency: str,
+                      platforms: Optional[List[str]]) -> Optional[np.ndarray]:
+        currency_code = self.currencies.find(currency)
+        if currency_code is None:
+            return None
+        return self._window(self.sales, start_day, end_day, platforms) & (self.sales['currency'] == currency_code)
+
+    def _by_platform(self, table: Dict[str, np.ndarray], mask: np.ndarray,
+                     columns: Iterable[str]) -> Dict[str, np.ndarray]:
+        codes = table['platform'][mask]
+        return {column: group_sum(codes, table[column][mask], len(self.platforms)) for column in columns}
+
+    def sales_by_platform(self, start_day: date, end_day: date, currency: str,
+                          platforms: Optional[List[str]] = None) -> Dict[str, Dict[str, int]]:
+        """
+        Sum sales per platform.
+
+        Returns:
+            Dictionary of platform -> sums (revenue, commission, net_revenue in
+            cents; rate_sum in RATE_SCALE units; orders, quantity, rate_count)
+            for platforms with orders in the window
+        """
+        mask = self._sales_window(start_day, end_day, currency, platforms)
+        if mask is None:
+            return {}
+        sums = self._by_platform(self.sales, mask, SALES_SUM_COLUMNS)
+        return {
+            self.platforms.values[code]: {column: int(sums[column][code]) for column in SALES_SUM_COLUMNS}
+            for code in np.flatnonzero(sums['orders'])
+        }
+
+    def top_products(self, start_day: date, end_day: date, currency: str,
+                     platforms: Optional[List[str]] = None, limit: int = 5) -> Dict[str, List[Tuple[str, int, int]]]:
+        """
+        Best-selling product titles per platform.
+
+        Returns:
+            Dictionary of platform -> [(title, revenue in cents, orders)], highest revenue first
+        """
+        mask = self._sales_window(start_day, end_day, currency, platforms)
+        if mask is None or not len(self.titles):
+            return {}
+        mask &= self.sales['title'] >= 0
+
+        title_count = len(self.titles)
+        keys = self.sales['platform'][mask].astype(np.int64) * title_count + self.sales['title'][mask]
+        groups, inverse = np.unique(keys, return_inverse=True)
+        revenue = group_sum(inverse, self.sales['revenue'][mask], len(groups))
+        orders = group_sum(inverse, self.sales['orders'][mask], len(groups))
+        group_platforms = groups // title_count
+
+        top: Dict[str, List[Tuple[str, int, int]]] = {}
+        for code in np.unique(group_platforms):
+            members = np.flatnonzero(group_platforms == code)
+            best = members[np.argsort(-revenue[members], kind='stable')[:limit]]
+            top[self.platforms.values[code]] = [
+                (self.titles.values[groups[i] % title_count], int(revenue[i]), int(orders[i])) for i in best
+            ]
+        return top
+
+    def engagement_by_platform(self, start_day: date, end_day: date,
+                               platforms: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """
+        Sum engagement per platform, as engagement_rollups.platform_totals does.
+
+        Returns:
+            Dictionary of platform -> totals (posts, likes, ..., engagement_rate_sum, rated_posts)
+        """
+        mask = self._window(self.engagement, start_day, end_day, platforms)
+        sums = self._by_platform(self.engagement, mask, ENGAGEMENT_SUM_COLUMNS)
+        present = np.bincount(self.engagement['platform'][mask], minlength=len(self.platforms))
+
+        totals = {}
+        for code in np.flatnonzero(present):
+            platform_totals = {column: int(sums[column][code]) for column in ENGAGEMENT_SUM_COLUMNS}
+            platform_totals['engagement_rate_sum'] = from_units(platform_totals.pop('rate_sum'), MONEY_SCALE)
+            totals[self.platforms.values[code]] = platform_totals
+        return totals
+
+    def post_counts(self, start_day: date, end_day: date, platforms: Optional[List[str]] = None) -> Dict[str, int]:
+        """Posts published successfully to each platform in the window."""
+        mask = self._window(self.posts, start_day, end_day, platforms)
+        counts = np.bincount(self.posts['platform'][mask], minlength=len(self.platforms))
+        return {self.platforms.values[code]: int(counts[code]) for code in np.flatnonzero(counts)}
+
+    def _by_period(self, table: Dict[str, np.ndarray], mask: np.ndarray, group_by: str,
+                   columns: Iterable[str]) -> Dict[Tuple[date, str], Dict[str, int]]:
+        platform_count = max(len(self.platforms), 1)
+        periods = period_starts(table['day'][mask], group_by).astype(np.int64)
+        keys = periods * platform_count + table['platform'][mask]
+        groups, inverse = np.unique(keys, return_inverse=True)
+        sums = {column: group_sum(inverse, table[column][mask], len(groups)) for column in columns}
+
+        grouped = {}
+        for i, key in enumerate(groups):
+            period = np.datetime64(int(key // platform_count), 'D').item()
+            grouped[(period, self.platforms.values[key % platform_count])] = {
+                column: int(sums[column][i]) for column in columns
+            }
+        return grouped
+
+    def trend(self, start_day: date, end_day: date, group_by: str, currency: str,
+              platforms: Optional[List[str]] = None) -> Dict[Tuple[date, str], Dict[str, int]]:
+        """
+        Sales, engagement and posts per period and platform.
+
+        Returns:
+            Dictionary of (period start, platform) -> revenue (cents), orders,
+            likes, shares, comments, reach and published posts
+        """
+        grouped: Dict[Tuple[date, str], Dict[str, int]] = {}
+        sources = [
+            (self.engagement, self._window(self.engagement, start_day, end_day, platforms),
+             ('likes', 'shares', 'comments', 'reach')),
+            (self.posts, self._window(self.posts, start_day, end_day, platforms), ('published',)),
+        ]
+        sales_mask = self._sales_window(start_day, end_day, currency, platforms)
+        if sales_mask is not None:
+            sources.append((self.sales, sales_mask, ('revenue', 'orders')))
+
+        for table, mask, columns in sources:
+            for key, sums in self._by_period(table, mask, group_by, columns).items():
+                grouped.setdefault(key, {}).update(sums)
+        return grouped
+
+
+class ColumnarSnapshotCache:
+    """
+    Per-user snapshots covering the last ``settings.analytics_snapshot_days``.
+
+    Snapshots are kept for the most recently used users while the user's
+    data version is unchanged (and known; see data_versions), and reloaded after
+    ``settings.analytics_snapshot_ttl`` seconds regardless. Windows reaching
+    further back are loaded on demand and not cached.
+    """
+
+    def __init__(self):
+        self._snapshots: "OrderedDict[str, ColumnarSnapshot]" = OrderedDict()
+
+    def get(self, db: Session, user_id: str, first_day: date) -> ColumnarSnapshot:
+        """Get a snapshot of the user's analytics covering first_day onwards."""
+        # Read the version before loading: a write committed meanwhile leaves
+        # the snapshot tagged with an outdated version rather than hiding it
+        version = get_data_versions().get(user_id)
+        if version is None:
+            # Versions are not shared between workers, so snapshots cannot be reused
+            return ColumnarSnapshot.load(db, user_id, first_day)
+
+        snapshot = self._snapshots.get(user_id)
+        if (snapshot is not None and snapshot.version == version and snapshot.covers(first_day)
+                and time.monotonic() - snapshot.built_at < settings.analytics_snapshot_ttl):
+            self._snapshots.move_to_end(user_id)
+            return snapshot
+
+        cached_first_day = datetime.utcnow().date() - timedelta(days=settings.analytics_snapshot_days)
+        if first_day < cached_first_day:
+            return ColumnarSnapshot.load(db, user_id, first_day, version)
+
+        snapshot = ColumnarSnapshot.load(db, user_id, cached_first_day, version)
+        self._snapshots[user_id] = snapshot
+        self._snapshots.move_to_end(user_id)
+        while len(self._snapshots) > settings.analytics_snapshot_max_users:
+            self._snapshots.popitem(last=False)
+        return snapshot
+
+
+# Global cache instance
+_columnar_snapshot_cache: Optional[ColumnarSnapshotCache] = None
+
+
+def get_columnar_snapshot_cache() -> ColumnarSnapshotCache:
+    """Get the global columnar snapshot cache."""
+    global _columnar_snapshot_cache
+    if _columnar_snapshot_cache is None:
+        _columnar_snapshot_cache = ColumnarSnapshotCache()
+    return _columnar_snapshot_cache
@@ -0,0 +1,193 @@
+"""
+Query planning for platform analytics.
+
+The platform analytics endpoints need, for every platform, sales totals for
+the requested period and the one before it, the top products, engagement
+totals and the number of posts published. AnalyticsQueryPlanner computes
+all of that from the user's columnar snapshot (see analytics_columnar),
+which is loaded with a fixed number of queries regardless of how many
+platforms a user sells on and cached across requests, and returns it
+indexed by platform so callers join with dictionary lookups.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..schemas import PlatformSalesBreakdown
+from .analytics_columnar import MONEY_SCALE, RATE_SCALE, ColumnarSnapshot, from_units, get_columnar_snapshot_cache
+from .engagement_rollups import average_rate
+from .sales_rollups import average, utc_day
+
+logger = logging.getLogger(__name__)
+
+# Top products kept per platform
+TOP_PRODUCTS_PER_PLATFORM = 5
+
+EMPTY_ENGAGEMENT = {
+    "likes": 0, "shares": 0, "comments": 0, "views": 0,
+    "reach": 0, "average_engagement_rate": 0, "post_count": 0
+}
+
+
+@dataclass
+class PlatformSales:
+    """Sales totals for one platform over the current and previous period."""
+    platform: str
+    total_revenue: Decimal = Decimal(0)
+    total_orders: int = 0
+    total_commission: Decimal = Decimal(0)
+    net_revenue: Decimal = Decimal(0)
+    commission_rate_sum: Decimal = Decimal(0)
+    commission_rate_count: int = 0
+    previous_revenue: Decimal = Decimal(0)
+    top_products: List[Dict[str, Any]] = field(default_factory=list)
+
+    def to_breakdown(self) -> PlatformSalesBreakdown:
+        return PlatformSalesBreakdown(
+            platform=self.platform,
+            total_revenue=float(self.total_revenue),
+            total_orders=self.total_orders,
+            average_order_value=float(average(self.total_revenue, self.total_orders)),
+            commission_rate=(
+                float(self.commission_rate_sum / self.commission_rate_count)
+                if self.commission_rate_count else None
+            ),
+            total_commission=float(self.total_commission),
+            net_revenue=float(self.net_revenue),
+            top_products=self.top_products
+        )
+
+
+@dataclass
+class AnalyticsSnapshot:
+    """Everything the platform analytics need for one user and period, keyed by platform."""
+    sales: Dict[str, PlatformSales]
+    engagement: Dict[str, Dict[str, Any]]
+    post_counts: Dict[str, int]
+
+    def engagement_for(self, platform: str) -> Dict[str, Any]:
+        return self.engagement.get(platform, EMPTY_ENGAGEMENT)
+
+
+class AnalyticsQueryPlanner:
+    """Computes platform analytics for a user from their cached columnar snapshot."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.cache = get_columnar_snapshot_cache()
+
+    def _snapshot(self, user_id: str, first_day: date) -> ColumnarSnapshot:
+        return self.cache.get(self.db, user_id, first_day)
+
+    def fetch(
+        self,
+        user_id: str,
+        start_date: datetime,
+        end_date: datetime,
+        platforms: Optional[List[str]] = None,
+        currency: str = "INR"
+    ) -> AnalyticsSnapshot:
+        """
+        Fetch sales, engagement and post counts for every platform.
+
+        The previous period is the one of the same length ending at start_date,
+        as used for trends. Windows cover whole UTC days.
+
+        Args:
+            user_id: User identifier
+            start_date: Start of the period
+            end_date: End of the period
+            platforms: Only include these platforms (all when None)
+            currency: Currency of the sales totals
+
+        Returns:
+            AnalyticsSnapshot for the period
+        """
+        current_start = utc_day(start_date)
+        end_day = utc_day(end_date)
+        previous_start = utc_day(start_date - (end_date - start_date))
+        columns = self._snapshot(user_id, previous_start)
+
+        current = columns.sales_by_platform(current_start, end_day, currency, platforms)
+        previous = columns.sales_by_platform(previous_start, current_start - timedelta(days=1), currency, platforms)
+        top_products = columns.top_products(current_start, end_day, currency, platforms, TOP_PRODUCTS_PER_PLATFORM)
+
+        sales = {}
+        for platform, totals in current.items():
+            sales[platform] = PlatformSales(
+                platform=platform,
+                total_revenue=from_units(totals['revenue'], MONEY_SCALE),
+                total_orders=totals['orders'],
+                total_commission=from_units(totals['commission'], MONEY_SCALE),
+                net_revenue=from_units(totals['net_revenue'], MONEY_SCALE),
+                commission_rate_sum=from_units(totals['rate_sum'], RATE_SCALE),
+                commission_rate_count=totals['rate_count'],
+                previous_revenue=from_units(previous.get(platform, {}).get('revenue', 0), MONEY_SCALE),
+                top_products=[
+                    {"title": title, "revenue": float(from_units(revenue, MONEY_SCALE)), "orders": orders}
+                    for title, revenue, orders in top_products.get(platform, [])
+                ]
+            )
+
+        engagement = {
+            platform: {
+                "likes": totals["likes"],
+                "shares": totals["shares"],
+                "comments": totals["comments"],
+                "views": totals["views"],
+                "reach": totals["reach"],
+                "average_engagement_rate": average_rate(totals),
+                "post_count": totals["posts"]
+            }
+            for platform, totals in columns.engagement_by_platform(current_start, end_day, platforms).items()
+        }
+
+        return AnalyticsSnapshot(
+            sales=sales,
+            engagement=engagement,
+            post_counts=columns.post_counts(current_start, end_day, platforms)
+        )
+
+    def fetch_trends(
+        self,
+        user_id: str,
+        start_date: datetime,
+        end_date: datetime,
+        group_by: str = "day",
+        platforms: Optional[List[str]] = None,
+        currency: str = "INR"
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Fetch per-period sales, engagement and post counts for every platform.
+
+        Args:
+            user_id: User identifier
+            start_date: Start of the period
+            end_date: End of the period
+            group_by: Period length: day, week (starting Monday) or month
+            platforms: Only include these platforms (all when None)
+            currency: Currency of the revenue figures
+
+        Returns:
+            Dictionary of platform -> periods, oldest first
+        """
+        start_day = utc_day(start_date)
+        columns = self._snapshot(user_id, start_day)
+        grouped = columns.trend(start_day, utc_day(end_date), group_by, currency, platforms)
+
+        trends: Dict[str, List[Dict[str, Any]]] = {}
+        for (period, platform), sums in sorted(grouped.items()):
+            trends.setdefault(platform, []).append({
+                "period": datetime.combine(period, datetime.min.time()).isoformat(),
+                "revenue": float(from_units(sums.get('revenue', 0), MONEY_SCALE)),
+                "orders": sums.get('orders', 0),
+                "engagement": sums.get('likes', 0) + sums.get('shares', 0) + sums.get('comments', 0),
+                "reach": sums.get('reach', 0),
+                "posts": sums.get('published', 0)
+            })
+        return trends
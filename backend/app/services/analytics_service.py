@@ -11,17 +11,117 @@ This service provides comprehensive analytics functionality including:
 from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 from decimal import Decimal
+import heapq
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, desc, distinct
+from sqlalchemy import func, and_, desc
 import logging
 
-from ..models import SaleEvent, EngagementMetrics, Post, Product, PlatformConnection
+from ..models import SalesDailyRollup, EngagementMetrics, Post, Product, PlatformConnection
+from .analytics_planner import AnalyticsQueryPlanner
+from .sales_rollups import money, utc_day
 from .sales_tracking import SalesTrackingService
 from .engagement_metrics import get_engagement_metrics_service
 
 logger = logging.getLogger(__name__)
 
 
+def product_platform_score(platform_data: Dict[str, Any]) -> int:
+    """Calculate performance score for a product on a specific platform."""
+    revenue_score = min(platform_data["revenue"] / 100, 50)  # Max 50 points
+    order_score = min(platform_data["orders"] * 5, 30)  # Max 30 points
+    engagement_score = min(platform_data["engagement"] / 10, 20)  # Max 20 points
+    
+    return int(revenue_score + order_score + engagement_score)
+
+
+def rank_products(product_sales, product_engagement, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Merge product sales and engagement aggregates and rank the products.
+    
+    Sales rows are (product_id, product_title, platform, revenue, orders);
+    engagement rows are (product_id, title, platform, total_engagement).
+    Products are indexed by product id and by lower-cased title, so each
+    engagement row is matched with two dictionary lookups. For S sales rows,
+    E engagement rows and P products this runs in O(S + E + P log limit).
+    
+    Returns:
+        Tuple of (top products, best first; number of products)
+    """
+    products_data: Dict[str, Dict[str, Any]] = {}
+    by_product_id: Dict[str, Dict[str, Any]] = {}
+    by_title: Dict[str, Dict[str, Any]] = {}
+    
+    for sale in product_sales:
+        product_key = sale.product_title or f"Product {sale.product_id}"
+        product = products_data.get(product_key)
+        if product is None:
+            product = products_data[product_key] = {
+                "id": sale.product_id,
+                "title": product_key,
+                "total_revenue": Decimal(0),
+                "total_orders": 0,
+                "total_engagement": 0,
+                "platforms": {},
+                "best_platform": "",
+                "performance_score": 0
+            }
+            by_title.setdefault(product_key.lower(), product)
+        if sale.product_id:
+            by_product_id.setdefault(sale.product_id, product)
+        
+        revenue = money(sale.revenue)
+        orders = int(sale.orders or 0)
+        
+        platform_data = product["platforms"].get(sale.platform)
+        if platform_data is None:
+            platform_data = product["platforms"][sale.platform] = {
+                "platform": sale.platform,
+                "revenue": Decimal(0),
+                "orders": 0,
+                "engagement": 0,
+                "performance_score": 0
+            }
+        platform_data["revenue"] += revenue
+        platform_data["orders"] += orders
+        
+        product["total_revenue"] += revenue
+        product["total_orders"] += orders
+    
+    for engagement in product_engagement:
+        product = by_product_id.get(engagement.product_id) if engagement.product_id else None
+        if product is None and engagement.title:
+            product = by_title.get(engagement.title.lower())
+        if product is None:
+            continue
+        platform_data = product["platforms"].get(engagement.platform)
+        if platform_data is not None:
+            total_engagement = int(engagement.total_engagement or 0)
+            platform_data["engagement"] += total_engagement
+            product["total_engagement"] += total_engagement
+    
+    # Score each product's platforms and find its best one
+    for product in products_data.values():
+        best_platform = ""
+        best_score = 0
+        
+        for platform, platform_data in product["platforms"].items():
+            platform_data["revenue"] = float(platform_data["revenue"])
+            score = product_platform_score(platform_data)
+            platform_data["performance_score"] = score
+            
+            if score > best_score:
+                best_score = score
+                best_platform = platform
+        
+        product["best_platform"] = best_platform
+        product["performance_score"] = best_score
+        product["total_revenue"] = float(product["total_revenue"])
+        product["platforms"] = list(product["platforms"].values())
+    
+    top_products = heapq.nlargest(limit, products_data.values(), key=lambda x: x["performance_score"])
+    return top_products, len(products_data)
+
+
 class AnalyticsService:
     """
     Service for advanced analytics and platform performance analysis.
@@ -31,6 +131,7 @@ class AnalyticsService:
         self.db = db
         self.sales_service = SalesTrackingService(db)
         self.engagement_service = get_engagement_metrics_service()
+        self.planner = AnalyticsQueryPlanner(db)
         self.logger = logging.getLogger(__name__)
     
     async def get_platform_performance_breakdown(
@@ -55,40 +156,19 @@ class AnalyticsService:
             Dictionary containing platform performance metrics
         """
         try:
-            # Get sales data for each platform
-            platform_breakdown = await self.sales_service.get_platform_breakdown(
-                user_id, start_date, end_date, currency
-            )
-            
-            # Get engagement data
-            engagement_data = await self.engagement_service.get_engagement_dashboard_data(
-                user_id, start_date, end_date, platforms
-            )
-            
-            # Get post counts per platform
-            post_counts = await self._get_post_counts_by_platform(user_id, start_date, end_date, platforms)
+            # Sales (this and the previous period), engagement and post counts
+            # for every platform in a fixed number of queries
+            snapshot = self.planner.fetch(user_id, start_date, end_date, platforms, currency)
             
             # Calculate performance metrics for each platform
             performance_metrics = []
             
-            for sales_data in platform_breakdown:
-                platform = sales_data.platform
-                
-                # Skip if platform filter is specified and doesn't match
-                if platforms and platform not in platforms:
-                    continue
-                
-                # Find corresponding engagement data
-                engagement = next(
-                    (e for e in engagement_data.engagement_by_platform if e["platform"] == platform),
-                    {
-                        "likes": 0, "shares": 0, "comments": 0, "views": 0, 
-                        "reach": 0, "average_engagement_rate": 0, "post_count": 0
-                    }
-                )
+            for platform, platform_sales in sorted(snapshot.sales.items()):
+                sales_data = platform_sales.to_breakdown()
+                engagement = snapshot.engagement_for(platform)
                 
                 # Get post count for this platform
-                post_count = post_counts.get(platform, 1)  # Avoid division by zero
+                post_count = snapshot.post_counts.get(platform, 1)  # Avoid division by zero
                 
                 # Calculate ROI metrics
                 revenue_per_post = sales_data.total_revenue / max(post_count, 1)
@@ -99,9 +179,9 @@ class AnalyticsService:
                     sales_data, engagement, post_count
                 )
                 
-                # Calculate trend (simplified - would need historical data for real trends)
-                trend_direction, trend_percentage = await self._calculate_trend(
-                    user_id, platform, start_date, end_date, currency
+                # Trend against the previous period of the same length
+                trend_direction, trend_percentage = self._calculate_trend(
+                    platform_sales.total_revenue, platform_sales.previous_revenue
                 )
                 
                 performance_metrics.append({
@@ -265,37 +345,37 @@ class AnalyticsService:
             Dictionary containing top performing products data
         """
         try:
-            # Get sales data by product
+            # Get sales data by product, summed from the daily rollup
             query = self.db.query(
-                SaleEvent.product_id,
-                SaleEvent.product_title,
-                SaleEvent.platform,
-                func.sum(SaleEvent.amount).label('revenue'),
-                func.count(SaleEvent.id).label('orders'),
-                func.sum(SaleEvent.quantity).label('quantity')
+                SalesDailyRollup.product_id,
+                SalesDailyRollup.product_title,
+                SalesDailyRollup.platform,
+                func.sum(SalesDailyRollup.revenue).label('revenue'),
+                func.sum(SalesDailyRollup.order_count).label('orders'),
+                func.sum(SalesDailyRollup.quantity).label('quantity')
             ).filter(
                 and_(
-                    SaleEvent.user_id == user_id,
-                    SaleEvent.occurred_at >= start_date,
-                    SaleEvent.occurred_at <= end_date,
-                    SaleEvent.status == "confirmed",
-                    SaleEvent.currency == currency,
-                    SaleEvent.product_title.isnot(None)
+                    SalesDailyRollup.user_id == user_id,
+                    SalesDailyRollup.day >= utc_day(start_date),
+                    SalesDailyRollup.day <= utc_day(end_date),
+                    SalesDailyRollup.currency == currency,
+                    SalesDailyRollup.product_title.isnot(None)
                 )
             )
             
             if platforms:
-                query = query.filter(SaleEvent.platform.in_(platforms))
+                query = query.filter(SalesDailyRollup.platform.in_(platforms))
             
             product_sales = query.group_by(
-                SaleEvent.product_id, 
-                SaleEvent.product_title, 
-                SaleEvent.platform
+                SalesDailyRollup.product_id, 
+                SalesDailyRollup.product_title, 
+                SalesDailyRollup.platform
             ).all()
             
-            # Get engagement data for products (if available)
+            # Engagement per product and platform: posts link to products by
+            # product_id; unlinked posts fall back to their title
             engagement_query = self.db.query(
-                EngagementMetrics.post_id,
+                Post.product_id,
                 Post.title,
                 EngagementMetrics.platform,
                 func.sum(EngagementMetrics.likes + EngagementMetrics.shares + EngagementMetrics.comments).label('total_engagement')
@@ -312,81 +392,16 @@ class AnalyticsService:
                 engagement_query = engagement_query.filter(EngagementMetrics.platform.in_(platforms))
             
             product_engagement = engagement_query.group_by(
-                EngagementMetrics.post_id,
+                Post.product_id,
                 Post.title,
                 EngagementMetrics.platform
             ).all()
             
-            # Aggregate by product
-            products_data = {}
-            
-            for sale in product_sales:
-                product_key = sale.product_title or f"Product {sale.product_id}"
-                
-                if product_key not in products_data:
-                    products_data[product_key] = {
-                        "id": sale.product_id,
-                        "title": product_key,
-                        "total_revenue": 0,
-                        "total_orders": 0,
-                        "total_engagement": 0,
-                        "platforms": {},
-                        "best_platform": "",
-                        "performance_score": 0
-                    }
-                
-                # Add platform data
-                products_data[product_key]["platforms"][sale.platform] = {
-                    "platform": sale.platform,
-                    "revenue": float(sale.revenue),
-                    "orders": sale.orders,
-                    "engagement": 0,  # Will be updated below
-                    "performance_score": 0
-                }
-                
-                products_data[product_key]["total_revenue"] += float(sale.revenue)
-                products_data[product_key]["total_orders"] += sale.orders
-            
-            # Add engagement data
-            for engagement in product_engagement:
-                # Try to match by product title (simplified matching)
-                for product_key, product_data in products_data.items():
-                    if engagement.title and engagement.title.lower() in product_key.lower():
-                        if engagement.platform in product_data["platforms"]:
-                            product_data["platforms"][engagement.platform]["engagement"] = int(engagement.total_engagement or 0)
-                            product_data["total_engagement"] += int(engagement.total_engagement or 0)
-                        break
-            
-            # Calculate performance scores and find best platforms
-            for product_key, product_data in products_data.items():
-                best_platform = ""
-                best_score = 0
-                
-                for platform, platform_data in product_data["platforms"].items():
-                    # Calculate performance score for this platform
-                    score = self._calculate_product_platform_score(platform_data)
-                    platform_data["performance_score"] = score
-                    
-                    if score > best_score:
-                        best_score = score
-                        best_platform = platform
-                
-                product_data["best_platform"] = best_platform
-                product_data["performance_score"] = best_score
-                
-                # Convert platforms dict to list
-                product_data["platforms"] = list(product_data["platforms"].values())
-            
-            # Sort by performance score and limit results
-            top_products = sorted(
-                products_data.values(),
-                key=lambda x: x["performance_score"],
-                reverse=True
-            )[:limit]
+            top_products, total_products = rank_products(product_sales, product_engagement, limit)
             
             return {
                 "products": top_products,
-                "total_products": len(products_data),
+                "total_products": total_products,
                 "period_start": start_date.isoformat(),
                 "period_end": end_date.isoformat()
             }
@@ -417,24 +432,14 @@ class AnalyticsService:
             Dictionary containing ROI analysis data
         """
         try:
-            # Get platform breakdown data
-            platform_breakdown = await self.sales_service.get_platform_breakdown(
-                user_id, start_date, end_date, currency
-            )
-            
-            # Get post counts for investment calculation
-            post_counts = await self._get_post_counts_by_platform(user_id, start_date, end_date, platforms)
+            # Platform sales and post counts for investment calculation
+            snapshot = self.planner.fetch(user_id, start_date, end_date, platforms, currency)
             
             roi_analysis = []
             
-            for platform_data in platform_breakdown:
-                platform = platform_data.platform
-                
-                # Skip if platform filter is specified and doesn't match
-                if platforms and platform not in platforms:
-                    continue
-                
-                post_count = post_counts.get(platform, 1)
+            for platform, platform_sales in sorted(snapshot.sales.items()):
+                platform_data = platform_sales.to_breakdown()
+                post_count = snapshot.post_counts.get(platform, 1)
                 
                 # Calculate investment metrics (simplified)
                 # In a real scenario, this would include actual advertising costs, time tracking, etc.
@@ -562,62 +567,63 @@ class AnalyticsService:
             self.logger.error(f"Failed to get analytics insights: {e}")
             raise
     
-    # Helper methods
-    
-    async def _get_post_counts_by_platform(
-        self, 
-        user_id: str, 
-        start_date: datetime, 
+    async def get_performance_trends(
+        self,
+        user_id: str,
+        start_date: datetime,
         end_date: datetime,
-        platforms: Optional[List[str]] = None
-    ) -> Dict[str, int]:
-        """Get post counts by platform for the specified period."""
-        try:
-            query = self.db.query(
-                func.json_extract(Post.results, '$[*].platform').label('platform'),
-                func.count(Post.id).label('count')
-            ).filter(
-                and_(
-                    Post.user_id == user_id,
-                    Post.published_at >= start_date,
-                    Post.published_at <= end_date,
-                    Post.status == "published"
-                )
-            )
-            
-            # This is a simplified approach - in reality, we'd need to properly parse JSON arrays
-            # For now, we'll get total posts and estimate distribution
-            total_posts = self.db.query(func.count(Post.id)).filter(
-                and_(
-                    Post.user_id == user_id,
-                    Post.published_at >= start_date,
-                    Post.published_at <= end_date,
-                    Post.status == "published"
-                )
-            ).scalar() or 0
-            
-            # Get unique platforms from sales data as a proxy
-            platform_query = self.db.query(distinct(SaleEvent.platform)).filter(
-                and_(
-                    SaleEvent.user_id == user_id,
-                    SaleEvent.occurred_at >= start_date,
-                    SaleEvent.occurred_at <= end_date
-                )
-            )
-            
-            if platforms:
-                platform_query = platform_query.filter(SaleEvent.platform.in_(platforms))
-            
-            unique_platforms = [p[0] for p in platform_query.all()]
+        platforms: Optional[List[str]] = None,
+        group_by: str = "day",
+        currency: str = "INR"
+    ) -> Dict[str, Any]:
+        """
+        Get performance trends over time for each platform.
+        
+        Args:
+            user_id: User identifier
+            start_date: Start date for trend analysis
+            end_date: End date for trend analysis
+            platforms: Specific platforms to analyze
+            group_by: Grouping period: day, week or month
+            currency: Currency for calculations
             
-            # Distribute posts evenly across platforms (simplified)
-            posts_per_platform = max(total_posts // max(len(unique_platforms), 1), 1)
+        Returns:
+            Dictionary containing per-platform trend series
+        """
+        try:
+            trends = self.planner.fetch_trends(user_id, start_date, end_date, group_by, platforms, currency)
+            
+            platform_trends = []
+            for platform, periods in sorted(trends.items()):
+                # Direction: revenue of the later half of the periods against the earlier half
+                half = len(periods) // 2
+                earlier = sum(Decimal(str(period["revenue"])) for period in periods[:half])
+                later = sum(Decimal(str(period["revenue"])) for period in periods[half:])
+                trend_direction, trend_percentage = self._calculate_trend(later, earlier)
+                
+                platform_trends.append({
+                    "platform": platform,
+                    "periods": periods,
+                    "total_revenue": float(earlier + later),
+                    "total_orders": sum(period["orders"] for period in periods),
+                    "total_engagement": sum(period["engagement"] for period in periods),
+                    "trend_direction": trend_direction,
+                    "trend_percentage": trend_percentage
+                })
             
-            return {platform: posts_per_platform for platform in unique_platforms}
+            return {
+                "period_start": start_date.isoformat(),
+                "period_end": end_date.isoformat(),
+                "group_by": group_by,
+                "currency": currency,
+                "platforms": platform_trends
+            }
             
         except Exception as e:
-            self.logger.error(f"Failed to get post counts by platform: {e}")
-            return {}
+            self.logger.error(f"Failed to get performance trends: {e}")
+            raise
+    
+    # Helper methods
     
     def _calculate_performance_score(
         self, 
@@ -650,60 +656,19 @@ class AnalyticsService:
             self.logger.error(f"Failed to calculate performance score: {e}")
             return 0
     
-    async def _calculate_trend(
-        self, 
-        user_id: str, 
-        platform: str, 
-        start_date: datetime, 
-        end_date: datetime,
-        currency: str
-    ) -> Tuple[str, float]:
-        """Calculate trend direction and percentage for a platform."""
-        try:
-            # Get data for the previous period for comparison
-            period_length = end_date - start_date
-            previous_start = start_date - period_length
-            previous_end = start_date
-            
-            # Get current period revenue
-            current_revenue = self.db.query(func.sum(SaleEvent.amount)).filter(
-                and_(
-                    SaleEvent.user_id == user_id,
-                    SaleEvent.platform == platform,
-                    SaleEvent.occurred_at >= start_date,
-                    SaleEvent.occurred_at <= end_date,
-                    SaleEvent.status == "confirmed",
-                    SaleEvent.currency == currency
-                )
-            ).scalar() or 0
-            
-            # Get previous period revenue
-            previous_revenue = self.db.query(func.sum(SaleEvent.amount)).filter(
-                and_(
-                    SaleEvent.user_id == user_id,
-                    SaleEvent.platform == platform,
-                    SaleEvent.occurred_at >= previous_start,
-                    SaleEvent.occurred_at <= previous_end,
-                    SaleEvent.status == "confirmed",
-                    SaleEvent.currency == currency
-                )
-            ).scalar() or 0
-            
-            if previous_revenue == 0:
-                return "stable", 0.0
-            
-            change_percentage = ((float(current_revenue) - float(previous_revenue)) / float(previous_revenue)) * 100
-            
-            if change_percentage > 5:
-                return "up", change_percentage
-            elif change_percentage < -5:
-                return "down", abs(change_percentage)
-            else:
-                return "stable", abs(change_percentage)
-                
-        except Exception as e:
-            self.logger.error(f"Failed to calculate trend: {e}")
+    def _calculate_trend(self, current_revenue: Decimal, previous_revenue: Decimal) -> Tuple[str, float]:
+        """Calculate trend direction and percentage from two periods' revenue."""
+        if previous_revenue == 0:
             return "stable", 0.0
+        
+        change_percentage = float((current_revenue - previous_revenue) / previous_revenue * 100)
+        
+        if change_percentage > 5:
+            return "up", change_percentage
+        elif change_percentage < -5:
+            return "down", abs(change_percentage)
+        else:
+            return "stable", abs(change_percentage)
     
     def _calculate_conversion_rate(self, orders: int, reach: int) -> float:
         """Calculate conversion rate from reach to orders."""
@@ -726,19 +691,6 @@ class AnalyticsService:
             return 0.0
         return ((net_revenue - estimated_investment) / estimated_investment) * 100
     
-    def _calculate_product_platform_score(self, platform_data: Dict[str, Any]) -> int:
-        """Calculate performance score for a product on a specific platform."""
-        try:
-            revenue_score = min(platform_data["revenue"] / 100, 50)  # Max 50 points
-            order_score = min(platform_data["orders"] * 5, 30)  # Max 30 points
-            engagement_score = min(platform_data["engagement"] / 10, 20)  # Max 20 points
-            
-            return int(revenue_score + order_score + engagement_score)
-            
-        except Exception as e:
-            self.logger.error(f"Failed to calculate product platform score: {e}")
-            return 0
-    
     def _generate_performance_insights(self, platforms: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Generate insights from platform performance data."""
         if not platforms:
@@ -17,6 +17,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_, desc
 from fastapi import Request
 from ..models import AuditLog, User
+from ..pagination import Page, keyset_page, list_total, newest_first
 from ..security import input_sanitizer
 
 logger = logging.getLogger(__name__)
@@ -326,21 +327,28 @@ class AuditService:
         limit: int = 100,
         offset: int = 0,
         action_filter: Optional[str] = None,
-        sensitivity_filter: Optional[str] = None
-    ) -> List[AuditLog]:
+        sensitivity_filter: Optional[str] = None,
+        cursor: Optional[str] = None,
+        exact_total: bool = False
+    ) -> Page:
         """
-        Get audit log entries for a specific user.
+        Get audit log entries for a specific user, newest first.
         
         Args:
             db: Database session
             user_id: User ID
             limit: Maximum number of entries to return
-            offset: Number of entries to skip
+            offset: Number of entries to skip (prefer cursor)
             action_filter: Filter by action type
             sensitivity_filter: Filter by sensitivity level
+            cursor: next_cursor of the previous page
+            exact_total: Count the total even when the log is large
             
         Returns:
-            List of AuditLog entries
+            Page of AuditLog entries, keyed on (timestamp, id)
+            
+        Raises:
+            InvalidCursor: If cursor is malformed
         """
         query = db.query(AuditLog).filter(AuditLog.user_id == user_id)
         
@@ -350,7 +358,11 @@ class AuditService:
         if sensitivity_filter:
             query = query.filter(AuditLog.sensitivity_level == sensitivity_filter)
         
-        return query.order_by(desc(AuditLog.timestamp)).offset(offset).limit(limit).all()
+        total, total_exact = list_total(query, exact_total)
+        entries, next_cursor = keyset_page(
+            query, newest_first(AuditLog.timestamp, AuditLog.id), limit, cursor, offset=offset
+        )
+        return Page(entries, total, total_exact, next_cursor)
     
     async def get_critical_events(
         self,
@@ -5,17 +5,21 @@ This service provides cloud storage operations using Cloudflare R2
 with S3-compatible API for cost-effective and reliable file storage.
 """
 
+import asyncio
+import mimetypes
 import uuid
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional, Union
 import logging
 
 import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
 from botocore.config import Config
 from pydantic import BaseModel
+from sqlalchemy.orm import Session
 
 from ..config import settings
+from ..models import Image, ProductImage
 
 logger = logging.getLogger(__name__)
 
@@ -41,12 +45,17 @@ class PresignedUploadData(BaseModel):
     upload_url: str
     fields: Dict[str, str]
     file_id: str
+    storage_path: str
     expires_at: datetime
 
 
 
 
 
+# Maximum keys per DeleteObjects request
+DELETE_BATCH_SIZE = 1000
+
+
 class CloudflareR2Provider:
     """Cloudflare R2 storage provider implementation (S3-compatible)."""
     
@@ -70,6 +79,12 @@ class CloudflareR2Provider:
         except ClientError as e:
             raise StorageError(f"Cloudflare R2 initialization failed: {e}")
     
+    def _public_url(self, storage_path: str) -> str:
+        """Public URL of a key, using the custom domain if available, otherwise the endpoint URL."""
+        if settings.cloudflare_public_url:
+            return f"{settings.cloudflare_public_url}/{storage_path}"
+        return f"{settings.cloudflare_endpoint_url}/{self.bucket}/{storage_path}"
+    
     def _generate_storage_path(self, filename: str, folder: str = "") -> str:
         """Generate storage path with folder structure."""
         file_id = str(uuid.uuid4())
@@ -79,15 +94,27 @@ class CloudflareR2Provider:
             return f"{folder}/{timestamp}/{file_id}_{filename}"
         return f"{timestamp}/{file_id}_{filename}"
     
-    async def upload_file(self, file_data: bytes, filename: str, content_type: str, 
-                         folder: str = "") -> StoredFile:
-        """Upload file to Cloudflare R2."""
+    async def upload_file(self, file_data: Union[bytes, BinaryIO], filename: str, content_type: str, 
+                         folder: str = "", storage_path: Optional[str] = None) -> StoredFile:
+        """Upload bytes or a file object to Cloudflare R2, optionally at a caller-chosen key."""
         try:
-            storage_path = self._generate_storage_path(filename, folder)
-            file_id = storage_path.split('/')[-1].split('_')[0]
+            if isinstance(file_data, (bytes, bytearray)):
+                size = len(file_data)
+            else:
+                start = file_data.tell()
+                file_data.seek(0, 2)
+                size = file_data.tell() - start
+                file_data.seek(start)
             
-            # Upload file
-            self.client.put_object(
+            if storage_path:
+                file_id = storage_path.split('/')[-1].split('.')[0]
+            else:
+                storage_path = self._generate_storage_path(filename, folder)
+                file_id = storage_path.split('/')[-1].split('_')[0]
+            
+            # Upload file off the event loop so uploads can overlap
+            await asyncio.to_thread(
+                self.client.put_object,
                 Bucket=self.bucket,
                 Key=storage_path,
                 Body=file_data,
@@ -99,17 +126,11 @@ class CloudflareR2Provider:
                 }
             )
             
-            # Generate public URL using custom domain if available, otherwise endpoint URL
-            if settings.cloudflare_public_url:
-                url = f"{settings.cloudflare_public_url}/{storage_path}"
-            else:
-                url = f"{settings.cloudflare_endpoint_url}/{self.bucket}/{storage_path}"
-            
             return StoredFile(
                 file_id=file_id,
                 filename=filename,
-                url=url,
-                size=len(file_data),
+                url=self._public_url(storage_path),
+                size=size,
                 content_type=content_type,
                 storage_path=storage_path,
                 created_at=datetime.utcnow()
@@ -122,12 +143,83 @@ class CloudflareR2Provider:
     async def download_file(self, storage_path: str) -> bytes:
         """Download file from Cloudflare R2."""
         try:
-            response = self.client.get_object(Bucket=self.bucket, Key=storage_path)
-            return response['Body'].read()
+            # Off the event loop, like the other transfers
+            response = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=storage_path)
+            body = response['Body']
+            try:
+                return await asyncio.to_thread(body.read)
+            finally:
+                body.close()
         except ClientError as e:
             logger.error(f"Cloudflare R2 download failed: {e}")
             raise StorageError(f"Download failed: {e}")
     
+    async def iter_file(self, storage_path: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        """Stream a file from Cloudflare R2 in chunks, without buffering the whole body."""
+        try:
+            response = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=storage_path)
+            body = response['Body']
+            try:
+                while True:
+                    chunk = await asyncio.to_thread(body.read, chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                body.close()
+        except ClientError as e:
+            logger.error(f"Cloudflare R2 streamed download failed: {e}")
+            raise StorageError(f"Download failed: {e}")
+    
+    async def head_file(self, storage_path: str) -> Optional[Dict]:
+        """Return size and content type of a file in Cloudflare R2, or None if it does not exist."""
+        try:
+            response = await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=storage_path)
+            return {
+                'size': response['ContentLength'],
+                'content_type': response.get('ContentType', 'application/octet-stream'),
+                'metadata': response.get('Metadata', {})
+            }
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            logger.error(f"Cloudflare R2 head failed: {e}")
+            raise StorageError(f"Head failed: {e}")
+    
+    async def copy_file(self, source_path: str, storage_path: str, filename: str,
+                        content_type: str) -> StoredFile:
+        """Copy a file within the bucket server-side, without transferring its bytes."""
+        try:
+            file_id = storage_path.split('/')[-1].split('.')[0]
+            response = await asyncio.to_thread(
+                self.client.copy_object,
+                Bucket=self.bucket,
+                Key=storage_path,
+                CopySource={'Bucket': self.bucket, 'Key': source_path},
+                ContentType=content_type,
+                Metadata={
+                    'original_filename': filename,
+                    'file_id': file_id,
+                    'uploaded_at': datetime.utcnow().isoformat()
+                },
+                MetadataDirective='REPLACE'
+            )
+            head = await self.head_file(storage_path)
+            
+            return StoredFile(
+                file_id=file_id,
+                filename=filename,
+                url=self._public_url(storage_path),
+                size=head['size'] if head else 0,
+                content_type=content_type,
+                storage_path=storage_path,
+                created_at=response.get('CopyObjectResult', {}).get('LastModified', datetime.utcnow())
+            )
+            
+        except ClientError as e:
+            logger.error(f"Cloudflare R2 copy failed: {e}")
+            raise StorageError(f"Copy failed: {e}")
+    
     async def delete_file(self, storage_path: str) -> bool:
         """Delete file from Cloudflare R2."""
         try:
@@ -137,6 +229,44 @@ class CloudflareR2Provider:
             logger.error(f"Cloudflare R2 delete failed: {e}")
             return False
     
+    async def delete_files(self, storage_paths: List[str]) -> Dict[str, bool]:
+        """
+        Delete many files from Cloudflare R2 with batched DeleteObjects requests.
+        
+        Keys are sent up to DELETE_BATCH_SIZE per request, with up to
+        ``settings.storage_delete_concurrency`` requests in flight. Keys that
+        no longer exist count as deleted.
+        
+        Returns:
+            Dictionary of storage_path -> success_status
+        """
+        paths = list(dict.fromkeys(path for path in storage_paths if path))
+        semaphore = asyncio.Semaphore(settings.storage_delete_concurrency)
+        
+        async def delete_batch(batch: List[str]) -> Dict[str, bool]:
+            async with semaphore:
+                try:
+                    response = await asyncio.to_thread(
+                        self.client.delete_objects,
+                        Bucket=self.bucket,
+                        Delete={'Objects': [{'Key': path} for path in batch], 'Quiet': True}
+                    )
+                except ClientError as e:
+                    logger.error(f"Cloudflare R2 batch delete of {len(batch)} keys failed: {e}")
+                    return {path: False for path in batch}
+                
+                # Quiet mode only reports failures
+                failed = {error['Key'] for error in response.get('Errors', [])}
+                for error in response.get('Errors', []):
+                    logger.warning(f"Cloudflare R2 delete of {error['Key']} failed: {error.get('Code')} {error.get('Message')}")
+                return {path: path not in failed for path in batch}
+        
+        results = {}
+        batches = [paths[i:i + DELETE_BATCH_SIZE] for i in range(0, len(paths), DELETE_BATCH_SIZE)]
+        for batch_results in await asyncio.gather(*(delete_batch(batch) for batch in batches)):
+            results.update(batch_results)
+        return results
+    
     async def generate_presigned_upload_url(self, filename: str, content_type: str,
                                           folder: str = "", expires_in: int = 3600) -> PresignedUploadData:
         """Generate presigned URL for Cloudflare R2 upload."""
@@ -164,6 +294,7 @@ class CloudflareR2Provider:
                 upload_url=response['url'],
                 fields=response['fields'],
                 file_id=file_id,
+                storage_path=storage_path,
                 expires_at=datetime.utcnow() + timedelta(seconds=expires_in)
             )
             
@@ -185,42 +316,63 @@ class CloudflareR2Provider:
             logger.error(f"Cloudflare R2 presigned download URL generation failed: {e}")
             raise StorageError(f"Presigned download URL generation failed: {e}")
     
-    async def list_files(self, folder: str = "", limit: int = 100) -> List[StoredFile]:
-        """List files in Cloudflare R2 bucket."""
+    async def iter_files(self, folder: str = "", page_size: int = 1000) -> AsyncIterator[StoredFile]:
+        """
+        Iterate over every file under a folder, one listing page at a time.
+        
+        Follows continuation tokens until the listing is exhausted. Details
+        come from the listing alone (no per-object HEAD requests): the
+        filename and id are parsed from the key and the content type is
+        inferred from its extension.
+        """
+        kwargs = {'Bucket': self.bucket, 'MaxKeys': page_size}
+        if folder:
+            kwargs['Prefix'] = folder + '/'
+        
         try:
-            kwargs = {'Bucket': self.bucket, 'MaxKeys': limit}
-            if folder:
-                kwargs['Prefix'] = folder + '/'
-            
-            response = self.client.list_objects_v2(**kwargs)
-            files = []
-            
-            for obj in response.get('Contents', []):
-                # Get metadata
-                head_response = self.client.head_object(Bucket=self.bucket, Key=obj['Key'])
-                metadata = head_response.get('Metadata', {})
+            while True:
+                response = await asyncio.to_thread(self.client.list_objects_v2, **kwargs)
                 
-                # Generate public URL using custom domain if available
-                if settings.cloudflare_public_url:
-                    file_url = f"{settings.cloudflare_public_url}/{obj['Key']}"
-                else:
-                    file_url = f"{settings.cloudflare_endpoint_url}/{self.bucket}/{obj['Key']}"
+                for obj in response.get('Contents', []):
+                    yield self._listed_file(obj)
+                
+                if not response.get('IsTruncated'):
+                    break
+                kwargs['ContinuationToken'] = response['NextContinuationToken']
                 
-                files.append(StoredFile(
-                    file_id=metadata.get('file_id', obj['Key'].split('/')[-1].split('_')[0]),
-                    filename=metadata.get('original_filename', obj['Key'].split('/')[-1]),
-                    url=file_url,
-                    size=obj['Size'],
-                    content_type=head_response.get('ContentType', 'application/octet-stream'),
-                    storage_path=obj['Key'],
-                    created_at=obj['LastModified']
-                ))
-            
-            return files
-            
         except ClientError as e:
             logger.error(f"Cloudflare R2 list files failed: {e}")
             raise StorageError(f"List files failed: {e}")
+    
+    async def list_files(self, folder: str = "", limit: int = 100) -> List[StoredFile]:
+        """List up to limit files in Cloudflare R2 bucket."""
+        files = []
+        async for file_info in self.iter_files(folder, page_size=min(limit, 1000)):
+            files.append(file_info)
+            if len(files) >= limit:
+                break
+        return files
+    
+    def _listed_file(self, obj: Dict) -> StoredFile:
+        """Build a StoredFile from a list_objects_v2 entry."""
+        key = obj['Key']
+        name = key.split('/')[-1]
+        
+        # Keys are "{file_id}_{filename}" or, for content-addressed objects, "{hash}.{ext}"
+        if '_' in name:
+            file_id, filename = name.split('_', 1)
+        else:
+            file_id, filename = name.split('.')[0], name
+        
+        return StoredFile(
+            file_id=file_id,
+            filename=filename,
+            url=self._public_url(key),
+            size=obj['Size'],
+            content_type=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+            storage_path=key,
+            created_at=obj['LastModified']
+        )
 
 
 class CloudStorageService:
@@ -276,38 +428,70 @@ class CloudStorageService:
         
         return results
     
+    async def upload_to_path(self, file_data: Union[bytes, BinaryIO], storage_path: str, filename: str,
+                             content_type: str) -> StoredFile:
+        """
+        Upload a file to a fixed storage path.
+        
+        Used for content-addressed objects, where the key is derived from the
+        content hash and re-uploading identical bytes is idempotent.
+        """
+        return await self.provider.upload_file(file_data, filename, content_type, storage_path=storage_path)
+    
     async def download_file(self, storage_path: str) -> bytes:
         """Download file from storage."""
         return await self.provider.download_file(storage_path)
     
+    def iter_file(self, storage_path: str) -> AsyncIterator[bytes]:
+        """Stream a file from storage in chunks."""
+        return self.provider.iter_file(storage_path)
+    
+    async def head_file(self, storage_path: str) -> Optional[Dict]:
+        """Return size and content type of a stored file, or None if it does not exist."""
+        return await self.provider.head_file(storage_path)
+    
+    async def copy_to_path(self, source_path: str, storage_path: str, filename: str,
+                           content_type: str) -> StoredFile:
+        """Copy a stored file to another path without downloading it."""
+        return await self.provider.copy_file(source_path, storage_path, filename, content_type)
+    
     async def delete_file(self, storage_path: str) -> bool:
         """Delete file from storage."""
         return await self.provider.delete_file(storage_path)
     
-    async def delete_product_images(self, product_id: str) -> Dict[str, bool]:
+    async def delete_files(self, storage_paths: List[str]) -> Dict[str, bool]:
+        """Delete many files from storage in batched requests."""
+        return await self.provider.delete_files(storage_paths)
+    
+    async def delete_product_images(self, product_id: str, db: Session) -> Dict[str, bool]:
         """
         Delete all images for a product.
         
+        The product's ProductImage rows are removed and their references to
+        content-addressed objects released; objects are located from each
+        row's storage_paths, so no bucket listing is needed. Shared objects
+        are only deleted once no other image references them, and deletions
+        that fail are retried from the storage deletion queue.
+        
         Args:
             product_id: Product ID
+            db: Database session
             
         Returns:
             Dictionary of storage_path -> success_status
         """
-        results = {}
+        from .content_store import get_content_store
         
-        try:
-            # List all files for the product
-            files = await self.provider.list_files(f"products/{product_id}")
-            
-            for file_info in files:
-                success = await self.provider.delete_file(file_info.storage_path)
-                results[file_info.storage_path] = success
-                
-        except StorageError as e:
-            logger.error(f"Failed to delete images for product {product_id}: {e}")
+        content_store = get_content_store()
+        product_images = db.query(ProductImage).filter(ProductImage.product_id == product_id).all()
         
-        return results
+        releasable = []
+        for image in product_images:
+            releasable.extend(content_store.release_references(db, (image.storage_paths or {}).values()))
+            db.delete(image)
+        db.commit()
+        
+        return await content_store.purge(releasable)
     
     async def generate_presigned_upload_url(self, filename: str, content_type: str,
                                           image_type: str = "original", expires_in: int = 3600) -> PresignedUploadData:
@@ -315,50 +499,72 @@ class CloudStorageService:
         folder = f"images/{image_type}"
         return await self.provider.generate_presigned_upload_url(filename, content_type, folder, expires_in)
     
+    async def generate_direct_upload_url(self, user_id: str, filename: str, content_type: str,
+                                         expires_in: int = 900) -> PresignedUploadData:
+        """
+        Generate a presigned URL for uploading an original straight to storage.
+        
+        Objects land under ``uploads/{user_id}/`` and are removed once the
+        image processing job for them has finished.
+        """
+        return await self.provider.generate_presigned_upload_url(filename, content_type, f"uploads/{user_id}", expires_in)
+    
     async def generate_presigned_download_url(self, storage_path: str, 
                                             expires_in: int = 3600) -> str:
         """Generate presigned URL for secure download."""
         return await self.provider.generate_presigned_download_url(storage_path, expires_in)
     
-    async def list_user_images(self, user_id: str, limit: int = 100) -> List[StoredFile]:
-        """List all images for a user."""
-        return await self.provider.list_files(f"users/{user_id}", limit)
+    async def list_user_images(self, db: Session, user_id: str, limit: int = 100) -> List[StoredFile]:
+        """
+        List a user's uploaded originals, newest first.
+        
+        Served from the images table (indexed on user_id, created_at) rather
+        than a bucket listing.
+        """
+        images = db.query(Image).filter(
+            Image.user_id == user_id
+        ).order_by(Image.created_at.desc()).limit(limit).all()
+        return [self._original_file(image) for image in images]
     
-    async def get_images_by_ids(self, user_id: str, image_ids: List[str]) -> List[StoredFile]:
-        """Get specific images by their IDs for a user."""
-        try:
-            all_images = await self.list_user_images(user_id, 1000)  # Get more images to search through
-            return [img for img in all_images if img.file_id in image_ids]
-        except Exception as e:
-            logger.error(f"Failed to get images by IDs for user {user_id}: {e}")
+    async def get_images_by_ids(self, db: Session, user_id: str, image_ids: List[str]) -> List[StoredFile]:
+        """Get a user's uploaded originals by image id, with a single indexed lookup."""
+        if not image_ids:
             return []
+        images = db.query(Image).filter(
+            Image.user_id == user_id,
+            Image.id.in_(image_ids)
+        ).all()
+        return [self._original_file(image) for image in images]
     
-    async def get_storage_stats(self) -> Dict[str, int]:
-        """Get storage usage statistics."""
-        try:
-            # Get all files (this is a simplified version - in production you'd want pagination)
-            all_files = await self.provider.list_files("", 1000)
-            
-            total_files = len(all_files)
-            total_size = sum(file.size for file in all_files)
-            
-            # Count by type
-            type_counts = {}
-            for file in all_files:
-                path_parts = file.storage_path.split('/')
-                if len(path_parts) >= 2:
-                    file_type = path_parts[1]  # images/original, products/xxx/compressed, etc.
-                    type_counts[file_type] = type_counts.get(file_type, 0) + 1
-            
-            return {
-                'total_files': total_files,
-                'total_size_bytes': total_size,
-                'type_breakdown': type_counts
-            }
-            
-        except StorageError as e:
-            logger.error(f"Failed to get storage stats: {e}")
-            return {'total_files': 0, 'total_size_bytes': 0, 'type_breakdown': {}}
+    def _original_file(self, image: Image) -> StoredFile:
+        """Describe the original of an Image row as a StoredFile."""
+        storage_paths = image.storage_paths or {}
+        return StoredFile(
+            file_id=image.id,
+            filename=image.original_filename,
+            url=image.original_url,
+            size=image.file_size,
+            content_type=mimetypes.guess_type(image.original_filename)[0] or f"image/{(image.format or 'jpeg').lower()}",
+            storage_path=storage_paths.get('original', ''),
+            created_at=image.created_at
+        )
+    
+    async def get_storage_stats(self, db: Session) -> Dict[str, int]:
+        """
+        Get storage usage statistics.
+        
+        Read from the usage counters the content store maintains as objects
+        are indexed and released, so no bucket scan is needed. Staged direct
+        uploads and files stored before content addressing are not counted.
+        """
+        from .content_store import get_content_store
+        
+        usage = get_content_store().usage(db)
+        return {
+            'total_files': sum(count for count, _ in usage.values()),
+            'total_size_bytes': sum(size for _, size in usage.values()),
+            'type_breakdown': {content_type: count for content_type, (count, _) in usage.items()}
+        }
 
 
 # Global service instance - initialized lazily
@@ -0,0 +1,377 @@
+"""
+Content-addressed storage index for the Acrylican.
+
+Stored image objects are keyed by a SHA-256 hash: of the uploaded bytes for
+originals, and of the source hash plus the variant specification for derived
+images (compressed copies, thumbnails, platform variants). Identical uploads
+therefore resolve to the same objects, which are shared between Image and
+ProductImage rows and reference counted in the ``stored_objects`` table.
+"""
+
+import hashlib
+import json
+import logging
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models import StoredObject, StorageUsage
+from .cloud_storage import StorageError, StoredFile, get_storage_service
+from .image_metrics import get_image_metrics
+from .storage_deletion import enqueue_deletions, get_storage_deletion_service, hold_deletions
+
+logger = logging.getLogger(__name__)
+
+# Bump when the rendering pipeline changes so old variants are not reused
+VARIANT_SPEC_VERSION = 1
+
+CAS_PREFIX = "cas"
+
+CONTENT_TYPE_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'image/avif': '.avif',
+}
+
+
+class ContentAddressedStore:
+    """Reference-counted, hash-keyed index over cloud storage objects."""
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        """Return the SHA-256 hex digest of raw bytes."""
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def variant_hash(source_hash: str, spec: Dict) -> str:
+        """
+        Return the content key for a variant derived from a source image.
+
+        Args:
+            source_hash: Hash of the original image bytes
+            spec: Rendering parameters (size, quality, format, ...)
+
+        Returns:
+            Hex digest identifying the rendered variant
+        """
+        payload = json.dumps({"v": VARIANT_SPEC_VERSION, "source": source_hash, "spec": spec}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def storage_path_for(content_hash: str, content_type: str) -> str:
+        """Build the storage key for a content hash, fanned out by prefix."""
+        extension = CONTENT_TYPE_EXTENSIONS.get(content_type, '')
+        return f"{CAS_PREFIX}/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{extension}"
+
+    def lookup(self, db: Session, content_hash: str) -> Optional[StoredObject]:
+        """Find an indexed object by content hash."""
+        return db.query(StoredObject).filter(StoredObject.content_hash == content_hash).first()
+
+    async def get_or_create(
+        self,
+        db: Session,
+        content_hash: str,
+        render: Callable[[], Union[bytes, BinaryIO]],
+        filename: str,
+        content_type: str
+    ) -> StoredFile:
+        """
+        Return the stored object for a hash, uploading it on first use.
+
+        ``render`` is only called on a cache miss, so callers can defer
+        expensive encoding until it is known to be needed. Each call takes one
+        reference on the object; the caller must commit the session.
+
+        Args:
+            db: Database session
+            content_hash: Content key (see hash_bytes / variant_hash)
+            render: Callable producing the object bytes or a file object
+            filename: Original filename recorded in object metadata
+            content_type: MIME type of the rendered bytes
+
+        Returns:
+            StoredFile describing the (possibly pre-existing) object
+        """
+        existing = self._acquire(db, content_hash)
+        if existing:
+            return self.to_stored_file(existing, filename)
+
+        storage_path = self.storage_path_for(content_hash, content_type)
+        # The path may still be queued for deletion from an earlier life
+        hold_deletions(db, [storage_path])
+        data = render()
+
+        # Uploading to a content-derived key is idempotent, so a concurrent
+        # writer racing us to the same hash is harmless.
+        with get_image_metrics().time('upload'):
+            stored_file = await get_storage_service().upload_to_path(data, storage_path, filename, content_type)
+
+        try:
+            with db.begin_nested():
+                db.add(StoredObject(
+                    content_hash=content_hash,
+                    storage_path=storage_path,
+                    url=stored_file.url,
+                    size=stored_file.size,
+                    content_type=content_type,
+                    ref_count=1
+                ))
+                db.flush()
+                self._record_usage(db, {content_type: (1, stored_file.size)})
+        except IntegrityError:
+            # Another request indexed the same hash first; take a reference on it
+            existing = self._acquire(db, content_hash)
+            if existing:
+                return self.to_stored_file(existing, filename)
+            raise
+
+        return stored_file
+
+    def lookup_many(self, db: Session, content_hashes: Iterable[str]) -> Dict[str, StoredObject]:
+        """Find indexed objects for several content hashes in one query."""
+        hashes = list(set(content_hashes))
+        if not hashes:
+            return {}
+        return {
+            obj.content_hash: obj
+            for obj in db.query(StoredObject).filter(StoredObject.content_hash.in_(hashes)).all()
+        }
+
+    def reserve(self, db: Session, objects: Iterable[Tuple[str, str]]) -> None:
+        """
+        Hold off queued deletions of objects about to be uploaded with upload() or adopt().
+
+        Call in the session that later indexes them with commit_references.
+
+        Args:
+            db: Database session
+            objects: (content_hash, content_type) pairs to be uploaded
+        """
+        hold_deletions(db, (self.storage_path_for(content_hash, content_type) for content_hash, content_type in objects))
+
+    async def upload(self, content_hash: str, data: Union[bytes, BinaryIO], filename: str,
+                     content_type: str) -> StoredFile:
+        """
+        Upload an object to its content-derived key without indexing it.
+
+        Used by batch processing, which reserves the objects first and indexes
+        uploads afterwards with commit_references in a single transaction.
+        """
+        storage_path = self.storage_path_for(content_hash, content_type)
+        with get_image_metrics().time('upload'):
+            return await get_storage_service().upload_to_path(data, storage_path, filename, content_type)
+
+    async def adopt(self, content_hash: str, source_path: str, filename: str, content_type: str) -> StoredFile:
+        """
+        Copy an object already in storage to its content-derived key without indexing it.
+
+        Used for originals uploaded directly by clients, so their bytes are
+        never re-uploaded.
+        """
+        storage_path = self.storage_path_for(content_hash, content_type)
+        with get_image_metrics().time('upload', 'copy'):
+            return await get_storage_service().copy_to_path(source_path, storage_path, filename, content_type)
+
+    def commit_references(self, db: Session, reference_counts: Dict[str, int],
+                          uploaded: Dict[str, StoredFile]) -> None:
+        """
+        Take references on objects for a batch of new rows.
+
+        Objects in ``uploaded`` are indexed if no concurrent request indexed
+        them first; all others must already be indexed. The caller must commit
+        the session.
+
+        Args:
+            db: Database session
+            reference_counts: Dictionary of content_hash -> number of new references
+            uploaded: Dictionary of content_hash -> StoredFile uploaded by the batch
+
+        Raises:
+            StorageError: If a referenced object is no longer indexed
+        """
+        by_count: Dict[int, List[str]] = {}
+
+        for content_hash, count in reference_counts.items():
+            stored_file = uploaded.get(content_hash)
+            if stored_file is not None:
+                try:
+                    with db.begin_nested():
+                        db.add(StoredObject(
+                            content_hash=content_hash,
+                            storage_path=stored_file.storage_path,
+                            url=stored_file.url,
+                            size=stored_file.size,
+                            content_type=stored_file.content_type,
+                            ref_count=count
+                        ))
+                        db.flush()
+                        self._record_usage(db, {stored_file.content_type: (1, stored_file.size)})
+                    continue
+                except IntegrityError:
+                    pass
+            by_count.setdefault(count, []).append(content_hash)
+
+        # One UPDATE per distinct reference count, normally just one
+        for count, hashes in by_count.items():
+            updated = db.query(StoredObject).filter(StoredObject.content_hash.in_(hashes)).update(
+                {
+                    StoredObject.ref_count: StoredObject.ref_count + count,
+                    StoredObject.last_referenced_at: func.now()
+                },
+                synchronize_session=False
+            )
+            if updated != len(hashes):
+                raise StorageError("Stored objects were deleted while being referenced")
+
+    def add_references(self, db: Session, storage_paths: Iterable[str]) -> None:
+        """Take one reference on each indexed object in storage_paths."""
+        paths = [path for path in storage_paths if path]
+        if not paths:
+            return
+
+        db.query(StoredObject).filter(StoredObject.storage_path.in_(paths)).update(
+            {
+                StoredObject.ref_count: StoredObject.ref_count + 1,
+                StoredObject.last_referenced_at: func.now()
+            },
+            synchronize_session=False
+        )
+
+    def release_references(self, db: Session, storage_paths: Iterable[str]) -> List[str]:
+        """
+        Drop one reference on each object and return paths safe to delete.
+
+        Objects whose count reaches zero are removed from the index. Paths that
+        are not indexed (files uploaded before content addressing) are owned by
+        a single row and are returned as-is. Storage deletion is left to the
+        caller, after the session has been committed (see purge).
+
+        Args:
+            db: Database session
+            storage_paths: Storage paths referenced by the row being deleted
+
+        Returns:
+            Storage paths no longer referenced by any row, queued for deletion
+        """
+        paths = list(dict.fromkeys(path for path in storage_paths if path))
+        if not paths:
+            return []
+
+        indexed = {
+            obj.storage_path: obj
+            for obj in db.query(StoredObject).filter(StoredObject.storage_path.in_(paths)).with_for_update().all()
+        }
+
+        releasable = []
+        freed: Dict[str, Tuple[int, int]] = {}
+        for path in paths:
+            obj = indexed.get(path)
+            if obj is None:
+                releasable.append(path)
+                continue
+
+            obj.ref_count = max((obj.ref_count or 0) - 1, 0)
+            if obj.ref_count == 0:
+                db.delete(obj)
+                releasable.append(path)
+                count, size = freed.get(obj.content_type, (0, 0))
+                freed[obj.content_type] = (count - 1, size - obj.size)
+
+        self._record_usage(db, freed)
+        enqueue_deletions(db, releasable)
+        return releasable
+
+    def usage(self, db: Session) -> Dict[str, Tuple[int, int]]:
+        """Return (object count, total bytes) of indexed objects per content type."""
+        return {
+            row.content_type: (row.object_count, row.total_bytes)
+            for row in db.query(StorageUsage).all()
+        }
+
+    async def purge(self, storage_paths: Iterable[str]) -> Dict[str, bool]:
+        """
+        Delete released objects from cloud storage.
+
+        Objects are deleted in batches; any that fail stay in the storage
+        deletion queue (where release_references put them) and are retried.
+
+        Args:
+            storage_paths: Paths returned by release_references
+
+        Returns:
+            Dictionary of storage_path -> success_status
+        """
+        return await get_storage_deletion_service().delete(storage_paths)
+
+    def _record_usage(self, db: Session, changes: Dict[str, Tuple[int, int]]) -> None:
+        """
+        Apply (object count, bytes) deltas to the per-content-type usage counters.
+
+        Counters are updated in the same transaction as the index rows they
+        describe, so storage statistics never need a bucket scan.
+        """
+        for content_type, (count, size) in changes.items():
+            if not count and not size:
+                continue
+
+            updated = db.query(StorageUsage).filter(StorageUsage.content_type == content_type).update(
+                {
+                    StorageUsage.object_count: StorageUsage.object_count + count,
+                    StorageUsage.total_bytes: StorageUsage.total_bytes + size,
+                    StorageUsage.updated_at: func.now()
+                },
+                synchronize_session=False
+            )
+            if updated:
+                continue
+
+            try:
+                with db.begin_nested():
+                    db.add(StorageUsage(content_type=content_type, object_count=count, total_bytes=size))
+            except IntegrityError:
+                # Another transaction created the counter first
+                self._record_usage(db, {content_type: (count, size)})
+
+    def _acquire(self, db: Session, content_hash: str) -> Optional[StoredObject]:
+        """Atomically increment the reference count of an indexed object."""
+        updated = db.query(StoredObject).filter(StoredObject.content_hash == content_hash).update(
+            {
+                StoredObject.ref_count: StoredObject.ref_count + 1,
+                StoredObject.last_referenced_at: func.now()
+            },
+            synchronize_session=False
+        )
+        if not updated:
+            return None
+        return self.lookup(db, content_hash)
+
+    @staticmethod
+    def to_stored_file(obj: StoredObject, filename: str) -> StoredFile:
+        """Describe an indexed object as a StoredFile."""
+        return StoredFile(
+            file_id=obj.content_hash,
+            filename=filename,
+            url=obj.url,
+            size=obj.size,
+            content_type=obj.content_type,
+            storage_path=obj.storage_path,
+            created_at=obj.created_at
+        )
+
+
+# Global content store instance
+_content_store: Optional[ContentAddressedStore] = None
+
+
+def get_content_store() -> ContentAddressedStore:
+    """Get the global content-addressed store instance."""
+    global _content_store
+    if _content_store is None:
+        _content_store = ContentAddressedStore()
+    return _content_store
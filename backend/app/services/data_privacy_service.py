@@ -10,20 +10,24 @@ This service provides:
 
 import json
 import logging
+import os
 import zipfile
+from contextlib import suppress
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, BinaryIO
 from io import BytesIO
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 from ..models import (
-    User, Product, ProductImage, PlatformConnection, Post, PostQueue,
+    User, Product, ProductImage, Image, PlatformConnection, Post, PostQueue,
     PlatformPreferences, ContentTemplate, SaleEvent, EngagementMetrics,
-    MetricsAggregation
+    MetricsAggregation, ImageProcessingJob, SalesDailyRollup, SalesSyncState,
+    EngagementPollSchedule, EngagementSample, SalesImportJob
 )
 from ..security import token_encryption, security_validator
 from ..secure_storage import secure_token_storage
-# from .cloud_storage import CloudStorageService  # Import when needed
+from .content_store import get_content_store
+from .storage_deletion import enqueue_deletions
 
 logger = logging.getLogger(__name__)
 
@@ -436,14 +440,21 @@ For questions about this export, please contact support.
             
             # Delete user data in correct order (respecting foreign key constraints)
             
-            # 1. Delete engagement metrics
+            # 1. Delete engagement metrics, their history and poll schedule
             db.query(EngagementMetrics).filter(EngagementMetrics.user_id == user_id).delete()
+            db.query(EngagementPollSchedule).filter(EngagementPollSchedule.user_id == user_id).delete()
+            db.query(EngagementSample).filter(EngagementSample.user_id == user_id).delete(synchronize_session=False)
             
             # 2. Delete metrics aggregations
             db.query(MetricsAggregation).filter(MetricsAggregation.user_id == user_id).delete()
             
-            # 3. Delete sale events
+            # 3. Delete sale events, their rollup and CSV imports
             db.query(SaleEvent).filter(SaleEvent.user_id == user_id).delete()
+            db.query(SalesDailyRollup).filter(SalesDailyRollup.user_id == user_id).delete()
+            import_files = [
+                path for (path,) in db.query(SalesImportJob.file_path).filter(SalesImportJob.user_id == user_id)
+            ]
+            db.query(SalesImportJob).filter(SalesImportJob.user_id == user_id).delete()
             
             # 4. Delete post queue items
             post_ids = [p.id for p in db.query(Post).filter(Post.user_id == user_id).all()]
@@ -460,27 +471,37 @@ For questions about this export, please contact support.
             db.query(PlatformPreferences).filter(PlatformPreferences.user_id == user_id).delete()
             
             # 8. Delete platform connections (this will clear encrypted tokens)
+            db.query(SalesSyncState).filter(SalesSyncState.user_id == user_id).delete()
             db.query(PlatformConnection).filter(PlatformConnection.user_id == user_id).delete()
             
-            # 9. Delete product images and their cloud storage files
+            # 9. Release stored files held by the user's images. Objects shared
+            # with other users' images stay in storage until their last reference goes.
+            content_store = get_content_store()
+            releasable = []
+            
             product_images = db.query(ProductImage).join(Product).filter(Product.user_id == user_id).all()
             for image in product_images:
-                # Delete files from cloud storage
-                try:
-                    # In a real implementation, you would import and use the cloud storage service
-                    # from .cloud_storage import CloudStorageService
-                    # cloud_service = CloudStorageService()
-                    # storage_paths = image.storage_paths or {}
-                    # for path_type, path in storage_paths.items():
-                    #     await cloud_service.delete_file(path)
-                    logger.info(f"Would delete cloud storage files for image {image.id}")
-                except Exception as e:
-                    logger.warning(f"Failed to delete cloud storage file: {e}")
-            
-            # 10. Delete product images
+                releasable.extend(content_store.release_references(db, (image.storage_paths or {}).values()))
+            
+            user_images = db.query(Image).filter(Image.user_id == user_id).all()
+            for image in user_images:
+                releasable.extend(content_store.release_references(db, (image.storage_paths or {}).values()))
+            
+            # 10. Delete product images and uploaded images
             db.query(ProductImage).filter(ProductImage.product_id.in_(
                 db.query(Product.id).filter(Product.user_id == user_id)
-            )).delete()
+            )).delete(synchronize_session=False)
+            db.query(Image).filter(Image.user_id == user_id).delete(synchronize_session=False)
+            
+            # Drop direct upload jobs, along with uploads still waiting to be processed
+            pending_jobs = db.query(ImageProcessingJob).filter(
+                ImageProcessingJob.user_id == user_id,
+                ImageProcessingJob.status.in_(["pending", "processing"])
+            ).all()
+            staged_paths = [job.upload_path for job in pending_jobs]
+            enqueue_deletions(db, staged_paths)
+            releasable.extend(staged_paths)
+            db.query(ImageProcessingJob).filter(ImageProcessingJob.user_id == user_id).delete(synchronize_session=False)
             
             # 11. Delete products
             db.query(Product).filter(Product.user_id == user_id).delete()
@@ -490,6 +511,17 @@ For questions about this export, please contact support.
             
             db.commit()
             
+            # Staged CSV uploads of imports (completed imports have already removed theirs)
+            for path in import_files:
+                with suppress(OSError):
+                    os.remove(path)
+            
+            # Delete unreferenced files from cloud storage only once the rows are gone
+            try:
+                await content_store.purge(releasable)
+            except Exception as e:
+                logger.warning(f"Failed to delete cloud storage files for user {user_id}: {e}")
+            
             logger.info(f"Successfully deleted all data for user {user_id}")
             return True
             
@@ -533,6 +565,7 @@ For questions about this export, please contact support.
                 sale.platform_data = {}
             
             # Remove platform connections
+            db.query(SalesSyncState).filter(SalesSyncState.user_id == user_id).delete()
             db.query(PlatformConnection).filter(PlatformConnection.user_id == user_id).delete()
             
             # Keep products and posts but remove identifying content
@@ -0,0 +1,117 @@
+"""
+Per-user data versions.
+
+Dashboards and analytics are derived from a user's sales, engagement
+metrics and posts. Each user has a version counter that is bumped when a
+transaction changing any of those commits; caches (columnar analytics
+snapshots, cached API responses) record the version they were computed at
+and are stale as soon as it moves on.
+
+ORM writes to SaleEvent, EngagementMetrics and Post rows are picked up at
+flush. Code that changes derived data with bulk statements (rollup
+rebuilds and recomputes) calls mark_changed() in its transaction.
+
+Counters are shared through Redis when it is configured (see shared_cache)
+and kept in process memory otherwise. In-process counters only see the
+writes of their own process, so without Redis versions are reported as
+unknown (and caches are bypassed) unless settings.single_worker says one
+process serves every request.
+"""
+
+import logging
+from itertools import chain
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import EngagementMetrics, Post, SaleEvent
+from .shared_cache import KEY_PREFIX, SHARED_CACHE_ERRORS, get_redis
+
+logger = logging.getLogger(__name__)
+
+TRACKED_MODELS = (SaleEvent, EngagementMetrics, Post)
+
+_CHANGED_USERS_KEY = 'data_versions_changed_users'
+
+
+class DataVersions:
+    """Version counters per user, in Redis when available."""
+
+    def __init__(self):
+        self._local: Dict[str, int] = {}
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return f"{KEY_PREFIX}data_version:{user_id}"
+
+    def get(self, user_id: str) -> Optional[int]:
+        """
+        Current version of the user's data.
+
+        Returns:
+            The version, or None when it cannot be known: without Redis (or
+            while it is unavailable) other workers' writes are not counted,
+            unless settings.single_worker is set
+        """
+        client = get_redis()
+        if client is not None:
+            try:
+                value = client.get(self._key(user_id))
+                return int(value) if value is not None else 0
+            except SHARED_CACHE_ERRORS as e:
+                logger.warning(f"Shared data version unavailable: {e}")
+                return None
+        if not settings.single_worker:
+            return None
+        return self._local.get(user_id, 0)
+
+    def bump(self, user_ids: Iterable[str]) -> None:
+        """Move the users' data on to a new version."""
+        user_ids = list(user_ids)
+        for user_id in user_ids:
+            self._local[user_id] = self._local.get(user_id, 0) + 1
+
+        client = get_redis()
+        if client is not None:
+            try:
+                pipeline = client.pipeline(transaction=False)
+                for user_id in user_ids:
+                    pipeline.incr(self._key(user_id))
+                pipeline.execute()
+            except SHARED_CACHE_ERRORS as e:
+                logger.warning(f"Failed to bump shared data versions: {e}")
+
+
+def mark_changed(db: Session, user_id: str) -> None:
+    """Bump the user's data version once db's current transaction commits."""
+    db.info.setdefault(_CHANGED_USERS_KEY, set()).add(user_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flushed_changes(session: Session, flush_context) -> None:
+    # new/dirty/deleted still describe what this flush wrote
+    modified = (instance for instance in session.dirty if session.is_modified(instance))
+    for instance in chain(session.new, modified, session.deleted):
+        if isinstance(instance, TRACKED_MODELS) and instance.user_id:
+            mark_changed(session, instance.user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_committed_changes(session: Session) -> None:
+    user_ids = session.info.pop(_CHANGED_USERS_KEY, None)
+    if user_ids:
+        get_data_versions().bump(user_ids)
+
+
+# Global instance
+_data_versions: Optional[DataVersions] = None
+
+
+def get_data_versions() -> DataVersions:
+    """Get the global data versions."""
+    global _data_versions
+    if _data_versions is None:
+        _data_versions = DataVersions()
+    return _data_versions
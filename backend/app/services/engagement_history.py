@@ -0,0 +1,388 @@
+"""
+Engagement history as a downsampled time series.
+
+EngagementMetrics holds each post's latest counters. Every time they change
+an EngagementSample row is appended with the change since the previous
+sample, so the history is append-only and a period's engagement is a plain
+sum of its samples.
+
+Samples are kept at three resolutions:
+
+- raw: one row per collection, kept for ``engagement_history_raw_days``
+- hourly: raw samples summed per post, platform and hour, kept for
+  ``engagement_history_hourly_days``
+- daily: hourly samples summed per day, kept indefinitely
+
+EngagementHistoryService rolls completed hours and days up into the next
+resolution in the background and prunes expired rows. A sample is flagged
+rolled_up in the same transaction that adds it to the coarser row, so
+reading a resolution plus the finer samples not yet rolled up is exact at
+any time. On PostgreSQL the table is partitioned by month of sampled_at;
+the service creates partitions ahead of time.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, exists, func, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal, engine
+from ..models import EngagementMetrics, EngagementSample
+
+logger = logging.getLogger(__name__)
+
+RAW = 0
+HOURLY = 1
+DAILY = 2
+
+COUNTERS = ('likes', 'shares', 'comments', 'views', 'reach')
+
+# Ranges up to this long are charted per hour (while hourly samples are kept)
+HOURLY_TREND_MAX_RANGE = timedelta(days=2)
+
+# Monthly partitions created ahead of the current month
+PARTITIONS_AHEAD = 2
+
+
+def period_start(resolution: int, moment: datetime) -> datetime:
+    """Start of the hour or day containing moment."""
+    if resolution == HOURLY:
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def period_length(resolution: int) -> timedelta:
+    return timedelta(hours=1) if resolution == HOURLY else timedelta(days=1)
+
+
+def counters_of(metrics: Optional[EngagementMetrics]) -> Tuple[int, ...]:
+    """A metrics row's counters, zeros for no row."""
+    if metrics is None:
+        return (0,) * len(COUNTERS)
+    return tuple(getattr(metrics, counter) or 0 for counter in COUNTERS)
+
+
+def record_sample(db: Session, metrics: EngagementMetrics, before: Tuple[int, ...],
+                  sampled_at: Optional[datetime] = None) -> None:
+    """
+    Append the change in a metrics row's counters to the history.
+
+    Call this in the transaction that writes the row, with its counters
+    from before the write (see counters_of). Nothing is recorded when the
+    counters did not change.
+    """
+    record_samples(db, [(metrics, before)], sampled_at)
+
+
+def record_samples(db: Session, changes: Iterable[Tuple[EngagementMetrics, Tuple[int, ...]]],
+                   sampled_at: Optional[datetime] = None) -> None:
+    """
+    Append the changes of several metrics rows, sampled at one time, to the history.
+
+    History is kept per post and platform, so rows of the same post and
+    platform (several listings of it) are merged into one sample.
+    """
+    sampled_at = sampled_at or datetime.utcnow()
+    merged: Dict[Tuple[str, str], Tuple[str, List[int]]] = {}
+    for metrics, before in changes:
+        increments = [after - previous for after, previous in zip(counters_of(metrics), before)]
+        if not any(increments):
+            continue
+        _, totals = merged.setdefault((metrics.post_id, metrics.platform), (metrics.user_id, [0] * len(COUNTERS)))
+        for position, increment in enumerate(increments):
+            totals[position] += increment
+
+    for (post_id, platform), (user_id, increments) in merged.items():
+        if not any(increments):
+            continue
+        db.add(EngagementSample(
+            post_id=post_id,
+            platform=platform,
+            resolution=RAW,
+            sampled_at=sampled_at,
+            user_id=user_id,
+            rolled_up=False,
+            **dict(zip(COUNTERS, increments))
+        ))
+
+
+def _empty_totals() -> Dict[str, int]:
+    return {counter: 0 for counter in COUNTERS}
+
+
+def trend_resolution(start_date: datetime, end_date: datetime) -> int:
+    """Hourly for short recent ranges, daily otherwise."""
+    hourly_since = datetime.utcnow() - timedelta(days=settings.engagement_history_hourly_days)
+    if end_date - start_date <= HOURLY_TREND_MAX_RANGE and start_date >= hourly_since:
+        return HOURLY
+    return DAILY
+
+
+def engagement_history(
+    db: Session,
+    user_id: str,
+    start_date: datetime,
+    end_date: datetime,
+    resolution: int,
+    platforms: Optional[List[str]] = None
+) -> List[Tuple[datetime, Dict[str, int]]]:
+    """
+    Engagement gained per hour or day across a user's posts.
+
+    Reads the samples of the requested resolution, plus finer samples not
+    yet rolled up into it.
+
+    Args:
+        db: Database session
+        user_id: User identifier
+        start_date: Start of the range
+        end_date: End of the range (inclusive)
+        resolution: HOURLY or DAILY
+        platforms: Only include these platforms (all when None)
+
+    Returns:
+        List of (period start, counter totals) for periods with engagement, oldest first
+    """
+    first = period_start(resolution, start_date)
+    end_exclusive = period_start(resolution, end_date) + period_length(resolution)
+
+    periods: Dict[datetime, Dict[str, int]] = {}
+    for source in range(resolution, RAW - 1, -1):
+        query = db.query(
+            EngagementSample.sampled_at,
+            *(func.sum(getattr(EngagementSample, counter)).label(counter) for counter in COUNTERS)
+        ).filter(
+            EngagementSample.user_id == user_id,
+            EngagementSample.resolution == source,
+            EngagementSample.sampled_at >= first,
+            EngagementSample.sampled_at < end_exclusive
+        )
+        if source != resolution:
+            query = query.filter(EngagementSample.rolled_up.is_(False))
+        if platforms:
+            query = query.filter(EngagementSample.platform.in_(platforms))
+
+        for row in query.group_by(EngagementSample.sampled_at):
+            totals = periods.setdefault(period_start(resolution, row.sampled_at), _empty_totals())
+            for counter in COUNTERS:
+                totals[counter] += int(getattr(row, counter) or 0)
+
+    return sorted(periods.items())
+
+
+class EngagementHistoryService:
+    """
+    Downsamples and prunes engagement history in the background.
+
+    Follows the same start/stop lifecycle as the other background
+    processors.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.running = False
+        self.interval = settings.engagement_history_interval
+        self.batch_size = settings.engagement_history_batch_size
+
+    def roll_up(self, source: int) -> int:
+        """
+        Add a batch of completed-period samples into the next coarser resolution.
+
+        Args:
+            source: RAW (into hourly) or HOURLY (into daily)
+
+        Returns:
+            Number of samples rolled up
+        """
+        target = source + 1
+        db = SessionLocal()
+        try:
+            cutoff = period_start(target, datetime.utcnow())
+            samples = db.query(EngagementSample).filter(
+                EngagementSample.resolution == source,
+                EngagementSample.rolled_up.is_(False),
+                EngagementSample.sampled_at < cutoff
+            ).order_by(EngagementSample.sampled_at).limit(self.batch_size).with_for_update(skip_locked=True).all()
+            if not samples:
+                return 0
+
+            sums: Dict[Tuple[str, str, datetime], Tuple[str, List[int]]] = {}
+            for sample in samples:
+                key = (sample.post_id, sample.platform, period_start(target, sample.sampled_at))
+                _, totals = sums.setdefault(key, (sample.user_id, [0] * len(COUNTERS)))
+                for index, counter in enumerate(COUNTERS):
+                    totals[index] += getattr(sample, counter) or 0
+                sample.rolled_up = True
+
+            for (post_id, platform, sampled_at), (user_id, totals) in sums.items():
+                self._add_to_period(db, post_id, platform, target, sampled_at, user_id, totals)
+            db.commit()
+            return len(samples)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _add_to_period(self, db: Session, post_id: str, platform: str, resolution: int,
+                       sampled_at: datetime, user_id: str, totals: List[int]) -> None:
+        """
+        Add counter totals to a period's sample, creating it if needed.
+
+        Totals for a period that was rolled up meanwhile (a late commit) are
+        added to the coarser period it was rolled up into instead.
+        """
+        key = (
+            EngagementSample.post_id == post_id,
+            EngagementSample.platform == platform,
+            EngagementSample.resolution == resolution,
+            EngagementSample.sampled_at == sampled_at
+        )
+        updated = db.query(EngagementSample).filter(*key, EngagementSample.rolled_up.is_(False)).update(
+            {
+                getattr(EngagementSample, counter): getattr(EngagementSample, counter) + total
+                for counter, total in zip(COUNTERS, totals)
+            },
+            synchronize_session=False
+        )
+        if updated:
+            return
+
+        if resolution < DAILY and db.query(exists().where(and_(*key))).scalar():
+            coarser = resolution + 1
+            self._add_to_period(
+                db, post_id, platform, coarser, period_start(coarser, sampled_at), user_id, totals
+            )
+            return
+
+        try:
+            with db.begin_nested():
+                db.add(EngagementSample(
+                    post_id=post_id,
+                    platform=platform,
+                    resolution=resolution,
+                    sampled_at=sampled_at,
+                    user_id=user_id,
+                    rolled_up=False,
+                    **dict(zip(COUNTERS, totals))
+                ))
+        except IntegrityError:
+            # Another transaction created the period first
+            self._add_to_period(db, post_id, platform, resolution, sampled_at, user_id, totals)
+
+    def prune(self) -> int:
+        """
+        Delete raw and hourly samples past their retention.
+
+        Only samples already rolled up are deleted.
+
+        Returns:
+            Number of samples deleted
+        """
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            deleted = 0
+            for resolution, days in ((RAW, settings.engagement_history_raw_days),
+                                     (HOURLY, settings.engagement_history_hourly_days)):
+                deleted += db.query(EngagementSample).filter(
+                    EngagementSample.resolution == resolution,
+                    EngagementSample.rolled_up.is_(True),
+                    EngagementSample.sampled_at < now - timedelta(days=days)
+                ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    def ensure_partitions(self) -> None:
+        """
+        Create monthly partitions for this month and the next few (PostgreSQL only).
+
+        Samples that landed in the default partition because their month had
+        no partition yet are moved into the new one: PostgreSQL refuses to
+        create a partition while the default one holds rows in its range.
+        """
+        if engine.dialect.name != 'postgresql':
+            return
+
+        month = datetime.utcnow().date().replace(day=1)
+        for _ in range(PARTITIONS_AHEAD + 1):
+            following = (month + timedelta(days=32)).replace(day=1)
+            partition = f"engagement_samples_{month:%Y_%m}"
+            in_range = f"sampled_at >= '{month}' AND sampled_at < '{following}'"
+            with engine.begin() as connection:
+                if connection.execute(text(f"SELECT to_regclass('{partition}')")).scalar() is None:
+                    # Hold off inserts into the default partition while its rows move
+                    connection.execute(text("LOCK TABLE engagement_samples_default IN SHARE ROW EXCLUSIVE MODE"))
+                    connection.execute(text(
+                        f"CREATE TABLE {partition} (LIKE engagement_samples INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+                    ))
+                    moved = connection.execute(text(
+                        f"WITH moved AS (DELETE FROM engagement_samples_default WHERE {in_range} RETURNING *) "
+                        f"INSERT INTO {partition} SELECT * FROM moved"
+                    )).rowcount
+                    connection.execute(text(
+                        f"ALTER TABLE engagement_samples ATTACH PARTITION {partition} "
+                        f"FOR VALUES FROM ('{month}') TO ('{following}')"
+                    ))
+                    if moved:
+                        self.logger.info(f"Moved {moved} engagement samples into new partition {partition}")
+            month = following
+
+    async def start(self):
+        """Start maintaining engagement history."""
+        if self.running:
+            self.logger.warning("Engagement history service is already running")
+            return
+
+        self.running = True
+        self.logger.info("Starting engagement history service")
+
+        try:
+            while self.running:
+                # Partitions first and on their own, so a failing roll-up cannot
+                # leave new samples piling up in the default partition
+                try:
+                    await asyncio.to_thread(self.ensure_partitions)
+                except Exception as e:
+                    self.logger.error(f"Error creating engagement history partitions: {e}")
+
+                try:
+                    for source in (RAW, HOURLY):
+                        # Keep draining while full batches come back
+                        while self.running and await asyncio.to_thread(self.roll_up, source) >= self.batch_size:
+                            pass
+                    await asyncio.to_thread(self.prune)
+                except Exception as e:
+                    self.logger.error(f"Error maintaining engagement history: {e}")
+
+                await asyncio.sleep(self.interval)
+
+        except asyncio.CancelledError:
+            self.logger.info("Engagement history service cancelled")
+        finally:
+            self.running = False
+            self.logger.info("Engagement history service stopped")
+
+    async def stop(self):
+        """Stop the maintenance loop."""
+        self.logger.info("Stopping engagement history service")
+        self.running = False
+
+
+# Global service instance
+_engagement_history_service: Optional[EngagementHistoryService] = None
+
+
+def get_engagement_history_service() -> EngagementHistoryService:
+    """Get the global engagement history service instance."""
+    global _engagement_history_service
+    if _engagement_history_service is None:
+        _engagement_history_service = EngagementHistoryService()
+    return _engagement_history_service
@@ -9,11 +9,12 @@ analytics for posts across all connected platforms.
 import asyncio
 from datetime import datetime, timedelta
 from decimal import Decimal
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, NamedTuple, Optional, Any, Tuple
 import logging
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, desc
+from sqlalchemy import and_, or_, desc
 
+from ..config import settings
 from ..database import get_db
 from ..models import EngagementMetrics, MetricsAggregation, Post, User, PlatformConnection
 from ..schemas import (
@@ -23,11 +24,93 @@ from ..schemas import (
     MetricsCollectionResult,
     MetricsAggregationResponse
 )
+from .engagement_rollups import (
+    apply_metrics_change, apply_metrics_changes, average_rate, contribution_of, get_engagement_rollup_service,
+    platform_totals
+)
+from .engagement_history import HOURLY, counters_of, engagement_history, record_sample, record_samples, trend_resolution
+from .platform_config import get_platform_config
 from .platform_service import get_platform_service
-from .platform_integration import Platform, PlatformMetrics
+from .platform_integration import Platform, PlatformMetrics, PostStatus
 
 logger = logging.getLogger(__name__)
 
+# Post statuses with successfully published platform results
+COLLECTABLE_POST_STATUSES = ("published", "partial")
+
+# (post_id, platform, platform_post_id) identifying a metrics row for one user
+MetricsKey = Tuple[str, str, str]
+
+
+class MetricsTarget(NamedTuple):
+    """A published platform result to collect metrics for."""
+    post_id: str
+    product_id: Optional[str]
+    platform: Platform
+    platform_post_id: str
+
+    @property
+    def key(self) -> MetricsKey:
+        return (self.post_id, self.platform.value, self.platform_post_id)
+
+
+def published_targets(
+    post_id: str,
+    product_id: Optional[str],
+    results: Optional[List[Any]],
+    platforms: Optional[List[Platform]] = None
+) -> Tuple[List[MetricsTarget], int]:
+    """
+    The successful platform results of a post, as metrics targets.
+    
+    Returns:
+        Tuple of (targets, number of results skipped)
+    """
+    targets = []
+    skipped_count = 0
+    for result in results or []:
+        if not isinstance(result, dict):
+            continue
+        
+        platform_name = result.get("platform")
+        platform_post_id = result.get("post_id")
+        status = str(result.get("status") or "").lower()
+        
+        if not platform_name or not platform_post_id or status != PostStatus.SUCCESS.value:
+            skipped_count += 1
+            continue
+        
+        try:
+            platform = Platform(platform_name)
+        except ValueError:
+            skipped_count += 1
+            continue
+        
+        # Skip if platform filter is specified and doesn't match
+        if platforms and platform not in platforms:
+            skipped_count += 1
+            continue
+        
+        targets.append(MetricsTarget(post_id, product_id, platform, platform_post_id))
+    return targets, skipped_count
+
+
+class RequestPacer:
+    """Spaces out request starts to stay within a per-minute rate limit."""
+
+    def __init__(self, per_minute: Optional[int]):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next_start = 0.0
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        start = max(now, self._next_start)
+        self._next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
 
 class EngagementMetricsService:
     """
@@ -92,25 +175,7 @@ class EngagementMetricsService:
                 self.logger.warning(f"No metrics available for post {platform_post_id} on {platform.value}")
                 return None
             
-            # Calculate engagement rate
-            engagement_rate = self._calculate_engagement_rate(platform_metrics)
-            
-            # Create or update metrics record
-            metrics_data = EngagementMetricsCreate(
-                post_id=post_id,
-                platform=platform.value,
-                platform_post_id=platform_post_id,
-                likes=platform_metrics.likes or 0,
-                shares=platform_metrics.shares or 0,
-                comments=platform_metrics.comments or 0,
-                views=platform_metrics.views or 0,
-                reach=platform_metrics.reach or 0,
-                engagement_rate=engagement_rate,
-                platform_specific_metrics=self._extract_platform_specific_metrics(platform_metrics),
-                collection_method="api",
-                data_quality="complete",
-                metrics_date=datetime.utcnow()
-            )
+            metrics_data = self._metrics_create(post_id, platform, platform_post_id, platform_metrics)
             
             # Save to database
             db_metrics = await self._save_metrics(db, user_id, metrics_data, force_refresh)
@@ -137,6 +202,12 @@ class EngagementMetricsService:
         """
         Collect engagement metrics for all posts of a user.
         
+        Existing metrics are loaded with one query. Metrics that are stale
+        (or all of them, with force_refresh) are fetched concurrently, up to
+        ``settings.metrics_collection_concurrency`` requests per platform
+        and within each platform's rate limit, then saved together with
+        their rollup changes in a single transaction.
+        
         Args:
             user_id: User identifier
             platforms: Specific platforms to collect from (None for all)
@@ -149,71 +220,28 @@ class EngagementMetricsService:
         try:
             db = next(get_db())
             
-            # Get posts to collect metrics for
-            query = db.query(Post).filter(Post.user_id == user_id)
+            targets, skipped_count = self._collection_targets(db, user_id, platforms, post_ids)
+            existing = self._existing_metrics(db, user_id, {target.post_id for target in targets})
             
-            if post_ids:
-                query = query.filter(Post.id.in_(post_ids))
-            
-            # Only get published posts with results
-            query = query.filter(
-                and_(
-                    Post.status == "published",
-                    Post.results.isnot(None)
-                )
-            )
-            
-            posts = query.all()
-            
-            collected_count = 0
-            failed_count = 0
-            skipped_count = 0
-            errors = []
+            # Metrics collected within the last hour are reused
+            fresh_after = datetime.utcnow() - timedelta(hours=1)
             collected_metrics = []
+            stale_targets = []
+            for target in targets:
+                row = existing.get(target.key)
+                if not force_refresh and row is not None and row.collected_at and row.collected_at > fresh_after:
+                    collected_metrics.append(row.id)
+                else:
+                    stale_targets.append(target)
             
-            for post in posts:
-                if not post.results:
-                    continue
-                
-                # Process each platform result
-                for result in post.results:
-                    if not isinstance(result, dict):
-                        continue
-                    
-                    platform_name = result.get("platform")
-                    platform_post_id = result.get("post_id")
-                    status = result.get("status")
-                    
-                    if not platform_name or not platform_post_id or status != "SUCCESS":
-                        skipped_count += 1
-                        continue
-                    
-                    # Skip if platform filter is specified and doesn't match
-                    if platforms:
-                        platform_enum = Platform(platform_name)
-                        if platform_enum not in platforms:
-                            skipped_count += 1
-                            continue
-                    
-                    try:
-                        platform_enum = Platform(platform_name)
-                        metrics = await self.collect_metrics_for_post(
-                            user_id, post.id, platform_enum, platform_post_id, force_refresh
-                        )
-                        
-                        if metrics:
-                            collected_count += 1
-                            collected_metrics.append(metrics.id)
-                        else:
-                            failed_count += 1
-                            
-                    except Exception as e:
-                        failed_count += 1
-                        errors.append(f"Failed to collect metrics for post {post.id} on {platform_name}: {str(e)}")
-                        self.logger.error(f"Metrics collection failed for post {post.id}: {e}")
+            saved, errors = await self._refresh_targets(db, user_id, stale_targets, existing)
+            collected_metrics.extend(saved.values())
+            
+            collected_count = len(collected_metrics)
+            failed_count = len(stale_targets) - len(saved)
             
             # Update aggregations after collection
-            if collected_count > 0:
+            if saved:
                 await self._update_aggregations(user_id, db)
             
             return MetricsCollectionResult(
@@ -239,6 +267,191 @@ class EngagementMetricsService:
         finally:
             db.close()
     
+    def _collection_targets(
+        self,
+        db: Session,
+        user_id: str,
+        platforms: Optional[List[Platform]],
+        post_ids: Optional[List[str]]
+    ) -> Tuple[List[MetricsTarget], int]:
+        """
+        List the successful platform results of a user's published posts.
+        
+        Returns:
+            Tuple of (targets, number of results skipped)
+        """
+        query = db.query(Post.id, Post.product_id, Post.results).filter(
+            Post.user_id == user_id,
+            Post.status.in_(COLLECTABLE_POST_STATUSES),
+            Post.results.isnot(None)
+        )
+        if post_ids:
+            query = query.filter(Post.id.in_(post_ids))
+        
+        targets: Dict[MetricsKey, MetricsTarget] = {}
+        skipped_count = 0
+        for post_id, product_id, results in query:
+            post_targets, skipped = published_targets(post_id, product_id, results, platforms)
+            skipped_count += skipped
+            for target in post_targets:
+                targets.setdefault(target.key, target)
+        
+        return list(targets.values()), skipped_count
+    
+    async def refresh_metrics(
+        self,
+        db: Session,
+        user_id: str,
+        targets: List[MetricsTarget]
+    ) -> Tuple[Dict[MetricsKey, str], List[str]]:
+        """
+        Fetch and save current metrics for the given targets of one user.
+        
+        Args:
+            db: Database session
+            user_id: User identifier
+            targets: Published platform results to refresh
+            
+        Returns:
+            Tuple of (metrics row id per refreshed target, error messages)
+        """
+        existing = self._existing_metrics(db, user_id, {target.post_id for target in targets})
+        return await self._refresh_targets(db, user_id, targets, existing)
+    
+    async def _refresh_targets(
+        self,
+        db: Session,
+        user_id: str,
+        targets: List[MetricsTarget],
+        existing: Dict[MetricsKey, EngagementMetrics]
+    ) -> Tuple[Dict[MetricsKey, str], List[str]]:
+        """Fetch metrics for targets and save them in one transaction."""
+        fetched, errors = await self._fetch_metrics(user_id, targets)
+        saved = self._save_metrics_batch(db, user_id, fetched, existing)
+        if fetched and not saved:
+            errors.append(f"Failed to save metrics for {len(fetched)} posts")
+        return saved, errors
+    
+    def _existing_metrics(self, db: Session, user_id: str, post_ids: set) -> Dict[MetricsKey, EngagementMetrics]:
+        """Load the user's metrics rows for the given posts, keyed by post, platform and platform post."""
+        if not post_ids:
+            return {}
+        rows = db.query(EngagementMetrics).filter(
+            EngagementMetrics.user_id == user_id,
+            EngagementMetrics.post_id.in_(post_ids)
+        ).all()
+        return {(row.post_id, row.platform, row.platform_post_id): row for row in rows}
+    
+    async def _fetch_metrics(
+        self,
+        user_id: str,
+        targets: List[MetricsTarget]
+    ) -> Tuple[List[Tuple[MetricsTarget, PlatformMetrics]], List[str]]:
+        """
+        Fetch metrics from the platforms, concurrently within each platform's limits.
+        
+        Returns:
+            Tuple of (targets with the metrics fetched for them, error messages)
+        """
+        by_platform: Dict[Platform, List[MetricsTarget]] = {}
+        for target in targets:
+            by_platform.setdefault(target.platform, []).append(target)
+        
+        async def fetch_platform(platform: Platform, platform_targets: List[MetricsTarget]) -> List[Any]:
+            config = get_platform_config(platform)
+            pacer = RequestPacer(config.rate_limit_per_minute if config else None)
+            semaphore = asyncio.Semaphore(settings.metrics_collection_concurrency)
+            
+            async def fetch(target: MetricsTarget) -> Optional[PlatformMetrics]:
+                async with semaphore:
+                    await pacer.wait()
+                    return await self.platform_service.get_platform_metrics(
+                        platform, user_id, target.platform_post_id
+                    )
+            
+            return await asyncio.gather(*(fetch(target) for target in platform_targets), return_exceptions=True)
+        
+        platform_results = await asyncio.gather(
+            *(fetch_platform(platform, platform_targets) for platform, platform_targets in by_platform.items())
+        )
+        
+        fetched = []
+        errors = []
+        for platform_targets, results in zip(by_platform.values(), platform_results):
+            for target, result in zip(platform_targets, results):
+                if isinstance(result, Exception):
+                    errors.append(
+                        f"Failed to collect metrics for post {target.post_id} on {target.platform.value}: {str(result)}"
+                    )
+                    self.logger.error(f"Metrics collection failed for post {target.post_id}: {result}")
+                elif result:
+                    fetched.append((target, result))
+                else:
+                    self.logger.warning(
+                        f"No metrics available for post {target.platform_post_id} on {target.platform.value}"
+                    )
+        return fetched, errors
+    
+    def _save_metrics_batch(
+        self,
+        db: Session,
+        user_id: str,
+        fetched: List[Tuple[MetricsTarget, PlatformMetrics]],
+        existing: Dict[MetricsKey, EngagementMetrics]
+    ) -> Dict[MetricsKey, str]:
+        """
+        Insert or update collected metrics in a single transaction.
+        
+        The rows' rollup changes are applied in the same transaction.
+        
+        Returns:
+            Metrics row id per saved target (empty if the transaction failed)
+        """
+        if not fetched:
+            return {}
+        
+        now = datetime.utcnow()
+        saved = []
+        samples = []
+        try:
+            for target, platform_metrics in fetched:
+                metrics_data = self._metrics_create(
+                    target.post_id, target.platform, target.platform_post_id, platform_metrics
+                )
+                row = existing.get(target.key)
+                before = contribution_of(row, target.product_id)
+                counters_before = counters_of(row)
+                if row is None:
+                    row = EngagementMetrics(user_id=user_id, **metrics_data.model_dump())
+                    db.add(row)
+                else:
+                    for field, value in metrics_data.model_dump(exclude_unset=True).items():
+                        if hasattr(row, field):
+                            setattr(row, field, value)
+                    row.updated_at = now
+                row.collected_at = now
+                row.sync_status = "synced"
+                samples.append((row, counters_before))
+                saved.append((target, row, before))
+            # All share one sample time, so listings of the same post are merged
+            record_samples(db, samples, now)
+            
+            # Defaults (ids, status) are filled in for new rows at flush
+            db.flush()
+            apply_metrics_changes(
+                db, user_id, [(before, contribution_of(row, target.product_id)) for target, row, before in saved]
+            )
+            saved_ids = {target.key: row.id for target, row, _ in saved}
+            db.commit()
+            
+            self.logger.info(f"Collected metrics for {len(saved_ids)} posts of user {user_id}")
+            return saved_ids
+            
+        except Exception as e:
+            db.rollback()
+            self.logger.error(f"Failed to save metrics for user {user_id}: {e}")
+            return {}
+    
     async def get_engagement_dashboard_data(
         self,
         user_id: str,
@@ -280,49 +493,32 @@ class EngagementMetricsService:
             if platforms:
                 base_query = base_query.filter(EngagementMetrics.platform.in_(platforms))
             
-            # Get total engagement metrics
-            total_metrics = base_query.with_entities(
-                func.sum(EngagementMetrics.likes).label("total_likes"),
-                func.sum(EngagementMetrics.shares).label("total_shares"),
-                func.sum(EngagementMetrics.comments).label("total_comments"),
-                func.sum(EngagementMetrics.views).label("total_views"),
-                func.sum(EngagementMetrics.reach).label("total_reach"),
-                func.avg(EngagementMetrics.engagement_rate).label("avg_engagement_rate")
-            ).first()
-            
-            total_engagement = {
-                "likes": int(total_metrics.total_likes or 0),
-                "shares": int(total_metrics.total_shares or 0),
-                "comments": int(total_metrics.total_comments or 0),
-                "views": int(total_metrics.total_views or 0),
-                "reach": int(total_metrics.total_reach or 0)
-            }
-            
-            # Get engagement by platform
-            platform_metrics = base_query.with_entities(
-                EngagementMetrics.platform,
-                func.sum(EngagementMetrics.likes).label("likes"),
-                func.sum(EngagementMetrics.shares).label("shares"),
-                func.sum(EngagementMetrics.comments).label("comments"),
-                func.sum(EngagementMetrics.views).label("views"),
-                func.sum(EngagementMetrics.reach).label("reach"),
-                func.avg(EngagementMetrics.engagement_rate).label("avg_engagement_rate"),
-                func.count(EngagementMetrics.id).label("post_count")
-            ).group_by(EngagementMetrics.platform).all()
+            # Totals and the platform breakdown come from the rollups (whole days)
+            by_platform = platform_totals(db, user_id, start_date, end_date, platforms)
             
+            totals = {"likes": 0, "shares": 0, "comments": 0, "views": 0, "reach": 0}
+            rate_sum = Decimal(0)
+            rated_posts = 0
             engagement_by_platform = []
-            for metric in platform_metrics:
+            for platform, platform_total in sorted(by_platform.items()):
+                for field in totals:
+                    totals[field] += platform_total[field]
+                rate_sum += platform_total["engagement_rate_sum"]
+                rated_posts += platform_total["rated_posts"]
                 engagement_by_platform.append({
-                    "platform": metric.platform,
-                    "likes": int(metric.likes or 0),
-                    "shares": int(metric.shares or 0),
-                    "comments": int(metric.comments or 0),
-                    "views": int(metric.views or 0),
-                    "reach": int(metric.reach or 0),
-                    "average_engagement_rate": float(metric.avg_engagement_rate or 0),
-                    "post_count": int(metric.post_count or 0)
+                    "platform": platform,
+                    "likes": platform_total["likes"],
+                    "shares": platform_total["shares"],
+                    "comments": platform_total["comments"],
+                    "views": platform_total["views"],
+                    "reach": platform_total["reach"],
+                    "average_engagement_rate": average_rate(platform_total),
+                    "post_count": platform_total["posts"]
                 })
             
+            total_engagement = dict(totals)
+            average_engagement_rate = float(rate_sum / rated_posts) if rated_posts else 0.0
+            
             # Get engagement trend (daily aggregation)
             engagement_trend = await self._get_engagement_trend(
                 db, user_id, start_date, end_date, platforms
@@ -368,7 +564,7 @@ class EngagementMetricsService:
                 engagement_trend=engagement_trend,
                 top_performing_posts=top_performing_posts,
                 recent_metrics=recent_metrics,
-                average_engagement_rate=float(total_metrics.avg_engagement_rate or 0),
+                average_engagement_rate=average_engagement_rate,
                 total_reach=total_engagement["reach"]
             )
             
@@ -428,6 +624,30 @@ class EngagementMetricsService:
         finally:
             db.close()
     
+    def _metrics_create(
+        self,
+        post_id: str,
+        platform: Platform,
+        platform_post_id: str,
+        platform_metrics: PlatformMetrics
+    ) -> EngagementMetricsCreate:
+        """Build the metrics record for metrics fetched from a platform."""
+        return EngagementMetricsCreate(
+            post_id=post_id,
+            platform=platform.value,
+            platform_post_id=platform_post_id,
+            likes=platform_metrics.likes or 0,
+            shares=platform_metrics.shares or 0,
+            comments=platform_metrics.comments or 0,
+            views=platform_metrics.views or 0,
+            reach=platform_metrics.reach or 0,
+            engagement_rate=self._calculate_engagement_rate(platform_metrics),
+            platform_specific_metrics=self._extract_platform_specific_metrics(platform_metrics),
+            collection_method="api",
+            data_quality="complete",
+            metrics_date=datetime.utcnow()
+        )
+    
     def _calculate_engagement_rate(self, metrics: PlatformMetrics) -> Optional[float]:
         """
         Calculate engagement rate from platform metrics.
@@ -506,6 +726,8 @@ class EngagementMetricsService:
         """
         Save engagement metrics to database.
         
+        The change is applied to the rollup buckets in the same transaction.
+        
         Args:
             db: Database session
             user_id: User identifier
@@ -526,6 +748,10 @@ class EngagementMetricsService:
                 )
             ).first()
             
+            product_id = db.query(Post.product_id).filter(Post.id == metrics_data.post_id).scalar()
+            before = contribution_of(existing, product_id)
+            counters_before = counters_of(existing)
+            
             if existing and not force_refresh:
                 # Update existing metrics
                 for field, value in metrics_data.model_dump(exclude_unset=True).items():
@@ -534,6 +760,8 @@ class EngagementMetricsService:
                 existing.updated_at = datetime.utcnow()
                 existing.sync_status = "synced"
                 
+                record_sample(db, existing, counters_before)
+                apply_metrics_change(db, user_id, before, contribution_of(existing, product_id))
                 db.commit()
                 db.refresh(existing)
                 return existing
@@ -547,6 +775,8 @@ class EngagementMetricsService:
                 existing.collected_at = datetime.utcnow()
                 existing.sync_status = "synced"
                 
+                record_sample(db, existing, counters_before)
+                apply_metrics_change(db, user_id, before, contribution_of(existing, product_id))
                 db.commit()
                 db.refresh(existing)
                 return existing
@@ -559,6 +789,9 @@ class EngagementMetricsService:
                 )
                 
                 db.add(db_metrics)
+                db.flush()
+                record_sample(db, db_metrics, counters_before)
+                apply_metrics_change(db, user_id, None, contribution_of(db_metrics, product_id))
                 db.commit()
                 db.refresh(db_metrics)
                 return db_metrics
@@ -577,7 +810,11 @@ class EngagementMetricsService:
         platforms: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
         """
-        Get engagement trend data for dashboard charts.
+        Get engagement trend data for dashboard charts, from the engagement history.
+        
+        Ranges of up to two days within the hourly retention are charted per
+        hour, longer ones per day; each point is the engagement gained in
+        that period.
         
         Args:
             db: Database session
@@ -587,43 +824,24 @@ class EngagementMetricsService:
             platforms: Specific platforms to include
             
         Returns:
-            List of daily engagement data
+            List of hourly or daily engagement data
         """
         try:
-            # Query daily aggregated metrics
-            query = db.query(
-                func.date(EngagementMetrics.metrics_date).label("date"),
-                func.sum(EngagementMetrics.likes).label("likes"),
-                func.sum(EngagementMetrics.shares).label("shares"),
-                func.sum(EngagementMetrics.comments).label("comments"),
-                func.sum(EngagementMetrics.views).label("views"),
-                func.sum(EngagementMetrics.reach).label("reach"),
-                func.avg(EngagementMetrics.engagement_rate).label("avg_engagement_rate")
-            ).filter(
-                and_(
-                    EngagementMetrics.user_id == user_id,
-                    EngagementMetrics.metrics_date >= start_date,
-                    EngagementMetrics.metrics_date <= end_date,
-                    EngagementMetrics.status == "active"
-                )
-            )
-            
-            if platforms:
-                query = query.filter(EngagementMetrics.platform.in_(platforms))
-            
-            daily_metrics = query.group_by(func.date(EngagementMetrics.metrics_date)).order_by("date").all()
-            
+            resolution = trend_resolution(start_date, end_date)
             trend_data = []
-            for metric in daily_metrics:
+            for period, totals in engagement_history(db, user_id, start_date, end_date, resolution, platforms):
+                total_engagement = totals["likes"] + totals["shares"] + totals["comments"]
                 trend_data.append({
-                    "date": metric.date.isoformat(),
-                    "likes": int(metric.likes or 0),
-                    "shares": int(metric.shares or 0),
-                    "comments": int(metric.comments or 0),
-                    "views": int(metric.views or 0),
-                    "reach": int(metric.reach or 0),
-                    "engagement_rate": float(metric.avg_engagement_rate or 0),
-                    "total_engagement": int((metric.likes or 0) + (metric.shares or 0) + (metric.comments or 0))
+                    "date": period.isoformat() if resolution == HOURLY else period.date().isoformat(),
+                    "likes": totals["likes"],
+                    "shares": totals["shares"],
+                    "comments": totals["comments"],
+                    "views": totals["views"],
+                    "reach": totals["reach"],
+                    "engagement_rate": (
+                        min(round(total_engagement / totals["reach"] * 100, 2), 100.0) if totals["reach"] > 0 else 0.0
+                    ),
+                    "total_engagement": total_engagement
                 })
             
             return trend_data
@@ -634,42 +852,19 @@ class EngagementMetricsService:
     
     async def _update_aggregations(self, user_id: str, db: Session):
         """
-        Update metrics aggregations after collecting new metrics.
+        Settle a user's rollups after collecting new metrics.
+        
+        Deltas are applied as metrics are saved; this recomputes the user's
+        buckets that late-arriving metrics marked outdated.
         
         Args:
             user_id: User identifier
             db: Database session
         """
         try:
-            # Update daily aggregation for today
-            today = datetime.utcnow().date()
-            await self._update_daily_aggregation(db, user_id, today)
-            
-            # Update weekly aggregation for current week
-            week_start = today - timedelta(days=today.weekday())
-            await self._update_weekly_aggregation(db, user_id, week_start)
-            
-            # Update monthly aggregation for current month
-            month_start = today.replace(day=1)
-            await self._update_monthly_aggregation(db, user_id, month_start)
-            
+            await asyncio.to_thread(get_engagement_rollup_service().recompute_pending, user_id)
         except Exception as e:
             self.logger.error(f"Failed to update aggregations for user {user_id}: {e}")
-    
-    async def _update_daily_aggregation(self, db: Session, user_id: str, date: datetime.date):
-        """Update daily metrics aggregation."""
-        # Implementation for daily aggregation
-        pass
-    
-    async def _update_weekly_aggregation(self, db: Session, user_id: str, week_start: datetime.date):
-        """Update weekly metrics aggregation."""
-        # Implementation for weekly aggregation
-        pass
-    
-    async def _update_monthly_aggregation(self, db: Session, user_id: str, month_start: datetime.date):
-        """Update monthly metrics aggregation."""
-        # Implementation for monthly aggregation
-        pass
 
 
 # Global service instance
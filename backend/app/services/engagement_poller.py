@@ -0,0 +1,318 @@
+"""
+Background engagement polling.
+
+Keeps engagement metrics current without users having to request a
+collection. Every successful platform result of a published post gets an
+EngagementPollSchedule row, and the poller refreshes due rows through
+EngagementMetricsService. After each poll the row is rescheduled after
+
+    clamp(age * engagement_poll_age_factor,
+          engagement_poll_min_interval, engagement_poll_max_interval)
+
+so a post is polled every few minutes right after publishing, a few times a
+day once it is a few days old, and no longer after
+engagement_poll_max_age_days. Intervals are jittered so posts published
+together drift apart.
+
+Each pass polls at most engagement_poll_batch_size targets, shared evenly
+between the platforms with due targets, so API calls are bounded by
+batch size x passes per hour however many posts there are. When more is
+due than that, the longest-overdue targets go first.
+"""
+
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from itertools import zip_longest
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models import EngagementPollSchedule, Post
+from .engagement_metrics import (
+    COLLECTABLE_POST_STATUSES, MetricsTarget, get_engagement_metrics_service, published_targets
+)
+from .platform_integration import Platform
+
+logger = logging.getLogger(__name__)
+
+# Relative spread of poll intervals
+POLL_JITTER = 0.1
+
+# A claimed poll is retried after this long if its worker never finishes it
+CLAIM_LEASE = timedelta(minutes=15)
+
+# Posts updated shortly before the last discovery pass are looked at again,
+# in case their transaction committed after the pass
+DISCOVERY_OVERLAP = timedelta(minutes=5)
+
+
+class ClaimedPoll(NamedTuple):
+    """A schedule row claimed for polling."""
+    id: str
+    user_id: str
+    post_id: str
+    platform: str
+    platform_post_id: str
+    published_at: datetime
+    poll_count: int
+    consecutive_failures: int
+
+
+def poll_interval(age: timedelta) -> Optional[timedelta]:
+    """
+    How long to wait before polling a post of the given age again.
+
+    Returns:
+        The interval, or None once the post is too old to poll
+    """
+    if age > timedelta(days=settings.engagement_poll_max_age_days):
+        return None
+    seconds = max(age.total_seconds(), 0) * settings.engagement_poll_age_factor
+    seconds = min(max(seconds, settings.engagement_poll_min_interval), settings.engagement_poll_max_interval)
+    return timedelta(seconds=seconds)
+
+
+def next_poll_at(published_at: datetime, now: datetime, failures: int = 0) -> Optional[datetime]:
+    """When to poll a post result next, backing off after failed polls."""
+    if failures >= settings.engagement_poll_max_failures:
+        return None
+    interval = poll_interval(now - published_at)
+    if interval is None:
+        return None
+    if failures:
+        interval = min(interval * 2 ** failures, timedelta(seconds=settings.engagement_poll_max_interval))
+    return now + interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+
+class EngagementPoller:
+    """
+    Polls engagement metrics of published posts on an adaptive schedule.
+
+    Follows the same start/stop lifecycle as the other background
+    processors.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.running = False
+        self.interval = settings.engagement_poll_interval
+        self.batch_size = settings.engagement_poll_batch_size
+        self.metrics_service = get_engagement_metrics_service()
+        self._discovered_until: Optional[datetime] = None
+
+    def discover(self) -> int:
+        """
+        Create schedule rows for newly published post results.
+
+        Looks at posts updated since the previous pass (all posts still young
+        enough to poll on the first pass).
+
+        Returns:
+            Number of post results scheduled
+        """
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            oldest = now - timedelta(days=settings.engagement_poll_max_age_days)
+            since = self._discovered_until - DISCOVERY_OVERLAP if self._discovered_until else oldest
+
+            posts = db.query(
+                Post.id, Post.user_id, Post.results, Post.published_at, Post.updated_at
+            ).filter(
+                Post.updated_at > since,
+                Post.published_at >= oldest,
+                Post.status.in_(COLLECTABLE_POST_STATUSES),
+                Post.results.isnot(None)
+            ).all()
+            if not posts:
+                return 0
+
+            scheduled = set(
+                db.query(
+                    EngagementPollSchedule.post_id,
+                    EngagementPollSchedule.platform,
+                    EngagementPollSchedule.platform_post_id
+                ).filter(EngagementPollSchedule.post_id.in_({post.id for post in posts})).all()
+            )
+
+            created = 0
+            for post in posts:
+                targets, _ = published_targets(post.id, None, post.results)
+                for target in targets:
+                    if target.key in scheduled:
+                        continue
+                    scheduled.add(target.key)
+                    db.add(EngagementPollSchedule(
+                        user_id=post.user_id,
+                        post_id=target.post_id,
+                        platform=target.platform.value,
+                        platform_post_id=target.platform_post_id,
+                        published_at=post.published_at,
+                        next_poll_at=self._first_poll_at(post.published_at, now),
+                        poll_count=0,
+                        consecutive_failures=0
+                    ))
+                    created += 1
+
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another worker scheduled some of these meanwhile; the next pass retries
+                db.rollback()
+                return 0
+
+            self._discovered_until = max((post.updated_at for post in posts if post.updated_at), default=now)
+            if created:
+                self.logger.info(f"Scheduled engagement polling for {created} post results")
+            return created
+        finally:
+            db.close()
+
+    def _first_poll_at(self, published_at: datetime, now: datetime) -> datetime:
+        """First poll of a result: one interval after publishing, backlogs spread over an interval."""
+        interval = poll_interval(now - published_at) or timedelta(seconds=settings.engagement_poll_max_interval)
+        first = published_at + timedelta(seconds=settings.engagement_poll_min_interval)
+        if first >= now:
+            return first
+        return now + interval * random.random()
+
+    def _claim_due(self, db: Session) -> List[ClaimedPoll]:
+        """Claim up to a batch of due polls, shared evenly between platforms."""
+        now = datetime.utcnow()
+
+        # Longest-overdue candidates of each platform, interleaved
+        candidates = []
+        for platform in Platform:
+            candidates.append([
+                row_id for (row_id,) in db.query(EngagementPollSchedule.id).filter(
+                    EngagementPollSchedule.platform == platform.value,
+                    EngagementPollSchedule.next_poll_at <= now
+                ).order_by(EngagementPollSchedule.next_poll_at).limit(self.batch_size)
+            ])
+        picked = [row_id for group in zip_longest(*candidates) for row_id in group if row_id is not None]
+        picked = picked[:self.batch_size]
+        if not picked:
+            return []
+
+        rows = db.query(EngagementPollSchedule).filter(
+            EngagementPollSchedule.id.in_(picked),
+            EngagementPollSchedule.next_poll_at <= now
+        ).with_for_update(skip_locked=True).all()
+
+        claimed = []
+        for row in rows:
+            claimed.append(ClaimedPoll(
+                row.id, row.user_id, row.post_id, row.platform, row.platform_post_id,
+                row.published_at, row.poll_count, row.consecutive_failures
+            ))
+            row.next_poll_at = now + CLAIM_LEASE
+        db.commit()
+        return claimed
+
+    async def poll_due(self) -> int:
+        """
+        Poll one batch of due post results and reschedule them.
+
+        Returns:
+            Number of post results polled
+        """
+        db = SessionLocal()
+        try:
+            claimed = self._claim_due(db)
+            if not claimed:
+                return 0
+
+            product_ids = dict(
+                db.query(Post.id, Post.product_id).filter(Post.id.in_({poll.post_id for poll in claimed})).all()
+            )
+
+            # Targets by user; schedules of deleted posts are dropped
+            by_user: Dict[str, List[ClaimedPoll]] = {}
+            targets: Dict[str, MetricsTarget] = {}
+            gone = []
+            for poll in claimed:
+                try:
+                    platform = Platform(poll.platform)
+                except ValueError:
+                    platform = None
+                if poll.post_id not in product_ids or platform is None:
+                    gone.append(poll.id)
+                    continue
+                by_user.setdefault(poll.user_id, []).append(poll)
+                targets[poll.id] = MetricsTarget(poll.post_id, product_ids[poll.post_id], platform, poll.platform_post_id)
+
+            updates = []
+            for user_id, polls in by_user.items():
+                saved, errors = await self.metrics_service.refresh_metrics(
+                    db, user_id, [targets[poll.id] for poll in polls]
+                )
+                for error in errors:
+                    self.logger.warning(f"Engagement poll for user {user_id}: {error}")
+
+                now = datetime.utcnow()
+                for poll in polls:
+                    failures = 0 if targets[poll.id].key in saved else poll.consecutive_failures + 1
+                    updates.append({
+                        "id": poll.id,
+                        "next_poll_at": next_poll_at(poll.published_at, now, failures),
+                        "last_polled_at": now,
+                        "poll_count": poll.poll_count + 1,
+                        "consecutive_failures": failures
+                    })
+
+            db.bulk_update_mappings(EngagementPollSchedule, updates)
+            if gone:
+                db.query(EngagementPollSchedule).filter(
+                    EngagementPollSchedule.id.in_(gone)
+                ).delete(synchronize_session=False)
+            db.commit()
+            return len(claimed)
+        finally:
+            db.close()
+
+    async def start(self):
+        """Start polling engagement."""
+        if self.running:
+            self.logger.warning("Engagement poller is already running")
+            return
+
+        self.running = True
+        self.logger.info("Starting engagement poller")
+
+        try:
+            while self.running:
+                try:
+                    await asyncio.to_thread(self.discover)
+                    await self.poll_due()
+                except Exception as e:
+                    self.logger.error(f"Error polling engagement: {e}")
+
+                await asyncio.sleep(self.interval)
+
+        except asyncio.CancelledError:
+            self.logger.info("Engagement poller cancelled")
+        finally:
+            self.running = False
+            self.logger.info("Engagement poller stopped")
+
+    async def stop(self):
+        """Stop the polling loop."""
+        self.logger.info("Stopping engagement poller")
+        self.running = False
+
+
+# Global service instance
+_engagement_poller: Optional[EngagementPoller] = None
+
+
+def get_engagement_poller() -> EngagementPoller:
+    """Get the global engagement poller instance."""
+    global _engagement_poller
+    if _engagement_poller is None:
+        _engagement_poller = EngagementPoller()
+    return _engagement_poller
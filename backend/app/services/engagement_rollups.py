@@ -0,0 +1,614 @@
+"""
+Engagement Rollup Service
+
+This module maintains MetricsAggregation rows as incremental rollups of
+EngagementMetrics. Every change to a metrics row is applied as a delta to
+its daily, weekly and monthly per-platform buckets and its monthly
+per-product bucket, in the same transaction as the change. Buckets whose
+period has ended are recomputed from the raw rows once, by a background
+task, which also fills in best and worst performing posts; late-arriving
+data marks a closed bucket outdated so it is recomputed again.
+
+Bucket statuses:
+    open: the period has not ended; totals are maintained by deltas
+    current: recomputed after the period ended
+    outdated: changed after the period ended; awaiting recomputation
+    recalculating: claimed by a recomputation
+"""
+
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, case, exists, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models import EngagementMetrics, MetricsAggregation, Post, User
+from .data_versions import mark_changed
+
+logger = logging.getLogger(__name__)
+
+PERIOD_TYPES = ('daily', 'weekly', 'monthly')
+PRODUCT_TYPE = 'product'
+
+# Counters summed into each bucket
+TOTAL_FIELDS = ('posts', 'likes', 'shares', 'comments', 'views', 'reach')
+
+# Buckets left in recalculating longer than this are claimed again
+RECALCULATION_TIMEOUT = timedelta(minutes=10)
+
+# Users backfilled per cycle
+BACKFILL_BATCH_SIZE = 20
+
+
+class MetricsContribution(NamedTuple):
+    """What one active EngagementMetrics row adds to its buckets."""
+    platform: str
+    product_id: Optional[str]
+    metrics_date: datetime
+    likes: int
+    shares: int
+    comments: int
+    views: int
+    reach: int
+    engagement_rate: Optional[Decimal]
+
+
+class BucketDelta:
+    """Accumulated change to one bucket."""
+
+    def __init__(self):
+        self.totals = {field: 0 for field in TOTAL_FIELDS}
+        self.engagement_rate_sum = Decimal(0)
+        self.rated_posts = 0
+
+    def add(self, contribution: MetricsContribution, sign: int) -> None:
+        self.totals['posts'] += sign
+        for field in TOTAL_FIELDS[1:]:
+            self.totals[field] += sign * getattr(contribution, field)
+        if contribution.engagement_rate is not None:
+            self.engagement_rate_sum += sign * contribution.engagement_rate
+            self.rated_posts += sign
+
+    def is_empty(self) -> bool:
+        return not any(self.totals.values()) and not self.engagement_rate_sum and not self.rated_posts
+
+
+# (aggregation_type, aggregation_key) identifying a bucket for one user
+BucketId = Tuple[str, str]
+
+
+def period_bounds(aggregation_type: str, day: date) -> Tuple[datetime, datetime]:
+    """
+    The [start, end) period of the given type containing a day.
+
+    Weeks start on Monday.
+    """
+    if aggregation_type == 'daily':
+        start = day
+        end = day + timedelta(days=1)
+    elif aggregation_type == 'weekly':
+        start = day - timedelta(days=day.weekday())
+        end = start + timedelta(days=7)
+    elif aggregation_type in ('monthly', PRODUCT_TYPE):
+        start = day.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+    else:
+        raise ValueError(f"Unknown aggregation type: {aggregation_type}")
+    return datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.min.time())
+
+
+def contribution_of(metrics: EngagementMetrics, product_id: Optional[str] = None) -> Optional[MetricsContribution]:
+    """
+    Describe what a metrics row contributes to rollups.
+
+    Returns:
+        The contribution, or None for rows that are not counted (inactive or undated)
+    """
+    if metrics is None or metrics.status != "active" or metrics.metrics_date is None:
+        return None
+    rate = metrics.engagement_rate
+    return MetricsContribution(
+        platform=metrics.platform,
+        product_id=product_id,
+        metrics_date=metrics.metrics_date,
+        likes=metrics.likes or 0,
+        shares=metrics.shares or 0,
+        comments=metrics.comments or 0,
+        views=metrics.views or 0,
+        reach=metrics.reach or 0,
+        engagement_rate=None if rate is None else Decimal(str(rate))
+    )
+
+
+def _buckets_of(contribution: MetricsContribution) -> List[Tuple[BucketId, datetime, datetime]]:
+    """The buckets a contribution is counted in, with their periods."""
+    day = contribution.metrics_date.date()
+    buckets = []
+    for aggregation_type in PERIOD_TYPES:
+        start, end = period_bounds(aggregation_type, day)
+        buckets.append(((aggregation_type, f"{start:%Y-%m-%d}|{contribution.platform}"), start, end))
+    if contribution.product_id:
+        start, end = period_bounds(PRODUCT_TYPE, day)
+        buckets.append((
+            (PRODUCT_TYPE, f"{start:%Y-%m-%d}|{contribution.product_id}|{contribution.platform}"), start, end
+        ))
+    return buckets
+
+
+def apply_metrics_change(db: Session, user_id: str, before: Optional[MetricsContribution],
+                         after: Optional[MetricsContribution]) -> None:
+    """
+    Apply the change of one metrics row to its rollup buckets.
+
+    Call this in the transaction that writes the row, with its contribution
+    before and after the write (None for a new or removed row). The caller
+    must commit the session.
+    """
+    apply_metrics_changes(db, user_id, [(before, after)])
+
+
+def apply_metrics_changes(
+    db: Session,
+    user_id: str,
+    changes: Iterable[Tuple[Optional[MetricsContribution], Optional[MetricsContribution]]]
+) -> None:
+    """
+    Apply the changes of several of a user's metrics rows to their rollup buckets.
+
+    Deltas are merged per bucket first, so each bucket is written once
+    however many of the rows fall in it. The caller must commit the session.
+    """
+    changes = [(before, after) for before, after in changes if before != after]
+    if not changes:
+        return
+
+    if not _has_buckets(db, user_id):
+        # First rollup write for this user: build their buckets from all their
+        # rows, these included. Builds hold the user's row lock, so check again
+        # under it: a concurrent first write or backfill may have built them since
+        _lock_user(db, user_id)
+        if not _has_buckets(db, user_id):
+            db.flush()
+            build_buckets(db, user_id)
+            return
+
+    mark_changed(db, user_id)
+    deltas: Dict[BucketId, BucketDelta] = {}
+    periods: Dict[BucketId, Tuple[datetime, datetime, MetricsContribution]] = {}
+    for before, after in changes:
+        for contribution, sign in ((before, -1), (after, 1)):
+            if contribution is None:
+                continue
+            for bucket_id, start, end in _buckets_of(contribution):
+                deltas.setdefault(bucket_id, BucketDelta()).add(contribution, sign)
+                periods.setdefault(bucket_id, (start, end, contribution))
+
+    now = datetime.utcnow()
+    for bucket_id, delta in deltas.items():
+        if delta.is_empty():
+            continue
+        start, end, contribution = periods[bucket_id]
+        _apply_bucket_delta(db, user_id, bucket_id, start, end, contribution, delta, closed=end <= now)
+
+
+def _has_buckets(db: Session, user_id: str) -> bool:
+    return db.query(exists().where(MetricsAggregation.user_id == user_id)).scalar()
+
+
+def _lock_user(db: Session, user_id: str) -> None:
+    """Serialise building a user's buckets on their user row, until the transaction ends."""
+    db.query(User.id).filter(User.id == user_id).with_for_update().first()
+
+
+def build_buckets(db: Session, user_id: str) -> int:
+    """
+    Create a user's buckets from their active metrics rows.
+
+    For users without buckets. The user's row is locked until the
+    transaction ends. Buckets of ended periods are created outdated, so the
+    recomputation fills in their best and worst performing posts.
+
+    Returns:
+        Number of buckets created. The caller must commit the session.
+    """
+    _lock_user(db, user_id)
+    mark_changed(db, user_id)
+    rows = db.query(EngagementMetrics, Post.product_id).outerjoin(Post, Post.id == EngagementMetrics.post_id).filter(
+        EngagementMetrics.user_id == user_id,
+        EngagementMetrics.status == "active"
+    ).yield_per(10000)
+
+    deltas: Dict[BucketId, BucketDelta] = {}
+    periods: Dict[BucketId, Tuple[datetime, datetime, MetricsContribution]] = {}
+    for metrics, product_id in rows:
+        contribution = contribution_of(metrics, product_id)
+        if contribution is None:
+            continue
+        for bucket_id, start, end in _buckets_of(contribution):
+            deltas.setdefault(bucket_id, BucketDelta()).add(contribution, 1)
+            periods.setdefault(bucket_id, (start, end, contribution))
+
+    now = datetime.utcnow()
+    for bucket_id, delta in deltas.items():
+        start, end, contribution = periods[bucket_id]
+        db.add(_bucket_row(user_id, bucket_id, start, end, contribution, delta,
+                           status='outdated' if end <= now else 'open'))
+    return len(deltas)
+
+
+def _apply_bucket_delta(db: Session, user_id: str, bucket_id: BucketId, start: datetime, end: datetime,
+                        contribution: MetricsContribution, delta: BucketDelta, closed: bool) -> None:
+    """Add a delta to a bucket, creating it if needed."""
+    aggregation_type, aggregation_key = bucket_id
+    rate_sum = func.coalesce(MetricsAggregation.engagement_rate_sum, 0) + delta.engagement_rate_sum
+    rated = func.coalesce(MetricsAggregation.rated_posts, 0) + delta.rated_posts
+
+    # Late changes to a closed period (or one being recomputed) need recomputation
+    if closed:
+        status = 'outdated'
+    else:
+        status = case((MetricsAggregation.status == 'recalculating', 'outdated'), else_=MetricsAggregation.status)
+
+    updated = db.query(MetricsAggregation).filter(
+        MetricsAggregation.user_id == user_id,
+        MetricsAggregation.aggregation_type == aggregation_type,
+        MetricsAggregation.aggregation_key == aggregation_key
+    ).update(
+        {
+            MetricsAggregation.total_posts: MetricsAggregation.total_posts + delta.totals['posts'],
+            MetricsAggregation.total_likes: MetricsAggregation.total_likes + delta.totals['likes'],
+            MetricsAggregation.total_shares: MetricsAggregation.total_shares + delta.totals['shares'],
+            MetricsAggregation.total_comments: MetricsAggregation.total_comments + delta.totals['comments'],
+            MetricsAggregation.total_views: MetricsAggregation.total_views + delta.totals['views'],
+            MetricsAggregation.total_reach: MetricsAggregation.total_reach + delta.totals['reach'],
+            MetricsAggregation.engagement_rate_sum: rate_sum,
+            MetricsAggregation.rated_posts: rated,
+            MetricsAggregation.average_engagement_rate: rate_sum / func.nullif(rated, 0),
+            MetricsAggregation.status: status,
+            MetricsAggregation.updated_at: func.now()
+        },
+        synchronize_session=False
+    )
+    if updated:
+        return
+
+    try:
+        with db.begin_nested():
+            db.add(_bucket_row(
+                user_id, bucket_id, start, end, contribution, delta,
+                # A bucket first seen through a decrement is missing earlier data
+                status='outdated' if closed or delta.totals['posts'] < 0 else 'open'
+            ))
+    except IntegrityError:
+        # Another transaction created the bucket first
+        _apply_bucket_delta(db, user_id, bucket_id, start, end, contribution, delta, closed)
+
+
+def _bucket_row(user_id: str, bucket_id: BucketId, start: datetime, end: datetime,
+                contribution: MetricsContribution, delta: BucketDelta, status: str) -> MetricsAggregation:
+    aggregation_type, aggregation_key = bucket_id
+    return MetricsAggregation(
+        user_id=user_id,
+        aggregation_type=aggregation_type,
+        aggregation_key=aggregation_key,
+        period_start=start,
+        period_end=end,
+        total_posts=delta.totals['posts'],
+        total_likes=delta.totals['likes'],
+        total_shares=delta.totals['shares'],
+        total_comments=delta.totals['comments'],
+        total_views=delta.totals['views'],
+        total_reach=delta.totals['reach'],
+        engagement_rate_sum=delta.engagement_rate_sum,
+        rated_posts=delta.rated_posts,
+        average_engagement_rate=(
+            delta.engagement_rate_sum / delta.rated_posts if delta.rated_posts else None
+        ),
+        platforms_included=[contribution.platform],
+        products_included=[contribution.product_id] if aggregation_type == PRODUCT_TYPE else None,
+        status=status
+    )
+
+
+def _day_ranges(start_date: datetime, end_date: datetime) -> Tuple[Optional[Tuple[datetime, datetime]],
+                                                                    List[Tuple[datetime, datetime]]]:
+    """
+    Cover the days from start_date to end_date (inclusive) with whole months plus edge days.
+
+    Returns:
+        ([start, end) of the whole months or None, list of [start, end) day ranges)
+    """
+    first_day = datetime.combine(start_date.date(), datetime.min.time())
+    end_exclusive = datetime.combine(end_date.date(), datetime.min.time()) + timedelta(days=1)
+
+    months_start = first_day if first_day.day == 1 else period_bounds('monthly', first_day.date())[1]
+    months_end = end_exclusive.replace(day=1)
+    if months_start >= months_end:
+        return None, [(first_day, end_exclusive)]
+
+    day_ranges = [(first_day, months_start), (months_end, end_exclusive)]
+    return (months_start, months_end), [(start, end) for start, end in day_ranges if start < end]
+
+
+def _bucket_platform(bucket: MetricsAggregation) -> Optional[str]:
+    platforms = bucket.platforms_included or []
+    return platforms[0] if platforms else None
+
+
+def _empty_totals() -> Dict:
+    totals = {field: 0 for field in TOTAL_FIELDS}
+    totals['engagement_rate_sum'] = Decimal(0)
+    totals['rated_posts'] = 0
+    return totals
+
+
+def _accumulate(totals: Dict, bucket: MetricsAggregation) -> None:
+    totals['posts'] += bucket.total_posts or 0
+    for field in TOTAL_FIELDS[1:]:
+        totals[field] += getattr(bucket, f"total_{field}") or 0
+    totals['engagement_rate_sum'] += bucket.engagement_rate_sum or 0
+    totals['rated_posts'] += bucket.rated_posts or 0
+
+
+def average_rate(totals: Dict) -> float:
+    """Average engagement rate of accumulated totals."""
+    if not totals['rated_posts']:
+        return 0.0
+    return float(totals['engagement_rate_sum'] / totals['rated_posts'])
+
+
+def platform_totals(db: Session, user_id: str, start_date: datetime, end_date: datetime,
+                    platforms: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """
+    Sum rollups per platform over the days from start_date to end_date.
+
+    Whole months are read from monthly buckets and the remaining days from
+    daily buckets, so a year costs a few dozen rows per platform.
+
+    Returns:
+        Dictionary of platform -> totals (posts, likes, ..., engagement_rate_sum, rated_posts)
+    """
+    months, day_ranges = _day_ranges(start_date, end_date)
+
+    conditions = [
+        and_(
+            MetricsAggregation.aggregation_type == 'daily',
+            MetricsAggregation.period_start >= start,
+            MetricsAggregation.period_start < end
+        )
+        for start, end in day_ranges
+    ]
+    if months:
+        conditions.append(and_(
+            MetricsAggregation.aggregation_type == 'monthly',
+            MetricsAggregation.period_start >= months[0],
+            MetricsAggregation.period_start < months[1]
+        ))
+
+    buckets = db.query(MetricsAggregation).filter(
+        MetricsAggregation.user_id == user_id,
+        or_(*conditions)
+    ).all()
+
+    totals: Dict[str, Dict] = {}
+    for bucket in buckets:
+        platform = _bucket_platform(bucket)
+        if platform is None or (platforms and platform not in platforms):
+            continue
+        _accumulate(totals.setdefault(platform, _empty_totals()), bucket)
+    return totals
+
+
+class EngagementRollupService:
+    """
+    Recomputes rollup buckets from raw metrics in the background.
+
+    Buckets are recomputed once their period ends (to settle them and record
+    best and worst posts) and whenever late-arriving data marks them
+    outdated. Users with metrics but no buckets, e.g. from before rollups
+    were maintained, are backfilled. The loop follows the same start/stop
+    lifecycle as the other background processors.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.running = False
+        self.interval = settings.engagement_rollup_interval
+        self.batch_size = settings.engagement_rollup_batch_size
+
+    def recompute_pending(self, user_id: Optional[str] = None, limit: Optional[int] = None) -> int:
+        """
+        Recompute outdated buckets and buckets whose period has ended.
+
+        Args:
+            user_id: Only recompute this user's buckets
+            limit: Maximum buckets to recompute
+
+        Returns:
+            Number of buckets recomputed
+        """
+        db = SessionLocal()
+        try:
+            bucket_ids = self._claim_buckets(db, user_id, limit or self.batch_size)
+            for bucket_id in bucket_ids:
+                try:
+                    self._recompute(db, bucket_id)
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    self.logger.error(f"Failed to recompute rollup bucket {bucket_id}: {e}")
+            return len(bucket_ids)
+        finally:
+            db.close()
+
+    def _claim_buckets(self, db: Session, user_id: Optional[str], limit: int) -> List[str]:
+        """Mark buckets needing recomputation as recalculating and return their ids."""
+        now = datetime.utcnow()
+        query = db.query(MetricsAggregation).filter(
+            or_(
+                MetricsAggregation.status == 'outdated',
+                and_(MetricsAggregation.status == 'open', MetricsAggregation.period_end <= now),
+                and_(
+                    MetricsAggregation.status == 'recalculating',
+                    MetricsAggregation.updated_at < now - RECALCULATION_TIMEOUT
+                )
+            )
+        )
+        if user_id:
+            query = query.filter(MetricsAggregation.user_id == user_id)
+
+        buckets = query.order_by(MetricsAggregation.period_end).limit(limit).with_for_update(skip_locked=True).all()
+        for bucket in buckets:
+            bucket.status = 'recalculating'
+            bucket.updated_at = now
+        db.commit()
+        return [bucket.id for bucket in buckets]
+
+    def _recompute(self, db: Session, bucket_id: str) -> None:
+        """Recompute one claimed bucket from the raw metrics."""
+        bucket = db.get(MetricsAggregation, bucket_id)
+        if bucket is None or bucket.status != 'recalculating':
+            return
+
+        parts = bucket.aggregation_key.split('|')
+        platform = parts[-1]
+        query = db.query(EngagementMetrics).filter(
+            EngagementMetrics.user_id == bucket.user_id,
+            EngagementMetrics.platform == platform,
+            EngagementMetrics.metrics_date >= bucket.period_start,
+            EngagementMetrics.metrics_date < bucket.period_end,
+            EngagementMetrics.status == "active"
+        )
+        if bucket.aggregation_type == PRODUCT_TYPE:
+            query = query.join(Post, Post.id == EngagementMetrics.post_id).filter(Post.product_id == parts[1])
+
+        totals = query.with_entities(
+            func.count(EngagementMetrics.id).label("posts"),
+            func.sum(EngagementMetrics.likes).label("likes"),
+            func.sum(EngagementMetrics.shares).label("shares"),
+            func.sum(EngagementMetrics.comments).label("comments"),
+            func.sum(EngagementMetrics.views).label("views"),
+            func.sum(EngagementMetrics.reach).label("reach"),
+            func.sum(EngagementMetrics.engagement_rate).label("rate_sum"),
+            func.count(EngagementMetrics.engagement_rate).label("rated")
+        ).first()
+
+        total_engagement = EngagementMetrics.likes + EngagementMetrics.shares + EngagementMetrics.comments
+        best = query.with_entities(EngagementMetrics.post_id).order_by(total_engagement.desc()).first()
+        worst = query.with_entities(EngagementMetrics.post_id).order_by(total_engagement.asc()).first()
+
+        rate_sum = Decimal(str(totals.rate_sum or 0))
+        rated = int(totals.rated or 0)
+        mark_changed(db, bucket.user_id)
+
+        # Only write if no delta arrived since the claim; otherwise it stays outdated
+        db.query(MetricsAggregation).filter(
+            MetricsAggregation.id == bucket_id,
+            MetricsAggregation.status == 'recalculating'
+        ).update(
+            {
+                MetricsAggregation.total_posts: int(totals.posts or 0),
+                MetricsAggregation.total_likes: int(totals.likes or 0),
+                MetricsAggregation.total_shares: int(totals.shares or 0),
+                MetricsAggregation.total_comments: int(totals.comments or 0),
+                MetricsAggregation.total_views: int(totals.views or 0),
+                MetricsAggregation.total_reach: int(totals.reach or 0),
+                MetricsAggregation.engagement_rate_sum: rate_sum,
+                MetricsAggregation.rated_posts: rated,
+                MetricsAggregation.average_engagement_rate: rate_sum / rated if rated else None,
+                MetricsAggregation.best_performing_post_id: best.post_id if best else None,
+                MetricsAggregation.worst_performing_post_id: worst.post_id if worst else None,
+                MetricsAggregation.status: 'current' if bucket.period_end <= datetime.utcnow() else 'open',
+                MetricsAggregation.calculated_at: func.now(),
+                MetricsAggregation.updated_at: func.now()
+            },
+            synchronize_session=False
+        )
+
+    def backfill(self, limit: int = BACKFILL_BATCH_SIZE) -> int:
+        """
+        Create buckets for users whose metrics predate rollups.
+
+        Users are normally built on their first metrics write; this catches
+        metrics written before rollups were maintained.
+
+        Returns:
+            Number of users backfilled
+        """
+        db = SessionLocal()
+        try:
+            user_ids = [
+                row.user_id for row in db.query(EngagementMetrics.user_id).filter(
+                    EngagementMetrics.status == "active",
+                    ~exists().where(MetricsAggregation.user_id == EngagementMetrics.user_id)
+                ).distinct().limit(limit).all()
+            ]
+
+            for user_id in user_ids:
+                _lock_user(db, user_id)
+                if _has_buckets(db, user_id):
+                    # Built by a first metrics write or another worker meanwhile
+                    db.rollback()
+                    continue
+
+                created = build_buckets(db, user_id)
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # Buckets were created meanwhile; the next cycle retries
+                    db.rollback()
+                self.logger.info(f"Backfilled {created} rollup buckets for user {user_id}")
+
+            return len(user_ids)
+        finally:
+            db.close()
+
+    async def start(self):
+        """Start recomputing rollup buckets."""
+        if self.running:
+            self.logger.warning("Engagement rollup service is already running")
+            return
+
+        self.running = True
+        self.logger.info("Starting engagement rollup service")
+
+        try:
+            while self.running:
+                try:
+                    await asyncio.to_thread(self.backfill)
+                    # Keep draining while full batches come back
+                    while self.running and await asyncio.to_thread(self.recompute_pending) >= self.batch_size:
+                        pass
+                except Exception as e:
+                    self.logger.error(f"Error recomputing engagement rollups: {e}")
+
+                await asyncio.sleep(self.interval)
+
+        except asyncio.CancelledError:
+            self.logger.info("Engagement rollup service cancelled")
+        finally:
+            self.running = False
+            self.logger.info("Engagement rollup service stopped")
+
+    async def stop(self):
+        """Stop the recompute loop."""
+        self.logger.info("Stopping engagement rollup service")
+        self.running = False
+
+
+# Global service instance
+_engagement_rollup_service: Optional[EngagementRollupService] = None
+
+
+def get_engagement_rollup_service() -> EngagementRollupService:
+    """Get the global engagement rollup service instance."""
+    global _engagement_rollup_service
+    if _engagement_rollup_service is None:
+        _engagement_rollup_service = EngagementRollupService()
+    return _engagement_rollup_service
@@ -8,7 +8,7 @@ product listings, handling inventory synchronization, and retrieving marketplace
 import asyncio
 from datetime import datetime, timedelta
 from decimal import Decimal
-from typing import Dict, List, Optional, Any, Union
+from typing import AsyncIterator, Dict, List, Optional, Any, Set, Union
 import httpx
 from sqlalchemy.orm import Session
 
@@ -543,6 +543,86 @@ class EtsyIntegration(APIBasedIntegration):
         
         return results
     
+    async def get_shop_id(self) -> int:
+        """
+        Get the connected shop's ID, loading shop data if needed.
+        
+        Raises:
+            EtsyAPIError: If the shop cannot be loaded
+        """
+        if not self._shop_data:
+            credentials = self.oauth_service.get_decrypted_credentials(self.connection)
+            await self._load_shop_data(credentials.access_token)
+        return self._shop_data.shop_id
+    
+    async def iter_receipts_modified_since(
+        self,
+        shop_id: int,
+        min_last_modified: int,
+        page_size: int = 100
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Page through shop receipts (orders) modified at or after a time, least recently modified first.
+        
+        A shop without changes costs a single request. Each page restarts
+        from the last updated_timestamp seen (inclusive) rather than an
+        offset, so receipts modified while paging cannot shift past a page
+        boundary and be skipped; receipts seen at that timestamp are not
+        yielded again.
+        
+        Args:
+            shop_id: Etsy shop ID
+            min_last_modified: Unix timestamp, e.g. a previously seen receipt's updated_timestamp
+            page_size: Receipts per request (max 100)
+            
+        Yields:
+            Pages of raw receipt dictionaries
+            
+        Raises:
+            EtsyAPIError: If a request fails
+        """
+        credentials = self.oauth_service.get_decrypted_credentials(self.connection)
+        limit = min(page_size, 100)
+        since = min_last_modified
+        # Receipts already yielded at the since timestamp, and how far into
+        # them to skip when a whole page shares that timestamp
+        seen_at_since: Set[Any] = set()
+        offset = 0
+        
+        async with httpx.AsyncClient() as client:
+            while True:
+                response = await client.get(
+                    f"{self.config.api_base_url}/application/shops/{shop_id}/receipts",
+                    headers=self._get_auth_headers(credentials.access_token),
+                    params={
+                        "min_last_modified": since,
+                        "sort_on": "updated",
+                        "sort_order": "asc",
+                        "limit": limit,
+                        "offset": offset
+                    },
+                    timeout=30.0
+                )
+                if response.status_code != 200:
+                    raise EtsyAPIError(f"Failed to get receipts: {response.status_code}", response.status_code)
+                
+                receipts = response.json().get("results", [])
+                yield [receipt for receipt in receipts if receipt.get("receipt_id") not in seen_at_since]
+                if len(receipts) < limit:
+                    return
+                
+                latest = max(receipt.get("updated_timestamp") or 0 for receipt in receipts)
+                at_latest = {
+                    receipt.get("receipt_id") for receipt in receipts
+                    if (receipt.get("updated_timestamp") or 0) == latest
+                }
+                if latest > since:
+                    since, seen_at_since, offset = latest, at_latest, 0
+                else:
+                    # The whole page shares one timestamp; step through it by offset
+                    seen_at_since |= at_latest
+                    offset += len(receipts)
+    
     def _get_auth_headers(self, access_token: str) -> Dict[str, str]:
         """Get authentication headers for Etsy API requests"""
         return {
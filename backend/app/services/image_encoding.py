@@ -0,0 +1,177 @@
+"""
+Image encoding helpers for the Acrylican.
+
+Provides format-aware encoding (JPEG, PNG, WebP and, when the pillow-avif
+plugin is installed, AVIF), a size-targeted encoder that searches for the
+highest quality fitting a byte budget, and Accept-header format negotiation.
+"""
+
+import io
+import logging
+from typing import Iterable, List, Optional, Tuple
+
+from PIL import Image as PILImage
+
+try:
+    import pillow_avif  # noqa: F401  Registers the AVIF plugin with Pillow
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+FORMAT_CONTENT_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+    'AVIF': 'image/avif',
+}
+
+# Formats that keep an alpha channel
+ALPHA_FORMATS = {'PNG', 'WEBP', 'AVIF'}
+
+# Lower bound for size-targeted quality search; below this artifacts are obvious
+MIN_SEARCH_QUALITY = 40
+
+
+def available_formats() -> List[str]:
+    """Formats Pillow can encode in this environment."""
+    PILImage.init()
+    return [image_format for image_format in FORMAT_CONTENT_TYPES if image_format in PILImage.SAVE]
+
+
+def content_type_for(image_format: str) -> str:
+    """MIME type for an encoding format."""
+    return FORMAT_CONTENT_TYPES[image_format]
+
+
+def _prepare(image: PILImage.Image, image_format: str) -> PILImage.Image:
+    """Convert an image to a mode the target format can store."""
+    if image_format in ALPHA_FORMATS:
+        if image.mode not in ('RGB', 'RGBA'):
+            return image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+        return image
+
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # Flatten transparency onto a white background
+        if image.mode == 'P':
+            image = image.convert('RGBA')
+        background = PILImage.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    if image.mode != 'RGB':
+        return image.convert('RGB')
+    return image
+
+
+def encode(image: PILImage.Image, image_format: str = 'JPEG', quality: int = 85) -> bytes:
+    """
+    Encode an image in the given format.
+
+    Args:
+        image: PIL Image object
+        image_format: One of FORMAT_CONTENT_TYPES
+        quality: Encoder quality (1-100); ignored for PNG
+
+    Returns:
+        Encoded image bytes
+    """
+    prepared = _prepare(image, image_format)
+    output = io.BytesIO()
+
+    if image_format == 'JPEG':
+        prepared.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+    elif image_format == 'WEBP':
+        prepared.save(output, format='WEBP', quality=quality, method=4)
+    elif image_format == 'AVIF':
+        prepared.save(output, format='AVIF', quality=quality, speed=6)
+    else:
+        prepared.save(output, format=image_format, optimize=True)
+
+    return output.getvalue()
+
+
+def encode_to_budget(image: PILImage.Image, image_format: str, max_bytes: int,
+                     max_quality: int = 90, min_quality: int = MIN_SEARCH_QUALITY) -> Tuple[bytes, int]:
+    """
+    Encode at the highest quality whose output fits within a byte budget.
+
+    Binary-searches quality between min_quality and max_quality, so at most
+    about log2(max_quality - min_quality) + 1 encodes are made. If even
+    min_quality exceeds the budget, the min_quality encoding is returned.
+
+    Args:
+        image: PIL Image object
+        image_format: Lossy format to encode (JPEG, WEBP or AVIF)
+        max_bytes: Byte budget
+        max_quality: Highest quality to consider
+        min_quality: Lowest quality to consider
+
+    Returns:
+        Tuple of (encoded bytes, chosen quality)
+    """
+    best = encode(image, image_format, max_quality)
+    if len(best) <= max_bytes:
+        return best, max_quality
+
+    best_quality = None
+    low, high = min_quality, max_quality - 1
+    while low <= high:
+        quality = (low + high) // 2
+        data = encode(image, image_format, quality)
+        if len(data) <= max_bytes:
+            best, best_quality = data, quality
+            low = quality + 1
+        else:
+            high = quality - 1
+
+    if best_quality is None:
+        logger.info(f"{image_format} encoding exceeds {max_bytes} byte budget even at quality {min_quality}")
+        return encode(image, image_format, min_quality), min_quality
+
+    return best, best_quality
+
+
+def parse_accept(accept_header: Optional[str]) -> List[Tuple[str, float]]:
+    """Parse an Accept header into (media range, q) pairs."""
+    ranges = []
+    for part in (accept_header or '').split(','):
+        pieces = [piece.strip() for piece in part.split(';')]
+        if not pieces[0]:
+            continue
+        q = 1.0
+        for param in pieces[1:]:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        ranges.append((pieces[0].lower(), q))
+    return ranges
+
+
+def negotiate_format(accept_header: Optional[str], candidates: Iterable[str],
+                     default: str = 'JPEG') -> str:
+    """
+    Choose the encoding format a client prefers among candidates.
+
+    Only explicitly listed image types count: browsers list image/avif and
+    image/webp when they support them, while wildcards say nothing about
+    support. Among equally weighted types, candidates are preferred in the
+    order given (smallest format first).
+
+    Args:
+        accept_header: Value of the request's Accept header
+        candidates: Formats available for the resource, in preference order
+        default: Format to use when no candidate is explicitly accepted
+
+    Returns:
+        Chosen format
+    """
+    accepted = {media_range: q for media_range, q in parse_accept(accept_header) if q > 0}
+
+    best, best_q = default, 0.0
+    for image_format in candidates:
+        q = accepted.get(FORMAT_CONTENT_TYPES.get(image_format, ''), 0.0)
+        if q > best_q:
+            best, best_q = image_format, q
+    return best
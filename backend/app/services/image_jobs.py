@@ -0,0 +1,234 @@
+"""
+Image Processing Job Service
+
+This module processes originals that clients upload directly to cloud
+storage through presigned URLs. A completion request records a job; the
+background processor claims pending jobs, generates variants and stores the
+resulting Image or ProductImage rows, so API workers carry none of the
+upload bandwidth.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models import ImageProcessingJob
+from .image_processing import image_service, ImageValidationError
+from .storage_deletion import enqueue_deletions, get_storage_deletion_service
+
+logger = logging.getLogger(__name__)
+
+
+def create_image_job(db: Session, user_id: str, upload_path: str, original_filename: str,
+                     content_type: str, platforms: Optional[List[str]] = None,
+                     product_id: Optional[str] = None) -> ImageProcessingJob:
+    """
+    Record a processing job for a directly uploaded object.
+
+    Completing the same upload twice returns the existing job.
+
+    Args:
+        db: Database session
+        user_id: Owner of the upload
+        upload_path: Storage path the client uploaded to
+        original_filename: Original filename
+        content_type: MIME type of the upload
+        platforms: Platforms to optimize for
+        product_id: Optional product to attach the image to
+
+    Returns:
+        The pending (or existing) job
+    """
+    existing_job = db.query(ImageProcessingJob).filter(ImageProcessingJob.upload_path == upload_path).first()
+    if existing_job:
+        return existing_job
+
+    job = ImageProcessingJob(
+        user_id=user_id,
+        product_id=product_id,
+        upload_path=upload_path,
+        original_filename=original_filename,
+        content_type=content_type,
+        platforms=platforms or [],
+        status="pending",
+        attempts=0
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+class ImageJobProcessor:
+    """
+    Background service for processing direct-upload image jobs.
+
+    Jobs are claimed with row locks that skip rows other workers hold, so
+    several API processes can run a processor each. Jobs left in processing
+    by a crashed worker are retried after ``settings.image_job_timeout``.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.running = False
+        self.poll_interval = settings.image_job_poll_interval
+        self.batch_size = settings.image_batch_concurrency
+        self.max_attempts = settings.image_job_max_attempts
+        self._wakeup = asyncio.Event()
+
+    def notify(self):
+        """Wake the processor to pick up a newly created job."""
+        self._wakeup.set()
+
+    async def start(self):
+        """Start the job processor."""
+        if self.running:
+            self.logger.warning("Image job processor is already running")
+            return
+
+        self.running = True
+        self.logger.info("Starting image job processor")
+
+        try:
+            while self.running:
+                try:
+                    processed = await self._process_cycle()
+                except Exception as e:
+                    self.logger.error(f"Error in image job cycle: {e}")
+                    processed = 0
+
+                # Keep draining while jobs are waiting, otherwise sleep until notified
+                if processed < self.batch_size:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+
+        except asyncio.CancelledError:
+            self.logger.info("Image job processor cancelled")
+        finally:
+            self.running = False
+            self.logger.info("Image job processor stopped")
+
+    async def stop(self):
+        """Stop the job processor."""
+        self.logger.info("Stopping image job processor")
+        self.running = False
+        self._wakeup.set()
+
+    async def _process_cycle(self) -> int:
+        """Claim a batch of jobs and process them concurrently."""
+        db = SessionLocal()
+        try:
+            job_ids = self._claim_jobs(db)
+        finally:
+            db.close()
+
+        if job_ids:
+            await asyncio.gather(*(self._run_job(job_id) for job_id in job_ids))
+        return len(job_ids)
+
+    def _claim_jobs(self, db: Session) -> List[str]:
+        """Mark pending (or stale) jobs as processing and return their ids."""
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=settings.image_job_timeout)
+
+        jobs = db.query(ImageProcessingJob).filter(
+            or_(
+                ImageProcessingJob.status == "pending",
+                and_(
+                    ImageProcessingJob.status == "processing",
+                    ImageProcessingJob.started_at < stale_before
+                )
+            )
+        ).order_by(ImageProcessingJob.created_at).limit(self.batch_size).with_for_update(skip_locked=True).all()
+
+        claimed = []
+        for job in jobs:
+            # A stale job whose last attempt never finished (it hung or took the
+            # worker down) is given up on once it has used its attempts
+            if job.status == "processing" and (job.attempts or 0) >= self.max_attempts:
+                self.logger.error(f"Image job {job.id} did not finish in {job.attempts} attempts; giving up")
+                self._fail(job, f"Processing did not finish after {job.attempts} attempts")
+                enqueue_deletions(db, [job.upload_path])
+                continue
+            job.status = "processing"
+            job.started_at = now
+            job.attempts = (job.attempts or 0) + 1
+            claimed.append(job.id)
+        db.commit()
+
+        return claimed
+
+    async def _run_job(self, job_id: str):
+        """Process one claimed job and record its outcome."""
+        db = SessionLocal()
+        cleanup_path = None
+
+        try:
+            job = db.get(ImageProcessingJob, job_id)
+            try:
+                result_id = await image_service.process_stored_upload(db, job)
+                job.status = "completed"
+                job.result_id = result_id
+                job.error_message = None
+                job.completed_at = datetime.utcnow()
+                cleanup_path = job.upload_path
+                enqueue_deletions(db, [cleanup_path])
+                db.commit()
+                self.logger.info(f"Processed direct upload {job.upload_path} into {result_id}")
+
+            except ImageValidationError as e:
+                # Invalid uploads will not succeed on retry
+                db.rollback()
+                self._fail(job, str(e))
+                cleanup_path = job.upload_path
+                enqueue_deletions(db, [cleanup_path])
+                db.commit()
+
+            except Exception as e:
+                db.rollback()
+                self.logger.error(f"Image job {job_id} attempt {job.attempts} failed: {e}")
+                if job.attempts >= self.max_attempts:
+                    self._fail(job, str(e))
+                    cleanup_path = job.upload_path
+                    enqueue_deletions(db, [cleanup_path])
+                else:
+                    job.status = "pending"
+                    job.error_message = str(e)
+                db.commit()
+
+        except Exception as e:
+            db.rollback()
+            self.logger.error(f"Failed to record outcome of image job {job_id}: {e}")
+        finally:
+            db.close()
+
+        # The staged upload is no longer needed once the job is finished;
+        # it stays queued for deletion if this attempt fails
+        if cleanup_path:
+            await get_storage_deletion_service().delete([cleanup_path])
+
+    def _fail(self, job: ImageProcessingJob, error: str):
+        job.status = "failed"
+        job.error_message = error
+        job.completed_at = datetime.utcnow()
+
+
+# Global processor instance
+_image_job_processor: Optional[ImageJobProcessor] = None
+
+
+def get_image_job_processor() -> ImageJobProcessor:
+    """Get the global image job processor instance."""
+    global _image_job_processor
+    if _image_job_processor is None:
+        _image_job_processor = ImageJobProcessor()
+    return _image_job_processor
@@ -0,0 +1,149 @@
+"""
+Per-stage timing metrics for the image pipeline.
+
+Stages (ingest, decode, transpose, resize, encode, upload) are recorded as
+histograms keyed by stage and label, e.g. ``("encode", "WEBP")`` or
+``("resize", "thumbnail_150x150")``, and exported in the Prometheus text
+format. Worker processes record into their own registry; their histograms
+are drained and merged into the parent's after each task.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Histogram bucket upper bounds, in seconds
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_NAME = "image_processing_stage_seconds"
+
+StageKey = Tuple[str, str]
+
+
+class StageHistogram:
+    """Cumulative-bucket histogram of stage durations."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(STAGE_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(STAGE_BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def merge(self, bucket_counts: List[int], count: int, total: float) -> None:
+        self.bucket_counts = [a + b for a, b in zip(self.bucket_counts, bucket_counts)]
+        self.count += count
+        self.sum += total
+
+
+class ImageStageMetrics:
+    """Thread-safe registry of stage histograms."""
+
+    def __init__(self):
+        self._histograms: Dict[StageKey, StageHistogram] = {}
+        self._lock = threading.Lock()
+        self._samples: Optional[List[Tuple[str, str, float, float]]] = None
+
+    def observe(self, stage: str, seconds: float, label: str = "") -> None:
+        """Record one duration for a stage, ending now."""
+        ended_at = time.perf_counter()
+        with self._lock:
+            histogram = self._histograms.get((stage, label))
+            if histogram is None:
+                histogram = self._histograms[(stage, label)] = StageHistogram()
+            histogram.observe(seconds)
+            if self._samples is not None:
+                self._samples.append((stage, label, seconds, ended_at))
+
+    @contextmanager
+    def time(self, stage: str, label: str = "") -> Iterator[None]:
+        """Time the enclosed block as one observation of a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, label)
+
+    def drain(self) -> Dict[StageKey, Tuple[List[int], int, float]]:
+        """Return and reset all histograms, e.g. to ship them out of a worker process."""
+        with self._lock:
+            drained = {
+                key: (list(histogram.bucket_counts), histogram.count, histogram.sum)
+                for key, histogram in self._histograms.items()
+            }
+            self._histograms = {}
+        return drained
+
+    def merge(self, drained: Dict[StageKey, Tuple[List[int], int, float]]) -> None:
+        """Add histograms drained from another registry."""
+        with self._lock:
+            for key, (bucket_counts, count, total) in drained.items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = StageHistogram()
+                histogram.merge(bucket_counts, count, total)
+
+    def start_sampling(self) -> None:
+        """
+        Also keep every raw observation, for percentile reporting in benchmarks.
+
+        Samples are (stage, label, seconds, ended_at) with ended_at taken
+        from time.perf_counter().
+        """
+        with self._lock:
+            self._samples = []
+
+    def stop_sampling(self) -> List[Tuple[str, str, float, float]]:
+        """Stop keeping raw observations and return those collected."""
+        with self._lock:
+            samples, self._samples = self._samples or [], None
+        return samples
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict]]:
+        """Histogram summaries as stage -> label -> {count, sum, buckets}."""
+        with self._lock:
+            summary: Dict[str, Dict[str, Dict]] = {}
+            for (stage, label), histogram in sorted(self._histograms.items()):
+                summary.setdefault(stage, {})[label] = {
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "buckets": dict(zip(STAGE_BUCKETS, histogram.bucket_counts))
+                }
+        return summary
+
+    def render_prometheus(self) -> str:
+        """Render all histograms in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {METRIC_NAME} Time spent in each image processing stage.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        with self._lock:
+            for (stage, label), histogram in sorted(self._histograms.items()):
+                labels = f'stage="{stage}",label="{label}"'
+                cumulative = 0
+                for bound, bucket_count in zip(STAGE_BUCKETS, histogram.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{METRIC_NAME}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{METRIC_NAME}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{METRIC_NAME}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+# Global metrics registry (one per process)
+_image_metrics: Optional[ImageStageMetrics] = None
+
+
+def get_image_metrics() -> ImageStageMetrics:
+    """Get this process's image stage metrics registry."""
+    global _image_metrics
+    if _image_metrics is None:
+        _image_metrics = ImageStageMetrics()
+    return _image_metrics
@@ -5,17 +5,32 @@ This service handles image compression, thumbnail generation, format validation,
 and optimization for different platform requirements.
 """
 
+import asyncio
+import hashlib
 import io
+import mmap
+import os
+import resource
+import tempfile
+import time
 import uuid
-from typing import List, Dict, Tuple, Optional, BinaryIO
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Dict, Tuple, Optional, BinaryIO, Union
 from PIL import Image as PILImage, ImageOps
 from fastapi import UploadFile, HTTPException
 from pydantic import BaseModel
 import logging
 
-from .cloud_storage import get_storage_service, StorageError
+from .cloud_storage import get_storage_service, StorageError, StoredFile
+from .content_store import get_content_store
+from .image_encoding import available_formats, content_type_for, encode, encode_to_budget
+from .image_metrics import get_image_metrics
+from .perceptual_hash import dhash, get_near_duplicate_service, to_hex
+from .storage_deletion import enqueue_deletions
+from ..config import settings
 from ..database import get_db
-from ..models import Image
+from ..models import Image, ImageProcessingJob, ProductImage, StoredObject
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
@@ -24,43 +39,57 @@ logger = logging.getLogger(__name__)
 SUPPORTED_FORMATS = {'JPEG', 'PNG', 'WEBP'}
 ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
 
-# Platform-specific image requirements
+# Platform-specific image requirements. 'format' is the encoding used for the
+# platform's variant (WebP where the platform accepts it) and 'max_bytes' the
+# budget targeted by the size-aware encoder.
 PLATFORM_REQUIREMENTS = {
     'facebook': {
         'max_width': 2048,
         'max_height': 2048,
         'quality': 85,
-        'format': 'JPEG'
+        'format': 'WEBP',
+        'accepted_formats': ['JPEG', 'PNG', 'WEBP'],
+        'max_bytes': 1024 * 1024
     },
     'instagram': {
         'max_width': 1080,
         'max_height': 1080,
         'quality': 85,
-        'format': 'JPEG'
+        'format': 'JPEG',
+        'accepted_formats': ['JPEG', 'PNG'],
+        'max_bytes': 800 * 1024
     },
     'facebook_marketplace': {
         'max_width': 1200,
         'max_height': 1200,
         'quality': 80,
-        'format': 'JPEG'
+        'format': 'JPEG',
+        'accepted_formats': ['JPEG', 'PNG'],
+        'max_bytes': 600 * 1024
     },
     'etsy': {
         'max_width': 2000,
         'max_height': 2000,
         'quality': 90,
-        'format': 'JPEG'
+        'format': 'JPEG',
+        'accepted_formats': ['JPEG', 'PNG'],
+        'max_bytes': 1024 * 1024
     },
     'pinterest': {
         'max_width': 1000,
         'max_height': 1500,
         'quality': 85,
-        'format': 'JPEG'
+        'format': 'JPEG',
+        'accepted_formats': ['JPEG', 'PNG'],
+        'max_bytes': 600 * 1024
     },
     'shopify': {
         'max_width': 2048,
         'max_height': 2048,
         'quality': 85,
-        'format': 'JPEG'
+        'format': 'WEBP',
+        'accepted_formats': ['JPEG', 'PNG', 'WEBP'],
+        'max_bytes': 1024 * 1024
     },
 
 }
@@ -72,6 +101,16 @@ THUMBNAIL_SIZES = {
     'large': (600, 600)
 }
 
+# Near-duplicate images reported for an upload, nearest first
+MAX_NEAR_DUPLICATES = 5
+
+# Draft size requested from JPEG decoders when only a perceptual hash is needed
+PERCEPTUAL_HASH_DRAFT_SIZE = (256, 256)
+
+# Extra encodings of the small thumbnail served to browsers that accept them,
+# smallest first; the JPEG thumbnail remains the fallback
+DASHBOARD_THUMBNAIL_FORMATS = [f for f in ('AVIF', 'WEBP') if f in available_formats()]
+
 
 class ProcessedImage(BaseModel):
     """Schema for processed image data."""
@@ -85,6 +124,9 @@ class ProcessedImage(BaseModel):
     thumbnail_urls: Dict[str, str]
     platform_optimized_urls: Dict[str, str]
     storage_paths: Dict[str, str]
+    perceptual_hash: Optional[str] = None
+    near_duplicates: List[str] = []  # IDs of the user's visually similar images, nearest first
+    reused: bool = False  # True when a near-duplicate image was returned instead of processing the upload
 
 
 class ImageValidationError(Exception):
@@ -92,11 +134,255 @@ class ImageValidationError(Exception):
     pass
 
 
+# Leading bytes identifying each supported format
+MAGIC_NUMBERS = {
+    b'\xff\xd8\xff': 'JPEG',
+    b'\x89PNG\r\n\x1a\n': 'PNG',
+}
+
+# Read size for streaming uploads
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def sniff_image_format(header: bytes) -> Optional[str]:
+    """Identify a supported image format from its leading bytes."""
+    for magic, image_format in MAGIC_NUMBERS.items():
+        if header.startswith(magic):
+            return image_format
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process, or its peak where unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryProbe:
+    """Tracks the peak resident memory growth over an operation."""
+    
+    def __init__(self):
+        self.baseline = current_rss_bytes()
+        self.peak = self.baseline
+    
+    def sample(self) -> None:
+        self.peak = max(self.peak, current_rss_bytes())
+    
+    @property
+    def peak_growth(self) -> int:
+        return self.peak - self.baseline
+
+
+class IngestedUpload:
+    """
+    An upload spooled to a temporary file, with its hash and image header.
+    
+    The body is held in memory only up to ``settings.upload_spool_max_bytes``;
+    larger uploads live on disk and are memory-mapped for decoding. Pixel data
+    is decoded once, on first access to ``image``, so uploads whose variants
+    are already stored never decode the full image.
+    """
+    
+    # EXIF orientations that swap width and height
+    TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+    
+    def __init__(self, spool: tempfile.SpooledTemporaryFile, size: int, content_hash: str,
+                 filename: Optional[str], content_type: Optional[str]):
+        self.spool = spool
+        self.size = size
+        self.content_hash = content_hash
+        self.filename = filename
+        self.content_type = content_type
+        self._mmap = None
+        self._image = None
+        self._perceptual_hash = None
+        
+        # Map uploads that rolled over to disk instead of reading them back in
+        if size > settings.upload_spool_max_bytes:
+            self._mmap = mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        self._header = PILImage.open(self._mmap if self._mmap is not None else self._rewound_spool())
+        self.format = self._header.format
+        
+        width, height = self._header.size
+        if width * height > settings.max_image_pixels:
+            self.close()
+            raise ImageValidationError(
+                f"Image dimensions {width}x{height} exceed the maximum of {settings.max_image_pixels} pixels"
+            )
+        if self._orientation() in self.TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        self.dimensions = (width, height)
+    
+    def _orientation(self) -> Optional[int]:
+        """
+        The EXIF orientation from the image header, without decoding pixel data.
+        
+        Pillow's getexif() loads a PNG to look for eXIf chunks after the image
+        data, so PNGs are read from the chunks seen while opening instead; an
+        eXIf chunk after the image data is still applied when decoding.
+        """
+        if self.format == 'PNG':
+            exif_data = self._header.info.get('exif')
+            if not exif_data:
+                return None
+            exif = PILImage.Exif()
+            exif.load(exif_data)
+            return exif.get(0x0112)
+        return self._header.getexif().get(0x0112)
+    
+    def _rewound_spool(self) -> BinaryIO:
+        self.spool.seek(0)
+        return self.spool
+    
+    @property
+    def image(self) -> PILImage.Image:
+        """
+        The decoded image with EXIF orientation applied.
+        
+        Raises:
+            ImageValidationError: If the image data is corrupt or truncated
+        """
+        if self._image is None:
+            metrics = get_image_metrics()
+            try:
+                with metrics.time('decode', self.format or ''):
+                    self._header.load()
+            except Exception as e:
+                raise ImageValidationError(f"Invalid image file: {str(e)}")
+            with metrics.time('transpose'):
+                ImageOps.exif_transpose(self._header, in_place=True)
+            self._image = self._header
+        return self._image
+    
+    def perceptual_hash(self) -> str:
+        """
+        The image's perceptual hash, as hex.
+        
+        Uses the decoded image when it is already loaded; otherwise JPEGs are
+        decoded at a reduced draft size, so hashing costs a fraction of a full
+        decode.
+        
+        Raises:
+            ImageValidationError: If the image data is corrupt or truncated
+        """
+        if self._perceptual_hash is None:
+            if self._image is not None:
+                self._perceptual_hash = to_hex(dhash(self._image))
+            else:
+                try:
+                    with get_image_metrics().time('decode', 'perceptual_hash'):
+                        with PILImage.open(io.BytesIO(self.read_bytes())) as draft:
+                            draft.draft('RGB', PERCEPTUAL_HASH_DRAFT_SIZE)
+                            oriented = ImageOps.exif_transpose(draft)
+                except Exception as e:
+                    raise ImageValidationError(f"Invalid image file: {str(e)}")
+                self._perceptual_hash = to_hex(dhash(oriented))
+        return self._perceptual_hash
+    
+    def open_stream(self) -> BinaryIO:
+        """
+        Return a file object over the upload, positioned at the start.
+        
+        The image is decoded (and so validated) first: decoding reads from the
+        same file position that the returned stream moves.
+        """
+        self.image
+        if self._mmap is not None:
+            self._mmap.seek(0)
+            return self._mmap
+        return self._rewound_spool()
+    
+    def read_bytes(self) -> bytes:
+        """Return the raw upload, e.g. to hand to a worker process, without decoding it."""
+        if self._mmap is not None:
+            return self._mmap[:]
+        return self._rewound_spool().read()
+    
+    def close(self) -> None:
+        self._header = None
+        self._image = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self.spool.close()
+    
+    def __enter__(self) -> "IngestedUpload":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get the shared process pool used for CPU-bound image work."""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.image_process_workers or None)
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    """Shut down the shared process pool, if it was started."""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
+
+
+def render_variants(data: bytes, specs: Dict[str, Dict]) -> Tuple[Dict[str, bytes], Dict]:
+    """
+    Decode an image once and render every spec from it.
+    
+    Runs in process pool workers. Decoding also validates the image, so this
+    is called even when no variant needs rendering.
+    
+    Args:
+        data: Raw upload bytes
+        specs: Dictionary of key -> spec from _plan_variants
+        
+    Returns:
+        Tuple of (dictionary of key -> encoded variant bytes, stage timings
+        to merge into the parent's metrics)
+        
+    Raises:
+        ImageValidationError: If the image data is corrupt or truncated
+    """
+    metrics = get_image_metrics()
+    # Discard anything inherited from the parent when the worker was forked
+    metrics.drain()
+    
+    try:
+        img = PILImage.open(io.BytesIO(data))
+        with metrics.time('decode', img.format or ''):
+            img.load()
+    except Exception as e:
+        raise ImageValidationError(f"Invalid image file: {str(e)}")
+    
+    with metrics.time('transpose'):
+        ImageOps.exif_transpose(img, in_place=True)
+    rendered = {key: image_service.render_spec(img, spec) for key, spec in specs.items()}
+    return rendered, metrics.drain()
+
+
 class ImageProcessingService:
     """Service for handling image processing operations."""
     
     def __init__(self):
-        self.max_file_size = 10 * 1024 * 1024  # 10MB
+        self.max_file_size = settings.max_file_size
+        
+        # Expected peak per upload: the in-memory spool plus the decoded image,
+        # one working copy and encoder buffers at 4 bytes per pixel
+        self.max_upload_memory = settings.upload_spool_max_bytes + settings.max_image_pixels * 4 * 3
         self.default_quality = 85
         self.thumbnail_quality = 80
     
@@ -110,6 +396,25 @@ class ImageProcessingService:
         Raises:
             ImageValidationError: If validation fails
         """
+        with await self.ingest_upload(file) as ingested:
+            # Check for corrupted image
+            ingested.image
+        
+        await file.seek(0)  # Reset file pointer
+    
+    async def ingest_upload(self, file: UploadFile) -> IngestedUpload:
+        """
+        Stream an uploaded file into a spooled temporary file.
+        
+        Args:
+            file: The uploaded file
+            
+        Returns:
+            IngestedUpload; the caller must close it
+            
+        Raises:
+            ImageValidationError: If the file is too large or not a supported image
+        """
         # Check file size
         if file.size and file.size > self.max_file_size:
             raise ImageValidationError(f"File size {file.size} exceeds maximum allowed size of {self.max_file_size} bytes")
@@ -120,34 +425,84 @@ class ImageProcessingService:
             if extension not in ALLOWED_EXTENSIONS:
                 raise ImageValidationError(f"File extension {extension} not supported. Allowed: {ALLOWED_EXTENSIONS}")
         
-        # Validate image format by trying to open it
-        try:
-            file_content = await file.read()
-            await file.seek(0)  # Reset file pointer
+        async def chunks():
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        
+        return await self.ingest_stream(chunks(), file.filename, file.content_type)
+    
+    async def ingest_stream(self, chunks: AsyncIterator[bytes], filename: Optional[str] = None,
+                            content_type: Optional[str] = None) -> IngestedUpload:
+        """
+        Spool an image byte stream while hashing and size-checking it.
+        
+        The stream is rejected as soon as it exceeds the maximum file size or
+        its leading bytes are not a supported image format, without buffering
+        the rest of the body.
+        
+        Args:
+            chunks: Async iterator of body chunks
+            filename: Original filename
+            content_type: Declared MIME type
             
-            with PILImage.open(io.BytesIO(file_content)) as img:
-                if img.format not in SUPPORTED_FORMATS:
-                    raise ImageValidationError(f"Image format {img.format} not supported. Allowed: {SUPPORTED_FORMATS}")
-                
-                # No minimum dimension constraints - only size limit applies
+        Returns:
+            IngestedUpload; the caller must close it
+            
+        Raises:
+            ImageValidationError: If validation fails
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=settings.upload_spool_max_bytes)
+        hasher = hashlib.sha256()
+        size = 0
+        start = time.perf_counter()
+        
+        try:
+            async for chunk in chunks:
+                if size == 0 and sniff_image_format(chunk[:16]) is None:
+                    raise ImageValidationError(f"Image format not supported. Allowed: {SUPPORTED_FORMATS}")
                 
-                # Check for corrupted image
-                img.verify()
+                size += len(chunk)
+                if size > self.max_file_size:
+                    raise ImageValidationError(f"File size exceeds maximum allowed size of {self.max_file_size} bytes")
                 
+                hasher.update(chunk)
+                spool.write(chunk)
+            
+            if size == 0:
+                raise ImageValidationError("Uploaded file is empty")
+            
+            spool.flush()
+            ingested = IngestedUpload(spool, size, hasher.hexdigest(), filename, content_type)
+            get_image_metrics().observe('ingest', time.perf_counter() - start)
+            
+        except ImageValidationError:
+            spool.close()
+            raise
         except Exception as e:
-            if isinstance(e, ImageValidationError):
-                raise
+            spool.close()
             raise ImageValidationError(f"Invalid image file: {str(e)}")
+        
+        if ingested.format not in SUPPORTED_FORMATS:
+            ingested.close()
+            raise ImageValidationError(f"Image format {ingested.format} not supported. Allowed: {SUPPORTED_FORMATS}")
+        
+        return ingested
     
-    def compress_image(self, image: PILImage.Image, quality: int = None, max_width: int = None, max_height: int = None) -> bytes:
+    def compress_image(self, image: PILImage.Image, quality: int = None, max_width: int = None, max_height: int = None,
+                       format: str = 'JPEG', max_bytes: int = None) -> bytes:
         """
         Compress image with specified quality and dimensions.
         
         Args:
             image: PIL Image object
-            quality: JPEG quality (1-100)
+            quality: Encoder quality (1-100); the upper bound when max_bytes is given
             max_width: Maximum width in pixels
             max_height: Maximum height in pixels
+            format: Output format (JPEG, PNG, WEBP or AVIF)
+            max_bytes: Optional byte budget; quality is searched to fit it
             
         Returns:
             Compressed image as bytes
@@ -155,35 +510,31 @@ class ImageProcessingService:
         if quality is None:
             quality = self.default_quality
         
-        # Create a copy to avoid modifying original
-        img_copy = image.copy()
+        metrics = get_image_metrics()
         
-        # Resize if dimensions specified
+        # Resize if dimensions specified (resizing returns a new image, so the original is untouched)
+        img_copy = image
         if max_width or max_height:
-            img_copy = self._resize_image(img_copy, max_width, max_height)
+            with metrics.time('resize', f"compress_{max_width}x{max_height}"):
+                img_copy = self._resize_image(image, max_width, max_height)
         
-        # Convert to RGB if necessary (for JPEG)
-        if img_copy.mode in ('RGBA', 'LA', 'P'):
-            # Create white background for transparency
-            background = PILImage.new('RGB', img_copy.size, (255, 255, 255))
-            if img_copy.mode == 'P':
-                img_copy = img_copy.convert('RGBA')
-            background.paste(img_copy, mask=img_copy.split()[-1] if img_copy.mode in ('RGBA', 'LA') else None)
-            img_copy = background
-        
-        # Compress image
-        output = io.BytesIO()
-        img_copy.save(output, format='JPEG', quality=quality, optimize=True)
-        return output.getvalue()
+        with metrics.time('encode', format):
+            if max_bytes and format != 'PNG':
+                data, _ = encode_to_budget(img_copy, format, max_bytes, max_quality=quality)
+                return data
+            
+            return encode(img_copy, format, quality)
     
-    def generate_thumbnail(self, image: PILImage.Image, size: Tuple[int, int], quality: int = None) -> bytes:
+    def generate_thumbnail(self, image: PILImage.Image, size: Tuple[int, int], quality: int = None,
+                           format: str = 'JPEG') -> bytes:
         """
         Generate thumbnail from image.
         
         Args:
             image: PIL Image object
             size: Tuple of (width, height) for thumbnail
-            quality: JPEG quality for thumbnail
+            quality: Encoder quality for thumbnail
+            format: Output format (JPEG, PNG, WEBP or AVIF)
             
         Returns:
             Thumbnail image as bytes
@@ -191,21 +542,15 @@ class ImageProcessingService:
         if quality is None:
             quality = self.thumbnail_quality
         
-        # Create thumbnail using PIL's thumbnail method (maintains aspect ratio)
-        img_copy = image.copy()
-        img_copy.thumbnail(size, PILImage.Resampling.LANCZOS)
+        metrics = get_image_metrics()
         
-        # Convert to RGB if necessary
-        if img_copy.mode in ('RGBA', 'LA', 'P'):
-            background = PILImage.new('RGB', img_copy.size, (255, 255, 255))
-            if img_copy.mode == 'P':
-                img_copy = img_copy.convert('RGBA')
-            background.paste(img_copy, mask=img_copy.split()[-1] if img_copy.mode in ('RGBA', 'LA') else None)
-            img_copy = background
+        # Create thumbnail using PIL's thumbnail method (maintains aspect ratio)
+        with metrics.time('resize', f"thumbnail_{size[0]}x{size[1]}"):
+            img_copy = image.copy()
+            img_copy.thumbnail(size, PILImage.Resampling.LANCZOS)
         
-        output = io.BytesIO()
-        img_copy.save(output, format='JPEG', quality=quality, optimize=True)
-        return output.getvalue()
+        with metrics.time('encode', format):
+            return encode(img_copy, format, quality)
     
     def optimize_for_platform(self, image: PILImage.Image, platform: str) -> bytes:
         """
@@ -224,23 +569,31 @@ class ImageProcessingService:
         if platform not in PLATFORM_REQUIREMENTS:
             raise ValueError(f"Platform {platform} not supported. Available: {list(PLATFORM_REQUIREMENTS.keys())}")
         
-        requirements = PLATFORM_REQUIREMENTS[platform]
-        
-        return self.compress_image(
-            image,
-            quality=requirements['quality'],
-            max_width=requirements['max_width'],
-            max_height=requirements['max_height']
-        )
+        return self.render_spec(image, self._platform_spec(platform))
     
-    async def process_image(self, file: UploadFile, platforms: List[str] = None, product_id: str = None, user_id: str = None) -> ProcessedImage:
+    async def process_image(self, file: UploadFile, platforms: List[str] = None, product_id: str = None, user_id: str = None,
+                            reuse_similar: bool = False) -> ProcessedImage:
         """
         Process uploaded image: validate, compress, generate thumbnails, optimize for platforms, and upload to cloud storage.
         
+        Which variants are stored up front is decided by _plan_variants.
+        Storage is content addressed: the original is keyed by the hash of its
+        bytes and every derived variant by the source hash plus its rendering
+        spec. Re-uploading an image the user already has returns the existing
+        Image row (rendering only platform variants it lacks), and variants
+        already stored for anyone are reused without decoding or encoding.
+        
+        Uploads are also compared by perceptual hash with the user's other
+        images. Near duplicates (e.g. a slightly different crop) are listed in
+        ``near_duplicates``; with reuse_similar, the nearest one is returned
+        instead of processing the upload.
+        
         Args:
             file: Uploaded image file
             platforms: List of platforms to optimize for
-            product_id: Optional product ID for organizing files
+            product_id: Optional product ID the upload belongs to
+            user_id: Optional owner; when given, the image is saved to the database
+            reuse_similar: Return the user's nearest similar image, if any, instead of processing the upload
             
         Returns:
             ProcessedImage object with all processed variants and cloud URLs
@@ -249,135 +602,80 @@ class ImageProcessingService:
             ImageValidationError: If image validation fails
             HTTPException: If processing fails
         """
+        from ..database import SessionLocal
+        
         try:
-            # Validate image
-            await self.validate_image(file)
+            # Validate, hash and spool the upload in a single pass
+            probe = MemoryProbe()
+            source = await self.ingest_upload(file)
+            probe.sample()
             
-            # Read file content
-            file_content = await file.read()
+            content_hash = source.content_hash
             
-            # Open image
-            with PILImage.open(io.BytesIO(file_content)) as img:
-                # Apply EXIF orientation
-                img = ImageOps.exif_transpose(img)
-                
-                # Generate unique ID
-                image_id = str(uuid.uuid4())
-                
-                # Get image info
-                original_size = len(file_content)
-                dimensions = {'width': img.width, 'height': img.height}
-                original_filename = file.filename or f"image_{image_id}.jpg"
-                
-                # Prepare data for cloud upload
-                images_to_upload = {}
-                filenames = {}
-                content_types = {}
+            db = SessionLocal()
+            try:
+                if user_id:
+                    existing_image = db.query(Image).filter(
+                        Image.user_id == user_id,
+                        Image.content_hash == content_hash
+                    ).first()
+                    
+                    if existing_image:
+                        if not settings.lazy_image_variants:
+                            await self._add_platform_variants(db, existing_image, source, content_hash, platforms or [])
+                        db.commit()
+                        logger.info(f"Reusing image {existing_image.id} for duplicate upload by user {user_id}")
+                        return self._to_processed_image(existing_image)
                 
-                # Original image
-                images_to_upload['original'] = file_content
-                filenames['original'] = original_filename
-                content_types['original'] = file.content_type or 'image/jpeg'
+                perceptual_hash = await asyncio.to_thread(source.perceptual_hash)
+                near_duplicates = self._find_near_duplicates(db, user_id, perceptual_hash) if user_id else []
                 
-                # Compressed image
-                compressed_data = self.compress_image(img)
-                images_to_upload['compressed'] = compressed_data
-                filenames['compressed'] = f"compressed_{original_filename}"
-                content_types['compressed'] = 'image/jpeg'
+                if near_duplicates and reuse_similar:
+                    logger.info(f"Reusing similar image {near_duplicates[0].id} for upload by user {user_id}")
+                    reused = self._to_processed_image(near_duplicates[0])
+                    reused.near_duplicates = [image.id for image in near_duplicates]
+                    reused.reused = True
+                    return reused
                 
-                # Generate thumbnails
-                for size_name, size_dims in THUMBNAIL_SIZES.items():
-                    thumbnail_data = self.generate_thumbnail(img, size_dims)
-                    images_to_upload[f'thumbnail_{size_name}'] = thumbnail_data
-                    filenames[f'thumbnail_{size_name}'] = f"thumb_{size_name}_{original_filename}"
-                    content_types[f'thumbnail_{size_name}'] = 'image/jpeg'
+                image_id = str(uuid.uuid4())
+                original_filename = file.filename or f"image_{image_id}.jpg"
                 
-                # Optimize for platforms
-                if platforms:
-                    for platform in platforms:
-                        try:
-                            platform_data = self.optimize_for_platform(img, platform)
-                            images_to_upload[f'platform_{platform}'] = platform_data
-                            filenames[f'platform_{platform}'] = f"{platform}_{original_filename}"
-                            content_types[f'platform_{platform}'] = 'image/jpeg'
-                        except ValueError as e:
-                            logger.warning(f"Platform optimization failed for {platform}: {e}")
+                uploaded_files = {}
+                acquired = {}
                 
-                # Upload all images to cloud storage
-                storage_service = get_storage_service()
-                if product_id:
-                    uploaded_files = await storage_service.upload_product_images(
-                        product_id, images_to_upload, filenames, content_types
+                plan = self._plan_variants(content_hash, original_filename, file.content_type, platforms)
+                for image_type, (variant_hash, spec, filename, content_type) in plan.items():
+                    if spec is None:
+                        render = source.open_stream
+                    else:
+                        render = lambda spec=spec: self.render_spec(source.image, spec)
+                    uploaded_files[image_type] = await self._store_variant(
+                        db, acquired, variant_hash, render, filename, content_type
                     )
-                else:
-                    # Upload to general images folder
-                    uploaded_files = {}
-                    for image_type, file_data in images_to_upload.items():
-                        try:
-                            stored_file = await storage_service.upload_image(
-                                file_data, filenames[image_type], content_types[image_type], image_type
-                            )
-                            uploaded_files[image_type] = stored_file
-                        except StorageError as e:
-                            logger.error(f"Failed to upload {image_type}: {e}")
+                    probe.sample()
                 
-                # Extract URLs and storage paths
-                original_url = uploaded_files.get('original', {}).url if 'original' in uploaded_files else ""
-                compressed_url = uploaded_files.get('compressed', {}).url if 'compressed' in uploaded_files else ""
+                processed = self._build_processed_image(image_id, original_filename, source, uploaded_files, perceptual_hash)
+                processed.near_duplicates = [image.id for image in near_duplicates]
                 
-                thumbnail_urls = {}
-                platform_optimized_urls = {}
-                storage_paths = {}
+                # Save image metadata to database if user_id is provided
+                if user_id:
+                    db.add(Image(**self._image_row(processed, user_id, content_hash)))
                 
-                for image_type, stored_file in uploaded_files.items():
-                    storage_paths[image_type] = stored_file.storage_path
-                    
-                    if image_type.startswith('thumbnail_'):
-                        size_name = image_type.replace('thumbnail_', '')
-                        thumbnail_urls[size_name] = stored_file.url
-                    elif image_type.startswith('platform_'):
-                        platform_name = image_type.replace('platform_', '')
-                        platform_optimized_urls[platform_name] = stored_file.url
+                # Persist the new image and its object references together
+                db.commit()
                 
-                # Save image metadata to database if user_id is provided
                 if user_id:
-                    from ..database import SessionLocal
-                    db = SessionLocal()
-                    try:
-                        db_image = Image(
-                            id=image_id,
-                            user_id=user_id,
-                            original_filename=original_filename,
-                            original_url=original_url,
-                            compressed_url=compressed_url,
-                            thumbnail_urls=thumbnail_urls,
-                            platform_optimized_urls=platform_optimized_urls,
-                            storage_paths=storage_paths,
-                            file_size=original_size,
-                            dimensions=dimensions,
-                            format=img.format or "JPEG"
-                        )
-                        db.add(db_image)
-                        db.commit()
-                        db.refresh(db_image)
-                    except Exception as e:
-                        logger.error(f"Failed to save image metadata to database: {e}")
-                        db.rollback()
-                    finally:
-                        db.close()
-
-                return ProcessedImage(
-                    id=image_id,
-                    original_filename=original_filename,
-                    file_size=original_size,
-                    dimensions=dimensions,
-                    format=img.format or "JPEG",
-                    original_url=original_url,
-                    compressed_url=compressed_url,
-                    thumbnail_urls=thumbnail_urls,
-                    platform_optimized_urls=platform_optimized_urls,
-                    storage_paths=storage_paths
-                )
+                    get_near_duplicate_service().add(user_id, image_id, perceptual_hash)
+                
+                return processed
+            
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+                source.close()
+                self._record_memory_usage(probe, source.size)
                 
         except ImageValidationError:
             raise
@@ -388,6 +686,587 @@ class ImageProcessingService:
             logger.error(f"Image processing failed: {e}")
             raise HTTPException(status_code=500, detail=f"Image processing failed: {str(e)}")
     
+    async def process_batch(self, files: List[UploadFile], user_id: str,
+                            platforms: List[str] = None) -> AsyncIterator[Dict]:
+        """
+        Process several uploads, yielding a progress event per file.
+        
+        Files are spooled and hashed first; duplicates and already-stored
+        variants are then resolved with two queries for the whole batch. Each
+        remaining file is decoded, resized and encoded in the process pool
+        while other files upload, and all Image rows are written with a single
+        bulk insert once every file has finished.
+        
+        Events are dictionaries with an ``index`` into ``files`` and a
+        ``status`` of ``received``, ``completed``, ``duplicate`` or ``error``,
+        followed by a final ``done`` (or ``failed``) event once the batch has
+        been committed. Image ids in ``completed`` events are only persistent
+        after ``done``.
+        
+        Args:
+            files: Uploaded image files
+            user_id: Owner of the images
+            platforms: List of platforms to optimize for
+            
+        Yields:
+            Progress event dictionaries
+        """
+        from ..database import SessionLocal
+        
+        content_store = get_content_store()
+        db = SessionLocal()
+        sources: Dict[int, IngestedUpload] = {}
+        uploaded: Dict[str, StoredFile] = {}
+        # Every object each file's item uploaded, whether or not the item succeeded
+        item_uploads: Dict[int, Dict[str, StoredFile]] = {}
+        completed: Dict[int, ProcessedImage] = {}
+        tasks: List[asyncio.Task] = []
+        committed = False
+        failed = 0
+        
+        try:
+            # Spool, hash and header-check every file
+            for index, file in enumerate(files):
+                try:
+                    sources[index] = await self.ingest_upload(file)
+                    yield self._batch_event(index, file.filename, 'received')
+                except ImageValidationError as e:
+                    failed += 1
+                    yield self._batch_event(index, file.filename, 'error', error=str(e))
+            
+            # Resolve duplicates against the user's images and within the batch
+            hashes = {source.content_hash for source in sources.values()}
+            existing_images = {}
+            if hashes:
+                existing_images = {
+                    image.content_hash: image
+                    for image in db.query(Image).filter(Image.user_id == user_id, Image.content_hash.in_(hashes)).all()
+                }
+            
+            plans = {}
+            first_index_by_hash = {}
+            batch_duplicates: Dict[int, List[int]] = {}
+            for index, source in sources.items():
+                existing_image = existing_images.get(source.content_hash)
+                if existing_image:
+                    yield self._batch_event(index, files[index].filename, 'duplicate',
+                                            image=self._to_processed_image(existing_image))
+                elif source.content_hash in first_index_by_hash:
+                    batch_duplicates.setdefault(first_index_by_hash[source.content_hash], []).append(index)
+                else:
+                    first_index_by_hash[source.content_hash] = index
+                    image_id = str(uuid.uuid4())
+                    filename = files[index].filename or f"image_{image_id}.jpg"
+                    plan = self._plan_variants(source.content_hash, filename, files[index].content_type, platforms)
+                    plans[index] = (image_id, filename, plan)
+            
+            indexed = content_store.lookup_many(
+                db, (entry[0] for _, _, plan in plans.values() for entry in plan.values())
+            )
+            content_store.reserve(db, {
+                (content_hash, content_type)
+                for _, _, plan in plans.values()
+                for content_hash, _, _, content_type in plan.values()
+                if content_hash not in indexed
+            })
+            
+            # Render and upload files concurrently, reporting each as it finishes
+            semaphore = asyncio.Semaphore(settings.image_batch_concurrency)
+            for index, (image_id, filename, plan) in plans.items():
+                item_uploads[index] = {}
+                tasks.append(asyncio.create_task(self._process_batch_item(
+                    index, sources[index], image_id, filename, plan, indexed, semaphore, stored=item_uploads[index]
+                )))
+            
+            for task in asyncio.as_completed(tasks):
+                index, processed, stored, error = await task
+                follow_ups = [index] + batch_duplicates.get(index, [])
+                
+                if error is not None:
+                    logger.error(f"Batch processing failed for {files[index].filename}: {error}")
+                    failed += len(follow_ups)
+                    for i in follow_ups:
+                        yield self._batch_event(i, files[i].filename, 'error', error=str(error))
+                    continue
+                
+                completed[index] = processed
+                uploaded.update(stored)
+                yield self._batch_event(index, files[index].filename, 'completed', image=processed)
+                for i in follow_ups[1:]:
+                    yield self._batch_event(i, files[i].filename, 'duplicate', image=processed)
+            
+            # Index uploads and write every Image row in one transaction
+            if completed:
+                reference_counts: Dict[str, int] = {}
+                rows = []
+                for index, processed in completed.items():
+                    _, _, plan = plans[index]
+                    for content_hash in {entry[0] for entry in plan.values()}:
+                        reference_counts[content_hash] = reference_counts.get(content_hash, 0) + 1
+                    rows.append(self._image_row(processed, user_id, sources[index].content_hash))
+                
+                content_store.commit_references(db, reference_counts, uploaded)
+                db.execute(insert(Image), rows)
+            db.commit()
+            committed = True
+            
+            if completed:
+                near_duplicate_service = get_near_duplicate_service()
+                for row in rows:
+                    near_duplicate_service.add(user_id, row['id'], row['perceptual_hash'])
+            
+            yield {
+                'status': 'done',
+                'processed': len(completed),
+                'failed': failed
+            }
+            
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Batch image processing failed: {e}")
+            yield {'status': 'failed', 'error': f"Image processing failed: {str(e)}"}
+        finally:
+            # Stop items still running (the client went away, or the batch failed)
+            # and let their uploads settle before the sources they read are closed
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            for source in sources.values():
+                source.close()
+            db.close()
+            # Objects no committed row references (the item failed, or the batch
+            # never committed) are queued for deletion instead of being orphaned
+            orphaned = [
+                stored_file
+                for index, stored in item_uploads.items()
+                if not committed or index not in completed
+                for stored_file in stored.values()
+            ]
+            if orphaned:
+                self._queue_uncommitted_uploads(orphaned)
+    
+    def _queue_uncommitted_uploads(self, stored_files: Iterable[StoredFile]) -> None:
+        """Queue the storage paths of uploads no row will reference for deletion."""
+        from ..database import SessionLocal
+        
+        db = SessionLocal()
+        try:
+            enqueue_deletions(db, (stored_file.storage_path for stored_file in stored_files))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to queue uncommitted batch uploads for deletion: {e}")
+        finally:
+            db.close()
+    
+    async def _process_batch_item(self, index: int, source: IngestedUpload, image_id: str, filename: str,
+                                  plan: Dict[str, Tuple[str, Optional[Dict], str, str]],
+                                  indexed: Dict[str, StoredObject], semaphore: asyncio.Semaphore,
+                                  original_path: Optional[str] = None,
+                                  stored: Optional[Dict[str, StoredFile]] = None
+                                  ) -> Tuple[int, Optional[ProcessedImage], Dict[str, StoredFile], Optional[Exception]]:
+        """
+        Render the missing objects of one batch file and upload them concurrently.
+        
+        When the original is already in storage at original_path, it is copied
+        server-side instead of being uploaded again. Every object that reaches
+        storage is recorded in ``stored`` (content_hash -> StoredFile) and
+        returned, including when the item fails; when it is cancelled, the
+        caller's ``stored`` still lists them.
+        """
+        content_store = get_content_store()
+        stored = {} if stored is None else stored
+        
+        async with semaphore:
+            try:
+                missing_specs = {
+                    variant_hash: spec
+                    for variant_hash, spec, _, _ in plan.values()
+                    if spec is not None and variant_hash not in indexed
+                }
+                
+                raw = source.read_bytes()
+                rendered = {}
+                if missing_specs or source.content_hash not in indexed:
+                    rendered, timings = await asyncio.get_running_loop().run_in_executor(
+                        get_process_pool(), render_variants, raw, missing_specs
+                    )
+                    get_image_metrics().merge(timings)
+                
+                perceptual_hash = await asyncio.to_thread(source.perceptual_hash)
+                
+                to_upload = {}
+                for variant_hash, spec, variant_filename, content_type in plan.values():
+                    if variant_hash in indexed or variant_hash in to_upload:
+                        continue
+                    if spec is None and original_path:
+                        to_upload[variant_hash] = content_store.adopt(variant_hash, original_path, variant_filename, content_type)
+                        continue
+                    data = raw if spec is None else rendered[variant_hash]
+                    to_upload[variant_hash] = content_store.upload(variant_hash, data, variant_filename, content_type)
+                
+                await self._upload_all(to_upload, stored)
+                
+                uploaded_files = {
+                    image_type: stored.get(variant_hash) or content_store.to_stored_file(indexed[variant_hash], variant_filename)
+                    for image_type, (variant_hash, _, variant_filename, _) in plan.items()
+                }
+                processed = self._build_processed_image(image_id, filename, source, uploaded_files, perceptual_hash)
+                return index, processed, stored, None
+                
+            except Exception as e:
+                return index, None, stored, e
+    
+    @staticmethod
+    async def _upload_all(uploads: Dict[str, Awaitable[StoredFile]], stored: Dict[str, StoredFile]) -> None:
+        """
+        Run uploads concurrently, recording each one that succeeds in stored.
+        
+        Every upload is waited for, also when another fails or the caller is
+        cancelled (uploads run in threads and cannot be stopped), so stored
+        lists every object that reached storage.
+        
+        Raises:
+            Exception: The first upload failure
+        """
+        if not uploads:
+            return
+        tasks = {content_hash: asyncio.ensure_future(upload) for content_hash, upload in uploads.items()}
+        try:
+            await asyncio.wait(tasks.values())
+        finally:
+            pending = [task for task in tasks.values() if not task.done()]
+            if pending:
+                await asyncio.wait(pending)
+            for content_hash, task in tasks.items():
+                if not task.cancelled() and task.exception() is None:
+                    stored[content_hash] = task.result()
+        
+        for task in tasks.values():
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+    
+    async def process_stored_upload(self, db: Session, job: ImageProcessingJob) -> str:
+        """
+        Process an original the client uploaded directly to storage.
+        
+        The object is streamed from storage into a spool, rendered in the
+        process pool and its original copied server-side to its content
+        address, so the upload's bytes never pass through an API request.
+        The result is saved as an Image, or as a ProductImage when the job
+        belongs to a product. The caller must commit the session.
+        
+        Args:
+            db: Database session
+            job: Job describing the uploaded object
+            
+        Returns:
+            ID of the Image or ProductImage row
+            
+        Raises:
+            ImageValidationError: If the uploaded object is not a valid image
+            StorageError: If a storage operation fails
+        """
+        content_store = get_content_store()
+        probe = MemoryProbe()
+        source = await self.ingest_stream(
+            get_storage_service().iter_file(job.upload_path), job.original_filename, job.content_type
+        )
+        probe.sample()
+        
+        try:
+            if job.product_id is None:
+                existing_image = db.query(Image).filter(
+                    Image.user_id == job.user_id,
+                    Image.content_hash == source.content_hash
+                ).first()
+                if existing_image:
+                    logger.info(f"Reusing image {existing_image.id} for direct upload {job.upload_path}")
+                    return existing_image.id
+            
+            image_id = str(uuid.uuid4())
+            plan = self._plan_variants(source.content_hash, job.original_filename, job.content_type, job.platforms)
+            indexed = content_store.lookup_many(db, (entry[0] for entry in plan.values()))
+            content_store.reserve(db, {
+                (content_hash, content_type)
+                for content_hash, _, _, content_type in plan.values()
+                if content_hash not in indexed
+            })
+            
+            _, processed, stored, error = await self._process_batch_item(
+                0, source, image_id, job.original_filename, plan, indexed, asyncio.Semaphore(1),
+                original_path=job.upload_path
+            )
+            if error is not None:
+                # Objects the item uploaded before failing would otherwise be orphaned
+                self._queue_uncommitted_uploads(stored.values())
+                raise error
+            
+            content_store.commit_references(db, {entry[0]: 1 for entry in plan.values()}, stored)
+            row = self._image_row(processed, job.user_id, source.content_hash)
+            if job.product_id:
+                row.pop('user_id')
+                db.add(ProductImage(product_id=job.product_id, **row))
+            else:
+                db.add(Image(**row))
+                get_near_duplicate_service().add(job.user_id, image_id, processed.perceptual_hash)
+            
+            return image_id
+        finally:
+            source.close()
+            self._record_memory_usage(probe, source.size)
+    
+    def _batch_event(self, index: int, filename: Optional[str], status: str,
+                     image: Optional[ProcessedImage] = None, error: Optional[str] = None) -> Dict:
+        """Build a per-file progress event for process_batch."""
+        event = {'index': index, 'filename': filename, 'status': status}
+        if image is not None:
+            event['image'] = image.model_dump()
+        if error is not None:
+            event['error'] = error
+        return event
+    
+    def _record_memory_usage(self, probe: MemoryProbe, upload_size: int) -> None:
+        """Log the peak memory growth of processing one upload."""
+        probe.sample()
+        if probe.peak_growth > self.max_upload_memory:
+            logger.warning(
+                f"Processing a {upload_size} byte upload grew RSS by {probe.peak_growth} bytes "
+                f"(budget {self.max_upload_memory})"
+            )
+        else:
+            logger.debug(f"Processing a {upload_size} byte upload grew RSS by {probe.peak_growth} bytes")
+    
+    def _compression_spec(self, quality: int, max_width: int = None, max_height: int = None,
+                          format: str = 'JPEG', max_bytes: int = None) -> Dict:
+        """Describe a compress_image call for content addressing."""
+        spec = {'kind': 'compress', 'quality': quality, 'max_width': max_width, 'max_height': max_height, 'format': format}
+        if max_bytes:
+            spec['max_bytes'] = max_bytes
+        return spec
+    
+    def _platform_spec(self, platform: str) -> Dict:
+        """Compression spec for a platform's requirements."""
+        requirements = PLATFORM_REQUIREMENTS[platform]
+        return self._compression_spec(
+            requirements['quality'], requirements['max_width'], requirements['max_height'],
+            requirements['format'], requirements.get('max_bytes')
+        )
+    
+    def render_spec(self, image: PILImage.Image, spec: Dict) -> bytes:
+        """
+        Render a variant described by a spec from _plan_variants.
+        
+        Args:
+            image: Decoded source image
+            spec: Variant spec
+            
+        Returns:
+            Encoded variant bytes
+        """
+        if spec['kind'] == 'thumbnail':
+            return self.generate_thumbnail(image, tuple(spec['size']), spec['quality'], spec['format'])
+        return self.compress_image(
+            image, spec['quality'], spec['max_width'], spec['max_height'], spec['format'], spec.get('max_bytes')
+        )
+    
+    def _plan_variants(self, content_hash: str, original_filename: str, content_type: Optional[str],
+                       platforms: Optional[List[str]]) -> Dict[str, Tuple[str, Optional[Dict], str, str]]:
+        """
+        List the objects stored for a new upload.
+        
+        When ``settings.lazy_image_variants`` is enabled, only the original,
+        the compressed master and the small thumbnail are planned; other
+        thumbnails and platform variants are rendered on first request by the
+        image variant service.
+        
+        Returns:
+            Dictionary of image_type -> (content hash, spec, filename, content_type);
+            the spec is None for the original upload
+        """
+        content_store = get_content_store()
+        plan = {'original': (content_hash, None, original_filename, content_type or 'image/jpeg')}
+        
+        spec = self._compression_spec(self.default_quality)
+        plan['compressed'] = (
+            content_store.variant_hash(content_hash, spec), spec, f"compressed_{original_filename}", 'image/jpeg'
+        )
+        
+        for size_name, size_dims in THUMBNAIL_SIZES.items():
+            if settings.lazy_image_variants and size_name != 'small':
+                continue
+            spec = {'kind': 'thumbnail', 'size': list(size_dims), 'quality': self.thumbnail_quality, 'format': 'JPEG'}
+            plan[f'thumbnail_{size_name}'] = (
+                content_store.variant_hash(content_hash, spec), spec, f"thumb_{size_name}_{original_filename}", 'image/jpeg'
+            )
+        
+        # Modern encodings of the dashboard thumbnail, chosen per client by negotiation
+        for image_format in DASHBOARD_THUMBNAIL_FORMATS:
+            spec = {'kind': 'thumbnail', 'size': list(THUMBNAIL_SIZES['small']), 'quality': self.thumbnail_quality, 'format': image_format}
+            suffix = image_format.lower()
+            plan[f'thumbnail_small_{suffix}'] = (
+                content_store.variant_hash(content_hash, spec), spec, f"thumb_small_{original_filename}.{suffix}",
+                content_type_for(image_format)
+            )
+        
+        for platform in [] if settings.lazy_image_variants else platforms or []:
+            if platform not in PLATFORM_REQUIREMENTS:
+                logger.warning(f"Platform optimization skipped for unsupported platform {platform}")
+                continue
+            spec = self._platform_spec(platform)
+            plan[f'platform_{platform}'] = (
+                content_store.variant_hash(content_hash, spec), spec, f"{platform}_{original_filename}",
+                content_type_for(spec['format'])
+            )
+        
+        return plan
+    
+    def _build_processed_image(self, image_id: str, original_filename: str, source: IngestedUpload,
+                               uploaded_files: Dict[str, StoredFile], perceptual_hash: Optional[str] = None) -> ProcessedImage:
+        """Assemble a ProcessedImage from the stored objects of an upload."""
+        thumbnail_urls = {}
+        platform_optimized_urls = {}
+        storage_paths = {}
+        
+        for image_type, stored_file in uploaded_files.items():
+            storage_paths[image_type] = stored_file.storage_path
+            
+            if image_type.startswith('thumbnail_'):
+                size_name = image_type.replace('thumbnail_', '')
+                thumbnail_urls[size_name] = stored_file.url
+            elif image_type.startswith('platform_'):
+                platform_name = image_type.replace('platform_', '')
+                platform_optimized_urls[platform_name] = stored_file.url
+        
+        width, height = source.dimensions
+        return ProcessedImage(
+            id=image_id,
+            original_filename=original_filename,
+            file_size=source.size,
+            dimensions={'width': width, 'height': height},
+            format=source.format or "JPEG",
+            original_url=uploaded_files['original'].url,
+            compressed_url=uploaded_files['compressed'].url,
+            thumbnail_urls=thumbnail_urls,
+            platform_optimized_urls=platform_optimized_urls,
+            storage_paths=storage_paths,
+            perceptual_hash=perceptual_hash
+        )
+    
+    def _find_near_duplicates(self, db: Session, user_id: str, perceptual_hash: str) -> List[Image]:
+        """The user's images within the near-duplicate distance of a hash, nearest first."""
+        matches = get_near_duplicate_service().find(db, user_id, perceptual_hash)
+        if not matches:
+            return []
+        
+        # The index may lag deletions made by other processes
+        image_ids = [image_id for image_id, _ in matches[:MAX_NEAR_DUPLICATES]]
+        images = {
+            image.id: image
+            for image in db.query(Image).filter(Image.user_id == user_id, Image.id.in_(image_ids)).all()
+        }
+        return [images[image_id] for image_id in image_ids if image_id in images]
+    
+    def _image_row(self, processed: ProcessedImage, user_id: str, content_hash: str) -> Dict:
+        """Column values of the Image row for a processed upload."""
+        return {
+            'id': processed.id,
+            'user_id': user_id,
+            'original_filename': processed.original_filename,
+            'original_url': processed.original_url,
+            'compressed_url': processed.compressed_url,
+            'thumbnail_urls': processed.thumbnail_urls,
+            'platform_optimized_urls': processed.platform_optimized_urls,
+            'storage_paths': processed.storage_paths,
+            'file_size': processed.file_size,
+            'dimensions': processed.dimensions,
+            'format': processed.format,
+            'content_hash': content_hash,
+            'perceptual_hash': processed.perceptual_hash
+        }
+    
+    async def _store_variant(self, db: Session, acquired: Dict[str, StoredFile], content_hash: str,
+                             render: Callable[[], Union[bytes, BinaryIO]], filename: str, content_type: str) -> StoredFile:
+        """
+        Store a variant through the content store, once per image row.
+        
+        Variants with identical specs (e.g. two platforms with the same
+        requirements) share one object, and the row holds a single reference.
+        """
+        if content_hash not in acquired:
+            acquired[content_hash] = await get_content_store().get_or_create(
+                db, content_hash, render, filename, content_type
+            )
+        return acquired[content_hash]
+    
+    async def _store_platform_variant(self, db: Session, acquired: Dict[str, StoredFile], source: IngestedUpload,
+                                      content_hash: str, platform: str, original_filename: str) -> StoredFile:
+        """Store the variant of an image optimized for a platform."""
+        self.get_platform_requirements(platform)
+        spec = self._platform_spec(platform)
+        
+        return await self._store_variant(
+            db, acquired, get_content_store().variant_hash(content_hash, spec),
+            lambda: self.render_spec(source.image, spec),
+            f"{platform}_{original_filename}", content_type_for(spec['format'])
+        )
+    
+    async def _add_platform_variants(self, db: Session, image: Image, source: IngestedUpload,
+                                     content_hash: str, platforms: List[str]) -> None:
+        """Add platform variants missing from an existing image row."""
+        platform_optimized_urls = dict(image.platform_optimized_urls or {})
+        storage_paths = dict(image.storage_paths or {})
+        
+        # Objects the row already references must not be referenced twice
+        acquired = {}
+        held_paths = set(storage_paths.values())
+        
+        for platform in platforms:
+            if platform in platform_optimized_urls:
+                continue
+            
+            try:
+                self.get_platform_requirements(platform)
+            except ValueError as e:
+                logger.warning(f"Platform optimization failed for {platform}: {e}")
+                continue
+            
+            spec = self._platform_spec(platform)
+            variant_hash = get_content_store().variant_hash(content_hash, spec)
+            stored_object = get_content_store().lookup(db, variant_hash)
+            
+            if stored_object and stored_object.storage_path in held_paths:
+                platform_optimized_urls[platform] = stored_object.url
+                storage_paths[f'platform_{platform}'] = stored_object.storage_path
+                continue
+            
+            stored_file = await self._store_platform_variant(
+                db, acquired, source, content_hash, platform, image.original_filename
+            )
+            platform_optimized_urls[platform] = stored_file.url
+            storage_paths[f'platform_{platform}'] = stored_file.storage_path
+        
+        # Reassign so SQLAlchemy detects the JSON changes
+        image.platform_optimized_urls = platform_optimized_urls
+        image.storage_paths = storage_paths
+    
+    def _to_processed_image(self, image: Image) -> ProcessedImage:
+        """Build a ProcessedImage from a stored Image row."""
+        return ProcessedImage(
+            id=image.id,
+            original_filename=image.original_filename,
+            file_size=image.file_size,
+            dimensions=image.dimensions,
+            format=image.format,
+            original_url=image.original_url,
+            compressed_url=image.compressed_url,
+            thumbnail_urls=image.thumbnail_urls or {},
+            platform_optimized_urls=image.platform_optimized_urls or {},
+            storage_paths=image.storage_paths or {},
+            perceptual_hash=image.perceptual_hash
+        )
+    
     def _resize_image(self, image: PILImage.Image, max_width: int = None, max_height: int = None) -> PILImage.Image:
         """
         Resize image while maintaining aspect ratio.
@@ -417,7 +1296,7 @@ class ImageProcessingService:
         if ratio < 1:
             new_width = int(width * ratio)
             new_height = int(height * ratio)
-            return image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            return image.resize((new_width, new_height), PILImage.Resampling.LANCZOS)
         
         return image
     
@@ -458,18 +1337,15 @@ class ImageProcessingService:
         Returns:
             Dictionary of storage_path -> success_status
         """
-        results = {}
+        try:
+            results = await get_storage_service().delete_files(list(storage_paths.values()))
+        except StorageError as e:
+            logger.error(f"Error deleting image variants: {e}")
+            return {storage_path: False for storage_path in storage_paths.values()}
         
-        storage_service = get_storage_service()
         for image_type, storage_path in storage_paths.items():
-            try:
-                success = await storage_service.delete_file(storage_path)
-                results[storage_path] = success
-                if not success:
-                    logger.warning(f"Failed to delete {image_type} at {storage_path}")
-            except StorageError as e:
-                logger.error(f"Error deleting {image_type} at {storage_path}: {e}")
-                results[storage_path] = False
+            if not results.get(storage_path):
+                logger.warning(f"Failed to delete {image_type} at {storage_path}")
         
         return results
     
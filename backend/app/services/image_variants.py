@@ -0,0 +1,356 @@
+"""
+Lazy image variant service for the Acrylican.
+
+Uploads store only the original and a compressed master. Every other variant
+(thumbnail sizes, platform-optimized copies, ad hoc sizes) is rendered from
+the master the first time it is requested, stored in cloud storage through
+the content-addressed store, and kept in a local disk LRU cache. Concurrent
+requests for the same variant share a single render.
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional
+
+from PIL import Image as PILImage
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import Image
+from .cloud_storage import StoredFile, get_storage_service
+from .content_store import get_content_store
+from .image_encoding import available_formats, content_type_for, encode, encode_to_budget
+from .image_metrics import get_image_metrics
+from .image_processing import PLATFORM_REQUIREMENTS, THUMBNAIL_SIZES
+
+logger = logging.getLogger(__name__)
+
+
+class VariantError(Exception):
+    """Custom exception for variant generation errors."""
+    pass
+
+
+@dataclass(frozen=True)
+class VariantSpec:
+    """Bounding box, quality and format of a rendered variant."""
+    width: int
+    height: int
+    quality: int = 85
+    format: str = 'JPEG'
+    max_bytes: Optional[int] = None  # Byte budget; quality is searched to fit it
+
+    def __post_init__(self):
+        if self.width <= 0 or self.height <= 0:
+            raise VariantError("Variant dimensions must be positive")
+        if not 1 <= self.quality <= 100:
+            raise VariantError("Variant quality must be between 1 and 100")
+        if self.format not in available_formats():
+            raise VariantError(f"Variant format {self.format} not supported. Allowed: {available_formats()}")
+
+    @property
+    def key(self) -> str:
+        """Short name used for the variant in an image's storage_paths."""
+        key = f"{self.width}x{self.height}_q{self.quality}_{self.format.lower()}"
+        return f"{key}_max{self.max_bytes}" if self.max_bytes else key
+
+    @property
+    def content_type(self) -> str:
+        return content_type_for(self.format)
+
+    def to_dict(self) -> Dict:
+        spec = {'kind': 'variant', **asdict(self)}
+        if not self.max_bytes:
+            spec.pop('max_bytes')
+        return spec
+
+    @classmethod
+    def for_platform(cls, platform: str) -> "VariantSpec":
+        """Spec matching a platform's image requirements."""
+        if platform not in PLATFORM_REQUIREMENTS:
+            raise VariantError(f"Platform {platform} not supported. Available: {list(PLATFORM_REQUIREMENTS.keys())}")
+        requirements = PLATFORM_REQUIREMENTS[platform]
+        return cls(
+            width=requirements['max_width'],
+            height=requirements['max_height'],
+            quality=requirements['quality'],
+            format=requirements['format'],
+            max_bytes=requirements.get('max_bytes')
+        )
+
+    @classmethod
+    def for_thumbnail(cls, size_name: str, quality: int = 80, format: str = 'JPEG') -> "VariantSpec":
+        """Spec for one of the standard thumbnail sizes."""
+        if size_name not in THUMBNAIL_SIZES:
+            raise VariantError(f"Thumbnail size {size_name} not supported. Available: {list(THUMBNAIL_SIZES.keys())}")
+        width, height = THUMBNAIL_SIZES[size_name]
+        return cls(width=width, height=height, quality=quality, format=format)
+
+
+def render_variant(master: bytes, width: int, height: int, quality: int, format: str,
+                   max_bytes: Optional[int] = None) -> bytes:
+    """
+    Render a variant from master image bytes.
+
+    Kept at module level (and free of service state) so it can run in a
+    worker thread or process.
+    """
+    metrics = get_image_metrics()
+    with PILImage.open(io.BytesIO(master)) as img:
+        with metrics.time('decode', img.format or ''):
+            img.load()
+        with metrics.time('resize', f"variant_{width}x{height}"):
+            img.thumbnail((width, height), PILImage.Resampling.LANCZOS)
+
+        with metrics.time('encode', format):
+            if max_bytes and format != 'PNG':
+                data, _ = encode_to_budget(img, format, max_bytes, max_quality=quality)
+                return data
+            return encode(img, format, quality)
+
+
+class DiskLRUCache:
+    """
+    Size-bounded byte cache on local disk.
+
+    Entries are evicted least recently used first, using file modification
+    times as the recency record so the cache survives restarts.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self._total_bytes = sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached bytes for key, marking the entry as recently used."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        """Store bytes for key, evicting old entries to stay within max_bytes."""
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+
+        # Write atomically so readers never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        self._total_bytes += len(data) - previous_size
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.endswith('.tmp')),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._total_bytes -= size
+            except FileNotFoundError:
+                continue
+
+
+class ImageVariantService:
+    """Renders image variants on first request and caches the results."""
+
+    def __init__(self, cache: Optional[DiskLRUCache] = None):
+        self.cache = cache or DiskLRUCache(settings.image_variant_cache_dir, settings.image_variant_cache_max_bytes)
+        self.logger = logging.getLogger(__name__)
+
+        # Renders in progress in this process, keyed by variant hash
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _source_hash(self, image: Image) -> str:
+        return image.content_hash or image.id
+
+    async def get_variant(self, db: Session, image: Image, spec: VariantSpec) -> StoredFile:
+        """
+        Return a variant of an image, rendering and storing it on first use.
+
+        The variant is recorded in the image's storage_paths (holding one
+        reference on the stored object). The image row is locked (and
+        reloaded) while it is recorded, so the caller's further changes to the
+        row are safe from concurrent requests; the caller must commit the
+        session.
+
+        Args:
+            db: Database session
+            image: Image row to derive the variant from
+            spec: Variant to return
+
+        Returns:
+            StoredFile for the variant
+
+        Raises:
+            VariantError: If the image has no master to render from
+        """
+        content_store = get_content_store()
+        variant_hash = content_store.variant_hash(self._source_hash(image), spec.to_dict())
+        storage_paths = dict(image.storage_paths or {})
+        variant_name = f"variant_{spec.key}"
+
+        stored_object = content_store.lookup(db, variant_hash)
+        if stored_object and storage_paths.get(variant_name) == stored_object.storage_path:
+            return content_store.to_stored_file(stored_object, image.original_filename)
+
+        if stored_object:
+            # Rendered before (possibly for another image with the same bytes)
+            content_store.add_references(db, [stored_object.storage_path])
+            stored_file = content_store.to_stored_file(stored_object, image.original_filename)
+        else:
+            data = await self._render_once(variant_hash, image, spec)
+            stored_file = await content_store.get_or_create(
+                db, variant_hash, lambda: data, f"{spec.key}_{image.original_filename}", spec.content_type
+            )
+
+        # Record the path under a row lock: a concurrent request may have
+        # recorded the variant (or another path for it) since storage_paths was read
+        image = self._lock_image(db, image)
+        storage_paths = dict(image.storage_paths or {})
+        previous_path = storage_paths.get(variant_name)
+        if previous_path == stored_file.storage_path:
+            # Already recorded with its reference; drop the one taken above
+            content_store.release_references(db, [stored_file.storage_path])
+            return stored_file
+
+        if previous_path:
+            # Released objects stay queued for deletion until the background retry purges them
+            content_store.release_references(db, [previous_path])
+        storage_paths[variant_name] = stored_file.storage_path
+        image.storage_paths = storage_paths
+        return stored_file
+
+    async def get_variant_bytes(self, db: Session, image: Image, spec: VariantSpec) -> bytes:
+        """Return the bytes of a variant, preferring the local disk cache."""
+        variant_hash = get_content_store().variant_hash(self._source_hash(image), spec.to_dict())
+        cached = await asyncio.to_thread(self.cache.get, variant_hash)
+        if cached is not None:
+            return cached
+
+        stored_file = await self.get_variant(db, image, spec)
+        data = await asyncio.to_thread(self.cache.get, variant_hash)
+        if data is None:
+            data = await get_storage_service().download_file(stored_file.storage_path)
+            await asyncio.to_thread(self.cache.put, variant_hash, data)
+        return data
+
+    async def get_platform_variant(self, db: Session, image: Image, platform: str) -> StoredFile:
+        """Return the platform-optimized variant of an image, recording its URL."""
+        stored_file = await self.get_variant(db, image, VariantSpec.for_platform(platform))
+
+        if (image.platform_optimized_urls or {}).get(platform) != stored_file.url:
+            image = self._lock_image(db, image)
+            platform_optimized_urls = dict(image.platform_optimized_urls or {})
+            platform_optimized_urls[platform] = stored_file.url
+            image.platform_optimized_urls = platform_optimized_urls
+        return stored_file
+
+    async def get_thumbnail(self, db: Session, image: Image, size_name: str, format: str = 'JPEG') -> StoredFile:
+        """Return a standard thumbnail of an image, recording its URL."""
+        stored_file = await self.get_variant(db, image, VariantSpec.for_thumbnail(size_name, format=format))
+
+        # JPEG thumbnails keep the plain size name; others are suffixed, e.g. "small_webp"
+        url_key = size_name if format == 'JPEG' else f"{size_name}_{format.lower()}"
+        if (image.thumbnail_urls or {}).get(url_key) != stored_file.url:
+            image = self._lock_image(db, image)
+            thumbnail_urls = dict(image.thumbnail_urls or {})
+            thumbnail_urls[url_key] = stored_file.url
+            image.thumbnail_urls = thumbnail_urls
+        return stored_file
+
+    def _lock_image(self, db: Session, image: Image) -> Image:
+        """Lock an image row for update and reload it, so JSON fields are not overwritten by a racing request."""
+        return db.query(Image).filter(Image.id == image.id).populate_existing().with_for_update().one()
+
+    async def _render_once(self, variant_hash: str, image: Image, spec: VariantSpec) -> bytes:
+        """
+        Render a variant, sharing the work between concurrent callers.
+
+        Callers in other processes may still race to render the same variant;
+        that is safe because stored objects are keyed by content and indexing
+        is resolved by the content store.
+        """
+        inflight = self._inflight.get(variant_hash)
+        if inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # When the owner was cancelled rather than this caller, render here instead
+                if not inflight.cancelled():
+                    raise
+            return await self._render_once(variant_hash, image, spec)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[variant_hash] = future
+        try:
+            data = await asyncio.to_thread(self.cache.get, variant_hash)
+            if data is None:
+                master = await self._load_master(image)
+                data = await asyncio.to_thread(
+                    render_variant, master, spec.width, spec.height, spec.quality, spec.format, spec.max_bytes
+                )
+                await asyncio.to_thread(self.cache.put, variant_hash, data)
+            future.set_result(data)
+            return data
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else is waiting
+            future.exception()
+            raise
+        finally:
+            # Cancelled (e.g. the client went away): don't leave waiters hanging
+            if not future.done():
+                future.cancel()
+            self._inflight.pop(variant_hash, None)
+
+    async def _load_master(self, image: Image) -> bytes:
+        """Fetch the compressed master of an image, via the disk cache."""
+        storage_paths = image.storage_paths or {}
+        master_path = storage_paths.get('compressed') or storage_paths.get('original')
+        if not master_path:
+            raise VariantError(f"Image {image.id} has no stored master to render from")
+
+        cache_key = f"master:{master_path}"
+        data = await asyncio.to_thread(self.cache.get, cache_key)
+        if data is None:
+            data = await get_storage_service().download_file(master_path)
+            await asyncio.to_thread(self.cache.put, cache_key, data)
+        return data
+
+
+# Global variant service instance
+_variant_service: Optional[ImageVariantService] = None
+
+
+def get_variant_service() -> ImageVariantService:
+    """Get the global image variant service instance."""
+    global _variant_service
+    if _variant_service is None:
+        _variant_service = ImageVariantService()
+    return _variant_service
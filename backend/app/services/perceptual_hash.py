@@ -0,0 +1,199 @@
+"""
+Perceptual hashing and near-duplicate image lookup.
+
+Images get a 64-bit difference hash (dHash) that changes little under
+re-encoding, resizing and small crops. Each user's hashes are held in an
+in-memory banded index: the 64 bits are split into ``max_distance + 1``
+bands, so by the pigeonhole principle any hash within ``max_distance`` bits
+of a query shares at least one band exactly with it. Lookups only compare
+the few images that share a band, which keeps them well under a
+millisecond at hundreds of thousands of images per user.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from PIL import Image as PILImage
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import Image
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+
+# dHash compares horizontally adjacent pixels of a 9x8 grayscale thumbnail
+DHASH_SIZE = (9, 8)
+
+
+def dhash(image: PILImage.Image) -> int:
+    """Compute the 64-bit difference hash of an image."""
+    if image.mode not in ('L', 'RGB', 'RGBA'):
+        image = image.convert('RGBA' if image.mode in ('P', 'LA', 'PA') else 'RGB')
+    small = image.resize(DHASH_SIZE, PILImage.Resampling.BOX, reducing_gap=2.0).convert('L')
+    pixels = list(small.getdata())
+
+    value = 0
+    width, height = DHASH_SIZE
+    for row in range(height):
+        for col in range(width - 1):
+            left = pixels[row * width + col]
+            right = pixels[row * width + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def to_hex(value: int) -> str:
+    """Format a hash for storage."""
+    return f"{value:016x}"
+
+
+def from_hex(value: str) -> int:
+    return int(value, 16)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class BandedHashIndex:
+    """
+    Near-duplicate index over 64-bit hashes for one user.
+
+    Each hash is bucketed by each of its bands; a query gathers the
+    candidates sharing any band and keeps those within max_distance bits.
+    """
+
+    def __init__(self, max_distance: int):
+        self.max_distance = max_distance
+        self.bands = self._band_masks(max_distance + 1)
+        self._buckets: List[Dict[int, Set[str]]] = [{} for _ in self.bands]
+        self._hashes: Dict[str, int] = {}
+
+    @staticmethod
+    def _band_masks(count: int) -> List[Tuple[int, int]]:
+        """Split HASH_BITS into count (shift, mask) bands of near-equal width."""
+        bands = []
+        shift = 0
+        for i in range(count):
+            width = HASH_BITS // count + (1 if i < HASH_BITS % count else 0)
+            bands.append((shift, (1 << width) - 1))
+            shift += width
+        return bands
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, item_id: str, value: int) -> None:
+        if item_id in self._hashes:
+            self.remove(item_id)
+        self._hashes[item_id] = value
+        for (shift, mask), buckets in zip(self.bands, self._buckets):
+            buckets.setdefault((value >> shift) & mask, set()).add(item_id)
+
+    def remove(self, item_id: str) -> None:
+        value = self._hashes.pop(item_id, None)
+        if value is None:
+            return
+        for (shift, mask), buckets in zip(self.bands, self._buckets):
+            key = (value >> shift) & mask
+            bucket = buckets.get(key)
+            if bucket is not None:
+                bucket.discard(item_id)
+                if not bucket:
+                    del buckets[key]
+
+    def query(self, value: int, max_distance: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Find indexed items within max_distance bits of value.
+
+        Returns:
+            List of (item id, distance), nearest first
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+
+        candidates: Set[str] = set()
+        for (shift, mask), buckets in zip(self.bands, self._buckets):
+            candidates.update(buckets.get((value >> shift) & mask, ()))
+
+        matches = []
+        for item_id in candidates:
+            distance = hamming_distance(value, self._hashes[item_id])
+            if distance <= max_distance:
+                matches.append((item_id, distance))
+        return sorted(matches, key=lambda match: match[1])
+
+
+class NearDuplicateService:
+    """
+    Per-user near-duplicate indexes, built from the images table on demand.
+
+    Indexes are kept for the most recently used users and rebuilt after
+    ``settings.near_duplicate_index_ttl`` seconds, so images added or deleted
+    by other processes are picked up. Callers should confirm a match still
+    exists before reusing it.
+    """
+
+    def __init__(self):
+        self.max_distance = settings.near_duplicate_max_distance
+        self._indexes: "OrderedDict[str, Tuple[float, BandedHashIndex]]" = OrderedDict()
+
+    def _index_for(self, db: Session, user_id: str) -> BandedHashIndex:
+        entry = self._indexes.get(user_id)
+        if entry is not None and time.monotonic() - entry[0] < settings.near_duplicate_index_ttl:
+            self._indexes.move_to_end(user_id)
+            return entry[1]
+
+        index = BandedHashIndex(self.max_distance)
+        rows = db.query(Image.id, Image.perceptual_hash).filter(
+            Image.user_id == user_id,
+            Image.perceptual_hash.isnot(None)
+        ).yield_per(10000)
+        for image_id, perceptual_hash in rows:
+            index.add(image_id, from_hex(perceptual_hash))
+
+        self._indexes[user_id] = (time.monotonic(), index)
+        self._indexes.move_to_end(user_id)
+        while len(self._indexes) > settings.near_duplicate_index_max_users:
+            self._indexes.popitem(last=False)
+
+        logger.debug(f"Built near-duplicate index of {len(index)} images for user {user_id}")
+        return index
+
+    def find(self, db: Session, user_id: str, perceptual_hash: str,
+             max_distance: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Find a user's images that look like the given hash.
+
+        Returns:
+            List of (image id, distance), nearest first
+        """
+        return self._index_for(db, user_id).query(from_hex(perceptual_hash), max_distance)
+
+    def add(self, user_id: str, image_id: str, perceptual_hash: Optional[str]) -> None:
+        """Record a new image in the user's index, if it is loaded."""
+        entry = self._indexes.get(user_id)
+        if entry is not None and perceptual_hash:
+            entry[1].add(image_id, from_hex(perceptual_hash))
+
+    def remove(self, user_id: str, image_ids: Iterable[str]) -> None:
+        """Drop deleted images from the user's index, if it is loaded."""
+        entry = self._indexes.get(user_id)
+        if entry is not None:
+            for image_id in image_ids:
+                entry[1].remove(image_id)
+
+
+# Global service instance
+_near_duplicate_service: Optional[NearDuplicateService] = None
+
+
+def get_near_duplicate_service() -> NearDuplicateService:
+    """Get the global near-duplicate service instance."""
+    global _near_duplicate_service
+    if _near_duplicate_service is None:
+        _near_duplicate_service = NearDuplicateService()
+    return _near_duplicate_service
@@ -27,8 +27,11 @@ from .platform_registry import PlatformRegistry, get_platform_registry
 from .platform_config import PlatformConfigManager, get_config_manager
 from .oauth_service import get_oauth_service, OAuthService
 from .platform_oauth_integrations import create_oauth_integration
-from ..models import PlatformConnection
-from ..database import get_db
+from .image_processing import PLATFORM_REQUIREMENTS
+from .image_variants import get_variant_service
+from ..models import PlatformConnection, Image
+from ..database import get_db, SessionLocal
+from sqlalchemy import or_
 
 logger = logging.getLogger(__name__)
 
@@ -201,6 +204,9 @@ class PlatformService:
             PostingError: If posting fails
         """
         try:
+            # Swap uploaded images for their platform-optimized variants
+            content = await self._resolve_platform_images(platform, user_id, content)
+            
             # Try OAuth integration
             oauth_integration = self._get_oauth_integration(platform, user_id)
             if oauth_integration:
@@ -247,6 +253,64 @@ class PlatformService:
                 error_code="POSTING_ERROR"
             )
     
+    async def _resolve_platform_images(
+        self,
+        platform: Platform,
+        user_id: str,
+        content: PostContent
+    ) -> PostContent:
+        """
+        Replace image URLs with variants optimized for a platform.
+        
+        Images the user uploaded are matched by their original or compressed
+        URL; variants that do not exist yet are rendered on demand. Unknown
+        URLs are passed through unchanged.
+        
+        Args:
+            platform: Platform being posted to
+            user_id: User identifier
+            content: Content to post
+            
+        Returns:
+            Content with platform-optimized image URLs
+        """
+        if not content.images or platform.value not in PLATFORM_REQUIREMENTS:
+            return content
+        
+        db = SessionLocal()
+        try:
+            images = db.query(Image).filter(
+                Image.user_id == user_id,
+                or_(Image.compressed_url.in_(content.images), Image.original_url.in_(content.images))
+            ).all()
+            if not images:
+                return content
+            
+            images_by_url = {}
+            for image in images:
+                images_by_url[image.original_url] = image
+                images_by_url[image.compressed_url] = image
+            
+            variant_service = get_variant_service()
+            resolved = []
+            for url in content.images:
+                image = images_by_url.get(url)
+                if image is None:
+                    resolved.append(url)
+                    continue
+                stored_file = await variant_service.get_platform_variant(db, image, platform.value)
+                resolved.append(stored_file.url)
+            
+            db.commit()
+            return content.model_copy(update={"images": resolved})
+            
+        except Exception as e:
+            db.rollback()
+            self.logger.warning(f"Using unoptimized images for {platform.value}: {e}")
+            return content
+        finally:
+            db.close()
+    
     async def post_to_multiple_platforms(
         self,
         platforms: List[Platform],
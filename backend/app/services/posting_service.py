@@ -11,12 +11,13 @@ This module provides a comprehensive posting service that handles:
 import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, desc, asc
 
 from ..database import get_db
 from ..models import Post, PostQueue, User, Product, PlatformConnection
+from ..pagination import Page, keyset_page, list_total, newest_first
 from ..schemas import (
     PostCreate, PostUpdate, PostResponse, PostQueueResponse, 
     PostResultResponse, PostingResult, PostingRequest, SchedulePostRequest
@@ -198,21 +199,28 @@ class PostingService:
         skip: int = 0,
         limit: int = 50,
         status: Optional[str] = None,
-        product_id: Optional[str] = None
-    ) -> Tuple[List[PostResponse], int]:
+        product_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        exact_total: bool = False
+    ) -> Page:
         """
-        List posts for a user with pagination and filtering.
+        List posts for a user with pagination and filtering, newest first.
         
         Args:
             user_id: User ID
             db: Database session
-            skip: Number of posts to skip
+            skip: Number of posts to skip (prefer cursor)
             limit: Maximum number of posts to return
             status: Filter by status
             product_id: Filter by product ID
+            cursor: next_cursor of the previous page
+            exact_total: Count the total even when the list is large
             
         Returns:
-            Tuple of (posts, total_count)
+            Page of PostResponse items, keyed on (created_at, id)
+            
+        Raises:
+            InvalidCursor: If cursor is malformed
         """
         query = db.query(Post).filter(Post.user_id == user_id)
         
@@ -222,12 +230,14 @@ class PostingService:
         if product_id:
             query = query.filter(Post.product_id == product_id)
         
-        total = query.count()
-        posts = query.order_by(desc(Post.created_at)).offset(skip).limit(limit).all()
+        total, total_exact = list_total(query, exact_total)
+        posts, next_cursor = keyset_page(
+            query, newest_first(Post.created_at, Post.id), limit, cursor, offset=skip
+        )
         
         post_responses = [self._post_to_response(post) for post in posts]
         
-        return post_responses, total
+        return Page(post_responses, total, total_exact, next_cursor)
     
     async def delete_post(self, post_id: str, user_id: str, db: Session) -> bool:
         """
@@ -410,7 +420,7 @@ class PostingService:
                     post_id=request.post_id,
                     platform=platform,
                     scheduled_at=request.scheduled_at,
-                    priority=post.priority,
+                    priority=post.priority or 0,
                     status="pending"
                 )
                 db.add(queue_item)
@@ -500,20 +510,30 @@ class PostingService:
         db: Session = None,
         status: Optional[str] = None,
         skip: int = 0,
-        limit: int = 50
-    ) -> Tuple[List[PostQueueResponse], int]:
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        exact_total: bool = False
+    ) -> Page:
         """
         Get queue status with optional filtering.
         
+        Items are in processing order: highest priority first, then
+        earliest scheduled.
+        
         Args:
             user_id: Filter by user ID
             db: Database session
             status: Filter by status
-            skip: Number of items to skip
+            skip: Number of items to skip (prefer cursor)
             limit: Maximum number of items to return
+            cursor: next_cursor of the previous page
+            exact_total: Count the total even when the queue is large
             
         Returns:
-            Tuple of (queue_items, total_count)
+            Page of PostQueueResponse items, keyed on (priority, scheduled_at, id)
+            
+        Raises:
+            InvalidCursor: If cursor is malformed
         """
         query = db.query(PostQueue)
         
@@ -523,15 +543,16 @@ class PostingService:
         if status:
             query = query.filter(PostQueue.status == status)
         
-        total = query.count()
-        queue_items = query.order_by(
-            desc(PostQueue.priority),
-            asc(PostQueue.scheduled_at)
-        ).offset(skip).limit(limit).all()
+        total, total_exact = list_total(query, exact_total)
+        queue_items, next_cursor = keyset_page(
+            query,
+            [(PostQueue.priority, True), (PostQueue.scheduled_at, False), (PostQueue.id, False)],
+            limit, cursor, offset=skip
+        )
         
         responses = [self._queue_item_to_response(item) for item in queue_items]
         
-        return responses, total
+        return Page(responses, total, total_exact, next_cursor)
     
     async def retry_failed_posts(
         self, 
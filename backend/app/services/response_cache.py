@@ -0,0 +1,238 @@
+"""
+Response cache for dashboard and analytics endpoints.
+
+Dashboards are read far more often than the sales, engagement metrics and
+posts behind them change. Responses are cached per user, endpoint and
+normalised query parameters, and tagged with the user's data version (see
+data_versions): a write to any of the user's data makes every cached
+response for that user a miss on the next read.
+
+Entries are served as fresh for ``settings.response_cache_ttl`` seconds.
+For ``settings.response_cache_stale_ttl`` seconds after that they are still
+served, while a background task recomputes them, so relative windows
+("last 30 days") roll forward without making a request wait. Each response
+carries an ETag, and a matching If-None-Match is answered with 304.
+
+Entries live in process memory and, when Redis is configured, in Redis so
+that workers share them. Without Redis the cache is bypassed, since a
+worker cannot see the others' writes, unless settings.single_worker is set.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional, Set
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from .data_versions import get_data_versions
+from .shared_cache import KEY_PREFIX, SHARED_CACHE_ERRORS, get_redis
+
+logger = logging.getLogger(__name__)
+
+# Computes an endpoint's result with the given session
+Compute = Callable[[Session], Awaitable[Any]]
+
+
+@dataclass
+class CachedResponse:
+    """A serialised JSON response and the data version it was computed at."""
+    version: int
+    etag: str
+    body: bytes
+    stored_at: float
+
+    def age(self) -> float:
+        return time.time() - self.stored_at
+
+    def to_bytes(self) -> bytes:
+        header = json.dumps({"version": self.version, "etag": self.etag, "stored_at": self.stored_at})
+        return header.encode() + b"\n" + self.body
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CachedResponse":
+        header, body = data.split(b"\n", 1)
+        fields = json.loads(header)
+        return cls(version=fields["version"], etag=fields["etag"], body=body, stored_at=fields["stored_at"])
+
+
+def cache_key(user_id: str, endpoint: str, request: Request) -> str:
+    """Key for a user's request, independent of query parameter order."""
+    params = "&".join(f"{name}={value}" for name, value in sorted(request.query_params.multi_items()))
+    digest = hashlib.sha256(f"{user_id}|{endpoint}|{params}".encode()).hexdigest()
+    return f"{KEY_PREFIX}response:{digest}"
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match header lists etag."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """Versioned, stale-while-revalidate cache of JSON responses."""
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._refreshing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+
+        client = get_redis()
+        if client is not None:
+            try:
+                data = client.get(key)
+            except SHARED_CACHE_ERRORS as e:
+                logger.warning(f"Shared response cache unavailable: {e}")
+                return None
+            if data is not None:
+                entry = CachedResponse.from_bytes(data)
+                self._store_local(key, entry)
+        return entry
+
+    def _store_local(self, key: str, entry: CachedResponse) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > settings.response_cache_max_entries:
+            self._entries.popitem(last=False)
+
+    def _put(self, key: str, entry: CachedResponse) -> None:
+        self._store_local(key, entry)
+
+        client = get_redis()
+        if client is not None:
+            try:
+                client.set(key, entry.to_bytes(),
+                           ex=settings.response_cache_ttl + settings.response_cache_stale_ttl)
+            except SHARED_CACHE_ERRORS as e:
+                logger.warning(f"Failed to store shared cached response: {e}")
+
+    @staticmethod
+    def _serialise(result: Any, version: int) -> CachedResponse:
+        body = json.dumps(
+            jsonable_encoder(result), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode()
+        return CachedResponse(
+            version=version,
+            etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+            body=body,
+            stored_at=time.time()
+        )
+
+    async def _compute(self, key: str, version: int, compute: Compute, db: Session) -> CachedResponse:
+        entry = self._serialise(await compute(db), version)
+        self._put(key, entry)
+        return entry
+
+    async def _render(self, compute: Compute, db: Optional[Session]) -> CachedResponse:
+        """Compute a response without caching it."""
+        if db is not None:
+            return self._serialise(await compute(db), 0)
+        db = SessionLocal()
+        try:
+            return self._serialise(await compute(db), 0)
+        finally:
+            db.close()
+
+    async def _refresh(self, key: str, version: int, compute: Compute) -> None:
+        db = SessionLocal()
+        try:
+            await self._compute(key, version, compute, db)
+        except Exception as e:
+            logger.warning(f"Failed to refresh cached response: {e}")
+        finally:
+            db.close()
+            self._refreshing.discard(key)
+
+    def _schedule_refresh(self, key: str, version: int, compute: Compute) -> None:
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        task = asyncio.create_task(self._refresh(key, version, compute))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def respond(
+        self,
+        request: Request,
+        user_id: str,
+        endpoint: str,
+        compute: Compute,
+        db: Optional[Session] = None
+    ) -> Response:
+        """
+        Serve an endpoint's result from the cache, computing it when needed.
+
+        Args:
+            request: The incoming request (query parameters and If-None-Match)
+            user_id: User the result belongs to
+            endpoint: Name of the endpoint, part of the cache key
+            compute: Computes the result from a session; it is also called
+                from a background refresh with a session of its own
+            db: Session for computing on a miss (a new one when None)
+
+        Returns:
+            JSON response, or 304 Not Modified
+        """
+        key = cache_key(user_id, endpoint, request)
+        # Read before computing: a write committed meanwhile leaves the entry
+        # tagged with an outdated version rather than hiding it
+        version = get_data_versions().get(user_id)
+
+        entry = self._get(key) if version is not None else None
+        if version is None:
+            # Versions are not shared between workers, so nothing can be cached
+            status = "bypass"
+            entry = await self._render(compute, db)
+        elif entry is not None and entry.version == version and entry.age() < settings.response_cache_ttl:
+            status = "hit"
+        elif (entry is not None and entry.version == version
+                and entry.age() < settings.response_cache_ttl + settings.response_cache_stale_ttl):
+            status = "stale"
+            self._schedule_refresh(key, version, compute)
+        else:
+            status = "miss"
+            if db is not None:
+                entry = await self._compute(key, version, compute, db)
+            else:
+                db = SessionLocal()
+                try:
+                    entry = await self._compute(key, version, compute, db)
+                finally:
+                    db.close()
+
+        headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache", "X-Cache": status}
+        if etag_matches(request, entry.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+# Global cache instance
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Get the global response cache."""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
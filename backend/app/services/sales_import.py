@@ -0,0 +1,460 @@
+"""
+Bulk sales import.
+
+CSV files are imported in the background without loading them into memory:
+records are streamed from the staged file, validated and normalised in
+chunks of ``settings.sales_import_chunk_size`` rows, checked against the
+user's existing (platform, order_id) pairs with one IN query per chunk and
+bulk inserted. Each chunk commits together with the job's progress (byte
+offset and row counts), so an interrupted import resumes after its last
+committed chunk instead of starting over.
+
+Uploads are staged under ``settings.sales_import_dir``, which must be
+shared by every process that runs a SalesImportProcessor.
+"""
+
+import asyncio
+import csv
+import logging
+import os
+import uuid
+from contextlib import suppress
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import UploadFile
+from pydantic import ValidationError
+from sqlalchemy import and_, insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models import SaleEvent, SalesImportJob
+from ..schemas import SaleEventCreate
+from .data_versions import mark_changed
+from .sales_rollups import apply_sale_changes, contribution_of
+from .sales_tracking import sale_event_values
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ("platform", "order_id", "amount", "occurred_at")
+
+# Columns an import may set; imported sales are always recorded as manual entries
+IMPORT_FIELDS = frozenset(SaleEventCreate.model_fields) - {"platform_data", "sale_source"}
+
+# Bytes read from an upload at a time while staging it
+UPLOAD_READ_SIZE = 1024 * 1024
+
+# An import row: its 1-based number in the file and its raw values
+ImportRow = Tuple[int, Dict[str, Any]]
+
+
+@dataclass
+class ImportProgress:
+    """Row counts of an import, and the first few row errors."""
+    processed: int = 0
+    imported: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    def fail(self, row: int, error: str) -> None:
+        self.failed += 1
+        if len(self.errors) < settings.sales_import_max_errors:
+            self.errors.append({"row": row, "error": error})
+
+    def add(self, other: "ImportProgress") -> None:
+        self.processed += other.processed
+        self.imported += other.imported
+        self.duplicates += other.duplicates
+        self.failed += other.failed
+        self.errors.extend(other.errors[:max(settings.sales_import_max_errors - len(self.errors), 0)])
+
+
+def normalize_sale_row(user_id: str, row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate one imported row and turn it into SaleEvent column values.
+
+    Column names are matched case-insensitively and blank values count as
+    missing, so optional columns may be left empty.
+
+    Raises:
+        ValueError: Describing what is wrong with the row
+    """
+    values = {}
+    for name, value in row.items():
+        if isinstance(value, str):
+            value = value.strip()
+        if name is None or value is None or value == "":
+            continue
+        values[name.strip().lower()] = value
+
+    missing = [name for name in REQUIRED_FIELDS if name not in values]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+
+    try:
+        sale = SaleEventCreate(
+            **{name: value for name, value in values.items() if name in IMPORT_FIELDS},
+            sale_source="manual_entry"
+        )
+    except ValidationError as e:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+        ))
+    return sale_event_values(user_id, sale)
+
+
+def _existing_orders(db: Session, user_id: str, keys: Iterable[Tuple[str, str]]) -> set:
+    """Which of the (platform, order_id) pairs the user already has sales for."""
+    order_ids = {order_id for _, order_id in keys}
+    return {
+        tuple(row) for row in db.query(SaleEvent.platform, SaleEvent.order_id).filter(
+            SaleEvent.user_id == user_id,
+            SaleEvent.order_id.in_(order_ids)
+        )
+    }
+
+
+def import_sales_chunk(db: Session, user_id: str, rows: List[ImportRow]) -> ImportProgress:
+    """
+    Validate, deduplicate and insert one chunk of rows.
+
+    Rows repeating an order of the same chunk or one the user already has
+    are counted as duplicates and skipped. The caller must commit the
+    session.
+
+    Args:
+        db: Database session
+        user_id: User the sales belong to
+        rows: (row number, raw row) pairs
+
+    Returns:
+        Counts and errors for the chunk
+    """
+    progress = ImportProgress(processed=len(rows))
+    valid: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for number, row in rows:
+        try:
+            values = normalize_sale_row(user_id, row)
+        except ValueError as e:
+            progress.fail(number, str(e))
+            continue
+        key = (values["platform"], values["order_id"])
+        if key in valid:
+            progress.duplicates += 1
+        else:
+            valid[key] = values
+
+    if not valid:
+        return progress
+
+    for attempt in range(2):
+        existing = _existing_orders(db, user_id, valid)
+        new = [values for key, values in valid.items() if key not in existing]
+        if not new:
+            break
+        try:
+            with db.begin_nested():
+                db.execute(insert(SaleEvent), new)
+            break
+        except IntegrityError:
+            # Some of these orders were recorded meanwhile; dedupe against them again
+            if attempt:
+                raise
+
+    if new:
+        mark_changed(db, user_id)
+        apply_sale_changes(db, user_id, [(None, contribution_of(SaleEvent(**values))) for values in new])
+    progress.imported = len(new)
+    progress.duplicates += len(valid) - len(new)
+    return progress
+
+
+class _LineReader:
+    """Decodes a binary file's lines, tracking the offset just past the last line read."""
+
+    def __init__(self, file: BinaryIO):
+        self.file = file
+        self.offset = file.tell()
+
+    def __iter__(self) -> Iterator[str]:
+        for line in self.file:
+            self.offset += len(line)
+            yield line.decode("utf-8")
+
+
+def read_sales_csv(path: str, offset: int = 0) -> Iterator[Tuple[Dict[str, str], int]]:
+    """
+    Stream the rows of a sales CSV file with a header row.
+
+    Args:
+        path: CSV file
+        offset: Byte offset of the row to resume at (0 for the first row)
+
+    Yields:
+        (row, byte offset just past the row) pairs; blank lines are skipped
+    """
+    with open(path, "rb") as file:
+        lines = _LineReader(file)
+        reader = csv.reader(lines)
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [name.lstrip("\ufeff") for name in header]
+
+        if offset > lines.offset:
+            file.seek(offset)
+            lines = _LineReader(file)
+            reader = csv.reader(lines)
+
+        for record in reader:
+            if any(value.strip() for value in record):
+                yield dict(zip(header, record)), lines.offset
+
+
+async def create_import_job(db: Session, user_id: str, upload: UploadFile) -> SalesImportJob:
+    """
+    Stage an uploaded CSV file on disk and record an import job for it.
+
+    Raises:
+        ValueError: If the file exceeds ``settings.sales_import_max_bytes``
+    """
+    os.makedirs(settings.sales_import_dir, exist_ok=True)
+    path = os.path.join(settings.sales_import_dir, f"{uuid.uuid4()}.csv")
+
+    size = 0
+    try:
+        with open(path, "wb") as staged:
+            while data := await upload.read(UPLOAD_READ_SIZE):
+                size += len(data)
+                if size > settings.sales_import_max_bytes:
+                    raise ValueError(
+                        f"File exceeds the {settings.sales_import_max_bytes // (1024 * 1024)}MB import limit"
+                    )
+                staged.write(data)
+
+        job = SalesImportJob(
+            user_id=user_id,
+            file_path=path,
+            original_filename=upload.filename or "sales.csv",
+            file_size=size,
+            status="pending",
+            attempts=0
+        )
+        db.add(job)
+        db.commit()
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.remove(path)
+        raise
+
+    db.refresh(job)
+    return job
+
+
+class SalesImportProcessor:
+    """
+    Background service for running sales import jobs.
+
+    Jobs are claimed with row locks that skip rows other workers hold.
+    Progress is committed per chunk, which also serves as a heartbeat: a
+    processing job without progress for ``settings.sales_import_timeout``
+    is resumed by another worker.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.running = False
+        self.poll_interval = settings.sales_import_poll_interval
+        self.chunk_size = settings.sales_import_chunk_size
+        self.max_attempts = settings.sales_import_max_attempts
+        self._wakeup = asyncio.Event()
+
+    def notify(self):
+        """Wake the processor to pick up a newly created job."""
+        self._wakeup.set()
+
+    async def start(self):
+        """Start the import processor."""
+        if self.running:
+            self.logger.warning("Sales import processor is already running")
+            return
+
+        self.running = True
+        self.logger.info("Starting sales import processor")
+
+        try:
+            while self.running:
+                try:
+                    processed = await asyncio.to_thread(self._process_next)
+                except Exception as e:
+                    self.logger.error(f"Error in sales import cycle: {e}")
+                    processed = False
+
+                # Keep going while jobs are waiting, otherwise sleep until notified
+                if not processed:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+
+        except asyncio.CancelledError:
+            self.logger.info("Sales import processor cancelled")
+        finally:
+            self.running = False
+            self.logger.info("Sales import processor stopped")
+
+    async def stop(self):
+        """Stop the import processor; a job in progress is left to resume later."""
+        self.logger.info("Stopping sales import processor")
+        self.running = False
+        self._wakeup.set()
+
+    def _process_next(self) -> bool:
+        """Claim and run one job. Returns whether there was one."""
+        db = SessionLocal()
+        try:
+            job_id = self._claim_job(db)
+        finally:
+            db.close()
+
+        if job_id is None:
+            return False
+        self._run_job(job_id)
+        return True
+
+    def _claim_job(self, db: Session) -> Optional[str]:
+        """Mark the oldest pending (or stalled) job as processing and return its id."""
+        now = datetime.utcnow()
+        stalled_before = now - timedelta(seconds=settings.sales_import_timeout)
+
+        while True:
+            job = db.query(SalesImportJob).filter(
+                or_(
+                    SalesImportJob.status == "pending",
+                    and_(
+                        SalesImportJob.status == "processing",
+                        SalesImportJob.updated_at < stalled_before
+                    )
+                )
+            ).order_by(SalesImportJob.created_at).limit(1).with_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            if job.status == "pending" or (job.attempts or 0) < self.max_attempts:
+                break
+
+            # Stalled on its last attempt (it hung or took the worker down): give up on it
+            self.logger.error(f"Sales import {job.id} made no progress in {job.attempts} attempts; giving up")
+            self._fail(job, f"Import stalled after {job.attempts} attempts")
+            db.commit()
+            with suppress(FileNotFoundError):
+                os.remove(job.file_path)
+
+        job.status = "processing"
+        job.started_at = job.started_at or now
+        job.attempts = (job.attempts or 0) + 1
+        db.commit()
+        return job.id
+
+    def _run_job(self, job_id: str):
+        """Import a claimed job's remaining rows and record the outcome."""
+        db = SessionLocal()
+        finished = False
+
+        try:
+            job = db.get(SalesImportJob, job_id)
+            progress = ImportProgress(
+                processed=job.rows_processed,
+                imported=job.rows_imported,
+                duplicates=job.rows_duplicate,
+                failed=job.rows_failed,
+                errors=list(job.errors or [])
+            )
+            try:
+                chunk: List[ImportRow] = []
+                offset = job.byte_offset
+                for row, offset in read_sales_csv(job.file_path, job.byte_offset):
+                    chunk.append((progress.processed + len(chunk) + 1, row))
+                    if len(chunk) < self.chunk_size:
+                        continue
+                    self._commit_chunk(db, job, chunk, offset, progress)
+                    chunk = []
+                    if not self.running:
+                        # Shutting down: hand the job back to resume from the committed offset
+                        job.status = "pending"
+                        job.attempts -= 1
+                        db.commit()
+                        return
+                if chunk:
+                    self._commit_chunk(db, job, chunk, offset, progress)
+
+                job.status = "completed"
+                job.error_message = None
+                job.completed_at = datetime.utcnow()
+                db.commit()
+                finished = True
+                self.logger.info(
+                    f"Imported {progress.imported} sales from {job.original_filename} "
+                    f"({progress.duplicates} duplicates, {progress.failed} failed rows)"
+                )
+
+            except (OSError, csv.Error, UnicodeDecodeError) as e:
+                # An unreadable file will not import on retry
+                db.rollback()
+                self._fail(job, f"Could not read the CSV file: {e}")
+                db.commit()
+                finished = True
+
+            except Exception as e:
+                db.rollback()
+                self.logger.error(f"Sales import {job_id} attempt {job.attempts} failed: {e}")
+                if job.attempts >= self.max_attempts:
+                    self._fail(job, str(e))
+                    finished = True
+                else:
+                    job.status = "pending"
+                    job.error_message = str(e)
+                db.commit()
+
+        except Exception as e:
+            db.rollback()
+            self.logger.error(f"Failed to record outcome of sales import {job_id}: {e}")
+        finally:
+            if finished:
+                with suppress(FileNotFoundError):
+                    os.remove(job.file_path)
+            db.close()
+
+    def _commit_chunk(self, db: Session, job: SalesImportJob, chunk: List[ImportRow],
+                      offset: int, progress: ImportProgress):
+        """Import a chunk and commit it together with the job's new progress."""
+        chunk_progress = import_sales_chunk(db, job.user_id, chunk)
+        progress.add(chunk_progress)
+        job.byte_offset = offset
+        job.rows_processed = progress.processed
+        job.rows_imported = progress.imported
+        job.rows_duplicate = progress.duplicates
+        job.rows_failed = progress.failed
+        job.errors = list(progress.errors)
+        db.commit()
+
+    def _fail(self, job: SalesImportJob, error: str):
+        job.status = "failed"
+        job.error_message = error
+        job.completed_at = datetime.utcnow()
+
+
+# Global processor instance
+_sales_import_processor: Optional[SalesImportProcessor] = None
+
+
+def get_sales_import_processor() -> SalesImportProcessor:
+    """Get the global sales import processor instance."""
+    global _sales_import_processor
+    if _sales_import_processor is None:
+        _sales_import_processor = SalesImportProcessor()
+    return _sales_import_processor
@@ -0,0 +1,416 @@
+"""
+Sales rollup maintenance.
+
+Confirmed sales are summed into ``sales_daily_rollup`` rows keyed by user,
+UTC day, platform, product and currency, so dashboard queries read a few
+rows per day instead of every sale. Sale writes apply their change to the
+affected rows in the same transaction; a background repair job rebuilds
+days whose sales changed recently (catching writes that bypassed the
+service) and backfills users whose sales predate the rollup.
+"""
+
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, exists, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models import SaleEvent, SalesDailyRollup, User
+from .data_versions import mark_changed
+
+logger = logging.getLogger(__name__)
+
+# Sale changes older than the last repair by up to this much are repaired again,
+# covering transactions that were in flight during the previous pass
+REPAIR_MARGIN = timedelta(minutes=15)
+
+# Users backfilled per repair pass
+BACKFILL_BATCH_SIZE = 20
+
+CENTS = Decimal('0.01')
+
+
+class SaleContribution(NamedTuple):
+    """What one confirmed sale adds to its rollup row."""
+    day: date
+    platform: str
+    product_key: str
+    product_id: Optional[str]
+    product_title: Optional[str]
+    currency: str
+    revenue: Decimal
+    commission: Decimal
+    net_revenue: Decimal
+    quantity: int
+    commission_rate: Optional[Decimal]
+
+    @property
+    def bucket(self) -> Tuple[date, str, str, str]:
+        return self.day, self.platform, self.product_key, self.currency
+
+
+class RollupTotals:
+    """Accumulated sums for one rollup row."""
+
+    def __init__(self):
+        self.order_count = 0
+        self.quantity = 0
+        self.revenue = Decimal(0)
+        self.commission = Decimal(0)
+        self.net_revenue = Decimal(0)
+        self.commission_rate_sum = Decimal(0)
+        self.commission_rate_count = 0
+
+    def add(self, contribution: SaleContribution, sign: int = 1) -> None:
+        self.order_count += sign
+        self.quantity += sign * contribution.quantity
+        self.revenue += sign * contribution.revenue
+        self.commission += sign * contribution.commission
+        self.net_revenue += sign * contribution.net_revenue
+        if contribution.commission_rate is not None:
+            self.commission_rate_sum += sign * contribution.commission_rate
+            self.commission_rate_count += sign
+
+    def is_empty(self) -> bool:
+        return not any((
+            self.order_count, self.quantity, self.revenue, self.commission, self.net_revenue,
+            self.commission_rate_sum, self.commission_rate_count
+        ))
+
+
+def money(value) -> Decimal:
+    """
+    A summed money column as an exact Decimal.
+
+    SUM over no rows is NULL, and some drivers (SQLite) hand numerics back
+    as floats; both are normalised here so callers never do float math.
+    """
+    if value is None:
+        return Decimal(0)
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def average(total: Decimal, count: int) -> Decimal:
+    """Mean of a money total over count items, rounded to cents."""
+    if not count:
+        return Decimal(0)
+    return (total / count).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def product_key(product_id: Optional[str], product_title: Optional[str]) -> str:
+    """Key grouping sales the way product reports do: by product id and title."""
+    return f"{product_id or ''}|{product_title or ''}"
+
+
+def utc_day(moment: datetime) -> date:
+    """The UTC calendar day of a (naive UTC or aware) datetime."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.date()
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+def contribution_of(sale: Optional[SaleEvent]) -> Optional[SaleContribution]:
+    """
+    Describe what a sale contributes to the rollup.
+
+    Returns:
+        The contribution, or None for sales that are not counted (not confirmed)
+    """
+    if sale is None or sale.status != "confirmed" or sale.occurred_at is None:
+        return None
+    amount = Decimal(str(sale.amount or 0))
+    return SaleContribution(
+        day=utc_day(sale.occurred_at),
+        platform=sale.platform,
+        product_key=product_key(sale.product_id, sale.product_title),
+        product_id=sale.product_id,
+        product_title=sale.product_title,
+        currency=sale.currency or "INR",
+        revenue=amount,
+        commission=Decimal(str(sale.commission_amount or 0)),
+        net_revenue=Decimal(str(sale.net_amount)) if sale.net_amount is not None else amount,
+        quantity=sale.quantity or 0,
+        commission_rate=Decimal(str(sale.commission_rate)) if sale.commission_rate is not None else None
+    )
+
+
+def apply_sale_change(db: Session, user_id: str, before: Optional[SaleContribution],
+                      after: Optional[SaleContribution]) -> None:
+    """
+    Apply the change of one sale to the rollup.
+
+    Call this in the transaction that writes the sale, with its contribution
+    before and after the write (None for a new or deleted sale). The caller
+    must commit the session.
+    """
+    apply_sale_changes(db, user_id, [(before, after)])
+
+
+def apply_sale_changes(
+    db: Session,
+    user_id: str,
+    changes: Iterable[Tuple[Optional[SaleContribution], Optional[SaleContribution]]]
+) -> None:
+    """
+    Apply the changes of several of a user's sales to the rollup.
+
+    Deltas are merged per bucket first, so each rollup row is written once
+    however many of the sales fall in it. The sales must already be flushed
+    or inserted. The caller must commit the session.
+    """
+    changes = [(before, after) for before, after in changes if before != after]
+    if not changes:
+        return
+
+    mark_changed(db, user_id)
+    if not _has_rollup(db, user_id):
+        # First rollup write for this user: build it from all their sales, these
+        # included. Full rebuilds hold the user's row lock, so check again
+        # under it: a concurrent first write or backfill may have built it since
+        _lock_user(db, user_id)
+        if not _has_rollup(db, user_id):
+            db.flush()
+            rebuild_rollup(db, user_id)
+            return
+
+    deltas: Dict[Tuple, Tuple[SaleContribution, RollupTotals]] = {}
+    for before, after in changes:
+        for contribution, sign in ((before, -1), (after, 1)):
+            if contribution is not None:
+                deltas.setdefault(contribution.bucket, (contribution, RollupTotals()))[1].add(contribution, sign)
+
+    for contribution, delta in deltas.values():
+        if not delta.is_empty():
+            _apply_delta(db, user_id, contribution, delta)
+
+
+def _has_rollup(db: Session, user_id: str) -> bool:
+    return db.query(exists().where(SalesDailyRollup.user_id == user_id)).scalar()
+
+
+def _lock_user(db: Session, user_id: str) -> None:
+    """Serialise full rollup rebuilds of a user on their user row, until the transaction ends."""
+    db.query(User.id).filter(User.id == user_id).with_for_update().first()
+
+
+def _bucket_filter(user_id: str, contribution: SaleContribution):
+    return and_(
+        SalesDailyRollup.user_id == user_id,
+        SalesDailyRollup.day == contribution.day,
+        SalesDailyRollup.platform == contribution.platform,
+        SalesDailyRollup.product_key == contribution.product_key,
+        SalesDailyRollup.currency == contribution.currency
+    )
+
+
+def _apply_delta(db: Session, user_id: str, contribution: SaleContribution, delta: RollupTotals) -> None:
+    """Add a delta to a rollup row, creating it if needed."""
+    updated = db.query(SalesDailyRollup).filter(_bucket_filter(user_id, contribution)).update(
+        {
+            SalesDailyRollup.order_count: SalesDailyRollup.order_count + delta.order_count,
+            SalesDailyRollup.quantity: SalesDailyRollup.quantity + delta.quantity,
+            SalesDailyRollup.revenue: SalesDailyRollup.revenue + delta.revenue,
+            SalesDailyRollup.commission: SalesDailyRollup.commission + delta.commission,
+            SalesDailyRollup.net_revenue: SalesDailyRollup.net_revenue + delta.net_revenue,
+            SalesDailyRollup.commission_rate_sum: SalesDailyRollup.commission_rate_sum + delta.commission_rate_sum,
+            SalesDailyRollup.commission_rate_count: SalesDailyRollup.commission_rate_count + delta.commission_rate_count,
+            SalesDailyRollup.updated_at: func.now()
+        },
+        synchronize_session=False
+    )
+    if updated:
+        return
+
+    try:
+        with db.begin_nested():
+            db.add(_rollup_row(user_id, contribution, delta))
+    except IntegrityError:
+        # Another transaction created the row first
+        _apply_delta(db, user_id, contribution, delta)
+
+
+def _rollup_row(user_id: str, contribution: SaleContribution, totals: RollupTotals) -> SalesDailyRollup:
+    return SalesDailyRollup(
+        user_id=user_id,
+        day=contribution.day,
+        platform=contribution.platform,
+        product_key=contribution.product_key,
+        product_id=contribution.product_id,
+        product_title=contribution.product_title,
+        currency=contribution.currency,
+        order_count=totals.order_count,
+        quantity=totals.quantity,
+        revenue=totals.revenue,
+        commission=totals.commission,
+        net_revenue=totals.net_revenue,
+        commission_rate_sum=totals.commission_rate_sum,
+        commission_rate_count=totals.commission_rate_count
+    )
+
+
+def _day_ranges(days: Iterable[date]) -> List[Tuple[date, date]]:
+    """Group days into inclusive runs of consecutive days."""
+    ranges: List[Tuple[date, date]] = []
+    for day in sorted(set(days)):
+        if ranges and ranges[-1][1] + timedelta(days=1) == day:
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+
+def rebuild_rollup(db: Session, user_id: str, days: Optional[Iterable[date]] = None) -> int:
+    """
+    Recompute a user's rollup rows from their sales.
+
+    Full rebuilds (days=None) lock the user's row until the transaction
+    ends, so they cannot race a concurrent first write for the user.
+
+    Args:
+        db: Database session
+        user_id: User whose rollup to rebuild
+        days: Days to rebuild (all of the user's sales when None)
+
+    Returns:
+        Number of rollup rows written. The caller must commit the session.
+    """
+    if days is None:
+        _lock_user(db, user_id)
+    mark_changed(db, user_id)
+    rollup_query = db.query(SalesDailyRollup).filter(SalesDailyRollup.user_id == user_id)
+    sales_query = db.query(SaleEvent).filter(SaleEvent.user_id == user_id, SaleEvent.status == "confirmed")
+
+    if days is not None:
+        ranges = _day_ranges(days)
+        if not ranges:
+            return 0
+        rollup_query = rollup_query.filter(or_(*(
+            SalesDailyRollup.day.between(first, last) for first, last in ranges
+        )))
+        sales_query = sales_query.filter(or_(*(
+            and_(SaleEvent.occurred_at >= day_start(first), SaleEvent.occurred_at < day_start(last + timedelta(days=1)))
+            for first, last in ranges
+        )))
+
+    totals: Dict[Tuple, Tuple[SaleContribution, RollupTotals]] = {}
+    for sale in sales_query.yield_per(5000):
+        contribution = contribution_of(sale)
+        if contribution is not None:
+            totals.setdefault(contribution.bucket, (contribution, RollupTotals()))[1].add(contribution)
+
+    rollup_query.delete(synchronize_session=False)
+    db.add_all(_rollup_row(user_id, contribution, bucket_totals) for contribution, bucket_totals in totals.values())
+    return len(totals)
+
+
+class SalesRollupRepairService:
+    """
+    Periodically rebuilds rollup days whose sales changed and backfills
+    users without rollup rows.
+
+    Follows the same start/stop lifecycle as the other background processors.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.running = False
+        self.interval = settings.sales_rollup_repair_interval
+        self.last_repair_at: Optional[datetime] = None
+
+    def repair(self) -> int:
+        """
+        Run one repair pass.
+
+        Returns:
+            Number of users whose rollup was rebuilt (fully or in part)
+        """
+        started_at = datetime.utcnow()
+        since = (self.last_repair_at or started_at - timedelta(days=1)) - REPAIR_MARGIN
+
+        db = SessionLocal()
+        try:
+            backfill_users = [
+                row.user_id for row in db.query(SaleEvent.user_id).filter(
+                    SaleEvent.status == "confirmed",
+                    ~exists().where(SalesDailyRollup.user_id == SaleEvent.user_id)
+                ).distinct().limit(BACKFILL_BATCH_SIZE).all()
+            ]
+
+            changed_days: Dict[str, set] = {}
+            for user_id, occurred_at in db.query(SaleEvent.user_id, SaleEvent.occurred_at).filter(
+                SaleEvent.updated_at >= since
+            ).yield_per(5000):
+                if user_id not in backfill_users and occurred_at is not None:
+                    changed_days.setdefault(user_id, set()).add(utc_day(occurred_at))
+
+            for user_id in backfill_users:
+                self._rebuild(db, user_id, None)
+            for user_id, days in changed_days.items():
+                self._rebuild(db, user_id, days)
+
+            self.last_repair_at = started_at
+            return len(backfill_users) + len(changed_days)
+        finally:
+            db.close()
+
+    def _rebuild(self, db: Session, user_id: str, days: Optional[Iterable[date]]) -> None:
+        try:
+            rows = rebuild_rollup(db, user_id, days)
+            db.commit()
+            self.logger.debug(f"Rebuilt {rows} sales rollup rows for user {user_id}")
+        except Exception as e:
+            db.rollback()
+            self.logger.error(f"Failed to rebuild sales rollup for user {user_id}: {e}")
+
+    async def start(self):
+        """Start the repair loop."""
+        if self.running:
+            self.logger.warning("Sales rollup repair service is already running")
+            return
+
+        self.running = True
+        self.logger.info("Starting sales rollup repair service")
+
+        try:
+            while self.running:
+                try:
+                    repaired = await asyncio.to_thread(self.repair)
+                    if repaired:
+                        self.logger.info(f"Repaired sales rollups for {repaired} users")
+                except Exception as e:
+                    self.logger.error(f"Error repairing sales rollups: {e}")
+
+                await asyncio.sleep(self.interval)
+
+        except asyncio.CancelledError:
+            self.logger.info("Sales rollup repair service cancelled")
+        finally:
+            self.running = False
+            self.logger.info("Sales rollup repair service stopped")
+
+    async def stop(self):
+        """Stop the repair loop."""
+        self.logger.info("Stopping sales rollup repair service")
+        self.running = False
+
+
+# Global service instance
+_sales_rollup_repair_service: Optional[SalesRollupRepairService] = None
+
+
+def get_sales_rollup_repair_service() -> SalesRollupRepairService:
+    """Get the global sales rollup repair service instance."""
+    global _sales_rollup_repair_service
+    if _sales_rollup_repair_service is None:
+        _sales_rollup_repair_service = SalesRollupRepairService()
+    return _sales_rollup_repair_service
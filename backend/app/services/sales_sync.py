@@ -1,15 +1,113 @@
 """
 Sales synchronization service for fetching sales data from connected platforms.
+
+Syncs are incremental: each connection's SalesSyncState keeps a cursor
+(high-water mark) of the orders seen so far, and a sync pulls only orders
+changed since then, page by page (see sales_sync_sources). Each page is
+upserted in one transaction together with the advanced cursor. A user's
+platforms sync concurrently, with at most
+``settings.sales_sync_platform_concurrency`` connections of a platform
+syncing at once per process and requests paced to the platform's rate limit.
 """
 
-from typing import List, Dict, Any, Optional
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from ..models import User, PlatformConnection, SaleEvent
+from ..config import settings
+from ..database import SessionLocal
+from ..models import User, PlatformConnection, SaleEvent, SalesSyncState
 from ..schemas import SaleEventCreate
+from .data_versions import mark_changed
+from .engagement_metrics import RequestPacer
+from .platform_config import get_platform_config
+from .sales_import import ImportProgress, import_sales_chunk
+from .sales_rollups import apply_sale_changes, contribution_of
+from .sales_sync_sources import OrderSource, SyncPage, get_order_source
 from .sales_tracking import SalesTrackingService
 
+logger = logging.getLogger(__name__)
+
+# Columns a sync overwrites on orders it has seen before
+SYNCED_FIELDS = (
+    "amount", "currency", "product_title", "product_sku", "quantity",
+    "customer_location", "net_amount", "occurred_at", "status", "platform_data"
+)
+
+# Per-platform limits on connections syncing at once, created on first use
+_platform_limits: Dict[str, asyncio.Semaphore] = {}
+
+
+def _platform_limit(platform: str) -> asyncio.Semaphore:
+    limit = _platform_limits.get(platform)
+    if limit is None:
+        limit = _platform_limits[platform] = asyncio.Semaphore(settings.sales_sync_platform_concurrency)
+    return limit
+
+
+def upsert_synced_sales(db: Session, user_id: str, platform: str, sales: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """
+    Save a page of synced orders: insert new ones, update changed ones.
+
+    New orders are inserted with one statement; the rollup is updated with
+    the merged changes. The caller must commit the session.
+
+    Args:
+        db: Database session
+        user_id: User the orders belong to
+        platform: Platform of the orders
+        sales: SaleEvent column values of the orders (see sales_sync_sources)
+
+    Returns:
+        Tuple of (orders created, orders updated)
+    """
+    by_order = {values["order_id"]: values for values in sales}
+    if not by_order:
+        return 0, 0
+
+    for attempt in range(2):
+        existing = {
+            sale.order_id: sale for sale in db.query(SaleEvent).filter(
+                SaleEvent.user_id == user_id,
+                SaleEvent.platform == platform,
+                SaleEvent.order_id.in_(by_order)
+            )
+        }
+        new = [{**values, "user_id": user_id} for order_id, values in by_order.items() if order_id not in existing]
+        if not new:
+            break
+        try:
+            with db.begin_nested():
+                db.execute(insert(SaleEvent), new)
+            break
+        except IntegrityError:
+            # A concurrent sync recorded some of these orders; update them instead
+            if attempt:
+                raise
+
+    changes = [(None, contribution_of(SaleEvent(**values))) for values in new]
+    updated = 0
+    for order_id, sale in existing.items():
+        values = by_order[order_id]
+        if all(getattr(sale, name) == values[name] for name in SYNCED_FIELDS):
+            continue
+        before = contribution_of(sale)
+        for name in SYNCED_FIELDS:
+            setattr(sale, name, values[name])
+        sale.sync_status = "synced"
+        changes.append((before, contribution_of(sale)))
+        updated += 1
+
+    if new:
+        mark_changed(db, user_id)
+    apply_sale_changes(db, user_id, changes)
+    return len(new), updated
+
 
 class SalesSyncService:
     """Service for synchronizing sales data from connected platforms."""
@@ -19,20 +117,15 @@ class SalesSyncService:
         self.sales_service = SalesTrackingService(db)
     
     async def sync_all_platforms(self, user_id: str) -> Dict[str, Any]:
-        """Sync sales data from all connected platforms for a user."""
+        """Sync sales data from all connected platforms for a user, concurrently."""
         # Get all active platform connections for the user
         connections = self.db.query(PlatformConnection).filter(
             PlatformConnection.user_id == user_id,
             PlatformConnection.is_active == True
         ).all()
         
-        sync_results = []
-        total_synced = 0
-        
-        for connection in connections:
-            result = await self.sync_platform_sales(user_id, connection.platform)
-            sync_results.append(result)
-            total_synced += result.get("synced_count", 0)
+        sync_results = await asyncio.gather(*(self._sync_connection(connection) for connection in connections))
+        total_synced = sum(result.get("synced_count", 0) for result in sync_results)
         
         return {
             "user_id": user_id,
@@ -60,74 +153,101 @@ class SalesSyncService:
                 "last_sync": None
             }
         
-        # Platform-specific sync logic
-        if platform == "etsy":
-            return await self._sync_etsy_sales(user_id, connection)
-        elif platform == "facebook":
-            return await self._sync_facebook_sales(user_id, connection)
-        elif platform == "shopify":
-            return await self._sync_shopify_sales(user_id, connection)
-        elif platform == "pinterest":
-            return await self._sync_pinterest_sales(user_id, connection)
-        else:
-            return {
-                "platform": platform,
-                "status": "not_implemented",
-                "message": f"Sales sync not yet implemented for {platform}",
-                "synced_count": 0,
-                "last_sync": datetime.utcnow().isoformat()
-            }
+        return await self._sync_connection(connection)
     
-    async def _sync_etsy_sales(self, user_id: str, connection: PlatformConnection) -> Dict[str, Any]:
-        """Sync sales from Etsy API."""
-        # Placeholder implementation
-        # In a real implementation, this would:
-        # 1. Use the Etsy API to fetch recent orders
-        # 2. Check for new orders since last sync
-        # 3. Create SaleEvent records for new orders
-        # 4. Handle pagination and rate limiting
+    async def _sync_connection(self, connection: PlatformConnection) -> Dict[str, Any]:
+        """Pull a connection's orders changed since its cursor and save them page by page."""
+        platform = connection.platform
+        try:
+            source = get_order_source(connection)
+        except Exception as e:
+            return self._sync_result(platform, "failed", f"Could not set up {platform} sync: {e}")
+        if source is None:
+            return self._sync_result(platform, "not_implemented", f"Sales sync not yet implemented for {platform}")
         
-        return {
-            "platform": "etsy",
-            "status": "not_implemented",
-            "message": "Etsy sales sync not yet implemented",
-            "synced_count": 0,
-            "last_sync": datetime.utcnow().isoformat(),
-            "api_calls_made": 0,
-            "rate_limit_remaining": None
-        }
+        # Each connection saves through a session of its own, as syncs run concurrently
+        db = SessionLocal()
+        try:
+            state = self._sync_state(db, connection)
+            created = updated = pages = 0
+            try:
+                async with _platform_limit(platform), aclosing(self._paced_pages(source, state.cursor)) as paced:
+                    async for page in paced:
+                        page_created, page_updated = upsert_synced_sales(db, connection.user_id, platform, page.sales)
+                        created += page_created
+                        updated += page_updated
+                        pages += 1
+                        state.cursor = page.cursor
+                        state.synced_count = (state.synced_count or 0) + page_created + page_updated
+                        db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Sales sync of {platform} for user {connection.user_id} failed: {e}")
+                state.last_sync_at = datetime.utcnow()
+                state.last_status = "failed"
+                state.last_error = str(e)
+                db.commit()
+                # Pages saved before the failure are kept; the next sync resumes after them
+                return self._sync_result(
+                    platform, "failed", f"Sales sync failed: {e}", created + updated,
+                    created=created, updated=updated, pages_fetched=pages
+                )
+            
+            state.last_sync_at = datetime.utcnow()
+            state.last_status = "success"
+            state.last_error = None
+            db.commit()
+            return self._sync_result(
+                platform, "success", f"Synced {created} new and {updated} changed orders", created + updated,
+                created=created, updated=updated, pages_fetched=pages
+            )
+        finally:
+            db.close()
     
-    async def _sync_facebook_sales(self, user_id: str, connection: PlatformConnection) -> Dict[str, Any]:
-        """Sync sales from Facebook/Instagram API."""
-        # Placeholder implementation
-        return {
-            "platform": "facebook",
-            "status": "not_implemented",
-            "message": "Facebook sales sync not yet implemented",
-            "synced_count": 0,
-            "last_sync": datetime.utcnow().isoformat()
-        }
+    def _sync_state(self, db: Session, connection: PlatformConnection) -> SalesSyncState:
+        """A connection's sync state, created on its first sync."""
+        state = db.query(SalesSyncState).filter(SalesSyncState.connection_id == connection.id).first()
+        if state is not None:
+            return state
+        
+        state = SalesSyncState(
+            connection_id=connection.id,
+            user_id=connection.user_id,
+            platform=connection.platform,
+            synced_count=0
+        )
+        try:
+            with db.begin_nested():
+                db.add(state)
+        except IntegrityError:
+            # Another sync created it first
+            state = db.query(SalesSyncState).filter(SalesSyncState.connection_id == connection.id).one()
+        db.commit()
+        return state
     
-    async def _sync_shopify_sales(self, user_id: str, connection: PlatformConnection) -> Dict[str, Any]:
-        """Sync sales from Shopify API."""
-        # Placeholder implementation
-        return {
-            "platform": "shopify",
-            "status": "not_implemented",
-            "message": "Shopify sales sync not yet implemented",
-            "synced_count": 0,
-            "last_sync": datetime.utcnow().isoformat()
-        }
+    async def _paced_pages(self, source: OrderSource, cursor: Optional[Dict[str, Any]]):
+        """A source's pages, with requests spaced out to the platform's rate limit."""
+        config = get_platform_config(source.platform)
+        pacer = RequestPacer(config.rate_limit_per_minute if config else None)
+        # Closed on failure too, so the source's HTTP client is released promptly
+        async with aclosing(source.pages(cursor)) as pages:
+            while True:
+                await pacer.wait()
+                try:
+                    page: SyncPage = await pages.__anext__()
+                except StopAsyncIteration:
+                    return
+                yield page
     
-    async def _sync_pinterest_sales(self, user_id: str, connection: PlatformConnection) -> Dict[str, Any]:
-        """Sync sales from Pinterest API."""
-        # Placeholder implementation
+    def _sync_result(self, platform: str, status: str, message: str, synced_count: int = 0,
+                     **details: Any) -> Dict[str, Any]:
         return {
-            "platform": "pinterest",
-            "status": "not_implemented",
-            "message": "Pinterest sales sync not yet implemented",
-            "synced_count": 0,
-            "last_sync": datetime.utcnow().isoformat()
+            "platform": platform,
+            "status": status,
+            "message": message,
+            "synced_count": synced_count,
+            "last_sync": datetime.utcnow().isoformat(),
+            **details
         }
     
     async def get_sync_status(self, user_id: str) -> Dict[str, Any]:
@@ -136,18 +256,22 @@ class SalesSyncService:
             PlatformConnection.user_id == user_id,
             PlatformConnection.is_active == True
         ).all()
+        states = {
+            state.connection_id: state for state in self.db.query(SalesSyncState).filter(
+                SalesSyncState.user_id == user_id
+            )
+        }
         
         platform_status = []
         for connection in connections:
-            # Get last sync time from platform_data if available
-            last_sync = None
-            if connection.platform_data and "last_sales_sync" in connection.platform_data:
-                last_sync = connection.platform_data["last_sales_sync"]
-            
+            state = states.get(connection.id)
             platform_status.append({
                 "platform": connection.platform,
                 "connected": True,
-                "last_sync": last_sync,
+                "last_sync": state.last_sync_at.isoformat() if state and state.last_sync_at else None,
+                "last_sync_status": state.last_status if state else None,
+                "last_sync_error": state.last_error if state else None,
+                "synced_count": state.synced_count if state else 0,
                 "sync_enabled": True,  # Could be a user preference
                 "connection_status": "active" if connection.is_active else "inactive"
             })
@@ -202,30 +326,22 @@ class SalesSyncService:
             }
     
     async def bulk_import_sales(self, user_id: str, sales_data: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Import multiple sales from CSV or other bulk format."""
-        results = {
-            "total_processed": len(sales_data),
-            "successful": 0,
-            "failed": 0,
-            "errors": []
+        """
+        Import multiple sales from CSV or other bulk format.
+
+        Rows are validated and inserted in chunks (see sales_import), one
+        transaction per chunk; orders the user already has are skipped.
+        """
+        progress = ImportProgress()
+        rows = list(enumerate(sales_data, start=1))
+        for start in range(0, len(rows), settings.sales_import_chunk_size):
+            progress.add(import_sales_chunk(self.db, user_id, rows[start:start + settings.sales_import_chunk_size]))
+            self.db.commit()
+
+        return {
+            "total_processed": progress.processed,
+            "successful": progress.imported,
+            "duplicates": progress.duplicates,
+            "failed": progress.failed,
+            "errors": progress.errors
         }
-        
-        for i, sale_data in enumerate(sales_data):
-            try:
-                result = await self.create_manual_sale(user_id, sale_data)
-                if result["success"]:
-                    results["successful"] += 1
-                else:
-                    results["failed"] += 1
-                    results["errors"].append({
-                        "row": i + 1,
-                        "error": result["error"]
-                    })
-            except Exception as e:
-                results["failed"] += 1
-                results["errors"].append({
-                    "row": i + 1,
-                    "error": f"Unexpected error: {str(e)}"
-                })
-        
-        return results
\ No newline at end of file
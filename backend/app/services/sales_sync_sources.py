@@ -0,0 +1,200 @@
+"""
+Order sources for incremental sales sync.
+
+Each source pages through a connection's orders changed since a cursor
+(the high-water mark kept in SalesSyncState), least recently changed
+first, and turns them into SaleEvent column values. The cursor yielded
+with a page covers every order up to and including that page, so a sync
+that stops midway resumes after its last saved page. Cursors are inclusive:
+the last order seen is fetched again by the next sync and saving it is a
+no-op, which keeps a sync with no new orders to one request.
+"""
+
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional
+
+from ..config import settings
+from ..models import PlatformConnection
+from .etsy_integration import EtsyIntegration
+from .oauth_service import get_oauth_service
+from .platform_integration import Platform
+from .shopify_integration import ShopifyIntegration, ShopifyOrderData
+
+# sale_source of synced sales
+SYNC_SALE_SOURCE = "platform_sync"
+
+
+class SyncPage(NamedTuple):
+    """One page of changed orders and the cursor to resume after it."""
+    sales: List[Dict[str, Any]]  # SaleEvent column values, without user_id
+    cursor: Dict[str, Any]
+
+
+class OrderSource(ABC):
+    """Pages through a connection's orders changed since a cursor."""
+
+    platform: Platform
+
+    @abstractmethod
+    def pages(self, cursor: Optional[Dict[str, Any]]) -> AsyncIterator[SyncPage]:
+        """
+        Yield pages of orders changed since the cursor (None for a first sync,
+        which covers the last ``settings.sales_sync_initial_days`` days).
+        """
+
+
+def _utc_naive(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO 8601 timestamp into a naive UTC datetime."""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _location(*parts: Optional[str]) -> Optional[str]:
+    return ", ".join(part for part in parts if part) or None
+
+
+def shopify_status(order: ShopifyOrderData) -> str:
+    """SaleEvent status of a Shopify order."""
+    if order.cancelled_at or order.financial_status == "voided":
+        return "cancelled"
+    if order.financial_status == "refunded":
+        return "refunded"
+    if order.financial_status in ("paid", "partially_paid", "partially_refunded"):
+        return "confirmed"
+    return "pending"
+
+
+def shopify_sale_values(order: ShopifyOrderData) -> Dict[str, Any]:
+    """
+    SaleEvent column values for a Shopify order.
+
+    Sales are recorded per order; multi-item orders take the first line
+    item's title and SKU.
+    """
+    items = order.line_items or []
+    address = (order.customer or {}).get("default_address") or {}
+    amount = Decimal(str(order.total_price or 0))
+    return {
+        "platform": Platform.SHOPIFY.value,
+        "order_id": str(order.order_id),
+        "amount": amount,
+        "currency": order.currency or "INR",
+        "product_title": items[0].get("title") if items else None,
+        "product_sku": items[0].get("sku") if items else None,
+        "quantity": sum(item.get("quantity") or 0 for item in items) or 1,
+        "customer_location": _location(address.get("city"), address.get("province"), address.get("country")),
+        "net_amount": amount,
+        "occurred_at": _utc_naive(order.processed_at) or _utc_naive(order.created_at),
+        "status": shopify_status(order),
+        "sale_source": SYNC_SALE_SOURCE,
+        "sync_status": "synced",
+        "platform_data": {
+            "order_name": order.name,
+            "financial_status": order.financial_status,
+            "fulfillment_status": order.fulfillment_status
+        }
+    }
+
+
+def etsy_status(receipt: Dict[str, Any]) -> str:
+    """SaleEvent status of an Etsy receipt."""
+    status = (receipt.get("status") or "").lower()
+    if status == "canceled":
+        return "cancelled"
+    if status == "fully refunded":
+        return "refunded"
+    if status in ("paid", "completed", "partially refunded") or receipt.get("is_paid"):
+        return "confirmed"
+    return "pending"
+
+
+def etsy_sale_values(receipt: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    SaleEvent column values for an Etsy receipt.
+
+    Sales are recorded per receipt; multi-item receipts take the first
+    transaction's title and SKU.
+    """
+    total = receipt.get("grandtotal") or {}
+    amount = Decimal(str(total.get("amount") or 0)) / Decimal(str(total.get("divisor") or 100))
+    transactions = receipt.get("transactions") or []
+    return {
+        "platform": Platform.ETSY.value,
+        "order_id": str(receipt["receipt_id"]),
+        "amount": amount,
+        "currency": total.get("currency_code") or "INR",
+        "product_title": transactions[0].get("title") if transactions else None,
+        "product_sku": transactions[0].get("sku") if transactions else None,
+        "quantity": sum(transaction.get("quantity") or 0 for transaction in transactions) or 1,
+        "customer_location": _location(receipt.get("city"), receipt.get("state"), receipt.get("country_iso")),
+        "net_amount": amount,
+        "occurred_at": datetime.utcfromtimestamp(receipt["create_timestamp"]),
+        "status": etsy_status(receipt),
+        "sale_source": SYNC_SALE_SOURCE,
+        "sync_status": "synced",
+        "platform_data": {
+            "receipt_status": receipt.get("status"),
+            "is_shipped": receipt.get("is_shipped")
+        }
+    }
+
+
+class ShopifyOrderSource(OrderSource):
+    """Shopify orders, by updated_at."""
+
+    platform = Platform.SHOPIFY
+
+    def __init__(self, connection: PlatformConnection):
+        self.integration = ShopifyIntegration(get_oauth_service(), connection)
+
+    async def pages(self, cursor: Optional[Dict[str, Any]]) -> AsyncIterator[SyncPage]:
+        since = (cursor or {}).get("updated_at")
+        if not since:
+            since = (datetime.utcnow() - timedelta(days=settings.sales_sync_initial_days)).isoformat() + "Z"
+
+        async for orders in self.integration.iter_orders_updated_since(since):
+            # Pages are in updated_at order, so the last order is the newest change
+            if orders and orders[-1].updated_at:
+                since = orders[-1].updated_at
+            yield SyncPage([shopify_sale_values(order) for order in orders], {"updated_at": since})
+
+
+class EtsyReceiptSource(OrderSource):
+    """Etsy shop receipts, by updated_timestamp."""
+
+    platform = Platform.ETSY
+
+    def __init__(self, connection: PlatformConnection):
+        self.integration = EtsyIntegration(get_oauth_service(), connection)
+
+    async def pages(self, cursor: Optional[Dict[str, Any]]) -> AsyncIterator[SyncPage]:
+        cursor = cursor or {}
+        # The shop id is kept in the cursor so later syncs skip the shop lookup
+        shop_id = cursor.get("shop_id") or await self.integration.get_shop_id()
+        since = cursor.get("updated_timestamp") or int(time.time()) - settings.sales_sync_initial_days * 86400
+
+        async for receipts in self.integration.iter_receipts_modified_since(shop_id, since):
+            since = max([since] + [receipt.get("updated_timestamp") or 0 for receipt in receipts])
+            yield SyncPage(
+                [etsy_sale_values(receipt) for receipt in receipts],
+                {"shop_id": shop_id, "updated_timestamp": since}
+            )
+
+
+ORDER_SOURCES = {
+    Platform.SHOPIFY.value: ShopifyOrderSource,
+    Platform.ETSY.value: EtsyReceiptSource
+}
+
+
+def get_order_source(connection: PlatformConnection) -> Optional[OrderSource]:
+    """The order source for a connection, or None when its platform has no order API."""
+    source_class = ORDER_SOURCES.get(connection.platform)
+    return source_class(connection) if source_class else None
@@ -1,20 +1,75 @@
 """
 Sales tracking service for managing sale events and analytics.
+
+Analytics read the per-day ``sales_daily_rollup`` table, which sale writes
+keep current (see sales_rollups), and cover whole UTC days.
 """
 
-from typing import List, Optional, Dict, Any
+from typing import Iterator, List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from decimal import Decimal
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, or_, desc
 from sqlalchemy.sql import extract
 
-from ..models import SaleEvent, Product, User, Post
+from ..models import SaleEvent, SalesDailyRollup, Product, User, Post
+from ..pagination import keyset_page, list_total, newest_first
 from ..schemas import (
     SaleEventCreate, SaleEventUpdate, SaleEventResponse,
     SalesMetrics, PlatformSalesBreakdown, SalesDashboardData,
     SalesReportRequest
 )
+from .sales_rollups import apply_sale_change, average, contribution_of, day_start, money, utc_day
+
+# Rows fetched per round trip when streaming report details
+REPORT_STREAM_BATCH_SIZE = 1000
+
+
+def sale_event_values(user_id: str, sale_data: SaleEventCreate) -> Dict[str, Any]:
+    """SaleEvent column values for a new sale, with net amount and commission filled in."""
+    # Calculate net amount if not provided
+    net_amount = sale_data.net_amount
+    if net_amount is None and sale_data.commission_amount is not None:
+        net_amount = sale_data.amount - sale_data.commission_amount
+    elif net_amount is None and sale_data.commission_rate is not None:
+        commission = sale_data.amount * sale_data.commission_rate
+        net_amount = sale_data.amount - commission
+    else:
+        net_amount = sale_data.amount
+
+    # Calculate commission amount if not provided but rate is
+    commission_amount = sale_data.commission_amount
+    if commission_amount is None and sale_data.commission_rate is not None:
+        commission_amount = sale_data.amount * sale_data.commission_rate
+
+    return dict(
+        user_id=user_id,
+        product_id=sale_data.product_id,
+        platform=sale_data.platform,
+        order_id=sale_data.order_id,
+        amount=Decimal(str(sale_data.amount)),
+        currency=sale_data.currency,
+        product_title=sale_data.product_title,
+        product_sku=sale_data.product_sku,
+        quantity=sale_data.quantity,
+        customer_location=sale_data.customer_location,
+        customer_type=sale_data.customer_type,
+        sale_source=sale_data.sale_source,
+        commission_rate=Decimal(str(sale_data.commission_rate)) if sale_data.commission_rate else None,
+        commission_amount=Decimal(str(commission_amount)) if commission_amount else None,
+        net_amount=Decimal(str(net_amount)),
+        post_id=sale_data.post_id,
+        referral_source=sale_data.referral_source,
+        campaign_id=sale_data.campaign_id,
+        occurred_at=sale_data.occurred_at,
+        status=sale_data.status,
+        platform_data=sale_data.platform_data
+    )
+
+
+class DuplicateSaleError(ValueError):
+    """The user already has a sale for this platform order."""
 
 
 class SalesTrackingService:
@@ -23,49 +78,35 @@ class SalesTrackingService:
     def __init__(self, db: Session):
         self.db = db
     
+    def _has_order(self, user_id: str, platform: str, order_id: str) -> bool:
+        return self.db.query(SaleEvent.id).filter(
+            SaleEvent.user_id == user_id,
+            SaleEvent.platform == platform,
+            SaleEvent.order_id == order_id
+        ).first() is not None
+    
     async def create_sale_event(self, user_id: str, sale_data: SaleEventCreate) -> SaleEventResponse:
-        """Create a new sale event."""
-        # Calculate net amount if not provided
-        net_amount = sale_data.net_amount
-        if net_amount is None and sale_data.commission_amount is not None:
-            net_amount = sale_data.amount - sale_data.commission_amount
-        elif net_amount is None and sale_data.commission_rate is not None:
-            commission = sale_data.amount * sale_data.commission_rate
-            net_amount = sale_data.amount - commission
-        else:
-            net_amount = sale_data.amount
-        
-        # Calculate commission amount if not provided but rate is
-        commission_amount = sale_data.commission_amount
-        if commission_amount is None and sale_data.commission_rate is not None:
-            commission_amount = sale_data.amount * sale_data.commission_rate
-        
-        sale_event = SaleEvent(
-            user_id=user_id,
-            product_id=sale_data.product_id,
-            platform=sale_data.platform,
-            order_id=sale_data.order_id,
-            amount=Decimal(str(sale_data.amount)),
-            currency=sale_data.currency,
-            product_title=sale_data.product_title,
-            product_sku=sale_data.product_sku,
-            quantity=sale_data.quantity,
-            customer_location=sale_data.customer_location,
-            customer_type=sale_data.customer_type,
-            sale_source=sale_data.sale_source,
-            commission_rate=Decimal(str(sale_data.commission_rate)) if sale_data.commission_rate else None,
-            commission_amount=Decimal(str(commission_amount)) if commission_amount else None,
-            net_amount=Decimal(str(net_amount)),
-            post_id=sale_data.post_id,
-            referral_source=sale_data.referral_source,
-            campaign_id=sale_data.campaign_id,
-            occurred_at=sale_data.occurred_at,
-            status=sale_data.status,
-            platform_data=sale_data.platform_data
-        )
+        """
+        Create a new sale event.
         
+        Raises:
+            DuplicateSaleError: If the user already has a sale for the platform order
+        """
+        values = sale_event_values(user_id, sale_data)
+        if self._has_order(user_id, values["platform"], values["order_id"]):
+            raise DuplicateSaleError(f"Sale for {values['platform']} order {values['order_id']} already exists")
+        
+        sale_event = SaleEvent(**values)
         self.db.add(sale_event)
-        self.db.commit()
+        try:
+            apply_sale_change(self.db, user_id, None, contribution_of(sale_event))
+            self.db.commit()
+        except IntegrityError:
+            self.db.rollback()
+            # The same order was recorded meanwhile
+            if self._has_order(user_id, values["platform"], values["order_id"]):
+                raise DuplicateSaleError(f"Sale for {values['platform']} order {values['order_id']} already exists")
+            raise
         self.db.refresh(sale_event)
         
         return SaleEventResponse.model_validate(sale_event)
@@ -90,6 +131,8 @@ class SalesTrackingService:
         if not sale_event:
             return None
         
+        before = contribution_of(sale_event)
+        
         # Update fields
         for field, value in update_data.model_dump(exclude_unset=True).items():
             if field in ['amount', 'commission_rate', 'commission_amount', 'net_amount'] and value is not None:
@@ -114,6 +157,7 @@ class SalesTrackingService:
             elif sale_event.commission_amount:
                 sale_event.net_amount = sale_event.amount - sale_event.commission_amount
         
+        apply_sale_change(self.db, user_id, before, contribution_of(sale_event))
         self.db.commit()
         self.db.refresh(sale_event)
         
@@ -128,7 +172,9 @@ class SalesTrackingService:
         if not sale_event:
             return False
         
+        before = contribution_of(sale_event)
         self.db.delete(sale_event)
+        apply_sale_change(self.db, user_id, before, None)
         self.db.commit()
         return True
     
@@ -140,9 +186,20 @@ class SalesTrackingService:
         platform: Optional[str] = None,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
-        status: Optional[str] = None
+        status: Optional[str] = None,
+        cursor: Optional[str] = None,
+        exact_total: bool = False
     ) -> Dict[str, Any]:
-        """Get paginated list of sale events with filters."""
+        """
+        Get paginated list of sale events with filters, newest first.
+        
+        Pages are keyed on (occurred_at, id); pass the previous page's
+        next_cursor to continue. The total is estimated for large lists
+        unless exact_total is set (see pagination.list_total).
+        
+        Raises:
+            InvalidCursor: If cursor is malformed
+        """
         query = self.db.query(SaleEvent).filter(SaleEvent.user_id == user_id)
         
         # Apply filters
@@ -155,19 +212,93 @@ class SalesTrackingService:
         if status:
             query = query.filter(SaleEvent.status == status)
         
-        # Get total count
-        total = query.count()
-        
-        # Get paginated results
-        sales = query.order_by(desc(SaleEvent.occurred_at)).offset(skip).limit(limit).all()
+        total, total_exact = list_total(query, exact_total)
+        sales, next_cursor = keyset_page(
+            query, newest_first(SaleEvent.occurred_at, SaleEvent.id), limit, cursor, offset=skip
+        )
         
         return {
             "sales": [SaleEventResponse.model_validate(sale) for sale in sales],
             "total": total,
+            "total_exact": total_exact,
             "skip": skip,
-            "limit": limit
+            "limit": limit,
+            "next_cursor": next_cursor
         }
     
+    def _report_sales_query(self, user_id: str, start_date: datetime, end_date: datetime,
+                            platforms: Optional[List[str]] = None):
+        """Query a report's detailed sales (start_date to end_date, inclusive)."""
+        query = self.db.query(SaleEvent).filter(
+            SaleEvent.user_id == user_id,
+            SaleEvent.occurred_at >= start_date,
+            SaleEvent.occurred_at <= end_date
+        )
+        if platforms:
+            query = query.filter(SaleEvent.platform.in_(platforms))
+        return query
+    
+    async def get_report_sales_page(
+        self,
+        user_id: str,
+        start_date: datetime,
+        end_date: datetime,
+        platforms: Optional[List[str]] = None,
+        limit: int = 1000,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Get one page of a report's detailed sales, newest first.
+        
+        Pages are keyed on (occurred_at, id), so later pages cost the same
+        as the first.
+        
+        Returns:
+            Dictionary with the page's sales and the cursor of the next page
+            (None on the last page)
+        
+        Raises:
+            InvalidCursor: If cursor is malformed
+        """
+        sales, next_cursor = keyset_page(
+            self._report_sales_query(user_id, start_date, end_date, platforms),
+            newest_first(SaleEvent.occurred_at, SaleEvent.id), limit, cursor
+        )
+        return {
+            "sales": [SaleEventResponse.model_validate(sale) for sale in sales],
+            "next_cursor": next_cursor
+        }
+    
+    def iter_report_sales(
+        self,
+        user_id: str,
+        start_date: datetime,
+        end_date: datetime,
+        platforms: Optional[List[str]] = None
+    ) -> Iterator[SaleEvent]:
+        """
+        Stream a report's detailed sales, newest first.
+        
+        Rows come through a server-side cursor in batches of
+        REPORT_STREAM_BATCH_SIZE, so memory use does not grow with the
+        number of sales.
+        """
+        query = self._report_sales_query(user_id, start_date, end_date, platforms).order_by(
+            desc(SaleEvent.occurred_at), desc(SaleEvent.id)
+        )
+        yield from query.yield_per(REPORT_STREAM_BATCH_SIZE)
+    
+    def _rollup_query(self, user_id: str, start_date: datetime, end_date: datetime, currency: str, *columns):
+        """Query rollup rows for the days from start_date to end_date (inclusive)."""
+        return self.db.query(*columns).filter(
+            and_(
+                SalesDailyRollup.user_id == user_id,
+                SalesDailyRollup.currency == currency,
+                SalesDailyRollup.day >= utc_day(start_date),
+                SalesDailyRollup.day <= utc_day(end_date)
+            )
+        )
+    
     async def get_sales_metrics(
         self, 
         user_id: str, 
@@ -177,22 +308,21 @@ class SalesTrackingService:
         currency: str = "INR"
     ) -> SalesMetrics:
         """Calculate sales metrics for a given period."""
-        query = self.db.query(SaleEvent).filter(
-            and_(
-                SaleEvent.user_id == user_id,
-                SaleEvent.occurred_at >= start_date,
-                SaleEvent.occurred_at <= end_date,
-                SaleEvent.status == "confirmed",
-                SaleEvent.currency == currency
-            )
+        query = self._rollup_query(
+            user_id, start_date, end_date, currency,
+            func.sum(SalesDailyRollup.revenue).label('total_revenue'),
+            func.sum(SalesDailyRollup.order_count).label('total_orders'),
+            func.sum(SalesDailyRollup.commission).label('total_commission'),
+            func.sum(SalesDailyRollup.net_revenue).label('net_revenue')
         )
         
         if platforms:
-            query = query.filter(SaleEvent.platform.in_(platforms))
+            query = query.filter(SalesDailyRollup.platform.in_(platforms))
         
-        sales = query.all()
+        totals = query.first()
+        total_orders = int(totals.total_orders or 0) if totals else 0
         
-        if not sales:
+        if not total_orders:
             return SalesMetrics(
                 total_revenue=0.0,
                 total_orders=0,
@@ -204,18 +334,15 @@ class SalesTrackingService:
                 period_end=end_date
             )
         
-        total_revenue = sum(float(sale.amount) for sale in sales)
-        total_orders = len(sales)
-        average_order_value = total_revenue / total_orders if total_orders > 0 else 0.0
-        total_commission = sum(float(sale.commission_amount or 0) for sale in sales)
-        net_revenue = sum(float(sale.net_amount or sale.amount) for sale in sales)
+        # Exact Decimal sums; floats only at the schema boundary
+        total_revenue = money(totals.total_revenue)
         
         return SalesMetrics(
-            total_revenue=total_revenue,
+            total_revenue=float(total_revenue),
             total_orders=total_orders,
-            average_order_value=average_order_value,
-            total_commission=total_commission,
-            net_revenue=net_revenue,
+            average_order_value=float(average(total_revenue, total_orders)),
+            total_commission=float(money(totals.total_commission)),
+            net_revenue=float(money(totals.net_revenue)),
             currency=currency,
             period_start=start_date,
             period_end=end_date
@@ -229,62 +356,53 @@ class SalesTrackingService:
         currency: str = "INR"
     ) -> List[PlatformSalesBreakdown]:
         """Get sales breakdown by platform."""
-        query = self.db.query(
-            SaleEvent.platform,
-            func.sum(SaleEvent.amount).label('total_revenue'),
-            func.count(SaleEvent.id).label('total_orders'),
-            func.avg(SaleEvent.amount).label('avg_order_value'),
-            func.avg(SaleEvent.commission_rate).label('avg_commission_rate'),
-            func.sum(SaleEvent.commission_amount).label('total_commission'),
-            func.sum(SaleEvent.net_amount).label('net_revenue')
+        results = self._rollup_query(
+            user_id, start_date, end_date, currency,
+            SalesDailyRollup.platform,
+            func.sum(SalesDailyRollup.revenue).label('total_revenue'),
+            func.sum(SalesDailyRollup.order_count).label('total_orders'),
+            func.sum(SalesDailyRollup.commission_rate_sum).label('commission_rate_sum'),
+            func.sum(SalesDailyRollup.commission_rate_count).label('commission_rate_count'),
+            func.sum(SalesDailyRollup.commission).label('total_commission'),
+            func.sum(SalesDailyRollup.net_revenue).label('net_revenue')
+        ).group_by(SalesDailyRollup.platform).all()
+        
+        # Top products of every platform in one query
+        product_rows = self._rollup_query(
+            user_id, start_date, end_date, currency,
+            SalesDailyRollup.platform,
+            SalesDailyRollup.product_title,
+            func.sum(SalesDailyRollup.revenue).label('revenue'),
+            func.sum(SalesDailyRollup.order_count).label('orders')
         ).filter(
-            and_(
-                SaleEvent.user_id == user_id,
-                SaleEvent.occurred_at >= start_date,
-                SaleEvent.occurred_at <= end_date,
-                SaleEvent.status == "confirmed",
-                SaleEvent.currency == currency
-            )
-        ).group_by(SaleEvent.platform)
-        
-        results = query.all()
+            SalesDailyRollup.product_title.isnot(None)
+        ).group_by(SalesDailyRollup.platform, SalesDailyRollup.product_title).all()
+        
+        top_products_by_platform: Dict[str, List] = {}
+        for product in sorted(product_rows, key=lambda row: money(row.revenue), reverse=True):
+            platform_products = top_products_by_platform.setdefault(product.platform, [])
+            if len(platform_products) < 5:
+                platform_products.append({
+                    "title": product.product_title,
+                    "revenue": float(money(product.revenue)),
+                    "orders": int(product.orders)
+                })
         
         breakdown = []
         for result in results:
-            # Get top products for this platform
-            top_products_query = self.db.query(
-                SaleEvent.product_title,
-                func.sum(SaleEvent.amount).label('revenue'),
-                func.count(SaleEvent.id).label('orders')
-            ).filter(
-                and_(
-                    SaleEvent.user_id == user_id,
-                    SaleEvent.platform == result.platform,
-                    SaleEvent.occurred_at >= start_date,
-                    SaleEvent.occurred_at <= end_date,
-                    SaleEvent.status == "confirmed",
-                    SaleEvent.product_title.isnot(None)
-                )
-            ).group_by(SaleEvent.product_title).order_by(desc('revenue')).limit(5)
-            
-            top_products = [
-                {
-                    "title": product.product_title,
-                    "revenue": float(product.revenue),
-                    "orders": product.orders
-                }
-                for product in top_products_query.all()
-            ]
+            total_orders = int(result.total_orders or 0)
+            total_revenue = money(result.total_revenue)
+            rate_count = int(result.commission_rate_count or 0)
             
             breakdown.append(PlatformSalesBreakdown(
                 platform=result.platform,
-                total_revenue=float(result.total_revenue or 0),
-                total_orders=result.total_orders or 0,
-                average_order_value=float(result.avg_order_value or 0),
-                commission_rate=float(result.avg_commission_rate or 0) if result.avg_commission_rate else None,
-                total_commission=float(result.total_commission or 0),
-                net_revenue=float(result.net_revenue or 0),
-                top_products=top_products
+                total_revenue=float(total_revenue),
+                total_orders=total_orders,
+                average_order_value=float(average(total_revenue, total_orders)),
+                commission_rate=float(money(result.commission_rate_sum) / rate_count) if rate_count else None,
+                total_commission=float(money(result.total_commission)),
+                net_revenue=float(money(result.net_revenue)),
+                top_products=top_products_by_platform.get(result.platform, [])
             ))
         
         return breakdown
@@ -298,33 +416,25 @@ class SalesTrackingService:
         currency: str = "INR"
     ) -> List[Dict[str, Any]]:
         """Get top-performing products by revenue."""
-        query = self.db.query(
-            SaleEvent.product_id,
-            SaleEvent.product_title,
-            func.sum(SaleEvent.amount).label('total_revenue'),
-            func.count(SaleEvent.id).label('total_orders'),
-            func.sum(SaleEvent.quantity).label('total_quantity'),
-            func.avg(SaleEvent.amount).label('avg_order_value')
-        ).filter(
-            and_(
-                SaleEvent.user_id == user_id,
-                SaleEvent.occurred_at >= start_date,
-                SaleEvent.occurred_at <= end_date,
-                SaleEvent.status == "confirmed",
-                SaleEvent.currency == currency
-            )
-        ).group_by(SaleEvent.product_id, SaleEvent.product_title).order_by(desc('total_revenue')).limit(limit)
-        
-        results = query.all()
+        results = self._rollup_query(
+            user_id, start_date, end_date, currency,
+            SalesDailyRollup.product_id,
+            SalesDailyRollup.product_title,
+            func.sum(SalesDailyRollup.revenue).label('total_revenue'),
+            func.sum(SalesDailyRollup.order_count).label('total_orders'),
+            func.sum(SalesDailyRollup.quantity).label('total_quantity')
+        ).group_by(
+            SalesDailyRollup.product_key, SalesDailyRollup.product_id, SalesDailyRollup.product_title
+        ).order_by(desc('total_revenue')).limit(limit).all()
         
         return [
             {
                 "product_id": result.product_id,
                 "product_title": result.product_title,
-                "total_revenue": float(result.total_revenue),
-                "total_orders": result.total_orders,
-                "total_quantity": result.total_quantity,
-                "average_order_value": float(result.avg_order_value)
+                "total_revenue": float(money(result.total_revenue)),
+                "total_orders": int(result.total_orders),
+                "total_quantity": int(result.total_quantity or 0),
+                "average_order_value": float(average(money(result.total_revenue), int(result.total_orders or 0)))
             }
             for result in results
         ]
@@ -337,51 +447,35 @@ class SalesTrackingService:
         group_by: str = "day",
         currency: str = "INR"
     ) -> List[Dict[str, Any]]:
-        """Get sales trend data for charts."""
-        # Use SQLite-compatible date functions
-        if group_by == "day":
-            date_part = func.date(SaleEvent.occurred_at)
-        elif group_by == "week":
-            # SQLite doesn't have week grouping, use day and group manually
-            date_part = func.date(SaleEvent.occurred_at)
-        elif group_by == "month":
-            date_part = func.strftime('%Y-%m', SaleEvent.occurred_at)
-        else:
-            date_part = func.date(SaleEvent.occurred_at)
-        
-        query = self.db.query(
-            date_part.label('period'),
-            func.sum(SaleEvent.amount).label('revenue'),
-            func.count(SaleEvent.id).label('orders')
-        ).filter(
-            and_(
-                SaleEvent.user_id == user_id,
-                SaleEvent.occurred_at >= start_date,
-                SaleEvent.occurred_at <= end_date,
-                SaleEvent.status == "confirmed",
-                SaleEvent.currency == currency
-            )
-        ).group_by('period').order_by('period')
-        
-        results = query.all()
-        
-        trend_data = []
-        for result in results:
-            # Convert period to ISO format
-            if group_by == "month":
-                # For month format like '2025-09', convert to first day of month
-                period_str = f"{result.period}-01T00:00:00"
+        """Get sales trend data for charts, by day, week (starting Monday) or month."""
+        daily = self._rollup_query(
+            user_id, start_date, end_date, currency,
+            SalesDailyRollup.day,
+            func.sum(SalesDailyRollup.revenue).label('revenue'),
+            func.sum(SalesDailyRollup.order_count).label('orders')
+        ).group_by(SalesDailyRollup.day).order_by(SalesDailyRollup.day).all()
+        
+        periods: Dict[Any, Dict[str, Any]] = {}
+        for result in daily:
+            if group_by == "week":
+                period = result.day - timedelta(days=result.day.weekday())
+            elif group_by == "month":
+                period = result.day.replace(day=1)
             else:
-                # For date format, add time component
-                period_str = f"{result.period}T00:00:00"
+                period = result.day
             
-            trend_data.append({
-                "period": period_str,
-                "revenue": float(result.revenue),
-                "orders": result.orders
-            })
+            totals = periods.setdefault(period, {"revenue": Decimal(0), "orders": 0})
+            totals["revenue"] += money(result.revenue)
+            totals["orders"] += int(result.orders or 0)
         
-        return trend_data
+        return [
+            {
+                "period": day_start(period).isoformat(),
+                "revenue": float(totals["revenue"]),
+                "orders": totals["orders"]
+            }
+            for period, totals in sorted(periods.items())
+        ]
     
     async def get_dashboard_data(
         self, 
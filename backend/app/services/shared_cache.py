@@ -0,0 +1,40 @@
+"""
+Optional shared cache backend.
+
+When settings.redis_url is set and the redis package is installed, caches
+that workers should share (data versions, cached API responses) keep their
+state in Redis; otherwise each process keeps its own.
+"""
+
+import logging
+from typing import Optional
+
+from ..config import settings
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "acrylican:"
+
+# Errors callers treat as "shared backend unavailable" and fall back from
+SHARED_CACHE_ERRORS = (redis.RedisError,) if redis is not None else ()
+
+_client: Optional["redis.Redis"] = None
+_configured = False
+
+
+def get_redis() -> Optional["redis.Redis"]:
+    """Get the shared Redis client, or None when caches should stay in-process."""
+    global _client, _configured
+    if not _configured:
+        _configured = True
+        if settings.redis_url:
+            if redis is None:
+                logger.warning("redis_url is set but the redis package is not installed; caches stay in-process")
+            else:
+                _client = redis.Redis.from_url(settings.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+    return _client
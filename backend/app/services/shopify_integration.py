@@ -8,7 +8,7 @@ products, handling inventory synchronization, order tracking, and retrieving sal
 import asyncio
 from datetime import datetime, timedelta
 from decimal import Decimal
-from typing import Dict, List, Optional, Any, Union
+from typing import AsyncIterator, Dict, List, Optional, Any, Union
 import httpx
 from sqlalchemy.orm import Session
 
@@ -663,6 +663,54 @@ class ShopifyIntegration(APIBasedIntegration):
             self.logger.error(f"Failed to get orders: {e}")
             return []
     
+    async def iter_orders_updated_since(
+        self,
+        updated_at_min: str,
+        page_size: int = 250
+    ) -> AsyncIterator[List[ShopifyOrderData]]:
+        """
+        Page through orders updated at or after a time, least recently updated first.
+        
+        Pages are followed through the Link header's page_info cursor, so a
+        store without changes costs a single request.
+        
+        Args:
+            updated_at_min: ISO 8601 timestamp, e.g. a previously seen order's updated_at
+            page_size: Orders per request (max 250)
+            
+        Yields:
+            Pages of ShopifyOrderData objects
+            
+        Raises:
+            ShopifyAPIError: If a request fails
+        """
+        credentials = self.oauth_service.get_decrypted_credentials(self.connection)
+        url = f"{self.config.api_base_url}/orders.json"
+        params = {
+            "status": "any",
+            "updated_at_min": updated_at_min,
+            "order": "updated_at asc",
+            "limit": min(page_size, 250)
+        }
+        
+        async with httpx.AsyncClient() as client:
+            while url:
+                response = await client.get(
+                    url,
+                    headers=self._get_auth_headers(credentials.access_token),
+                    params=params,
+                    timeout=30.0
+                )
+                if response.status_code != 200:
+                    raise ShopifyAPIError(f"Failed to get orders: {response.status_code}", response.status_code)
+                
+                yield [ShopifyOrderData(order) for order in response.json().get("orders", [])]
+                
+                # The next page's URL carries the cursor and must be used as is
+                next_page = response.links.get("next")
+                url = next_page["url"] if next_page else None
+                params = None
+    
     def _get_auth_headers(self, access_token: str) -> Dict[str, str]:
         """Get authentication headers for Shopify API requests"""
         return {
@@ -0,0 +1,235 @@
+"""
+Storage Deletion Service
+
+This module deletes objects from cloud storage in batches and keeps a
+durable queue of pending deletions. Paths are queued in the same
+transaction that removes the rows referencing them, deleted with batched
+DeleteObjects requests once that transaction commits, and retried with
+backoff by a background task until storage confirms the deletion.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models import StorageDeletion, StoredObject
+from .cloud_storage import get_storage_service
+
+logger = logging.getLogger(__name__)
+
+# Retry backoff: doubles per attempt from the base, capped
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=6)
+
+# Queued deletions retried per cycle
+RETRY_BATCH_SIZE = 5000
+
+
+def enqueue_deletions(db: Session, storage_paths: Iterable[str]) -> None:
+    """
+    Queue storage paths for deletion in the caller's transaction.
+
+    Call this in the transaction that drops the last reference to the
+    objects, so a crash before the objects are deleted leaves them queued
+    rather than orphaned. The caller must commit the session.
+    """
+    paths = list(dict.fromkeys(path for path in storage_paths if path))
+    if not paths:
+        return
+
+    queued = {
+        row.storage_path
+        for row in db.query(StorageDeletion.storage_path).filter(StorageDeletion.storage_path.in_(paths)).all()
+    }
+    for path in paths:
+        if path not in queued:
+            db.add(StorageDeletion(storage_path=path, attempts=0))
+
+
+def hold_deletions(db: Session, storage_paths: Iterable[str]) -> None:
+    """
+    Keep queued deletions of storage paths from running until the caller's transaction ends.
+
+    Call this before uploading to a path that may be queued for deletion
+    (content-addressed objects are uploaded again under their old key). It
+    waits for a deletion of the path already in progress, and the deletion
+    service skips the locked queue rows until the caller commits, by which
+    time the path is indexed again and its queue row is dropped.
+    """
+    paths = list(dict.fromkeys(path for path in storage_paths if path))
+    if not paths:
+        return
+
+    db.query(StorageDeletion.id).filter(StorageDeletion.storage_path.in_(paths)).with_for_update().all()
+
+
+class StorageDeletionService:
+    """
+    Deletes queued storage objects and retries failures in the background.
+
+    The retry loop follows the same start/stop lifecycle as the other
+    background processors.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.running = False
+        self.retry_interval = settings.storage_deletion_retry_interval
+
+    async def delete(self, storage_paths: Iterable[str]) -> Dict[str, bool]:
+        """
+        Delete objects now, then settle their queue entries.
+
+        Only queued paths are deleted, while their queue rows are locked so
+        an upload of identical content (see hold_deletions) cannot slip in
+        between the check and the deletion. Deleted paths are removed from
+        the queue; failed paths stay queued with their next retry scheduled.
+        Paths that were indexed again since being queued (identical content
+        uploaded anew) are dropped from the queue without being deleted.
+        Paths no longer queued count as deleted; paths held by an upload in
+        progress are left for a later retry.
+
+        Args:
+            storage_paths: Paths to delete
+
+        Returns:
+            Dictionary of storage_path -> success_status
+        """
+        paths = list(dict.fromkeys(path for path in storage_paths if path))
+        if not paths:
+            return {}
+
+        db = SessionLocal()
+        try:
+            # Rows locked by another deletion or an upload are skipped; the lock
+            # is held until the queue is settled below
+            queued = {
+                row.storage_path
+                for row in db.query(StorageDeletion.storage_path).filter(
+                    StorageDeletion.storage_path.in_(paths)
+                ).with_for_update(skip_locked=True).all()
+            }
+            unlocked = [path for path in paths if path not in queued]
+            held = {
+                row.storage_path
+                for row in db.query(StorageDeletion.storage_path).filter(StorageDeletion.storage_path.in_(unlocked)).all()
+            } if unlocked else set()
+
+            live = {
+                row.storage_path
+                for row in db.query(StoredObject.storage_path).filter(StoredObject.storage_path.in_(queued)).all()
+            }
+            to_delete = [path for path in paths if path in queued and path not in live]
+
+            try:
+                results = await get_storage_service().delete_files(to_delete) if to_delete else {}
+            except Exception as e:
+                self.logger.error(f"Batch deletion of {len(to_delete)} objects failed: {e}")
+                results = {path: False for path in to_delete}
+
+            try:
+                self._settle(db, results, live)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                self.logger.error(f"Failed to update storage deletion queue: {e}")
+        finally:
+            db.close()
+
+        results.update({path: False for path in live | held})
+        results.update({path: True for path in paths if path not in queued and path not in held})
+        return results
+
+    async def retry_pending(self, limit: int = RETRY_BATCH_SIZE) -> int:
+        """
+        Retry queued deletions that are due.
+
+        Returns:
+            Number of paths attempted
+        """
+        db = SessionLocal()
+        try:
+            rows = db.query(StorageDeletion).filter(
+                StorageDeletion.next_attempt_at <= datetime.utcnow()
+            ).order_by(StorageDeletion.next_attempt_at).limit(limit).with_for_update(skip_locked=True).all()
+            paths = [row.storage_path for row in rows]
+
+            # Push the rows back while the attempt is in flight so other workers skip them
+            for row in rows:
+                row.next_attempt_at = datetime.utcnow() + RETRY_BASE_DELAY
+            db.commit()
+        finally:
+            db.close()
+
+        if paths:
+            results = await self.delete(paths)
+            succeeded = sum(1 for ok in results.values() if ok)
+            self.logger.info(f"Retried {len(paths)} storage deletions: {succeeded} succeeded")
+        return len(paths)
+
+    def _settle(self, db: Session, results: Dict[str, bool], live: Iterable[str] = ()) -> None:
+        """Drop queue rows for deleted (or live again) paths and reschedule the rest."""
+        deleted = [path for path, ok in results.items() if ok] + list(live)
+        failed = [path for path, ok in results.items() if not ok]
+
+        if deleted:
+            db.query(StorageDeletion).filter(
+                StorageDeletion.storage_path.in_(deleted)
+            ).delete(synchronize_session=False)
+
+        if failed:
+            enqueue_deletions(db, failed)
+            db.flush()
+            now = datetime.utcnow()
+            for row in db.query(StorageDeletion).filter(StorageDeletion.storage_path.in_(failed)).all():
+                row.attempts = (row.attempts or 0) + 1
+                row.last_error = "Storage provider did not confirm deletion"
+                row.next_attempt_at = now + min(RETRY_BASE_DELAY * (2 ** (row.attempts - 1)), RETRY_MAX_DELAY)
+
+    async def start(self):
+        """Start retrying queued deletions."""
+        if self.running:
+            self.logger.warning("Storage deletion service is already running")
+            return
+
+        self.running = True
+        self.logger.info("Starting storage deletion service")
+
+        try:
+            while self.running:
+                try:
+                    # Keep draining while full batches come back
+                    while self.running and await self.retry_pending() >= RETRY_BATCH_SIZE:
+                        pass
+                except Exception as e:
+                    self.logger.error(f"Error retrying storage deletions: {e}")
+
+                await asyncio.sleep(self.retry_interval)
+
+        except asyncio.CancelledError:
+            self.logger.info("Storage deletion service cancelled")
+        finally:
+            self.running = False
+            self.logger.info("Storage deletion service stopped")
+
+    async def stop(self):
+        """Stop the retry loop."""
+        self.logger.info("Stopping storage deletion service")
+        self.running = False
+
+
+# Global service instance
+_storage_deletion_service: Optional[StorageDeletionService] = None
+
+
+def get_storage_deletion_service() -> StorageDeletionService:
+    """Get the global storage deletion service instance."""
+    global _storage_deletion_service
+    if _storage_deletion_service is None:
+        _storage_deletion_service = StorageDeletionService()
+    return _storage_deletion_service
@@ -0,0 +1,154 @@
+"""
+Benchmark image encodings on a corpus of product photos.
+
+For each available format (JPEG, WebP and, with pillow-avif installed, AVIF)
+reports average encoded size, SSIM against the source and encode time, both
+at a fixed quality and when searching quality to fit a byte budget.
+
+Usage (from the backend directory):
+    python -m benchmarks.image_formats [CORPUS_DIR] [--size 1200] [--quality 85] [--budget 150000]
+
+Without a corpus directory, a set of synthetic product-like photos is
+generated so the benchmark can run anywhere.
+"""
+
+import argparse
+import io
+import os
+import random
+import statistics
+import time
+from typing import Dict, List
+
+from PIL import Image as PILImage, ImageDraw, ImageFilter
+
+from app.services.image_encoding import available_formats, encode, encode_to_budget
+
+CORPUS_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+BENCHMARK_FORMATS = ['JPEG', 'WEBP', 'AVIF']
+
+
+def load_corpus(directory: str, size: int) -> List[PILImage.Image]:
+    """Load and downscale every image in a directory."""
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(CORPUS_EXTENSIONS):
+            continue
+        with PILImage.open(os.path.join(directory, name)) as img:
+            img = img.convert('RGB')
+            img.thumbnail((size, size), PILImage.Resampling.LANCZOS)
+            images.append(img)
+    return images
+
+
+def synthetic_corpus(size: int, count: int = 8, seed: int = 7) -> List[PILImage.Image]:
+    """Generate product-like photos: a lit backdrop, a textured object and noise."""
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        backdrop = tuple(rng.randint(180, 240) for _ in range(3))
+        img = PILImage.new('RGB', (size, size), backdrop)
+        draw = ImageDraw.Draw(img)
+
+        # Soft vertical light falloff on the backdrop
+        for y in range(size):
+            shade = int(30 * y / size)
+            draw.line([(0, y), (size, y)], fill=tuple(max(0, c - shade) for c in backdrop))
+
+        # The "product": an ellipse with painted strokes for texture
+        box = [size * 0.2, size * 0.2, size * 0.8, size * 0.85]
+        draw.ellipse(box, fill=tuple(rng.randint(40, 200) for _ in range(3)))
+        for _ in range(200):
+            x, y = rng.uniform(box[0], box[2]), rng.uniform(box[1], box[3])
+            draw.line(
+                [(x, y), (x + rng.uniform(-30, 30), y + rng.uniform(-30, 30))],
+                fill=tuple(rng.randint(0, 255) for _ in range(3)),
+                width=rng.randint(1, 4)
+            )
+
+        img = img.filter(ImageFilter.GaussianBlur(1.2))
+        noise = PILImage.effect_noise((size, size), 12).convert('RGB')
+        images.append(PILImage.blend(img, noise, 0.06))
+    return images
+
+
+def ssim(reference: PILImage.Image, candidate: PILImage.Image) -> float:
+    """
+    Mean structural similarity of two images' luma, over 8x8 windows.
+
+    Uses NumPy when installed; returns NaN otherwise.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        return float('nan')
+
+    a = np.asarray(reference.convert('L'), dtype=np.float64)
+    b = np.asarray(candidate.convert('L').resize(reference.size), dtype=np.float64)
+    h, w = (a.shape[0] // 8) * 8, (a.shape[1] // 8) * 8
+    a = a[:h, :w].reshape(h // 8, 8, w // 8, 8).swapaxes(1, 2)
+    b = b[:h, :w].reshape(h // 8, 8, w // 8, 8).swapaxes(1, 2)
+
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mu_a, mu_b = a.mean(axis=(2, 3)), b.mean(axis=(2, 3))
+    var_a, var_b = a.var(axis=(2, 3)), b.var(axis=(2, 3))
+    cov = ((a - mu_a[..., None, None]) * (b - mu_b[..., None, None])).mean(axis=(2, 3))
+    score = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(score.mean())
+
+
+def benchmark(images: List[PILImage.Image], image_format: str, quality: int,
+              budget: int = None) -> Dict[str, float]:
+    """Encode every image in one format and summarise size, SSIM and time."""
+    sizes, scores, timings, qualities = [], [], [], []
+    for img in images:
+        start = time.perf_counter()
+        if budget:
+            data, chosen_quality = encode_to_budget(img, image_format, budget, max_quality=quality)
+        else:
+            data, chosen_quality = encode(img, image_format, quality), quality
+        timings.append((time.perf_counter() - start) * 1000)
+
+        with PILImage.open(io.BytesIO(data)) as decoded:
+            decoded.load()
+            scores.append(ssim(img, decoded))
+        sizes.append(len(data))
+        qualities.append(chosen_quality)
+
+    return {
+        'bytes': statistics.mean(sizes),
+        'ssim': statistics.mean(scores),
+        'encode_ms': statistics.mean(timings),
+        'quality': statistics.mean(qualities),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('corpus', nargs='?', help='Directory of sample product photos')
+    parser.add_argument('--size', type=int, default=1200, help='Longest edge to downscale to')
+    parser.add_argument('--quality', type=int, default=85, help='Fixed / maximum encoder quality')
+    parser.add_argument('--budget', type=int, default=150_000, help='Byte budget for size-targeted encoding')
+    args = parser.parse_args()
+
+    images = load_corpus(args.corpus, args.size) if args.corpus else synthetic_corpus(args.size)
+    if not images:
+        parser.error(f"No images found in {args.corpus}")
+
+    formats = [f for f in BENCHMARK_FORMATS if f in available_formats()]
+    print(f"{len(images)} images, longest edge {args.size}px, formats: {', '.join(formats)}")
+    print(f"{'format':<8} {'mode':<14} {'avg bytes':>10} {'vs JPEG':>8} {'SSIM':>7} {'quality':>8} {'encode ms':>10}")
+
+    for mode, budget in (('fixed q', None), (f'budget {args.budget // 1000}KB', args.budget)):
+        baseline = None
+        for image_format in formats:
+            result = benchmark(images, image_format, args.quality, budget)
+            baseline = baseline or result['bytes']
+            print(
+                f"{image_format:<8} {mode:<14} {result['bytes']:>10.0f} {result['bytes'] / baseline:>7.0%} "
+                f"{result['ssim']:>7.4f} {result['quality']:>8.1f} {result['encode_ms']:>10.1f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
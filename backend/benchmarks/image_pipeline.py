@@ -0,0 +1,265 @@
+"""
+Benchmark the image processing pipeline stage by stage.
+
+Runs a fixed corpus (JPEG, PNG with alpha and WebP at 0.5-40 megapixels)
+through the same code paths uploads use: ingest (spool and hash), decode,
+EXIF transpose, each planned resize and encode, and upload. Uploads go to a
+local moto S3 server standing in for R2. Timings come from the pipeline's
+own stage metrics (app.services.image_metrics); peak memory per stage is
+taken from a background RSS sampler over each observed interval.
+
+Reports, per stage and label, throughput (megapixels/s), p50/p99 latency
+and peak RSS growth.
+
+Usage (from the backend directory):
+    python -m benchmarks.image_pipeline [--repeat 3] [--sizes 0.5,2,8,16,40] [--by-case] [--json out.json]
+
+Uploads are skipped when moto is not installed (see benchmarks/requirements.txt)
+or with --no-upload.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image as PILImage
+
+from app.config import settings
+from app.services.content_store import get_content_store
+from app.services.image_metrics import get_image_metrics
+from app.services.image_processing import (
+    PLATFORM_REQUIREMENTS, UPLOAD_CHUNK_SIZE, current_rss_bytes, image_service
+)
+
+CORPUS_FORMATS = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',  # with an alpha channel
+    'WEBP': 'image/webp',
+}
+DEFAULT_SIZES = (0.5, 2, 8, 16, 40)
+DEFAULT_CORPUS_DIR = './.cache/benchmark_corpus'
+
+# EXIF orientation "rotate 90 CW", so the transpose stage does real work
+EXIF_ORIENTATION_TAG = 0x0112
+
+
+def corpus_image(megapixels: float, image_format: str, seed: int = 11) -> bytes:
+    """Generate one deterministic, photo-like test image."""
+    width = int(math.sqrt(megapixels * 1_000_000 * 4 / 3))
+    height = int(width * 3 / 4)
+    rng = random.Random(seed)
+
+    # Smooth gradients plus upscaled noise approximate photographic content
+    channels = []
+    for _ in range(3):
+        gradient = PILImage.linear_gradient('L').rotate(rng.randint(0, 359)).resize((width, height))
+        noise = PILImage.effect_noise((max(1, width // 4), max(1, height // 4)), 40).resize(
+            (width, height), PILImage.Resampling.BILINEAR
+        )
+        channels.append(PILImage.blend(gradient, noise, 0.35))
+    img = PILImage.merge('RGB', channels)
+
+    output = io.BytesIO()
+    if image_format == 'PNG':
+        alpha = PILImage.radial_gradient('L').resize((width, height))
+        img.putalpha(alpha)
+        img.save(output, format='PNG', compress_level=6)
+    elif image_format == 'JPEG':
+        exif = PILImage.Exif()
+        exif[EXIF_ORIENTATION_TAG] = 6
+        img.save(output, format='JPEG', quality=92, exif=exif.tobytes())
+    else:
+        img.save(output, format='WEBP', quality=90)
+    return output.getvalue()
+
+
+def load_corpus(directory: str, sizes: List[float]) -> List[Tuple[str, float, str, bytes]]:
+    """Load the corpus from directory, generating any missing files."""
+    os.makedirs(directory, exist_ok=True)
+    corpus = []
+    for megapixels in sizes:
+        for image_format in CORPUS_FORMATS:
+            name = f"corpus_{megapixels}mp.{image_format.lower()}"
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                with open(path, 'wb') as f:
+                    f.write(corpus_image(megapixels, image_format))
+            with open(path, 'rb') as f:
+                corpus.append((name, megapixels, image_format, f.read()))
+    return corpus
+
+
+class RSSSampler:
+    """Samples resident memory on a background thread."""
+
+    def __init__(self, interval: float = 0.002):
+        self.interval = interval
+        self.samples: List[Tuple[float, int]] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.samples.append((time.perf_counter(), current_rss_bytes()))
+            time.sleep(self.interval)
+
+    def __enter__(self) -> "RSSSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def peak_growth(self, start: float, end: float) -> int:
+        """Peak RSS during [start, end] above the last reading before start."""
+        baseline = None
+        peak = 0
+        for at, rss in self.samples:
+            if at <= start:
+                baseline = rss
+            elif at <= end:
+                peak = max(peak, rss)
+            else:
+                break
+        if baseline is None or peak == 0:
+            return 0
+        return max(0, peak - baseline)
+
+
+def start_upload_server(port: int) -> Optional[object]:
+    """Start a local moto S3 server and point storage settings at it."""
+    try:
+        import boto3
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        return None
+
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=port)
+    server.start()
+
+    settings.cloudflare_endpoint_url = f"http://127.0.0.1:{port}"
+    settings.cloudflare_access_key_id = 'benchmark'
+    settings.cloudflare_secret_access_key = 'benchmark'
+    settings.cloudflare_bucket_name = 'benchmark'
+    settings.cloudflare_public_url = None
+
+    boto3.client(
+        's3',
+        endpoint_url=settings.cloudflare_endpoint_url,
+        aws_access_key_id='benchmark',
+        aws_secret_access_key='benchmark'
+    ).create_bucket(Bucket='benchmark')
+    return server
+
+
+async def run_case(name: str, image_format: str, data: bytes, upload: bool) -> None:
+    """Push one corpus image through every pipeline stage."""
+    async def chunks():
+        for offset in range(0, len(data), UPLOAD_CHUNK_SIZE):
+            yield data[offset:offset + UPLOAD_CHUNK_SIZE]
+
+    content_store = get_content_store()
+    with await image_service.ingest_stream(chunks(), name, CORPUS_FORMATS[image_format]) as source:
+        source.image  # decode + transpose
+
+        plan = image_service._plan_variants(
+            source.content_hash, name, CORPUS_FORMATS[image_format], list(PLATFORM_REQUIREMENTS)
+        )
+        for variant_hash, spec, filename, content_type in plan.values():
+            payload = source.read_bytes() if spec is None else image_service.render_spec(source.image, spec)
+            if upload:
+                await content_store.upload(variant_hash, payload, filename, content_type)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarise(rows: Dict[Tuple, Dict]) -> List[Dict]:
+    summary = []
+    for key, row in sorted(rows.items()):
+        durations = row['seconds']
+        total = sum(durations)
+        summary.append({
+            'key': key,
+            'count': len(durations),
+            'p50_ms': percentile(durations, 50) * 1000,
+            'p99_ms': percentile(durations, 99) * 1000,
+            'mp_per_s': row['megapixels'] / total if total else 0.0,
+            'ops_per_s': len(durations) / total if total else 0.0,
+            'peak_mb': row['peak'] / (1024 * 1024),
+        })
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpus-dir', default=DEFAULT_CORPUS_DIR, help='Where the generated corpus is kept')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='Comma-separated megapixel sizes')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per corpus image')
+    parser.add_argument('--no-upload', action='store_true', help='Skip the upload stage')
+    parser.add_argument('--moto-port', type=int, default=5055, help='Port for the local S3 stand-in')
+    parser.add_argument('--by-case', action='store_true', help='Report each corpus image separately')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    sizes = [float(size) for size in args.sizes.split(',')]
+    corpus = load_corpus(args.corpus_dir, sizes)
+
+    # Measure every variant a non-lazy upload would render, in this process
+    settings.lazy_image_variants = False
+    settings.max_file_size = max(settings.max_file_size, max(len(data) for *_, data in corpus))
+    settings.max_image_pixels = max(settings.max_image_pixels, int(max(sizes) * 1_100_000))
+
+    server = None if args.no_upload else start_upload_server(args.moto_port)
+    if server is None and not args.no_upload:
+        print("moto is not installed; skipping the upload stage")
+
+    metrics = get_image_metrics()
+    rows: Dict[Tuple, Dict] = {}
+
+    try:
+        with RSSSampler() as sampler:
+            for name, megapixels, image_format, data in corpus:
+                for _ in range(args.repeat):
+                    metrics.start_sampling()
+                    asyncio.run(run_case(name, image_format, data, upload=server is not None))
+                    for stage, label, seconds, ended_at in metrics.stop_sampling():
+                        key = (name, stage, label) if args.by_case else (stage, label)
+                        row = rows.setdefault(key, {'seconds': [], 'megapixels': 0.0, 'peak': 0})
+                        row['seconds'].append(seconds)
+                        row['megapixels'] += megapixels
+                        row['peak'] = max(row['peak'], sampler.peak_growth(ended_at - seconds, ended_at))
+    finally:
+        if server is not None:
+            server.stop()
+
+    summary = summarise(rows)
+    key_width = max(len(' / '.join(filter(None, row['key']))) for row in summary) + 2
+    print(f"{len(corpus)} corpus images x {args.repeat} runs")
+    print(f"{'stage':<{key_width}} {'n':>5} {'MP/s':>9} {'ops/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'peak MB':>9}")
+    for row in summary:
+        print(
+            f"{' / '.join(filter(None, row['key'])):<{key_width}} {row['count']:>5} {row['mp_per_s']:>9.1f} "
+            f"{row['ops_per_s']:>9.1f} {row['p50_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['peak_mb']:>9.1f}"
+        )
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump([{**row, 'key': list(row['key'])} for row in summary], f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
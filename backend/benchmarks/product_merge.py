@@ -0,0 +1,150 @@
+"""
+Benchmark the top-products merge of sales and engagement aggregates.
+
+Builds synthetic grouped rows as get_top_performing_products receives them
+from the database (one sales row and one engagement row per product and
+platform, half the posts linked by product id and half only by title) and
+times:
+
+- legacy: the previous merge, scanning every product for each engagement
+  row (O(E x P))
+- keyed: analytics_service.rank_products (O(S + E + P log limit))
+
+Usage (from the backend directory):
+    python -m benchmarks.product_merge [--products 1000,10000] [--platforms 6] [--repeat 3]
+
+The legacy merge is quadratic; it is skipped above --legacy-max-products
+(default 2000) unless that is raised.
+"""
+
+import argparse
+import random
+import statistics
+import time
+from collections import namedtuple
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+from app.services.analytics_service import product_platform_score, rank_products
+
+PLATFORM_NAMES = ('etsy', 'shopify', 'facebook', 'instagram', 'pinterest', 'facebook_marketplace',
+                  'meesho', 'snapdeal', 'indiamart')
+TOP_LIMIT = 10
+
+SalesRow = namedtuple('SalesRow', 'product_id product_title platform revenue orders quantity')
+EngagementRow = namedtuple('EngagementRow', 'product_id title platform total_engagement')
+
+
+def build_rows(products: int, platforms: int, seed: int = 3) -> Tuple[List[SalesRow], List[EngagementRow]]:
+    rng = random.Random(seed)
+    names = PLATFORM_NAMES[:platforms]
+    sales, engagement = [], []
+    for i in range(products):
+        product_id = f"product-{i}"
+        title = f"Handmade Item {i}"
+        for platform in names:
+            sales.append(SalesRow(
+                product_id, title, platform,
+                Decimal(rng.randint(100, 2_000_000)) / 100, rng.randint(1, 400), rng.randint(1, 800)
+            ))
+            linked = rng.random() < 0.5
+            engagement.append(EngagementRow(
+                product_id if linked else None, title, platform, rng.randint(0, 50_000)
+            ))
+    rng.shuffle(engagement)
+    return sales, engagement
+
+
+def legacy_rank(product_sales, product_engagement, limit: int) -> Tuple[List[Dict], int]:
+    """The previous implementation, kept for comparison."""
+    products_data = {}
+
+    for sale in product_sales:
+        product_key = sale.product_title or f"Product {sale.product_id}"
+
+        if product_key not in products_data:
+            products_data[product_key] = {
+                "id": sale.product_id,
+                "title": product_key,
+                "total_revenue": 0,
+                "total_orders": 0,
+                "total_engagement": 0,
+                "platforms": {},
+                "best_platform": "",
+                "performance_score": 0
+            }
+
+        products_data[product_key]["platforms"][sale.platform] = {
+            "platform": sale.platform,
+            "revenue": float(sale.revenue),
+            "orders": sale.orders,
+            "engagement": 0,
+            "performance_score": 0
+        }
+
+        products_data[product_key]["total_revenue"] += float(sale.revenue)
+        products_data[product_key]["total_orders"] += sale.orders
+
+    for engagement in product_engagement:
+        for product_key, product_data in products_data.items():
+            if engagement.title and engagement.title.lower() in product_key.lower():
+                if engagement.platform in product_data["platforms"]:
+                    product_data["platforms"][engagement.platform]["engagement"] = int(engagement.total_engagement or 0)
+                    product_data["total_engagement"] += int(engagement.total_engagement or 0)
+                break
+
+    for product_key, product_data in products_data.items():
+        best_platform = ""
+        best_score = 0
+
+        for platform, platform_data in product_data["platforms"].items():
+            score = product_platform_score(platform_data)
+            platform_data["performance_score"] = score
+
+            if score > best_score:
+                best_score = score
+                best_platform = platform
+
+        product_data["best_platform"] = best_platform
+        product_data["performance_score"] = best_score
+        product_data["platforms"] = list(product_data["platforms"].values())
+
+    top_products = sorted(products_data.values(), key=lambda x: x["performance_score"], reverse=True)[:limit]
+    return top_products, len(products_data)
+
+
+def time_merge(merge, sales, engagement, repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        merge(sales, engagement, TOP_LIMIT)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', default='1000,10000', help='Comma-separated product counts')
+    parser.add_argument('--platforms', type=int, default=6, help=f'Platforms per product (max {len(PLATFORM_NAMES)})')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per merge')
+    parser.add_argument('--legacy-max-products', type=int, default=2000,
+                        help='Skip the quadratic legacy merge above this many products')
+    args = parser.parse_args()
+
+    platforms = min(args.platforms, len(PLATFORM_NAMES))
+    print(f"{'products':>9} {'rows':>9} {'merge':<7} {'p50 ms':>11}")
+    for products in (int(count) for count in args.products.split(',')):
+        sales, engagement = build_rows(products, platforms)
+        merges = {'keyed': rank_products}
+        if products <= args.legacy_max_products:
+            merges['legacy'] = legacy_rank
+
+        for name, merge in merges.items():
+            seconds = time_merge(merge, sales, engagement, args.repeat)
+            print(f"{products:>9,} {len(sales) + len(engagement):>9,} {name:<7} {seconds * 1000:>11.1f}")
+        if 'legacy' not in merges:
+            print(f"{products:>9,} {len(sales) + len(engagement):>9,} {'legacy':<7} {'skipped':>11}")
+
+
+if __name__ == '__main__':
+    main()
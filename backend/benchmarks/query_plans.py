@@ -0,0 +1,332 @@
+"""
+Check that the hot queries are served by indexes.
+
+Seeds a scratch database with posts, queue items, sales, engagement metrics,
+platform connections and audit log entries for a few users, then runs
+EXPLAIN on each hot query (the same shapes the services and list endpoints
+issue) and reports the access path. Exits with status 1 if any query falls
+back to a full scan, so it can run as a regression check after schema or
+query changes.
+
+- SQLite: any SCAN step (a full table or full index walk) fails.
+- PostgreSQL: sequential scans are disabled for the session, so one that
+  remains has no index to use; it fails, as does an index scan without an
+  index condition. The database is ANALYZEd after seeding.
+
+Usage (from the backend directory):
+    python -m benchmarks.query_plans [--users 20] [--rows 20000] [--database-url URL] [--verbose]
+
+The default is a temporary SQLite file. Point --database-url at a scratch
+PostgreSQL database to check the plans production gets, including the
+partial indexes.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import and_, asc, create_engine, desc, insert, text
+from sqlalchemy.orm import Query, Session, sessionmaker
+
+from app.database import Base
+from app.models import (
+    AuditLog, EngagementMetrics, PlatformConnection, Post, PostQueue, SaleEvent, User
+)
+from app.pagination import keyset_order, newest_first
+
+PLATFORMS = ('etsy', 'shopify', 'facebook', 'instagram', 'pinterest')
+INSERT_BATCH_SIZE = 5_000
+NOW = datetime(2024, 6, 30)
+PERIOD_DAYS = 365
+
+# PostgreSQL plan nodes that read a relation
+SCAN_NODES = ('Seq Scan', 'Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+
+
+@dataclass
+class Context:
+    """Values the hot queries filter on."""
+    user_id: str
+    post_id: str
+
+
+@dataclass
+class HotQuery:
+    name: str
+    source: str  # Where the application issues it
+    build: Callable[[Session, Context], Query]
+
+
+def _moment(rng: random.Random) -> datetime:
+    return NOW - timedelta(seconds=rng.randint(0, PERIOD_DAYS * 86400))
+
+
+def _insert(db: Session, model, rows: List[Dict]) -> None:
+    for offset in range(0, len(rows), INSERT_BATCH_SIZE):
+        db.execute(insert(model), rows[offset:offset + INSERT_BATCH_SIZE])
+
+
+def seed(db: Session, users: int, rows: int, seed_value: int = 7) -> Context:
+    """Insert rows of each kind spread over users; most queue items are done, most sales confirmed."""
+    rng = random.Random(seed_value)
+    user_ids = [f"plan-check-{index}" for index in range(users)]
+    _insert(db, User, [
+        {'id': user_id, 'email': f"{user_id}@benchmark.invalid", 'password_hash': 'x',
+         'business_name': 'Benchmark', 'business_type': 'crafts'}
+        for user_id in user_ids
+    ])
+
+    posts = []
+    for _ in range(rows):
+        created_at = _moment(rng)
+        posts.append({
+            'id': str(uuid.uuid4()), 'user_id': rng.choice(user_ids), 'title': 'Post', 'description': 'Post',
+            'hashtags': [], 'images': [], 'target_platforms': [rng.choice(PLATFORMS)],
+            'status': rng.choice(('draft', 'scheduled', 'published', 'published', 'failed')),
+            'priority': rng.randint(0, 5), 'created_at': created_at, 'updated_at': created_at
+        })
+    _insert(db, Post, posts)
+
+    _insert(db, PostQueue, [
+        {'id': str(uuid.uuid4()), 'post_id': post['id'], 'platform': post['target_platforms'][0],
+         'status': rng.choices(('completed', 'failed', 'pending', 'processing'), (90, 5, 4, 1))[0],
+         'priority': post['priority'], 'scheduled_at': post['created_at'] + timedelta(hours=rng.randint(0, 48))}
+        for post in posts
+    ])
+
+    sales = []
+    for _ in range(rows):
+        occurred_at = _moment(rng)
+        sales.append({
+            'id': str(uuid.uuid4()), 'user_id': rng.choice(user_ids), 'platform': rng.choice(PLATFORMS),
+            'order_id': str(uuid.uuid4()), 'amount': rng.randint(100, 50_000) / 100,
+            'currency': rng.choice(('INR', 'INR', 'INR', 'USD')),
+            'status': rng.choices(('confirmed', 'pending', 'cancelled', 'refunded'), (85, 5, 5, 5))[0],
+            'sync_status': 'synced', 'occurred_at': occurred_at, 'updated_at': occurred_at
+        })
+    _insert(db, SaleEvent, sales)
+
+    metrics = []
+    for _ in range(rows):
+        post = rng.choice(posts)
+        metrics_date = _moment(rng)
+        metrics.append({
+            'id': str(uuid.uuid4()), 'user_id': post['user_id'], 'post_id': post['id'],
+            'platform': post['target_platforms'][0], 'platform_post_id': str(uuid.uuid4()),
+            'likes': rng.randint(0, 500), 'metrics_date': metrics_date, 'collected_at': metrics_date,
+            'status': rng.choices(('active', 'archived'), (90, 10))[0],
+            'collection_method': 'api', 'data_quality': 'complete', 'sync_status': 'synced'
+        })
+    _insert(db, EngagementMetrics, metrics)
+
+    _insert(db, PlatformConnection, [
+        {'id': str(uuid.uuid4()), 'user_id': user_id, 'platform': platform, 'integration_type': 'api',
+         'auth_method': 'oauth2', 'is_active': rng.random() < 0.8}
+        for user_id in user_ids for platform in PLATFORMS
+    ])
+
+    _insert(db, AuditLog, [
+        {'id': str(uuid.uuid4()), 'user_id': rng.choice(user_ids), 'action': 'data_access', 'resource_type': 'post',
+         'success': rng.random() < 0.97, 'timestamp': _moment(rng),
+         'sensitivity_level': rng.choices(('low', 'normal', 'high', 'critical'), (20, 70, 8, 2))[0]}
+        for _ in range(rows)
+    ])
+    db.commit()
+
+    user_id = user_ids[0]
+    post_id = next(post['id'] for post in posts if post['user_id'] == user_id)
+    return Context(user_id, post_id)
+
+
+HOT_QUERIES = [
+    HotQuery('posts.list', 'PostingService.list_posts', lambda db, c: db.query(Post).filter(
+        Post.user_id == c.user_id
+    ).order_by(*keyset_order(newest_first(Post.created_at, Post.id))).limit(50)),
+
+    HotQuery('posts.list_by_status', 'PostingService.list_posts(status=)', lambda db, c: db.query(Post).filter(
+        Post.user_id == c.user_id, Post.status == 'published'
+    ).order_by(*keyset_order(newest_first(Post.created_at, Post.id))).limit(50)),
+
+    HotQuery('queue.process', 'PostingService.process_queue', lambda db, c: db.query(PostQueue).filter(
+        and_(PostQueue.status == 'pending', PostQueue.scheduled_at <= NOW)
+    ).order_by(desc(PostQueue.priority), asc(PostQueue.scheduled_at)).limit(10)),
+
+    HotQuery('queue.list_by_status', 'PostingService.get_queue_status', lambda db, c: db.query(PostQueue).filter(
+        PostQueue.status == 'failed'
+    ).order_by(*keyset_order(
+        [(PostQueue.priority, True), (PostQueue.scheduled_at, False), (PostQueue.id, False)]
+    )).limit(50)),
+
+    HotQuery('queue.remaining_for_post', 'PostingService._process_queue_item', lambda db, c: db.query(PostQueue).filter(
+        and_(PostQueue.post_id == c.post_id, PostQueue.status.in_(['pending', 'processing']))
+    )),
+
+    HotQuery('sales.list', 'SalesTrackingService.get_sales_list', lambda db, c: db.query(SaleEvent).filter(
+        SaleEvent.user_id == c.user_id
+    ).order_by(*keyset_order(newest_first(SaleEvent.occurred_at, SaleEvent.id))).limit(100)),
+
+    HotQuery('sales.rollup_rebuild', 'sales_rollups.rebuild_rollup', lambda db, c: db.query(SaleEvent).filter(
+        SaleEvent.user_id == c.user_id, SaleEvent.status == 'confirmed',
+        SaleEvent.occurred_at >= NOW - timedelta(days=7), SaleEvent.occurred_at < NOW
+    )),
+
+    HotQuery('sales.rollup_changed', 'SalesRollupRepairService.repair', lambda db, c: db.query(
+        SaleEvent.user_id, SaleEvent.occurred_at
+    ).filter(SaleEvent.updated_at >= NOW - timedelta(hours=1))),
+
+    HotQuery('engagement.list', '/engagement/metrics', lambda db, c: db.query(EngagementMetrics).filter(
+        EngagementMetrics.user_id == c.user_id, EngagementMetrics.status == 'active'
+    ).order_by(*keyset_order(newest_first(EngagementMetrics.collected_at, EngagementMetrics.id))).limit(50)),
+
+    HotQuery('engagement.date_range', 'EngagementMetricsService dashboards, analytics', lambda db, c: db.query(
+        EngagementMetrics
+    ).filter(
+        EngagementMetrics.user_id == c.user_id,
+        EngagementMetrics.metrics_date >= NOW - timedelta(days=30),
+        EngagementMetrics.metrics_date <= NOW,
+        EngagementMetrics.status == 'active',
+        EngagementMetrics.platform.in_(['etsy', 'facebook'])
+    )),
+
+    HotQuery('engagement.post', 'EngagementMetricsService per-post reads and upserts', lambda db, c: db.query(
+        EngagementMetrics
+    ).filter(
+        EngagementMetrics.user_id == c.user_id, EngagementMetrics.post_id == c.post_id,
+        EngagementMetrics.platform == 'etsy'
+    )),
+
+    HotQuery('connections.active', 'user connection listings', lambda db, c: db.query(PlatformConnection).filter(
+        PlatformConnection.user_id == c.user_id, PlatformConnection.is_active == True
+    )),
+
+    HotQuery('connections.platform', 'PlatformService, secure_storage', lambda db, c: db.query(PlatformConnection).filter(
+        PlatformConnection.user_id == c.user_id, PlatformConnection.platform == 'etsy',
+        PlatformConnection.is_active == True
+    )),
+
+    HotQuery('audit.user_log', 'AuditService.get_user_audit_log', lambda db, c: db.query(AuditLog).filter(
+        AuditLog.user_id == c.user_id
+    ).order_by(*keyset_order(newest_first(AuditLog.timestamp, AuditLog.id))).limit(50)),
+
+    HotQuery('audit.critical', 'AuditService.get_critical_events', lambda db, c: db.query(AuditLog).filter(
+        and_(AuditLog.sensitivity_level == 'critical', AuditLog.timestamp >= NOW - timedelta(hours=24))
+    ).order_by(desc(AuditLog.timestamp)).limit(100)),
+
+    HotQuery('audit.cleanup', 'AuditService.cleanup_old_logs', lambda db, c: db.query(AuditLog.id).filter(
+        and_(AuditLog.timestamp < NOW - timedelta(days=90), AuditLog.sensitivity_level != 'critical')
+    )),
+]
+
+
+def _sql(db: Session, query: Query) -> str:
+    """The query's SQL with its parameters inlined, as a driver would send them."""
+    return str(query.statement.compile(
+        dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True}
+    ))
+
+
+def sqlite_plan(db: Session, query: Query) -> Tuple[List[str], List[str]]:
+    """(plan steps, full scans) from EXPLAIN QUERY PLAN."""
+    steps = [row[3] for row in db.execute(text(f"EXPLAIN QUERY PLAN {_sql(db, query)}"))]
+    full_scans = [step for step in steps if step.startswith('SCAN ')]
+    return steps, full_scans
+
+
+def _postgres_nodes(node: Dict):
+    yield node
+    for child in node.get('Plans', []):
+        yield from _postgres_nodes(child)
+
+
+def postgres_plan(db: Session, query: Query) -> Tuple[List[str], List[str]]:
+    """(plan steps, full scans) from EXPLAIN (FORMAT JSON)."""
+    plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {_sql(db, query)}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    steps, full_scans = [], []
+    for node in _postgres_nodes(plan[0]['Plan']):
+        node_type = node['Node Type']
+        if node_type not in SCAN_NODES:
+            continue
+        target = node.get('Relation Name') or ''
+        if node.get('Index Name'):
+            target = f"{target} USING {node['Index Name']}".strip()
+        step = f"{node_type} {target}"
+        if node.get('Index Cond'):
+            step += f" ({node['Index Cond']})"
+        steps.append(step)
+        if node_type == 'Seq Scan' or not node.get('Index Cond'):
+            full_scans.append(step)
+    return steps, full_scans
+
+
+def check(database_url: str, users: int, rows: int, verbose: bool) -> bool:
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    try:
+        context = seed(db, users, rows)
+        db.execute(text("ANALYZE"))
+        db.commit()
+
+        postgres = engine.dialect.name == 'postgresql'
+        if postgres:
+            db.execute(text("SET enable_seqscan = off"))
+
+        passed = True
+        print(f"{'query':<26} {'result':<6} access path")
+        for hot_query in HOT_QUERIES:
+            query = hot_query.build(db, context)
+            steps, full_scans = postgres_plan(db, query) if postgres else sqlite_plan(db, query)
+            ok = not full_scans
+            passed = passed and ok
+            shown = steps if verbose or not ok else steps[:1]
+            print(f"{hot_query.name:<26} {'ok' if ok else 'FULL':<6} {shown[0] if shown else '-'}")
+            for step in shown[1:]:
+                print(f"{'':<33} {step}")
+            if not ok:
+                print(f"{'':<33} from {hot_query.source}")
+        return passed
+    finally:
+        db.close()
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=20, help='Users the rows are spread over')
+    parser.add_argument('--rows', type=int, default=20_000, help='Rows seeded per table')
+    parser.add_argument('--database-url', help='Scratch database (its tables are created and dropped)')
+    parser.add_argument('--verbose', action='store_true', help='Show every plan step, not just the first')
+    args = parser.parse_args()
+
+    scratch_path = None
+    database_url = args.database_url
+    if database_url is None:
+        handle, scratch_path = tempfile.mkstemp(suffix='.db', prefix='query_plans_')
+        os.close(handle)
+        database_url = f"sqlite:///{scratch_path}"
+
+    try:
+        passed = check(database_url, args.users, args.rows, args.verbose)
+    finally:
+        if scratch_path is not None:
+            os.remove(scratch_path)
+
+    if not passed:
+        print("Some hot queries fall back to a full scan")
+        sys.exit(1)
+    print("All hot queries use an index")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Benchmark sales metrics aggregation strategies.
+
+Seeds a scratch database with confirmed sale events for one user (10k, 100k
+and 1M by default) and times three ways of computing the period totals
+behind get_sales_metrics:
+
+- legacy: load every SaleEvent row and sum float() conversions in Python
+- sql: a single SUM/COUNT aggregate over sale_events, exact Decimals
+- rollup: SalesTrackingService.get_sales_metrics over sales_daily_rollup
+
+Reports median latency, peak Python heap allocated during one call
+(tracemalloc) and how far the float total drifts from the exact one.
+
+Usage (from the backend directory):
+    python -m benchmarks.sales_aggregation [--sizes 10000,100000,1000000] [--repeat 5] [--database-url URL]
+
+Each size is seeded into a fresh scratch database; the default is a
+temporary SQLite file. SQLite stores numerics as floating point, so point
+--database-url at a scratch PostgreSQL database to see the exact sums the
+application gets in production.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import and_, create_engine, func, insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.database import Base
+from app.models import SaleEvent, User
+from app.services.sales_rollups import average, money, rebuild_rollup
+from app.services.sales_tracking import SalesTrackingService
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+PLATFORMS = ('etsy', 'shopify', 'facebook', 'instagram', 'pinterest')
+INSERT_BATCH_SIZE = 10_000
+PERIOD_DAYS = 365
+
+
+def seed(db: Session, user_id: str, count: int, end_date: datetime, seed_value: int = 7) -> None:
+    """Insert count confirmed sales for one user, spread over the period."""
+    rng = random.Random(seed_value)
+    db.add(User(
+        id=user_id, email=f"{user_id}@benchmark.invalid", password_hash='x',
+        business_name='Benchmark', business_type='crafts'
+    ))
+    db.flush()
+
+    for offset in range(0, count, INSERT_BATCH_SIZE):
+        rows = []
+        for _ in range(min(INSERT_BATCH_SIZE, count - offset)):
+            amount = Decimal(rng.randint(100, 500_000)) / 100
+            rate = Decimal(rng.choice((0, 500, 650, 1000))) / 10_000
+            commission = (amount * rate).quantize(Decimal('0.01'))
+            rows.append({
+                'id': str(uuid.uuid4()),
+                'user_id': user_id,
+                'platform': rng.choice(PLATFORMS),
+                'order_id': str(uuid.uuid4()),
+                'amount': amount,
+                'currency': 'INR',
+                'product_title': f"Product {rng.randint(1, 200)}",
+                'quantity': rng.randint(1, 3),
+                'commission_rate': rate or None,
+                'commission_amount': commission or None,
+                'net_amount': amount - commission,
+                'occurred_at': end_date - timedelta(seconds=rng.randint(0, PERIOD_DAYS * 86400)),
+                'status': 'confirmed',
+                'sync_status': 'synced',
+            })
+        db.execute(insert(SaleEvent), rows)
+    db.commit()
+
+    rebuild_rollup(db, user_id)
+    db.commit()
+
+
+def sale_filter(user_id: str, start_date: datetime, end_date: datetime):
+    return and_(
+        SaleEvent.user_id == user_id,
+        SaleEvent.occurred_at >= start_date,
+        SaleEvent.occurred_at <= end_date,
+        SaleEvent.status == "confirmed",
+        SaleEvent.currency == "INR"
+    )
+
+
+def legacy_totals(db: Session, user_id: str, start_date: datetime, end_date: datetime) -> Tuple:
+    """The pre-rollup implementation: every row loaded, summed as floats."""
+    sales = db.query(SaleEvent).filter(sale_filter(user_id, start_date, end_date)).all()
+    total_revenue = sum(float(sale.amount) for sale in sales)
+    total_orders = len(sales)
+    average_order_value = total_revenue / total_orders if total_orders > 0 else 0.0
+    total_commission = sum(float(sale.commission_amount or 0) for sale in sales)
+    net_revenue = sum(float(sale.net_amount or sale.amount) for sale in sales)
+    return total_revenue, total_orders, average_order_value, total_commission, net_revenue
+
+
+def sql_totals(db: Session, user_id: str, start_date: datetime, end_date: datetime) -> Tuple:
+    """One aggregate over the raw sales, summed exactly by the database."""
+    totals = db.query(
+        func.sum(SaleEvent.amount).label('total_revenue'),
+        func.count(SaleEvent.id).label('total_orders'),
+        func.sum(SaleEvent.commission_amount).label('total_commission'),
+        func.sum(func.coalesce(SaleEvent.net_amount, SaleEvent.amount)).label('net_revenue')
+    ).filter(sale_filter(user_id, start_date, end_date)).first()
+    total_revenue = money(totals.total_revenue)
+    total_orders = int(totals.total_orders or 0)
+    return (
+        total_revenue, total_orders, average(total_revenue, total_orders),
+        money(totals.total_commission), money(totals.net_revenue)
+    )
+
+
+def rollup_totals(db: Session, user_id: str, start_date: datetime, end_date: datetime) -> Tuple:
+    """What the service serves today, from the daily rollup."""
+    metrics = asyncio.run(SalesTrackingService(db).get_sales_metrics(user_id, start_date, end_date))
+    return (
+        metrics.total_revenue, metrics.total_orders, metrics.average_order_value,
+        metrics.total_commission, metrics.net_revenue
+    )
+
+
+STRATEGIES: Dict[str, Callable] = {
+    'legacy': legacy_totals,
+    'sql': sql_totals,
+    'rollup': rollup_totals,
+}
+
+
+def measure(strategy: Callable, db: Session, user_id: str, start_date: datetime,
+            end_date: datetime, repeat: int) -> Dict:
+    latencies = []
+    for _ in range(repeat):
+        db.expunge_all()
+        started = time.perf_counter()
+        result = strategy(db, user_id, start_date, end_date)
+        latencies.append(time.perf_counter() - started)
+
+    db.expunge_all()
+    tracemalloc.start()
+    strategy(db, user_id, start_date, end_date)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'result': result, 'p50_ms': statistics.median(latencies) * 1000, 'peak_mb': peak / (1024 * 1024)}
+
+
+def run_size(database_url: str, count: int, repeat: int) -> List[Dict]:
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    try:
+        user_id = f"benchmark-{count}"
+        end_date = datetime(2024, 6, 30)
+        start_date = end_date - timedelta(days=PERIOD_DAYS)
+
+        seed_started = time.perf_counter()
+        seed(db, user_id, count, end_date)
+        print(f"seeded {count:,} sales in {time.perf_counter() - seed_started:.1f}s")
+
+        rows = []
+        exact_revenue = None
+        for name, strategy in STRATEGIES.items():
+            row = measure(strategy, db, user_id, start_date, end_date, repeat)
+            revenue = row['result'][0]
+            if name == 'sql':
+                exact_revenue = revenue
+            rows.append({'sales': count, 'strategy': name, 'revenue': revenue, **row})
+
+        for row in rows:
+            row['drift'] = abs(Decimal(str(row['revenue'])) - exact_revenue) if exact_revenue is not None else None
+        return rows
+    finally:
+        db.close()
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='Comma-separated sale counts')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per strategy')
+    parser.add_argument('--database-url', help='Scratch database (its tables are created and dropped)')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    scratch_path = None
+    database_url = args.database_url
+    if database_url is None:
+        handle, scratch_path = tempfile.mkstemp(suffix='.db', prefix='sales_benchmark_')
+        os.close(handle)
+        database_url = f"sqlite:///{scratch_path}"
+
+    rows = []
+    try:
+        for count in sizes:
+            rows.extend(run_size(database_url, count, args.repeat))
+    finally:
+        if scratch_path is not None:
+            os.remove(scratch_path)
+
+    print(f"{'sales':>10} {'strategy':<8} {'p50 ms':>10} {'peak MB':>9} {'revenue':>16} {'drift':>10}")
+    for row in rows:
+        print(
+            f"{row['sales']:>10,} {row['strategy']:<8} {row['p50_ms']:>10.1f} {row['peak_mb']:>9.1f} "
+            f"{float(row['revenue']):>16,.2f} {row['drift']:>10}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Add engagement samples
+
+Revision ID: b95e7d1c4a38
+Revises: a6d3f0b82c57
+Create Date: 2025-10-16 14:03:17.912554
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b95e7d1c4a38'
+down_revision = 'a6d3f0b82c57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+
+    columns = [
+        sa.Column('post_id', sa.String(), nullable=False),
+        sa.Column('platform', sa.String(), nullable=False),
+        sa.Column('resolution', sa.SmallInteger(), nullable=False),
+        sa.Column('sampled_at', sa.DateTime(), nullable=False),
+        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('likes', sa.Integer(), nullable=False),
+        sa.Column('shares', sa.Integer(), nullable=False),
+        sa.Column('comments', sa.Integer(), nullable=False),
+        sa.Column('views', sa.Integer(), nullable=False),
+        sa.Column('reach', sa.Integer(), nullable=False),
+        sa.Column('rolled_up', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('post_id', 'platform', 'resolution', 'sampled_at'),
+    ]
+    if postgresql:
+        # Monthly partitions are created ahead of time by the engagement history
+        # service; the default partition catches anything outside them
+        op.create_table('engagement_samples', *columns, postgresql_partition_by='RANGE (sampled_at)')
+        op.execute('CREATE TABLE engagement_samples_default PARTITION OF engagement_samples DEFAULT')
+
+        # Partitions for the backfilled history below, through next month
+        first = op.get_bind().execute(sa.text(
+            "SELECT MIN(COALESCE(collected_at, metrics_date)) FROM engagement_metrics"
+        )).scalar()
+        month = (first or datetime.utcnow()).date().replace(day=1)
+        last = (datetime.utcnow().date().replace(day=1) + timedelta(days=32)).replace(day=1)
+        while month <= last:
+            following = (month + timedelta(days=32)).replace(day=1)
+            op.execute(
+                f"CREATE TABLE engagement_samples_{month:%Y_%m} "
+                f"PARTITION OF engagement_samples FOR VALUES FROM ('{month}') TO ('{following}')"
+            )
+            month = following
+    else:
+        op.create_table('engagement_samples', *columns)
+    op.create_index('ix_engagement_samples_user_resolution_sampled', 'engagement_samples', ['user_id', 'resolution', 'sampled_at'], unique=False)
+    op.create_index('ix_engagement_samples_resolution_rolled_sampled', 'engagement_samples', ['resolution', 'rolled_up', 'sampled_at'], unique=False)
+
+    # Existing metrics become daily samples on the day they were collected
+    collected_day = (
+        "date_trunc('day', COALESCE(collected_at, metrics_date))" if postgresql
+        else "datetime(date(COALESCE(collected_at, metrics_date)))"
+    )
+    op.execute(f"""
+        INSERT INTO engagement_samples
+            (post_id, platform, resolution, sampled_at, user_id, likes, shares, comments, views, reach, rolled_up)
+        SELECT post_id, platform, 2, {collected_day}, MIN(user_id),
+               SUM(COALESCE(likes, 0)), SUM(COALESCE(shares, 0)), SUM(COALESCE(comments, 0)),
+               SUM(COALESCE(views, 0)), SUM(COALESCE(reach, 0)), false
+        FROM engagement_metrics
+        WHERE status = 'active' AND COALESCE(collected_at, metrics_date) IS NOT NULL
+        GROUP BY post_id, platform, {collected_day}
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_engagement_samples_resolution_rolled_sampled', table_name='engagement_samples')
+    op.drop_index('ix_engagement_samples_user_resolution_sampled', table_name='engagement_samples')
+    op.drop_table('engagement_samples')
@@ -0,0 +1,68 @@
+"""Add sales import jobs and unique sale orders
+
+Revision ID: c3f8a1d26e94
+Revises: b95e7d1c4a38
+Create Date: 2025-10-17 10:12:44.306182
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f8a1d26e94'
+down_revision = 'b95e7d1c4a38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('sales_import_jobs',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('file_path', sa.String(), nullable=False),
+    sa.Column('original_filename', sa.String(), nullable=False),
+    sa.Column('file_size', sa.BigInteger(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.Column('error_message', sa.Text(), nullable=True),
+    sa.Column('byte_offset', sa.BigInteger(), nullable=False),
+    sa.Column('rows_processed', sa.Integer(), nullable=False),
+    sa.Column('rows_imported', sa.Integer(), nullable=False),
+    sa.Column('rows_duplicate', sa.Integer(), nullable=False),
+    sa.Column('rows_failed', sa.Integer(), nullable=False),
+    sa.Column('errors', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('file_path')
+    )
+    op.create_index(op.f('ix_sales_import_jobs_status'), 'sales_import_jobs', ['status'], unique=False)
+    op.create_index(op.f('ix_sales_import_jobs_user_id'), 'sales_import_jobs', ['user_id'], unique=False)
+
+    # Keep the first recorded copy of orders entered more than once. Rollups of
+    # the affected users are dropped; the rollup repair job backfills them.
+    duplicated = (
+        "SELECT user_id FROM sale_events "
+        "GROUP BY user_id, platform, order_id HAVING COUNT(*) > 1"
+    )
+    op.execute(f"DELETE FROM sales_daily_rollup WHERE user_id IN ({duplicated})")
+    op.execute(
+        "DELETE FROM sale_events WHERE id IN ("
+        "SELECT id FROM ("
+        "SELECT id, ROW_NUMBER() OVER ("
+        "PARTITION BY user_id, platform, order_id ORDER BY recorded_at, id"
+        ") AS copy FROM sale_events"
+        ") ranked WHERE copy > 1)"
+    )
+    op.create_index('ix_sale_events_user_platform_order', 'sale_events', ['user_id', 'platform', 'order_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sale_events_user_platform_order', table_name='sale_events')
+    op.drop_index(op.f('ix_sales_import_jobs_user_id'), table_name='sales_import_jobs')
+    op.drop_index(op.f('ix_sales_import_jobs_status'), table_name='sales_import_jobs')
+    op.drop_table('sales_import_jobs')
@@ -73,12 +73,20 @@ const ImagePreview: React.FC<ImagePreviewProps> = ({
       >
         {/* Image */}
         <div className="aspect-square relative overflow-hidden bg-gray-100">
-          <img
-            src={image.thumbnail_url}
-            alt={image.file_name}
-            className="w-full h-full object-cover transition-transform duration-200 group-hover:scale-105"
-            loading="lazy"
-          />
+          <picture>
+            {/* Smaller AVIF/WebP encodings where the browser supports them */}
+            {Object.entries(image.thumbnail_sources || {})
+              .filter(([type]) => type !== 'image/jpeg')
+              .map(([type, url]) => (
+                <source key={type} srcSet={url} type={type} />
+              ))}
+            <img
+              src={image.thumbnail_url}
+              alt={image.file_name}
+              className="w-full h-full object-cover transition-transform duration-200 group-hover:scale-105"
+              loading="lazy"
+            />
+          </picture>
           
           {/* Loading Overlay */}
           {isLoading && (
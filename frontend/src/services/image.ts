@@ -11,83 +11,244 @@ export interface ImageUploadResponse {
     thumbnails: Record<string, string>;
     platform_optimized: Record<string, string>;
   };
+  near_duplicates?: string[];
+  reused?: boolean;
 }
 
+interface ImageBatchEvent {
+  index: number;
+  filename?: string;
+  status: 'received' | 'completed' | 'duplicate' | 'error' | 'done' | 'failed';
+  image?: {
+    id: string;
+    original_url: string;
+    compressed_url: string;
+    thumbnail_urls: Record<string, string>;
+    file_size: number;
+    dimensions: { width: number; height: number };
+  };
+  error?: string;
+}
+
+export interface ImageJob {
+  id: string;
+  status: 'pending' | 'processing' | 'completed' | 'failed';
+  storage_path: string;
+  original_filename: string;
+  product_id?: string;
+  result_id?: string;
+  attempts: number;
+  error_message?: string;
+  created_at: string;
+  completed_at?: string;
+}
+
+interface DirectUploadData {
+  upload_url: string;
+  fields: Record<string, string>;
+  storage_path: string;
+  expires_at: string;
+}
+
+// Interval between job status checks while a direct upload is processed
+const JOB_POLL_INTERVAL_MS = 1500;
+
+// Thumbnail URL keys by content type, smallest encoding first
+const THUMBNAIL_SOURCE_KEYS: [string, string][] = [
+  ["image/avif", "small_avif"],
+  ["image/webp", "small_webp"],
+  ["image/jpeg", "small"],
+];
+
+const thumbnailSources = (thumbnailUrls?: Record<string, string>): Record<string, string> => {
+  const sources: Record<string, string> = {};
+  THUMBNAIL_SOURCE_KEYS.forEach(([type, key]) => {
+    if (thumbnailUrls?.[key]) {
+      sources[type] = thumbnailUrls[key];
+    }
+  });
+  return sources;
+};
+
 export class ImageService {
   static async uploadImages(
     files: File[],
     onProgress?: (fileIndex: number, progress: number) => void
   ): Promise<ProcessedImage[]> {
-    const uploadedImages: ProcessedImage[] = [];
+    const formData = new FormData();
+    files.forEach((file) => formData.append('files', file));
 
-    for (let i = 0; i < files.length; i++) {
-      const file = files[i];
-      const formData = new FormData();
-      formData.append('file', file);
+    const results: (ProcessedImage | undefined)[] = new Array(files.length);
+    const errors: string[] = [];
+    let parsedLength = 0;
 
-      try {
-        const response = await apiClient.post<ImageUploadResponse>(
-          "/images/upload",
-          formData,
-          {
-            headers: {
-              "Content-Type": "multipart/form-data",
-            },
-            onUploadProgress: (progressEvent) => {
-              if (onProgress && progressEvent.total) {
-                const progress = Math.round(
-                  (progressEvent.loaded * 100) / progressEvent.total
-                );
-                onProgress(i, progress);
-              }
-            },
-          }
-        );
+    // Events arrive as newline-delimited JSON while the batch is processed
+    const handleEvents = (text: string) => {
+      const lastNewline = text.lastIndexOf("\n");
+      if (lastNewline < parsedLength) {
+        return;
+      }
 
-        // Convert response to ProcessedImage format
-        const processedImage: ProcessedImage = {
-          id: response.data.image_id,
-          original_url: response.data.urls.original,
-          compressed_url: response.data.urls.compressed,
-          thumbnail_url: response.data.urls.thumbnails?.small || response.data.urls.compressed,
-          file_size: file.size, // Use actual file size
-          dimensions: { width: 0, height: 0 }, // Will be updated by backend
-          file_name: file.name,
-          created_at: new Date().toISOString()
-        };
+      const lines = text.slice(parsedLength, lastNewline).split("\n");
+      parsedLength = lastNewline + 1;
 
-        uploadedImages.push(processedImage);
-      } catch (error) {
-        console.error(`Image upload failed for ${file.name}:`, error);
-        
-        // Handle different types of errors
-        if (error instanceof Error) {
-          throw error;
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const event: ImageBatchEvent = JSON.parse(line);
+
+        if (event.status === 'completed' || event.status === 'duplicate') {
+          const file = files[event.index];
+          const image = event.image!;
+          results[event.index] = {
+            id: image.id,
+            original_url: image.original_url,
+            compressed_url: image.compressed_url,
+            thumbnail_url: image.thumbnail_urls?.small || image.compressed_url,
+            thumbnail_sources: thumbnailSources(image.thumbnail_urls),
+            file_size: image.file_size || file.size,
+            dimensions: image.dimensions,
+            file_name: file.name,
+            created_at: new Date().toISOString()
+          };
+          onProgress?.(event.index, 100);
+        } else if (event.status === 'error') {
+          errors.push(`${files[event.index].name}: ${event.error}`);
+        } else if (event.status === 'failed') {
+          errors.push(event.error || "Image upload failed");
         }
-        
-        // Handle axios errors
-        if (error && typeof error === 'object' && 'response' in error) {
-          const axiosError = error as any;
-          if (axiosError.response?.data?.detail) {
-            throw new Error(axiosError.response.data.detail);
-          }
-          if (axiosError.response?.status === 413) {
-            throw new Error("File size too large. Please choose smaller images.");
-          }
-          if (axiosError.response?.status === 400) {
-            throw new Error("Invalid file format. Please upload JPEG, PNG, or WebP images.");
-          }
+      }
+    };
+
+    try {
+      const response = await apiClient.post<string>(
+        "/images/upload/batch",
+        formData,
+        {
+          headers: {
+            "Content-Type": "multipart/form-data",
+          },
+          responseType: "text",
+          timeout: 0,
+          onUploadProgress: (progressEvent) => {
+            if (onProgress && progressEvent.total) {
+              // Files are sent in one request; report overall progress for each,
+              // leaving 100 for when the server reports the file as processed
+              const progress = Math.min(
+                99,
+                Math.round((progressEvent.loaded * 100) / progressEvent.total)
+              );
+              files.forEach((_, index) => onProgress(index, progress));
+            }
+          },
+          onDownloadProgress: (progressEvent) => {
+            const request = progressEvent.event?.target as XMLHttpRequest | undefined;
+            if (request?.responseText) {
+              handleEvents(request.responseText);
+            }
+          },
+        }
+      );
+
+      handleEvents(response.data.endsWith("\n") ? response.data : `${response.data}\n`);
+    } catch (error) {
+      console.error("Batch image upload failed:", error);
+
+      // Handle axios errors
+      if (error && typeof error === 'object' && 'response' in error) {
+        const axiosError = error as any;
+        if (axiosError.response?.data?.detail) {
+          throw new Error(axiosError.response.data.detail);
+        }
+        if (axiosError.response?.status === 413) {
+          throw new Error("File size too large. Please choose smaller images.");
+        }
+        if (axiosError.response?.status === 400) {
+          throw new Error("Invalid file format. Please upload JPEG, PNG, or WebP images.");
         }
-        
-        throw new Error(`Failed to upload ${file.name}. Please try again.`);
       }
+
+      throw new Error("Failed to upload images. Please try again.");
+    }
+
+    if (errors.length > 0) {
+      throw new Error(errors.join("; "));
     }
 
-    return uploadedImages;
+    return results.filter((image): image is ProcessedImage => image !== undefined);
+  }
+
+  /**
+   * Upload an original straight to storage and wait for background processing.
+   * Resolves with the id of the created image (or product image).
+   */
+  static async uploadImageDirect(
+    file: File,
+    options: { platforms?: string[]; productId?: string } = {},
+    onProgress?: (progress: number) => void
+  ): Promise<string> {
+    try {
+      const { data } = await apiClient.post<{ upload_data: DirectUploadData }>(
+        "/images/direct-upload",
+        null,
+        { params: { filename: file.name, content_type: file.type } }
+      );
+      const upload = data.upload_data;
+
+      // Presigned POST: policy fields first, then the file itself
+      const formData = new FormData();
+      Object.entries(upload.fields).forEach(([key, value]) => formData.append(key, value));
+      formData.append("file", file);
+
+      await new Promise<void>((resolve, reject) => {
+        const request = new XMLHttpRequest();
+        request.open("POST", upload.upload_url);
+        request.upload.onprogress = (event) => {
+          if (onProgress && event.lengthComputable) {
+            onProgress(Math.min(99, Math.round((event.loaded * 100) / event.total)));
+          }
+        };
+        request.onload = () =>
+          request.status >= 200 && request.status < 300
+            ? resolve()
+            : reject(new Error(`Storage upload failed with status ${request.status}`));
+        request.onerror = () => reject(new Error("Storage upload failed"));
+        request.send(formData);
+      });
+
+      let { data: job } = await apiClient.post<ImageJob>("/images/direct-upload/complete", {
+        storage_path: upload.storage_path,
+        filename: file.name,
+        content_type: file.type,
+        platforms: options.platforms || [],
+        product_id: options.productId,
+      });
+
+      while (job.status === "pending" || job.status === "processing") {
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+        ({ data: job } = await apiClient.get<ImageJob>(`/images/jobs/${job.id}`));
+      }
+
+      if (job.status === "failed" || !job.result_id) {
+        throw new Error(job.error_message || "Image processing failed");
+      }
+
+      onProgress?.(100);
+      return job.result_id;
+    } catch (error) {
+      console.error("Direct image upload failed:", error);
+      if (error && typeof error === 'object' && 'response' in error) {
+        const axiosError = error as any;
+        if (axiosError.response?.data?.detail) {
+          throw new Error(axiosError.response.data.detail);
+        }
+      }
+      throw error instanceof Error ? error : new Error("Failed to upload image. Please try again.");
+    }
   }
 
   static async deleteImage(imageId: string): Promise<void> {
     try {
+      // The server releases the image's stored objects and purges any no longer shared
       await apiClient.delete(`/images/${imageId}`);
     } catch (error) {
       console.error("Image deletion failed:", error);
@@ -95,6 +256,22 @@ export class ImageService {
     }
   }
 
+  static async getImageVariant(
+    imageId: string,
+    variant: { platform?: string; thumbnail?: string; width?: number; height?: number; quality?: number; format?: string }
+  ): Promise<string> {
+    try {
+      const response = await apiClient.get<{ url: string }>(
+        `/images/${imageId}/variant`,
+        { params: variant }
+      );
+      return response.data.url;
+    } catch (error) {
+      console.error("Failed to fetch image variant:", error);
+      throw new Error("Failed to load image variant. Please try again.");
+    }
+  }
+
   static async getUserImages(): Promise<ProcessedImage[]> {
     try {
       const response = await apiClient.get<{ images: ProcessedImage[] }>(
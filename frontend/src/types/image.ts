@@ -3,6 +3,7 @@ export interface ProcessedImage {
   original_url: string;
   compressed_url: string;
   thumbnail_url: string;
+  thumbnail_sources?: Record<string, string>;
   file_size: number;
   dimensions: {
     width: number;